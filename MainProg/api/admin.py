@@ -0,0 +1,22 @@
+"""
+Access to the admin-only debug endpoints.
+"""
+import hmac
+from typing import Optional
+
+from config.settings import ADMIN_TOKEN
+
+def is_admin_token(token: Optional[str]) -> bool:
+    """
+    Check a token sent in the X-Admin-Token header.
+
+    Args:
+        token: Token sent by the client, None if it sent none
+
+    Returns:
+        Whether the token is the configured admin token; always False when
+        no admin token is configured
+    """
+    if not ADMIN_TOKEN or not token:
+        return False
+    return hmac.compare_digest(token.encode('utf-8'), ADMIN_TOKEN.encode('utf-8'))
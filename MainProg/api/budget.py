@@ -0,0 +1,81 @@
+"""
+Per-request limits for API calls.
+"""
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, Optional
+
+from config.settings import (
+    API_MAX_RETRIES,
+    GENERATION_TIMEOUT,
+    MAX_GENERATION_TIMEOUT,
+    MAX_API_RETRIES,
+    MAX_COMPLETION_TOKENS
+)
+
+class BudgetExceeded(Exception):
+    """Raised when a request runs out of time before an API call could be made."""
+
+def _bounded(value: Any, default: float, low: float, high: float) -> float:
+    """Convert a client-supplied number, falling back to a default and clamping it to a range."""
+    if value is None or value == '':
+        return default
+    return min(max(float(value), low), high)
+
+@dataclass
+class Budget:
+    """
+    Limits shared by all the API calls made for one request.
+
+    The deadline covers every call and retry together, so a generation
+    fails once its time is up instead of after max_retries full API
+    timeouts per call.
+    """
+    deadline: float  # time.monotonic() value
+    max_retries: int = API_MAX_RETRIES
+    max_tokens: Optional[int] = None
+    endpoint: Optional[str] = None  # Endpoint the calls are made for, in the token ledger
+    session: Optional[str] = None  # Client the calls are accounted to, in the token ledger
+
+    @classmethod
+    def from_request(
+        cls,
+        data: Dict[str, Any],
+        endpoint: Optional[str] = None,
+        session: Optional[str] = None
+    ) -> 'Budget':
+        """
+        Build the budget a client asked for, capped by the server limits.
+
+        Args:
+            data: Request body, optionally with timeout (seconds), max_retries
+                (attempts per API call) and max_tokens (per API call)
+            endpoint: Endpoint of the request
+            session: Client making the request
+
+        Returns:
+            Budget starting now
+        """
+        timeout = _bounded(data.get('timeout'), GENERATION_TIMEOUT, 1, MAX_GENERATION_TIMEOUT)
+        max_retries = int(_bounded(data.get('max_retries'), API_MAX_RETRIES, 1, MAX_API_RETRIES))
+        max_tokens = int(_bounded(data.get('max_tokens'), MAX_COMPLETION_TOKENS, 1, MAX_COMPLETION_TOKENS))
+        return cls(time.monotonic() + timeout, max_retries, max_tokens, endpoint, session)
+
+    def remaining(self) -> float:
+        """Seconds left before the deadline."""
+        return self.deadline - time.monotonic()
+
+    def check(self) -> float:
+        """
+        Make sure there is time left for another API call.
+
+        Returns:
+            Seconds left before the deadline
+
+        Raises:
+            BudgetExceeded: If the deadline has passed
+        """
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise BudgetExceeded("Generation took longer than its time budget")
+        return remaining
@@ -0,0 +1,192 @@
+"""
+Record and replay of OpenAI API calls, for profiling without the live API.
+
+In record mode the real client is wrapped and every completion is appended
+to a cassette file with its request, response and latency. In replay mode a
+stand-in client answers from the cassette without importing the SDK or
+touching the network, optionally sleeping for the recorded latency, so the
+rest of the request pipeline runs exactly as it did when recorded.
+"""
+import asyncio
+import hashlib
+import json
+import os
+import threading
+import time
+from collections import deque
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, Optional
+
+# Cassette modes; "off" uses the live API only
+MODES = ('off', 'record', 'replay')
+
+# Request arguments that do not change the response
+_IGNORED_ARGUMENTS = ('timeout',)
+
+class CassetteMiss(Exception):
+    """Raised in replay mode for an API call the cassette has no recording of."""
+
+def request_key(arguments: Dict[str, Any]) -> str:
+    """
+    Digest identifying the arguments of a completion request.
+
+    Args:
+        arguments: Keyword arguments of chat.completions.create()
+
+    Returns:
+        Hex digest of the arguments that influence the response
+    """
+    relevant = {name: value for name, value in arguments.items() if name not in _IGNORED_ARGUMENTS}
+    encoded = json.dumps(relevant, sort_keys=True, ensure_ascii=False).encode('utf-8')
+    return hashlib.blake2b(encoded, digest_size=16).hexdigest()
+
+def _completion(entry: Dict[str, Any]) -> SimpleNamespace:
+    """Rebuild the parts of a completion the app reads from a cassette entry."""
+    response = entry['response']
+    return SimpleNamespace(
+        model=response.get('model'),
+        choices=[SimpleNamespace(message=SimpleNamespace(content=response['content']))],
+        usage=SimpleNamespace(**response['usage']) if response.get('usage') else None
+    )
+
+class Cassette:
+    """
+    File of recorded API calls, one JSON object per line.
+
+    Replay matches calls by their arguments. A prompt recorded several times
+    is answered with its recordings in order, then with its last one again,
+    so a run with repeated prompts replays the way it was recorded.
+    """
+
+    def __init__(self, path: str, mode: str, latency_scale: float = 0.0):
+        """
+        Open a cassette.
+
+        Args:
+            path: Cassette file
+            mode: "record" to append calls to the file, "replay" to answer from it
+            latency_scale: Share of the recorded latency to wait before
+                answering in replay mode, 0 to answer at once
+
+        Raises:
+            ValueError: If the mode is unknown
+        """
+        if mode not in ('record', 'replay'):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.path = path
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._lock = threading.Lock()
+        self._recordings: Dict[str, Deque[Dict[str, Any]]] = {}
+        if mode == 'replay':
+            self._load()
+
+    def _load(self) -> None:
+        """Read the recordings to replay."""
+        with open(self.path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    entry = json.loads(line)
+                    self._recordings.setdefault(entry['key'], deque()).append(entry)
+
+    def __len__(self) -> int:
+        return sum(len(entries) for entries in self._recordings.values())
+
+    def record(self, arguments: Dict[str, Any], response: Any, latency: float) -> None:
+        """
+        Append a completed call to the cassette.
+
+        Args:
+            arguments: Keyword arguments of chat.completions.create()
+            response: Completion returned by the API
+            latency: Seconds the call took
+        """
+        usage = getattr(response, 'usage', None)
+        entry = {
+            'key': request_key(arguments),
+            'request': {name: value for name, value in arguments.items() if name not in _IGNORED_ARGUMENTS},
+            'response': {
+                'model': getattr(response, 'model', None),
+                'content': response.choices[0].message.content,
+                'usage': {
+                    'prompt_tokens': usage.prompt_tokens,
+                    'completion_tokens': usage.completion_tokens
+                } if usage else None
+            },
+            'latency': round(latency, 4)
+        }
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, 'a', encoding='utf-8') as f:
+                f.write(line)
+
+    def replay(self, arguments: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Get the next recording of a call.
+
+        Args:
+            arguments: Keyword arguments of chat.completions.create()
+
+        Returns:
+            Cassette entry with the response and latency
+
+        Raises:
+            CassetteMiss: If the call was never recorded
+        """
+        with self._lock:
+            entries = self._recordings.get(request_key(arguments))
+            if not entries:
+                raise CassetteMiss("No recorded response for this API call; record the cassette again")
+            return entries.popleft() if len(entries) > 1 else entries[0]
+
+    def delay(self, entry: Dict[str, Any]) -> float:
+        """Seconds to wait before answering with a replayed entry."""
+        return entry['latency'] * self.latency_scale
+
+class _Completions:
+    """chat.completions of a blocking cassette client."""
+
+    def __init__(self, cassette: Cassette, client: Any):
+        self._cassette = cassette
+        self._client = client
+
+    def create(self, **arguments: Any) -> Any:
+        if self._cassette.mode == 'replay':
+            entry = self._cassette.replay(arguments)
+            time.sleep(self._cassette.delay(entry))
+            return _completion(entry)
+        started = time.monotonic()
+        response = self._client.chat.completions.create(**arguments)
+        self._cassette.record(arguments, response, time.monotonic() - started)
+        return response
+
+class _AsyncCompletions(_Completions):
+    """chat.completions of an async cassette client."""
+
+    async def create(self, **arguments: Any) -> Any:
+        if self._cassette.mode == 'replay':
+            entry = self._cassette.replay(arguments)
+            await asyncio.sleep(self._cassette.delay(entry))
+            return _completion(entry)
+        started = time.monotonic()
+        response = await self._client.chat.completions.create(**arguments)
+        self._cassette.record(arguments, response, time.monotonic() - started)
+        return response
+
+class CassetteClient:
+    """
+    Stand-in for openai.OpenAI or openai.AsyncOpenAI that records or replays completions.
+    """
+
+    def __init__(self, cassette: Cassette, client: Optional[Any] = None, asynchronous: bool = False):
+        """
+        Wrap a client.
+
+        Args:
+            cassette: Cassette to record to or replay from
+            client: Real client to record, None in replay mode
+            asynchronous: Whether completions are awaited
+        """
+        completions = (_AsyncCompletions if asynchronous else _Completions)(cassette, client)
+        self.chat = SimpleNamespace(completions=completions)
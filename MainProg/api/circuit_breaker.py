@@ -0,0 +1,221 @@
+"""
+Circuit breaker protecting the server from a failing or slow upstream API.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Deque, Dict, Iterator, Optional, Tuple
+
+# Circuit states
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+class CircuitOpen(Exception):
+    """Raised instead of calling the API while the circuit is open."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("The text generation service is temporarily unavailable")
+        self.retry_after = retry_after
+
+class CircuitBreaker:
+    """
+    Track the outcome of recent API calls and stop calling when they go bad.
+
+    The circuit opens when, over the last `window` seconds and at least
+    `min_calls` calls, the share of failed calls reaches `failure_rate` or
+    the share of calls slower than `slow_call_seconds` reaches
+    `slow_call_rate`. Calls then fail immediately with CircuitOpen. After
+    `open_seconds` the circuit is half open: up to `trial_calls` calls at a
+    time go through, and the first one to finish closes the circuit again
+    if it succeeded quickly or reopens it otherwise.
+    """
+
+    def __init__(
+        self,
+        window: float,
+        min_calls: int,
+        failure_rate: float,
+        slow_call_seconds: float,
+        slow_call_rate: float,
+        open_seconds: float,
+        trial_calls: int = 1
+    ):
+        """
+        Initialize a closed circuit.
+
+        Args:
+            window: Seconds of call history the rates are computed over
+            min_calls: Calls needed in the window before the circuit can open
+            failure_rate: Share of failed calls that opens the circuit (0-1)
+            slow_call_seconds: Duration above which a call counts as slow
+            slow_call_rate: Share of slow calls that opens the circuit (0-1)
+            open_seconds: Seconds the circuit stays open before trial calls
+            trial_calls: Concurrent trial calls allowed while half open
+        """
+        self.window = window
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.slow_call_seconds = slow_call_seconds
+        self.slow_call_rate = slow_call_rate
+        self.open_seconds = open_seconds
+        self.trial_calls = trial_calls
+
+        self._lock = threading.Lock()
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._trials = 0
+        self._times_opened = 0
+        # (finish time, failed, slow) of the calls in the window
+        self._calls: Deque[Tuple[float, bool, bool]] = deque()
+
+    def _expire(self, now: float) -> None:
+        while self._calls and self._calls[0][0] < now - self.window:
+            self._calls.popleft()
+
+    def _rates(self) -> Tuple[float, float]:
+        count = len(self._calls) or 1
+        return (
+            sum(failed for _, failed, _ in self._calls) / count,
+            sum(slow for _, _, slow in self._calls) / count
+        )
+
+    def _open(self, now: float) -> None:
+        self._state = OPEN
+        self._opened_at = now
+        self._times_opened += 1
+        print(f"Circuit breaker opened; API calls are suspended for {self.open_seconds:g}s")
+
+    def before_call(self) -> bool:
+        """
+        Ask for permission to make an API call.
+
+        Every permitted call must be followed by record(), or by release()
+        if it was cancelled.
+
+        Returns:
+            True if the call is a trial call of a half open circuit
+
+        Raises:
+            CircuitOpen: If the circuit is open, or half open with all trial calls in flight
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._state == OPEN:
+                retry_after = self._opened_at + self.open_seconds - now
+                if retry_after > 0:
+                    raise CircuitOpen(retry_after)
+                self._state = HALF_OPEN
+            if self._state == HALF_OPEN:
+                if self._trials >= self.trial_calls:
+                    raise CircuitOpen(self.open_seconds)
+                self._trials += 1
+                return True
+            return False
+
+    def record(self, duration: float, failed: bool, trial: bool = False) -> None:
+        """
+        Record the outcome of a permitted call.
+
+        Args:
+            duration: Seconds the call took
+            failed: Whether the call failed
+            trial: What before_call() returned for the call
+        """
+        slow = duration >= self.slow_call_seconds
+        with self._lock:
+            now = time.monotonic()
+            if trial:
+                self._trials -= 1
+                if self._state != HALF_OPEN:
+                    return
+                if failed or slow:
+                    self._open(now)
+                else:
+                    self._state = CLOSED
+                    self._calls.clear()
+                    print("Circuit breaker closed; API calls resumed")
+                return
+            if self._state != CLOSED:
+                return  # A call that started before the circuit opened
+
+            self._calls.append((now, failed, slow))
+            self._expire(now)
+            if len(self._calls) >= self.min_calls:
+                failure_rate, slow_rate = self._rates()
+                if failure_rate >= self.failure_rate or slow_rate >= self.slow_call_rate:
+                    self._open(now)
+
+    def release(self, trial: bool = False) -> None:
+        """
+        Give back the permission of a call that was cancelled before it finished.
+
+        A cancelled call says nothing about the API, so the state is left as
+        it is and a half open circuit lets the next trial call through.
+
+        Args:
+            trial: What before_call() returned for the call
+        """
+        if trial:
+            with self._lock:
+                self._trials -= 1
+
+    @contextmanager
+    def guard(self, is_failure: Callable[[Exception], bool] = lambda error: True) -> Iterator[None]:
+        """
+        Make one API call under the breaker.
+
+        The call is timed and recorded; an exception counts as a failure if
+        is_failure() says so. A cancelled call (CancelledError and other
+        BaseExceptions) is released without being recorded.
+
+        Args:
+            is_failure: Whether an exception raised by the call means the API is unhealthy
+
+        Raises:
+            CircuitOpen: If the call is not permitted
+        """
+        trial = self.before_call()
+        started = time.monotonic()
+        try:
+            yield
+        except Exception as e:
+            self.record(time.monotonic() - started, is_failure(e), trial)
+            raise
+        except BaseException:
+            self.release(trial)
+            raise
+        self.record(time.monotonic() - started, False, trial)
+
+    @property
+    def state(self) -> str:
+        """Current state: "closed", "open" or "half_open"."""
+        with self._lock:
+            if self._state == OPEN and time.monotonic() >= self._opened_at + self.open_seconds:
+                return HALF_OPEN
+            return self._state
+
+    def snapshot(self) -> Dict[str, Any]:
+        """
+        Describe the circuit for health checks.
+
+        Returns:
+            Dictionary with the state, the call rates over the window and,
+            while open, the seconds until trial calls are let through
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._expire(now)
+            failure_rate, slow_rate = self._rates()
+            retry_after: Optional[float] = None
+            if self._state == OPEN:
+                retry_after = max(self._opened_at + self.open_seconds - now, 0.0)
+            return {
+                "state": HALF_OPEN if retry_after == 0.0 else self._state,
+                "calls": len(self._calls),
+                "failure_rate": round(failure_rate, 3),
+                "slow_call_rate": round(slow_rate, 3),
+                "retry_after": None if retry_after is None else round(retry_after, 1),
+                "times_opened": self._times_opened
+            }
@@ -1,55 +1,459 @@
 """
 OpenAI API client wrapper.
 """
+import asyncio
+import functools
+import hashlib
+import threading
 import time
-import openai
-from typing import Optional, Dict, Any, List
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List, Tuple
 
-from config.settings import OPENAI_API_KEY, DEFAULT_MODEL, API_MAX_RETRIES, API_TIMEOUT
+from api.budget import Budget
+from api.cassette import Cassette, CassetteClient, CassetteMiss
+from api.circuit_breaker import CircuitBreaker, CircuitOpen
+from api.task_profiles import TaskProfile, task_profiles
+from api.token_ledger import token_ledger, task_name
+from config.settings import (
+    OPENAI_API_KEY,
+    API_MAX_RETRIES,
+    CIRCUIT_WINDOW,
+    CIRCUIT_MIN_CALLS,
+    CIRCUIT_FAILURE_RATE,
+    CIRCUIT_SLOW_CALL_SECONDS,
+    CIRCUIT_SLOW_CALL_RATE,
+    CIRCUIT_OPEN_SECONDS,
+    API_RESPONSE_CACHE_SIZE,
+    API_CASSETTE_MODE,
+    API_CASSETTE_PATH,
+    API_CASSETTE_LATENCY
+)
 
-# Set OpenAI API key
-openai.api_key = OPENAI_API_KEY
+# Clients built by get_client() on first use, keyed by whether they are async
+_clients: Dict[bool, Any] = {}
+_clients_lock = threading.Lock()
+
+# Recorded API calls, when the clients record or replay them (see api/cassette.py)
+cassette = Cassette(API_CASSETTE_PATH, API_CASSETTE_MODE, API_CASSETTE_LATENCY) if API_CASSETTE_MODE != 'off' else None
+
+# Shared by the blocking and async clients, so both stop calling an unhealthy API
+circuit_breaker = CircuitBreaker(
+    window=CIRCUIT_WINDOW,
+    min_calls=CIRCUIT_MIN_CALLS,
+    failure_rate=CIRCUIT_FAILURE_RATE,
+    slow_call_seconds=CIRCUIT_SLOW_CALL_SECONDS,
+    slow_call_rate=CIRCUIT_SLOW_CALL_RATE,
+    open_seconds=CIRCUIT_OPEN_SECONDS
+)
+
+# Recent responses by prompt digest, with the time they were received. They
+# are reused within the cache TTL of their task, and replayed while the
+# circuit is open whatever their age.
+_response_cache: "OrderedDict[bytes, Tuple[str, float]]" = OrderedDict()
+_response_cache_lock = threading.Lock()
+
+# Arguments of one API call, as yielded by step functions
+ApiRequest = Tuple[str, Optional[float], Optional[float], int]
+
+def _messages(prompt: str) -> List[Dict[str, str]]:
+    return [
+        {"role": "system", "content": "You are a creative text generator for language learners."},
+        {"role": "user", "content": prompt}
+    ]
+
+def _token_limit(budget: Optional[Budget], profile: TaskProfile) -> Dict[str, Any]:
+    """Extra completion arguments limiting the response length, by the task's and the request's limits."""
+    limits = [limit for limit in (profile.max_tokens, budget.max_tokens if budget else None) if limit]
+    return {"max_tokens": min(limits)} if limits else {}
+
+def _attempt_timeout(budget: Optional[Budget], profile: TaskProfile) -> float:
+    """Timeout of the next attempt, which may not run past the request deadline."""
+    return profile.timeout if budget is None else min(profile.timeout, budget.check())
+
+def _retry_delay(budget: Optional[Budget]) -> float:
+    """Pause before retrying, shortened so the deadline is not overslept."""
+    return 1 if budget is None else min(1, max(budget.remaining(), 0))
+
+def get_client(asynchronous: bool = False) -> Any:
+    """
+    Get the shared OpenAI client, building it on first use.
+    
+    The SDK takes longer to import than the rest of the app together, so it
+    is only imported once a text is generated. Retries are handled by the
+    callers, so the clients make one attempt per call. With a cassette the
+    client records its calls, or replays them without importing the SDK.
+    
+    Args:
+        asynchronous: Whether to get the client for the async serving mode
+        
+    Returns:
+        openai.OpenAI or openai.AsyncOpenAI instance, or a CassetteClient
+    """
+    client = _clients.get(asynchronous)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(asynchronous)
+            if client is None:
+                if cassette and cassette.mode == 'replay':
+                    client = CassetteClient(cassette, asynchronous=asynchronous)
+                else:
+                    import openai
+                    factory = openai.AsyncOpenAI if asynchronous else openai.OpenAI
+                    client = factory(api_key=OPENAI_API_KEY, max_retries=0)
+                    if cassette:
+                        client = CassetteClient(cassette, client, asynchronous)
+                _clients[asynchronous] = client
+    return client
+
+def _is_outage(error: Exception) -> bool:
+    """Whether an API error reflects on the API's health rather than on the request."""
+    if isinstance(error, CassetteMiss):
+        return False
+    import openai  # Already loaded by get_client()
+    return not isinstance(error, openai.BadRequestError)
+
+def _call_settings(
+    task: str,
+    temperature: Optional[float],
+    top_p: Optional[float],
+    model: Optional[str]
+) -> Tuple[TaskProfile, str, float, float]:
+    """The task's profile, and the model and sampling parameters of a call with the profile filling in those not given."""
+    profile = task_profiles.get(task)
+    return (
+        profile,
+        model or profile.model,
+        profile.temperature if temperature is None else temperature,
+        profile.top_p if top_p is None else top_p
+    )
+
+def _prompt_key(prompt: str, model: str, temperature: float, top_p: float) -> bytes:
+    """Digest identifying a prompt, its model and its sampling parameters in the response cache."""
+    return hashlib.blake2b(f"{model}\x00{temperature}\x00{top_p}\x00{prompt}".encode("utf-8"), digest_size=16).digest()
+
+def _remember(key: bytes, text: Optional[str]) -> Optional[str]:
+    """Keep a successful response for reuse and for replay during an outage."""
+    if text:
+        with _response_cache_lock:
+            _response_cache[key] = (text, time.monotonic())
+            _response_cache.move_to_end(key)
+            while len(_response_cache) > API_RESPONSE_CACHE_SIZE:
+                _response_cache.popitem(last=False)
+    return text
+
+def _recall(key: bytes, error: CircuitOpen) -> str:
+    """
+    Replay a recent response to the same prompt while the circuit is open.
+    
+    Raises:
+        CircuitOpen: The given error, if there is no such response
+    """
+    with _response_cache_lock:
+        cached = _response_cache.get(key)
+    if cached is None:
+        raise error
+    return cached[0]
+
+def _fresh(key: bytes, ttl: float) -> Optional[str]:
+    """A response to the same prompt received within the task's cache TTL, if any."""
+    if ttl <= 0:
+        return None
+    with _response_cache_lock:
+        cached = _response_cache.get(key)
+    if cached is None or time.monotonic() - cached[1] > ttl:
+        return None
+    return cached[0]
+
+def _record_call(
+    task: str,
+    model: str,
+    budget: Optional[Budget],
+    started: float,
+    response: Any = None,
+    cached: bool = False,
+    failed: bool = False
+) -> None:
+    """Record an API call attempt, or a replayed response, in the token ledger."""
+    usage = getattr(response, "usage", None)
+    token_ledger.record(
+        task,
+        model,
+        time.monotonic() - started,
+        prompt_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+        completion_tokens=getattr(usage, "completion_tokens", 0) or 0,
+        endpoint=budget.endpoint if budget else None,
+        session=budget.session if budget else None,
+        cached=cached,
+        failed=failed
+    )
 
 def call_openai_api(
     prompt: str, 
-    temperature: float = 0.7, 
-    top_p: float = 0.9, 
+    temperature: Optional[float] = None, 
+    top_p: Optional[float] = None, 
     max_retries: int = API_MAX_RETRIES,
-    model: str = DEFAULT_MODEL
+    model: Optional[str] = None,
+    budget: Optional[Budget] = None,
+    task: str = ""
 ) -> Optional[str]:
     """
     Call OpenAI API with retry logic.
     
     Args:
         prompt: The prompt to send to the API
-        temperature: Controls randomness (0-1)
-        top_p: Controls diversity (0-1)
+        temperature: Controls randomness (0-1); by default the task profile's
+        top_p: Controls diversity (0-1); by default the task profile's
         max_retries: Maximum number of retry attempts
-        model: The model name to use
+        model: The model name to use; by default the task profile's
+        budget: Limits of the request the call is made for; its deadline
+            bounds every attempt and its max_retries replaces max_retries
+        task: Task the call is made for, whose profile sets the model,
+            sampling parameters, token limit, timeout and cache TTL; it is
+            also recorded in the token ledger
         
     Returns:
-        The API response text or None if the request failed
+        The API response text or None if the request failed. A response to
+        the same prompt received within the task's cache TTL is reused
+        without a call; while the circuit breaker is open, any recent
+        response to the same prompt.
+        
+    Raises:
+        BudgetExceeded: If the request deadline passes before an attempt
+        CircuitOpen: If the circuit breaker is open and there is no recent
+            response to the same prompt
+        CassetteMiss: If the call is replayed and was never recorded
     """
+    profile, model, temperature, top_p = _call_settings(task, temperature, top_p, model)
+    key = _prompt_key(prompt, model, temperature, top_p)
+    text = _fresh(key, profile.cache_ttl)
+    if text is not None:
+        _record_call(task, model, budget, time.monotonic(), cached=True)
+        return text
+    attempts = budget.max_retries if budget else max_retries
     retry_count = 0
-    while retry_count < max_retries:
+    while retry_count < attempts:
+        timeout = _attempt_timeout(budget, profile)
+        started = time.monotonic()
         try:
-            response = openai.chat.completions.create(
-                model=model,
-                messages=[
-                    {"role": "system", "content": "You are a creative text generator for language learners."},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=temperature,
-                top_p=top_p,
-                timeout=API_TIMEOUT
-            )
-            return response.choices[0].message.content
+            client = get_client()
+            with circuit_breaker.guard(_is_outage):
+                response = client.chat.completions.create(
+                    model=model,
+                    messages=_messages(prompt),
+                    temperature=temperature,
+                    top_p=top_p,
+                    timeout=timeout,
+                    **_token_limit(budget, profile)
+                )
+            _record_call(task, model, budget, started, response)
+            return _remember(key, response.choices[0].message.content)
+        except CircuitOpen as e:
+            text = _recall(key, e)
+            _record_call(task, model, budget, started, cached=True)
+            return text
+        except CassetteMiss:
+            raise
         except Exception as e:
+            _record_call(task, model, budget, started, failed=True)
             print(f"API error: {e}")  # Better error logging
             retry_count += 1
-            if retry_count >= max_retries:
+            if retry_count >= attempts:
+                return None
+            time.sleep(_retry_delay(budget))  # Brief waiting period
+
+async def call_openai_api_async(
+    prompt: str,
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
+    max_retries: int = API_MAX_RETRIES,
+    model: Optional[str] = None,
+    budget: Optional[Budget] = None,
+    task: str = ""
+) -> Optional[str]:
+    """
+    Call OpenAI API with retry logic without blocking the event loop.
+    
+    Args:
+        prompt: The prompt to send to the API
+        temperature: Controls randomness (0-1); by default the task profile's
+        top_p: Controls diversity (0-1); by default the task profile's
+        max_retries: Maximum number of retry attempts
+        model: The model name to use; by default the task profile's
+        budget: Limits of the request the call is made for; its deadline
+            bounds every attempt and its max_retries replaces max_retries
+        task: Task the call is made for, whose profile sets the model,
+            sampling parameters, token limit, timeout and cache TTL; it is
+            also recorded in the token ledger
+        
+    Returns:
+        The API response text or None if the request failed. A response to
+        the same prompt received within the task's cache TTL is reused
+        without a call; while the circuit breaker is open, any recent
+        response to the same prompt.
+        
+    Raises:
+        BudgetExceeded: If the request deadline passes before an attempt
+        CircuitOpen: If the circuit breaker is open and there is no recent
+            response to the same prompt
+        CassetteMiss: If the call is replayed and was never recorded
+    """
+    profile, model, temperature, top_p = _call_settings(task, temperature, top_p, model)
+    key = _prompt_key(prompt, model, temperature, top_p)
+    text = _fresh(key, profile.cache_ttl)
+    if text is not None:
+        _record_call(task, model, budget, time.monotonic(), cached=True)
+        return text
+    attempts = budget.max_retries if budget else max_retries
+    retry_count = 0
+    while retry_count < attempts:
+        timeout = _attempt_timeout(budget, profile)
+        started = time.monotonic()
+        try:
+            client = get_client(asynchronous=True)
+            with circuit_breaker.guard(_is_outage):
+                response = await client.chat.completions.create(
+                    model=model,
+                    messages=_messages(prompt),
+                    temperature=temperature,
+                    top_p=top_p,
+                    timeout=timeout,
+                    **_token_limit(budget, profile)
+                )
+            _record_call(task, model, budget, started, response)
+            return _remember(key, response.choices[0].message.content)
+        except CircuitOpen as e:
+            text = _recall(key, e)
+            _record_call(task, model, budget, started, cached=True)
+            return text
+        except CassetteMiss:
+            raise
+        except Exception as e:
+            _record_call(task, model, budget, started, failed=True)
+            print(f"API error: {e}")
+            retry_count += 1
+            if retry_count >= attempts:
                 return None
-            time.sleep(1)  # Brief waiting period
+            await asyncio.sleep(_retry_delay(budget))
+
+def api_request(
+    prompt: str,
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
+    max_retries: int = API_MAX_RETRIES
+) -> ApiRequest:
+    """
+    Describe an API call for a step function to yield.
+    
+    Args:
+        prompt: The prompt to send to the API
+        temperature: Controls randomness (0-1); by default the task profile's
+        top_p: Controls diversity (0-1); by default the task profile's
+        max_retries: Maximum number of retry attempts
+        
+    Returns:
+        The call arguments
+    """
+    return (prompt, temperature, top_p, max_retries)
+
+def run_steps(generator, budget: Optional[Budget] = None) -> Any:
+    """
+    Run a started step function with the blocking API client.
+    
+    An exception raised by an API call (e.g. BudgetExceeded) is raised
+    inside the steps at the yield of the request, so they can recover from
+    it; uncaught, it propagates to the caller.
+    
+    Args:
+        generator: Generator returned by calling a step function
+        budget: Limits applied to every API call the steps make
+        
+    Returns:
+        The step function's return value
+    """
+    done, value = _advance(generator, None)
+    while not done:
+        try:
+            response = call_openai_api(*value, budget=budget, task=task_name(generator))
+        except Exception as e:
+            done, value = _advance(generator, None, e)
+        else:
+            done, value = _advance(generator, response)
+    return value
+
+def _advance(generator, response: Any, error: Optional[Exception] = None) -> Tuple[bool, Any]:
+    """
+    Run a step function up to its next API request.
+    
+    Args:
+        generator: Step function generator
+        response: Response to the previous request (None to start)
+        error: Exception the previous request raised, raised inside the steps instead
+    
+    Returns:
+        (False, the next request), or (True, the return value) once the
+        steps are done; a StopIteration cannot cross an executor future
+    """
+    try:
+        if error is not None:
+            return False, generator.throw(error)
+        return False, generator.send(response)
+    except StopIteration as stop:
+        return True, stop.value
+
+async def run_steps_async(generator, budget: Optional[Budget] = None) -> Any:
+    """
+    Run a started step function with the async API client.
+    
+    The code between API calls runs on the loop's default executor, as it
+    would on a WSGI worker thread, so blocking work in the steps (storage
+    appends and their fsyncs) never stalls the event loop. Exceptions of
+    API calls are raised inside the steps, as with run_steps().
+    
+    Args:
+        generator: Generator returned by calling a step function
+        budget: Limits applied to every API call the steps make
+        
+    Returns:
+        The step function's return value
+    """
+    loop = asyncio.get_running_loop()
+    done, value = await loop.run_in_executor(None, _advance, generator, None)
+    while not done:
+        try:
+            response = await call_openai_api_async(*value, budget=budget, task=task_name(generator))
+        except Exception as e:
+            done, value = await loop.run_in_executor(None, _advance, generator, None, e)
+        else:
+            done, value = await loop.run_in_executor(None, _advance, generator, response)
+    return value
+
+def uses_api(steps):
+    """
+    Decorator turning a step function into an API-calling function.
+    
+    A step function is a generator that yields an api_request() for every
+    call it needs and receives the response text (or None) back, so the
+    same generation logic can run in a worker thread or on an event loop.
+    
+    The decorated function runs the steps with call_openai_api and returns
+    the generator's return value. It also gets two attributes:
+    `run_async`, a coroutine function running the steps with
+    call_openai_api_async, and `steps`, the step function itself, for use
+    with `yield from` inside other step functions.
+    
+    Both runners take an optional `budget` keyword argument, a Budget
+    applied to every API call of the run, nested step functions included.
+    """
+    @functools.wraps(steps)
+    def run(*args, budget: Optional[Budget] = None, **kwargs):
+        return run_steps(steps(*args, **kwargs), budget)
+    
+    async def run_async(*args, budget: Optional[Budget] = None, **kwargs):
+        return await run_steps_async(steps(*args, **kwargs), budget)
+    
+    run.run_async = run_async
+    run.steps = steps
+    return run
 
 def parse_json_response(response: str) -> Any:
     """
@@ -0,0 +1,395 @@
+"""
+On-demand profiling of selected requests, for finding where slow requests spend their time.
+
+Profiling is switched on at runtime by installing a middleware in front of
+the app and switched off by removing it again, so a server that is not
+profiling runs exactly the code it would without this module. While it is
+on, a sample of the requests to the selected paths, plus every request an
+admin marks with an X-Profile header, is profiled with cProfile or, with
+pyinstrument installed, a sampling profiler, optionally with a tracemalloc
+comparison of the memory allocated during the request. Each profile is
+stored under the profile directory with a JSON summary next to it.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import re
+import threading
+import time
+import tracemalloc
+import uuid
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+from api.admin import is_admin_token
+
+# Profilers: deterministic function call profiles, or statistical call stacks
+MODES = ('cprofile', 'sampling')
+
+# Paths never profiled: the endpoints managing the profiles
+EXCLUDED_PREFIX = '/api/debug/'
+
+# Profile ids, as generated by ProfileSession
+_PROFILE_ID = re.compile(r'^\d{8}-\d{6}-[0-9a-f]{8}$')
+
+class ProfileSession:
+    """
+    Profile of one request in progress.
+
+    A cProfile session can be paused while a streamed response waits for
+    the client, so only the work of producing each chunk is counted.
+    """
+
+    def __init__(self, profiler: 'RequestProfiler', method: str, path: str):
+        self.profiler = profiler
+        self.method = method
+        self.path = path
+        self.status: Optional[int] = None
+        self.id = time.strftime('%Y%m%d-%H%M%S') + '-' + uuid.uuid4().hex[:8]
+        self.mode = profiler.mode
+        self.memory = profiler.memory
+        self._elapsed = 0.0
+        self._resumed: Optional[float] = None
+
+        if self.memory:
+            # Leave tracing on if it was started for the whole process (PYTHONTRACEMALLOC)
+            self._started_tracing = not tracemalloc.is_tracing()
+            if self._started_tracing:
+                tracemalloc.start(profiler.memory_frames)
+            self._snapshot = tracemalloc.take_snapshot()
+        if self.mode == 'sampling':
+            import pyinstrument  # Checked by RequestProfiler.configure()
+            self._profile = pyinstrument.Profiler(async_mode='enabled')
+            self._profile.start()
+        else:
+            self._profile = cProfile.Profile()
+        self.resume()
+
+    def resume(self) -> None:
+        """Count the work done from now on."""
+        self._resumed = time.perf_counter()
+        if self.mode == 'cprofile':
+            self._profile.enable()
+
+    def pause(self) -> None:
+        """Stop counting until resume()."""
+        if self._resumed is None:
+            return
+        if self.mode == 'cprofile':
+            self._profile.disable()
+        self._elapsed += time.perf_counter() - self._resumed
+        self._resumed = None
+
+    def finish(self) -> None:
+        """Stop profiling and store the profile."""
+        self.pause()
+        summary = {
+            "id": self.id,
+            "time": time.strftime('%Y-%m-%d %H:%M:%S'),
+            "method": self.method,
+            "path": self.path,
+            "status": self.status,
+            "mode": self.mode,
+            "duration_ms": round(self._elapsed * 1000, 2)
+        }
+        try:
+            if self.memory:
+                summary["memory"] = self._memory_summary()
+            if self.mode == 'sampling':
+                self._profile.stop()
+                summary["file"] = f"{self.id}.html"
+                summary["top"] = self._profile.output_text(unicode=True, color=False).splitlines()[:self.profiler.top]
+                output = self._profile.output_html()
+                self.profiler.store(summary, output.encode('utf-8'))
+            else:
+                summary["file"] = f"{self.id}.prof"
+                stats = pstats.Stats(self._profile, stream=io.StringIO())
+                summary["top"] = _top_functions(stats, self.profiler.top)
+                self.profiler.store(summary, None, stats)
+        finally:
+            self.profiler.release()
+
+    def _memory_summary(self) -> Dict[str, Any]:
+        """Allocations made during the request, by source line, largest first."""
+        snapshot = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        if self._started_tracing:
+            tracemalloc.stop()
+        differences = snapshot.compare_to(self._snapshot, 'lineno')
+        return {
+            "peak_kb": round(peak / 1024, 1),
+            "allocated_kb": round(sum(max(stat.size_diff, 0) for stat in differences) / 1024, 1),
+            "top": [
+                {
+                    "where": f"{stat.traceback[0].filename}:{stat.traceback[0].lineno}",
+                    "size_kb": round(stat.size_diff / 1024, 1),
+                    "count": stat.count_diff
+                }
+                for stat in differences[:self.profiler.top]
+                if stat.size_diff > 0
+            ]
+        }
+
+def _top_functions(stats: pstats.Stats, count: int) -> List[Dict[str, Any]]:
+    """Functions with the most cumulative time in a cProfile profile."""
+    rows = []
+    for (filename, line, name), (_, calls, own, cumulative, _) in stats.stats.items():
+        rows.append({
+            "function": f"{filename}:{line}({name})",
+            "calls": calls,
+            "own_ms": round(own * 1000, 2),
+            "cumulative_ms": round(cumulative * 1000, 2)
+        })
+    rows.sort(key=lambda row: row["cumulative_ms"], reverse=True)
+    return rows[:count]
+
+class RequestProfiler:
+    """
+    Settings and storage of request profiles.
+
+    Only one request is profiled at a time: Python allows a single active
+    cProfile profiler and tracemalloc traces the whole process, so
+    concurrent requests would blur each other's numbers. Requests arriving
+    while another is profiled are served normally.
+    """
+
+    def __init__(self, directory: str, max_profiles: int, top: int, memory_frames: int):
+        """
+        Initialize a profiler that is switched off.
+
+        Args:
+            directory: Directory the profiles are stored in
+            max_profiles: Profiles kept, oldest removed first
+            top: Functions and allocation sites listed in each summary
+            memory_frames: Stack frames tracemalloc records per allocation
+        """
+        self.directory = directory
+        self.max_profiles = max_profiles
+        self.top = top
+        self.memory_frames = memory_frames
+
+        self.enabled = False
+        self.mode = 'cprofile'
+        self.sample_rate = 0.0
+        self.paths: List[str] = ['/api/']
+        self.memory = False
+
+        self._busy = threading.Lock()
+        self._store_lock = threading.Lock()
+        # Called with True or False when profiling is switched on or off
+        self._installers: List[Callable[[bool], None]] = []
+
+    def add_installer(self, installer: Callable[[bool], None]) -> None:
+        """
+        Register a function that puts a profiling middleware in place or removes it.
+
+        Args:
+            installer: Called with True when profiling is switched on and
+                False when it is switched off
+        """
+        self._installers.append(installer)
+        if self.enabled:
+            installer(True)
+
+    def configure(
+        self,
+        enabled: bool,
+        mode: str = 'cprofile',
+        sample_rate: float = 0.0,
+        paths: Optional[List[str]] = None,
+        memory: bool = False
+    ) -> None:
+        """
+        Switch profiling on or off and choose what is profiled.
+
+        Args:
+            enabled: Whether to profile requests
+            mode: "cprofile" or "sampling"
+            sample_rate: Share of the requests to the selected paths profiled
+                without being asked for (0-1)
+            paths: Path prefixes of the requests that may be profiled
+            memory: Whether to compare memory snapshots taken around each request
+
+        Raises:
+            ValueError: If the settings are invalid
+        """
+        if mode not in MODES:
+            raise ValueError(f"Unknown profiling mode: {mode}")
+        if mode == 'sampling':
+            try:
+                import pyinstrument  # noqa: F401
+            except ImportError:
+                raise ValueError("Sampling profiles need pyinstrument installed") from None
+        if not 0 <= sample_rate <= 1:
+            raise ValueError("The sample rate must be between 0 and 1")
+
+        self.mode = mode
+        self.sample_rate = sample_rate
+        self.paths = list(paths) if paths else ['/api/']
+        self.memory = memory
+        if enabled != self.enabled:
+            self.enabled = enabled
+            for installer in self._installers:
+                installer(enabled)
+
+    def settings(self) -> Dict[str, Any]:
+        """Current profiling settings."""
+        return {
+            "enabled": self.enabled,
+            "mode": self.mode,
+            "sample_rate": self.sample_rate,
+            "paths": self.paths,
+            "memory": self.memory
+        }
+
+    def start(self, method: str, path: str, profile_header: Optional[str], admin_token: Optional[str]) -> Optional[ProfileSession]:
+        """
+        Start profiling a request if it is selected and no other request is profiled.
+
+        Args:
+            method: HTTP method
+            path: Request path
+            profile_header: Value of the X-Profile header, which asks for the request to be profiled
+            admin_token: Value of the X-Admin-Token header, required with X-Profile
+
+        Returns:
+            Profile session to finish when the response is complete, or None
+        """
+        if path.startswith(EXCLUDED_PREFIX) or not any(path.startswith(prefix) for prefix in self.paths):
+            return None
+        requested = bool(profile_header) and is_admin_token(admin_token)
+        if not requested and random.random() >= self.sample_rate:
+            return None
+        if not self._busy.acquire(blocking=False):
+            return None
+        try:
+            return ProfileSession(self, method, path)
+        except Exception:
+            self._busy.release()
+            raise
+
+    def release(self) -> None:
+        """Let the next request be profiled."""
+        self._busy.release()
+
+    def store(self, summary: Dict[str, Any], output: Optional[bytes], stats: Optional[pstats.Stats] = None) -> None:
+        """
+        Save a profile and its summary, removing the oldest profiles beyond the limit.
+
+        Args:
+            summary: Summary of the profile, with its id and file name
+            output: Profile file content, or None to dump the cProfile stats
+            stats: cProfile statistics to dump
+        """
+        with self._store_lock:
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, summary["file"])
+            if stats is not None:
+                stats.dump_stats(path)
+            else:
+                with open(path, 'wb') as f:
+                    f.write(output)
+            with open(os.path.join(self.directory, f"{summary['id']}.json"), 'w', encoding='utf-8') as f:
+                json.dump(summary, f, ensure_ascii=False)
+
+            for old in self.list()[self.max_profiles:]:
+                for name in (f"{old['id']}.json", old.get("file")):
+                    try:
+                        os.remove(os.path.join(self.directory, name))
+                    except (OSError, TypeError):
+                        pass
+
+    def list(self) -> List[Dict[str, Any]]:
+        """
+        List the stored profiles.
+
+        Returns:
+            Profile summaries, newest first
+        """
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        summaries = []
+        for name in sorted(names, reverse=True):
+            if name.endswith('.json') and _PROFILE_ID.match(name[:-5]):
+                try:
+                    with open(os.path.join(self.directory, name), 'r', encoding='utf-8') as f:
+                        summaries.append(json.load(f))
+                except (OSError, ValueError):
+                    continue
+        return summaries
+
+    def get(self, profile_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the summary of a stored profile.
+
+        Args:
+            profile_id: Profile id
+
+        Returns:
+            The summary, or None if there is no such profile
+        """
+        if not _PROFILE_ID.match(profile_id):
+            return None
+        try:
+            with open(os.path.join(self.directory, f"{profile_id}.json"), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+class _ProfiledBody:
+    """Response body of a profiled request, counting only the work of producing each chunk."""
+
+    def __init__(self, body: Iterable[bytes], session: ProfileSession):
+        self._body = body
+        self._iterator = iter(body)
+        self._session = session
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+        self._session.resume()
+        try:
+            return next(self._iterator)
+        finally:
+            self._session.pause()
+
+    def close(self) -> None:
+        try:
+            if hasattr(self._body, 'close'):
+                self._body.close()
+        finally:
+            self._session.finish()
+
+class ProfilingMiddleware:
+    """WSGI middleware profiling the requests a RequestProfiler selects."""
+
+    def __init__(self, wsgi_app: Callable, profiler: RequestProfiler):
+        self.wsgi_app = wsgi_app
+        self.profiler = profiler
+
+    def __call__(self, environ: Dict[str, Any], start_response: Callable) -> Iterable[bytes]:
+        session = self.profiler.start(
+            environ.get('REQUEST_METHOD', ''),
+            environ.get('PATH_INFO', ''),
+            environ.get('HTTP_X_PROFILE'),
+            environ.get('HTTP_X_ADMIN_TOKEN')
+        )
+        if session is None:
+            return self.wsgi_app(environ, start_response)
+
+        def profiled_start_response(status: str, headers: List, exc_info=None):
+            session.status = int(status.split(' ', 1)[0])
+            return start_response(status, headers, exc_info)
+
+        try:
+            body = self.wsgi_app(environ, profiled_start_response)
+        except BaseException:
+            session.finish()
+            raise
+        session.pause()
+        return _ProfiledBody(body, session)
@@ -0,0 +1,192 @@
+"""
+Model, sampling, input and caching settings of the API calls of each task.
+"""
+import json
+import os
+import threading
+import time
+from dataclasses import asdict, dataclass, fields
+from typing import Any, Dict, Optional
+
+from config.settings import TASK_PROFILES, TASK_PROFILE_PATH, TASK_PROFILE_CHECK_INTERVAL
+
+@dataclass(frozen=True)
+class TaskProfile:
+    """Settings of the API calls made for one task."""
+    model: str
+    temperature: float
+    top_p: float
+    max_tokens: int  # 0 for the request budget's limit only
+    input_chars: int  # Characters of the source text put into the prompt
+    cache_ttl: float  # Seconds an answer to the same prompt is reused, 0 to always call the API
+    timeout: float  # Seconds per attempt
+
+# Profile fields and the types their values are converted to
+FIELDS = {field.name: field.type for field in fields(TaskProfile)}
+
+# Allowed range of each numeric field
+_RANGES = {
+    'temperature': (0.0, 2.0),
+    'top_p': (0.0, 1.0),
+    'max_tokens': (0, None),
+    'input_chars': (1, None),
+    'cache_ttl': (0.0, None),
+    'timeout': (0.1, None)
+}
+
+def _check_fields(task: str, values: Any) -> Dict[str, Any]:
+    """
+    Validate the profile fields configured for a task.
+
+    Raises:
+        ValueError: If a field is unknown or its value is out of range
+    """
+    if not isinstance(values, dict):
+        raise ValueError(f"Profile of task {task} must be an object")
+    checked = {}
+    for name, value in values.items():
+        if name not in FIELDS:
+            raise ValueError(f"Unknown field in profile of task {task}: {name}")
+        if name == 'model':
+            if not isinstance(value, str) or not value:
+                raise ValueError(f"Model of task {task} must be a model name")
+            checked[name] = value
+            continue
+        try:
+            value = FIELDS[name](value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{name} of task {task} must be a number")
+        low, high = _RANGES[name]
+        if value < low or (high is not None and value > high):
+            raise ValueError(f"{name} of task {task} is out of range")
+        checked[name] = value
+    return checked
+
+class TaskProfiles:
+    """
+    Profiles of all tasks, from the settings overridden by an optional JSON file.
+
+    The file maps task names to the profile fields to override, e.g.
+    {"summary": {"model": "gpt-4o-mini", "cache_ttl": 604800}}. It is checked
+    for changes at most every `check_interval` seconds and reloaded when it
+    changed, so profiles can be tuned without a restart. A file that fails
+    to load leaves the previous profiles in place.
+    """
+
+    def __init__(self, defaults: Dict[str, Dict[str, Any]], path: Optional[str] = None, check_interval: float = 5.0):
+        """
+        Load the profiles.
+
+        Args:
+            defaults: Profile fields per task, with a "default" entry holding every field
+            path: JSON file overriding the defaults, or None
+            check_interval: Seconds between checks of the file for changes
+
+        Raises:
+            ValueError: If the defaults are invalid
+        """
+        self.path = path or None
+        self.check_interval = check_interval
+        self.version = 0
+        self.error: Optional[str] = None
+        self._defaults = {task: _check_fields(task, values) for task, values in defaults.items()}
+        if set(self._defaults.get('default', {})) != set(FIELDS):
+            raise ValueError("The default task profile must set every field")
+        self._lock = threading.Lock()
+        self._profiles: Dict[str, TaskProfile] = {}
+        self._mtime: Optional[float] = None
+        self._checked = time.monotonic()
+        self._build({})
+        if self.path and os.path.exists(self.path):
+            try:
+                self.reload()
+            except ValueError as e:
+                print(f"Error loading task profiles: {e}")
+
+    def _build(self, overrides: Dict[str, Dict[str, Any]]) -> None:
+        """Combine the defaults and overrides into the profiles of every configured task."""
+        base = {**self._defaults['default'], **overrides.get('default', {})}
+        profiles = {
+            task: TaskProfile(**{**base, **self._defaults.get(task, {}), **overrides.get(task, {})})
+            for task in set(self._defaults) | set(overrides)
+        }
+        with self._lock:
+            self._profiles = profiles
+            self.version += 1
+
+    def reload(self) -> None:
+        """
+        Read the profile file again.
+
+        Raises:
+            ValueError: If the file cannot be read or holds invalid profiles
+        """
+        if not self.path:
+            return
+        try:
+            mtime = os.path.getmtime(self.path)
+            with open(self.path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            if not isinstance(data, dict):
+                raise ValueError("Task profile file must hold an object of task profiles")
+            overrides = {task: _check_fields(task, values) for task, values in data.items()}
+        except (OSError, ValueError) as e:
+            self.error = str(e)
+            raise ValueError(f"Task profiles not reloaded: {e}")
+        self._build(overrides)
+        self._mtime = mtime
+        self.error = None
+
+    def _check_file(self) -> None:
+        """Reload the file if it changed since it was last read."""
+        now = time.monotonic()
+        if not self.path or now - self._checked < self.check_interval:
+            return
+        self._checked = now
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime != self._mtime:
+            try:
+                self.reload()
+            except ValueError as e:
+                self._mtime = mtime  # Report once, not on every check
+                print(e)
+
+    def get(self, task: str) -> TaskProfile:
+        """
+        Get the profile of a task.
+
+        Args:
+            task: Task name, see api/token_ledger.py
+
+        Returns:
+            The task's profile, or the default profile for unconfigured tasks
+        """
+        self._check_file()
+        profiles = self._profiles
+        return profiles.get(task) or profiles['default']
+
+    def describe(self) -> Dict[str, Any]:
+        """
+        Describe the profiles in use.
+
+        Returns:
+            Dictionary with the profiles by task, the file they were
+            overridden from and the last error reading it
+        """
+        self._check_file()
+        return {
+            "profiles": {task: asdict(profile) for task, profile in sorted(self._profiles.items())},
+            "path": self.path,
+            "version": self.version,
+            "error": self.error
+        }
+
+def input_limit(task: str) -> int:
+    """Characters of the source text a task puts into its prompt."""
+    return task_profiles.get(task).input_chars
+
+# Shared by every API call of the process
+task_profiles = TaskProfiles(TASK_PROFILES, TASK_PROFILE_PATH, TASK_PROFILE_CHECK_INTERVAL)
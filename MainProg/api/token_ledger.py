@@ -0,0 +1,309 @@
+"""
+Token and cost accounting of API calls, with per-client quotas.
+"""
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from config.settings import (
+    DATA_DIR,
+    LEDGER_FLUSH_SIZE,
+    LEDGER_FLUSH_INTERVAL,
+    LEDGER_REPORT_TOP,
+    QUOTA_WINDOW,
+    QUOTA_TOKENS_PER_WINDOW,
+    QUOTA_CALLS_PER_WINDOW,
+    TOKEN_PRICES_PER_1K
+)
+
+# Task names of the step functions making API calls; others are reported under their own name
+TASK_NAMES = {
+    'get_topic_suggestion': 'topic',
+    'generate_text': 'text',
+    'validate_and_repair': 'text_repair',
+    'generate_summary': 'summary',
+    'extract_key_words': 'key_words',
+    'generate_comprehension_questions': 'questions',
+    'generate_language_exercises': 'exercises',
+    'generate_translation': 'translation',
+    '_translate_segments': 'translation',
+    'generate_story_part': 'story_part',
+    'enrich_batch': 'batch_enrichment'
+}
+
+# Dimensions the ledger aggregates calls by
+DIMENSIONS = ('task', 'endpoint', 'session', 'model')
+
+# Seconds per quota bucket; usage is counted per bucket over the quota window
+_BUCKET_SECONDS = 60
+
+class QuotaExceeded(Exception):
+    """Raised when a client has used up its API quota for the current window."""
+
+    def __init__(self, retry_after: float):
+        super().__init__("API usage quota exceeded; please try again later")
+        self.retry_after = retry_after
+
+def task_name(generator: Any) -> str:
+    """
+    Name the task of the API call a step function generator just yielded.
+
+    Args:
+        generator: Suspended step function generator, possibly delegating with yield from
+
+    Returns:
+        Task name of the innermost step function
+    """
+    while getattr(generator, 'gi_yieldfrom', None) is not None:
+        generator = generator.gi_yieldfrom
+    name = generator.gi_code.co_name
+    return TASK_NAMES.get(name, name)
+
+def call_cost(model: str, prompt_tokens: int, completion_tokens: int) -> float:
+    """Estimated cost of a call in US dollars, 0 for models without a known price."""
+    prompt_price, completion_price = TOKEN_PRICES_PER_1K.get(model, (0.0, 0.0))
+    return (prompt_tokens * prompt_price + completion_tokens * completion_price) / 1000
+
+def _empty_totals() -> Dict[str, Any]:
+    return {
+        "calls": 0,
+        "failed": 0,
+        "cached": 0,
+        "prompt_tokens": 0,
+        "completion_tokens": 0,
+        "latency": 0.0,
+        "cost": 0.0
+    }
+
+class TokenLedger:
+    """
+    Record of every API call, aggregated in memory and appended to a file in batches.
+
+    Each call is recorded with its prompt and completion tokens, model,
+    latency and whether it was served from the response cache, tagged with
+    its task, the endpoint it was made for and the client session. Totals
+    per tag are kept in memory for reports; the entries themselves are
+    buffered and written as JSON lines once `flush_size` are pending or
+    `flush_interval` seconds have passed.
+
+    Quotas limit the tokens and calls of each session over a sliding window
+    of `quota_window` seconds; a limit of 0 disables it.
+    """
+
+    def __init__(
+        self,
+        path: Optional[str],
+        flush_size: int,
+        flush_interval: float,
+        quota_window: float,
+        quota_tokens: int,
+        quota_calls: int
+    ):
+        """
+        Initialize an empty ledger.
+
+        Args:
+            path: JSON lines file the entries are appended to, or None to keep them in memory only
+            flush_size: Pending entries that trigger a write
+            flush_interval: Seconds after which pending entries are written anyway
+            quota_window: Seconds of usage a quota covers
+            quota_tokens: Tokens per session and window, 0 for no limit
+            quota_calls: Calls per session and window, 0 for no limit
+        """
+        self.path = path
+        self.flush_size = flush_size
+        self.flush_interval = flush_interval
+        self.quota_window = quota_window
+        self.quota_tokens = quota_tokens
+        self.quota_calls = quota_calls
+
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._pending: List[Dict[str, Any]] = []
+        self._last_flush = time.monotonic()
+        self._totals = _empty_totals()
+        self._by: Dict[str, Dict[str, Dict[str, Any]]] = {dimension: {} for dimension in DIMENSIONS}
+        # Per session: [bucket start, tokens, calls] over the quota window, oldest first
+        self._usage: Dict[str, Deque[List[float]]] = {}
+
+    def record(
+        self,
+        task: str,
+        model: str,
+        latency: float,
+        prompt_tokens: int = 0,
+        completion_tokens: int = 0,
+        endpoint: Optional[str] = None,
+        session: Optional[str] = None,
+        cached: bool = False,
+        failed: bool = False
+    ) -> None:
+        """
+        Record one API call, or one response replayed from the cache.
+
+        Args:
+            task: Task the call was made for, see task_name()
+            model: Model name
+            latency: Seconds the call took
+            prompt_tokens: Prompt tokens reported by the API
+            completion_tokens: Completion tokens reported by the API
+            endpoint: Endpoint of the request the call was made for
+            session: Client the call is accounted to
+            cached: Whether the response came from the cache instead of the API
+            failed: Whether the call failed
+        """
+        cost = call_cost(model, prompt_tokens, completion_tokens)
+        entry = {
+            "time": round(time.time(), 3),
+            "task": task,
+            "endpoint": endpoint or "",
+            "session": session or "",
+            "model": model,
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": completion_tokens,
+            "latency": round(latency, 3),
+            "cached": cached,
+            "failed": failed,
+            "cost": round(cost, 6)
+        }
+        with self._lock:
+            for totals in [self._totals] + [
+                self._by[dimension].setdefault(entry[dimension], _empty_totals()) for dimension in DIMENSIONS
+            ]:
+                totals["calls"] += 1
+                totals["failed"] += failed
+                totals["cached"] += cached
+                totals["prompt_tokens"] += prompt_tokens
+                totals["completion_tokens"] += completion_tokens
+                totals["latency"] += latency
+                totals["cost"] += cost
+            if session and not cached:
+                self._add_usage(session, prompt_tokens + completion_tokens)
+            if self.path:
+                self._pending.append(entry)
+            due = len(self._pending) >= self.flush_size or time.monotonic() - self._last_flush >= self.flush_interval
+        if due:
+            self.flush()
+
+    def _add_usage(self, session: str, tokens: int) -> None:
+        """Count a call towards a session's quota."""
+        now = time.monotonic()
+        buckets = self._usage.setdefault(session, deque())
+        if buckets and now - buckets[-1][0] < _BUCKET_SECONDS:
+            buckets[-1][1] += tokens
+            buckets[-1][2] += 1
+        else:
+            buckets.append([now, tokens, 1])
+
+    def _window_usage(self, session: str, now: float) -> Deque[List[float]]:
+        """A session's quota buckets within the window, dropping older ones."""
+        buckets = self._usage.get(session, deque())
+        while buckets and buckets[0][0] <= now - self.quota_window:
+            buckets.popleft()
+        if not buckets:
+            self._usage.pop(session, None)
+        return buckets
+
+    def quota_status(self, session: str) -> Dict[str, Any]:
+        """
+        Describe a session's usage against its quotas.
+
+        Args:
+            session: Client session
+
+        Returns:
+            Dictionary with the tokens and calls used in the window and the limits
+        """
+        with self._lock:
+            buckets = self._window_usage(session, time.monotonic())
+            return {
+                "window": self.quota_window,
+                "tokens": int(sum(bucket[1] for bucket in buckets)),
+                "calls": int(sum(bucket[2] for bucket in buckets)),
+                "token_limit": self.quota_tokens or None,
+                "call_limit": self.quota_calls or None
+            }
+
+    def check_quota(self, session: Optional[str]) -> None:
+        """
+        Make sure a session may start another request that calls the API.
+
+        Args:
+            session: Client session, None for unattributed calls
+
+        Raises:
+            QuotaExceeded: If the session used its tokens or calls for the window
+        """
+        if not session or not (self.quota_tokens or self.quota_calls):
+            return
+        with self._lock:
+            now = time.monotonic()
+            buckets = self._window_usage(session, now)
+            tokens = sum(bucket[1] for bucket in buckets)
+            calls = sum(bucket[2] for bucket in buckets)
+            if (self.quota_tokens and tokens >= self.quota_tokens) or (self.quota_calls and calls >= self.quota_calls):
+                raise QuotaExceeded(buckets[0][0] + self.quota_window - now)
+
+    def flush(self) -> None:
+        """Append the pending entries to the ledger file."""
+        with self._flush_lock:
+            with self._lock:
+                entries, self._pending = self._pending, []
+                self._last_flush = time.monotonic()
+            if not entries or not self.path:
+                return
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                with open(self.path, 'a', encoding='utf-8') as f:
+                    f.write("".join(json.dumps(entry, ensure_ascii=False) + "\n" for entry in entries))
+            except OSError as e:
+                print(f"Error writing token ledger: {e}")
+                with self._lock:
+                    self._pending[:0] = entries
+
+    def report(self, top: int = LEDGER_REPORT_TOP) -> Dict[str, Any]:
+        """
+        Summarize API usage since the server started.
+
+        Args:
+            top: Sessions to list, heaviest first
+
+        Returns:
+            Dictionary with the overall totals and the totals per task,
+            endpoint, model and the heaviest sessions, each with its
+            average latency
+        """
+        def summary(totals: Dict[str, Any]) -> Dict[str, Any]:
+            answered = totals["calls"] - totals["cached"]
+            return dict(
+                totals,
+                latency=round(totals["latency"], 3),
+                cost=round(totals["cost"], 6),
+                tokens=totals["prompt_tokens"] + totals["completion_tokens"],
+                average_latency=round(totals["latency"] / answered, 3) if answered else None
+            )
+
+        with self._lock:
+            report = {"totals": summary(self._totals)}
+            for dimension in DIMENSIONS:
+                rows = {key: summary(totals) for key, totals in self._by[dimension].items()}
+                if dimension == 'session':
+                    heaviest = sorted(rows.items(), key=lambda row: row[1]["tokens"], reverse=True)[:top]
+                    rows = dict(heaviest)
+                report[f"by_{dimension}"] = rows
+            return report
+
+# Shared by every API call of the process
+token_ledger = TokenLedger(
+    path=os.path.join(DATA_DIR, 'token_ledger.jsonl'),
+    flush_size=LEDGER_FLUSH_SIZE,
+    flush_interval=LEDGER_FLUSH_INTERVAL,
+    quota_window=QUOTA_WINDOW,
+    quota_tokens=QUOTA_TOKENS_PER_WINDOW,
+    quota_calls=QUOTA_CALLS_PER_WINDOW
+)
+atexit.register(token_ledger.flush)
@@ -1,42 +1,364 @@
 """
 Main application entry point for the Flask-based web interface.
 """
-from flask import Flask, render_template, request, jsonify, session, redirect, url_for
+from flask import Flask, render_template, request, jsonify, session, redirect, url_for, Response, stream_with_context, make_response, send_from_directory, send_file
+import asyncio
+import functools
+import gzip
+import hashlib
+import io
+import itertools
 import json
+import math
 import os
+import random
+import uuid
+import zlib
 import datetime  # Added missing import
-from dotenv import load_dotenv
-
-# Load our application modules
-from config.settings import DEFAULT_TEMPERATURE, DEFAULT_TOP_P, DEFAULT_FONT_SIZE, DEFAULT_WORD_COUNT
-from config.language_data import LANGUAGE_MAP, DIFFICULTY_WORDS_COUNT, TEXT_TYPES, PROFICIENCY_LEVELS
-from core.text_generator import (
-    generate_text, 
-    get_topic_suggestion, 
-    generate_summary, 
-    extract_key_words,
-    generate_comprehension_questions,
-    generate_language_exercises,
-    generate_translation
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Any, AsyncIterator, Iterator, List, Optional, Tuple
+from flask.json.provider import DefaultJSONProvider
+from markupsafe import Markup, escape
+from werkzeug.datastructures import Accept
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Load our application modules; config.settings also loads the .env file.
+# The generators in core/ and the OpenAI SDK are imported on first use, so
+# the app starts serving pages without paying for them.
+from config.settings import (
+    DEFAULT_FONT_SIZE,
+    DEFAULT_WORD_COUNT,
+    SIMILARITY_THRESHOLD,
+    REUSE_SIMILARITY_THRESHOLD,
+    STORAGE_TYPE,
+    DATA_DIR,
+    LOG_FSYNC,
+    COMPRESSION_MIN_SIZE,
+    GZIP_LEVEL,
+    BROTLI_QUALITY,
+    ASSET_BUNDLES,
+    ASSET_DIST_DIR,
+    ASSET_PRELOAD_FONTS,
+    DEGRADED_SIMILARITY_THRESHOLD,
+    DEGRADED_POOL_SIZE,
+    STORY_LIBRARY_ENABLED,
+    STORY_LIBRARY_MAX_PARTS,
+    STORY_LIBRARY_NOVELTY,
+    STORY_LIBRARY_EVICTION_SAMPLE,
+    BACKFILL_LIMIT,
+    WORKSHEET_QUESTIONS,
+    WORKSHEET_EXERCISES,
+    WORKSHEET_MAX_ITEMS,
+    EXPORT_PACK_MAX_ITEMS,
+    LEDGER_REPORT_TOP,
+    ADMIN_TOKEN,
+    PROFILE_DIR,
+    PROFILE_MAX_FILES,
+    PROFILE_TOP,
+    PROFILE_MEMORY_FRAMES
 )
-from core.story_generator import generate_story_part, Story
+from config.language_data import LANGUAGE_MAP, DIFFICULTY_WORDS_COUNT, TEXT_TYPES, PROFICIENCY_LEVELS, FALLBACK_TOPICS
+from api.admin import is_admin_token
+from api.budget import Budget, BudgetExceeded
+from api.circuit_breaker import CircuitOpen
+from api.openai_client import uses_api, run_steps, run_steps_async, circuit_breaker
+from api.profiling import RequestProfiler, ProfilingMiddleware
+from api.task_profiles import task_profiles
+from api.token_ledger import token_ledger, QuotaExceeded
+from storage.item_bank import ItemBank, EXERCISE_TYPES, OTHER_TYPE
 from storage.session_manager import SessionManager
-from models.text import GeneratedText
+from storage.story_library import StoryLibrary
+from models.text import GeneratedText, Translation, TranslationSet
+from models.story import Story, is_valid_path
 
-# Load environment variables
-load_dotenv()
+class FastJSONProvider(DefaultJSONProvider):
+    """
+    JSON provider that encodes with orjson when it is installed.
+    
+    Output is compact and UTF-8 rather than ASCII-escaped, which also keeps
+    non-Latin texts much smaller on the wire.
+    """
+    ensure_ascii = False
+    
+    def _orjson_options(self) -> int:
+        return orjson.OPT_NON_STR_KEYS | (orjson.OPT_SORT_KEYS if self.sort_keys else 0)
+    
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        if orjson is None or kwargs.get('indent'):
+            kwargs.setdefault('separators', (',', ':'))
+            return super().dumps(obj, **kwargs)
+        return orjson.dumps(obj, default=self.default, option=self._orjson_options()).decode('utf-8')
+    
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        if orjson is None or self._app.debug:
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        body = orjson.dumps(obj, default=self.default, option=self._orjson_options() | orjson.OPT_APPEND_NEWLINE)
+        return self._app.response_class(body, mimetype=self.mimetype)
 
 # Initialize Flask app
 app = Flask(__name__, 
             static_folder='web/static',
             template_folder='web/templates')
+app.json = FastJSONProvider(app)
 
 # Configure Flask app
 app.secret_key = os.getenv("FLASK_SECRET_KEY", "dev-secret-key")
 app.config['SESSION_TYPE'] = 'filesystem'
 
+# Export processes started with forkserver or spawn import this script again, as
+# __mp_main__, when it is run with `python app.py`. They only render documents, so
+# they keep their (empty) data in memory instead of replaying the storage logs and
+# compacting them alongside the server, which would lose the server's appends.
+PERSISTENT_STORAGE = STORAGE_TYPE == 'log' and __name__ != '__mp_main__'
+
 # Initialize session manager
-session_manager = SessionManager()
+if PERSISTENT_STORAGE:
+    session_manager = SessionManager(
+        storage_type='log',
+        log_path=os.path.join(DATA_DIR, 'session.log'),
+        # Renamed when the signature shingles change, so old signatures are rebuilt
+        similarity_path=os.path.join(DATA_DIR, 'similarity-v3.idx')
+    )
+else:
+    session_manager = SessionManager()
+
+# Questions and exercises of all texts, for worksheets assembled without an API call
+if PERSISTENT_STORAGE:
+    item_bank = ItemBank(os.path.join(DATA_DIR, 'item_bank.log'), fsync=LOG_FSYNC)
+else:
+    item_bank = ItemBank()
+
+# Story parts shared by all stories on the same topic, when enabled
+story_library = StoryLibrary(STORY_LIBRARY_MAX_PARTS, STORY_LIBRARY_EVICTION_SAMPLE) if STORY_LIBRARY_ENABLED else None
+
+# Profiles of selected requests, switched on by an admin through /api/debug/profiling
+request_profiler = RequestProfiler(PROFILE_DIR, PROFILE_MAX_FILES, PROFILE_TOP, PROFILE_MEMORY_FRAMES)
+
+def install_profiling(enabled: bool) -> None:
+    """Put the profiling middleware in front of the app, or take it away so requests skip it entirely."""
+    if enabled and not isinstance(app.wsgi_app, ProfilingMiddleware):
+        app.wsgi_app = ProfilingMiddleware(app.wsgi_app, request_profiler)
+    elif not enabled and isinstance(app.wsgi_app, ProfilingMiddleware):
+        app.wsgi_app = app.wsgi_app.wsgi_app
+
+request_profiler.add_installer(install_profiling)
+
+# Fingerprints of static files, by filename, with the modification time they were computed for
+_static_fingerprints = {}
+
+# Cache lifetime of fingerprinted static files (one year)
+STATIC_MAX_AGE = 365 * 24 * 3600
+
+def _static_fingerprint(filename: str) -> Optional[str]:
+    """Short content hash of a static file, recomputed when the file changes."""
+    path = os.path.join(app.static_folder, filename)
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        return None
+    cached = _static_fingerprints.get(filename)
+    if cached is None or cached[0] != mtime:
+        with open(path, 'rb') as f:
+            cached = (mtime, hashlib.md5(f.read()).hexdigest()[:12])
+        _static_fingerprints[filename] = cached
+    return cached[1]
+
+@app.before_request
+def assign_client_id() -> None:
+    """Give each browser a client id in its session, for API usage accounting."""
+    if request.endpoint != 'static' and 'uid' not in session:
+        session['uid'] = uuid.uuid4().hex
+
+def client_id() -> str:
+    """Client of the current request: its session's client id, or its address without a session."""
+    return session.get('uid') or request.remote_addr or ""
+
+@app.url_defaults
+def add_static_fingerprint(endpoint: str, values: Dict[str, Any]) -> None:
+    """Add a content fingerprint to static URLs so they can be cached indefinitely."""
+    if endpoint == 'static' and 'filename' in values and 'v' not in values:
+        if values['filename'].startswith(f'{ASSET_DIST_DIR}/'):
+            return  # Built bundles carry their hash in the file name
+        fingerprint = _static_fingerprint(values['filename'])
+        if fingerprint:
+            values['v'] = fingerprint
+
+@app.after_request
+def cache_fingerprinted_static(response: Response) -> Response:
+    """Let browsers keep static files whose URL carries their current fingerprint."""
+    if request.endpoint == 'static' and response.status_code == 200:
+        filename = (request.view_args or {}).get('filename', '')
+        hashed = filename.startswith(f'{ASSET_DIST_DIR}/') and filename != f'{ASSET_DIST_DIR}/manifest.json'
+        if hashed or (request.args.get('v') and request.args.get('v') == _static_fingerprint(filename)):
+            response.headers['Cache-Control'] = f'public, max-age={STATIC_MAX_AGE}, immutable'
+    return response
+
+# Bundle manifest written by build_assets.py, with the modification time it was read at
+_asset_manifest = (None, {})
+
+def _built_assets() -> Dict[str, str]:
+    """Map of bundle names to their built files, reloaded when the manifest changes."""
+    global _asset_manifest
+    path = os.path.join(app.static_folder, ASSET_DIST_DIR, 'manifest.json')
+    try:
+        mtime = os.stat(path).st_mtime
+    except OSError:
+        mtime = None
+    if mtime != _asset_manifest[0]:
+        manifest = {}
+        if mtime is not None:
+            with open(path, encoding='utf-8') as f:
+                manifest = json.load(f)
+        _asset_manifest = (mtime, manifest)
+    return _asset_manifest[1]
+
+def _asset_urls(name: str) -> List[str]:
+    """URLs of a bundle: its built file when there is one, otherwise its sources in order."""
+    built = _built_assets().get(name)
+    files = [f'{ASSET_DIST_DIR}/{built}'] if built else ASSET_BUNDLES[name]
+    return [url_for('static', filename=filename) for filename in files]
+
+@app.template_global()
+def asset_tags(name: str) -> Markup:
+    """
+    Render the tags loading a bundle from ASSET_BUNDLES.
+    
+    Args:
+        name: Bundle name ending in .css or .js
+        
+    Returns:
+        Stylesheet links or script tags
+    """
+    if name.endswith('.css'):
+        template = '<link rel="stylesheet" href="{}">'
+    else:
+        template = '<script src="{}"></script>'
+    return Markup('\n    '.join(template.format(escape(url)) for url in _asset_urls(name)))
+
+@app.template_global()
+def asset_preloads(*names: str) -> Markup:
+    """
+    Render preload hints for bundles, and for the icon fonts once the bundles are built.
+    
+    Scripts at the end of the page then download while the body is parsed,
+    and fonts before the stylesheet that references them has been applied.
+    
+    Args:
+        names: Bundle names ending in .css or .js
+        
+    Returns:
+        Preload links
+    """
+    links = []
+    for name in names:
+        kind = 'style' if name.endswith('.css') else 'script'
+        links.extend(f'<link rel="preload" href="{escape(url)}" as="{kind}">' for url in _asset_urls(name))
+    # Built stylesheets reference fonts by fingerprinted URL, which the preload must match
+    if _built_assets():
+        links.extend(
+            f'<link rel="preload" href="{escape(url_for("static", filename=font))}" as="font" type="font/woff2" crossorigin>'
+            for font in ASSET_PRELOAD_FONTS
+        )
+    return Markup('\n    '.join(links))
+
+# Content codings offered for API responses, most preferred first
+CONTENT_ENCODINGS = ('br', 'gzip') if brotli else ('gzip',)
+
+def negotiate_encoding(accept_encodings: Accept) -> Optional[str]:
+    """
+    Pick the content coding for a response.
+    
+    Args:
+        accept_encodings: Parsed Accept-Encoding header of the request
+        
+    Returns:
+        "br", "gzip" or None for an uncompressed response
+    """
+    return accept_encodings.best_match(CONTENT_ENCODINGS)
+
+def compress_body(data: bytes, encoding: str) -> bytes:
+    """
+    Compress a response body.
+    
+    Args:
+        data: Uncompressed body
+        encoding: Content coding returned by negotiate_encoding()
+        
+    Returns:
+        Compressed body
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=BROTLI_QUALITY)
+    return gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+
+@app.after_request
+def compress_api_response(response: Response) -> Response:
+    """Compress large API responses with the best coding the client accepts."""
+    if not request.path.startswith('/api/') or response.is_streamed or response.direct_passthrough:
+        return response
+    response.vary.add('Accept-Encoding')
+    if response.status_code != 200 or 'Content-Encoding' in response.headers:
+        return response
+    
+    encoding = negotiate_encoding(request.accept_encodings)
+    data = response.get_data()
+    if not encoding or len(data) < COMPRESSION_MIN_SIZE:
+        return response
+    
+    response.set_data(compress_body(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    # Each coding is a different representation and needs its own strong tag
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+def _etag(*versions: Any) -> str:
+    """
+    Build a strong entity tag from version counters and the query string.
+    
+    Versions must be read before the response is built: a write in between
+    then only makes the tag older than the body, which costs one extra
+    full response instead of serving stale data.
+    """
+    query = zlib.crc32(request.query_string)
+    return "-".join([session_manager.epoch, *(str(version) for version in versions), f"{query:08x}"])
+
+def _conditional_response(etag: str, build) -> Response:
+    """
+    Answer 304 if the client already has this version, otherwise build the response.
+    
+    Args:
+        etag: Entity tag of the current version
+        build: Callable returning the full response, only called on a cache miss
+        
+    Returns:
+        The response, tagged if successful
+    """
+    # The client may hold a compressed representation, tagged with its coding
+    for candidate in (etag, *(f"{etag}-{encoding}" for encoding in CONTENT_ENCODINGS)):
+        if request.if_none_match.contains(candidate):
+            response = app.response_class(status=304)
+            response.set_etag(candidate)
+            response.headers['Cache-Control'] = 'no-cache'
+            return response
+    
+    response = make_response(build())
+    if response.status_code != 200:
+        return response
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
 
 # Routes
 @app.route('/')
@@ -66,181 +388,917 @@ def interactive_story():
 @app.route('/history')
 def history():
     """Render the history page."""
-    return render_template('history.html',
-                          history=session_manager.get('history', []),
-                          stories=session_manager.list_stories())
+    # The lists are fetched page by page from the API as they are scrolled into view
+    return render_template('history.html')
 
 # API Routes for AJAX calls
 
+def request_budget(data: Dict[str, Any], client: Optional[str] = None, endpoint: Optional[str] = None) -> Budget:
+    """
+    Build the budget of a generation request, accounted to its client.
+    
+    Args:
+        data: Request body
+        client: Client making the request; by default the client of the current Flask request
+        endpoint: Endpoint of the request; by default the path of the current Flask request
+        
+    Returns:
+        Budget starting now
+        
+    Raises:
+        QuotaExceeded: If the client has used up its API quota
+    """
+    if client is None:
+        client, endpoint = client_id(), request.path
+    token_ledger.check_quota(client)
+    return Budget.from_request(data, endpoint=endpoint, session=client)
+
+def generation_response(handler, data: Dict[str, Any]) -> Response:
+    """
+    Run a generation handler within the budget the request asks for.
+    
+    Args:
+        handler: Function decorated with uses_api returning (payload, status)
+        data: Request body
+        
+    Returns:
+        JSON response, with status 504 if the request ran out of time, 429
+        if the client is over its quota, or a degraded response if the API
+        circuit is open
+    """
+    headers = {}
+    try:
+        payload, status = handler(data, budget=request_budget(data))
+    except BudgetExceeded as e:
+        payload, status = {"error": str(e)}, 504
+    except QuotaExceeded as e:
+        payload, status = {"error": str(e)}, 429
+        headers = retry_after_headers(e)
+    except CircuitOpen as e:
+        payload, status = degraded_response(handler, data, e)
+        headers = retry_after_headers(e)
+    return jsonify(payload), status, headers
+
+def retry_after_headers(error: Exception) -> Dict[str, str]:
+    """Retry-After header telling clients when the API may be called again, from a CircuitOpen or QuotaExceeded."""
+    return {'Retry-After': str(math.ceil(error.retry_after))}
+
+def degraded_response(handler, data: Dict[str, Any], error: CircuitOpen):
+    """
+    Answer a generation request without the API while its circuit is open.
+    
+    Texts and topics are served from stored content; other handlers fail
+    fast with status 503.
+    
+    Args:
+        handler: Generation handler that could not call the API
+        data: Request body
+        error: The CircuitOpen raised by the handler
+        
+    Returns:
+        Response payload and HTTP status
+    """
+    fallback = DEGRADED_FALLBACKS.get(handler)
+    response = fallback(data) if fallback else None
+    if response:
+        return response
+    return {"error": str(error), "degraded": True, "retry_after": math.ceil(error.retry_after)}, 503
+
+def degraded_text_response(data: Dict[str, Any]):
+    """
+    Pick a stored text standing in for a generate-text request.
+    
+    A text with a similar topic is preferred; otherwise a recent text in the
+    same language and level is picked at random.
+    
+    Args:
+        data: Request body
+        
+    Returns:
+        Response payload and HTTP status, or None if no text fits
+    """
+    language = data.get('language', 'English')
+    level = data.get('level', 'B1-B2')
+    similar = session_manager.find_similar_text(
+        data.get('topic', ''),
+        language,
+        level,
+        data.get('text_type', 'General'),
+        DEGRADED_SIMILARITY_THRESHOLD
+    ) if data.get('topic') else None
+    item = similar['item'] if similar else None
+    
+    if not item:
+        results = session_manager.search(language=language, level=level, kind='history', per_page=DEGRADED_POOL_SIZE)['results']
+        if results:
+            item = session_manager.get_history_item(random.choice(results)['id'])
+    if not item:
+        return None
+    return {"success": True, "text": item, "reused": True, "degraded": True}, 200
+
+def degraded_topic_response(data: Dict[str, Any]):
+    """
+    Suggest a topic for a generate-topic request from stored texts or the built-in list.
+    
+    Args:
+        data: Request body
+        
+    Returns:
+        Response payload and HTTP status
+    """
+    results = session_manager.search(
+        language=data.get('language', 'English'),
+        level=data.get('level', 'B1-B2'),
+        kind='history',
+        per_page=DEGRADED_POOL_SIZE
+    )['results']
+    topics = [result['topic'] for result in results if result.get('topic')] or FALLBACK_TOPICS
+    return {"success": True, "topic": random.choice(topics), "degraded": True}, 200
+
+# Enrichments that can accompany a generated text, named after the result tabs
+ENRICHMENTS = ('summary', 'key_words', 'questions', 'exercises', 'translation')
+
+def _sampling(data: Dict[str, Any]) -> Tuple[Optional[float], Optional[float]]:
+    """Temperature and top_p a request asks for; None for those left to the task profile."""
+    temperature, top_p = data.get('temperature'), data.get('top_p')
+    return (
+        None if temperature is None else float(temperature),
+        None if top_p is None else float(top_p)
+    )
+
+def _main_text_steps(data: Dict[str, Any]):
+    """
+    Step function producing the main text of a generate-text request.
+    
+    Args:
+        data: Request body
+        
+    Returns:
+        Tuple of (GeneratedText, None), or (None, (payload, status)) when the
+        request is answered without a new text (an error or a reused text)
+    """
+    from core.text_generator import generate_text, get_topic_suggestion
+    language = data.get('language', 'English')
+    level = data.get('level', 'B1-B2')
+    word_count = int(data.get('word_count', DEFAULT_WORD_COUNT))
+    topic = data.get('topic')
+    text_type = data.get('text_type', 'General')
+    temperature, top_p = _sampling(data)
+    
+    # If no topic provided, generate one
+    if not topic:
+        topic = yield from get_topic_suggestion.steps(language, level, temperature, top_p)
+        if not topic:
+            return None, ({"error": "Failed to generate topic"}, 500)
+    
+    # Reuse a stored text on the same topic instead of generating a new one
+    elif data.get('reuse_similar', False):
+        similar = session_manager.find_similar_text(
+            topic, language, level, text_type, REUSE_SIMILARITY_THRESHOLD
+        )
+        if similar:
+            return None, ({
+                "success": True,
+                "text": similar['item'],
+                "reused": True,
+                "similarity": similar['similarity']
+            }, 200)
+    
+    # Generate the text
+    generated_text = yield from generate_text.steps(
+        language=language,
+        level=level,
+        word_count=word_count,
+        topic=topic,
+        text_type=text_type,
+        temperature=temperature,
+        top_p=top_p
+    )
+    
+    if not generated_text:
+        return None, ({"error": "Failed to generate text"}, 500)
+    
+    # Create a GeneratedText object
+    text_obj = GeneratedText(
+        topic=topic,
+        text=generated_text,
+        language=language,
+        level=level,
+        text_type=text_type,
+        word_count=word_count
+    )
+    return text_obj, None
+
+def _enrichment_steps(data: Dict[str, Any], text_obj: GeneratedText) -> Dict[str, Any]:
+    """
+    Prepare the step functions for the enrichments a request asks for.
+    
+    Each step function returns the fields to set on the text, in the shape
+    GeneratedText.to_dict() stores them in, or an empty dictionary if the
+    enrichment failed.
+    
+    Args:
+        data: Request body
+        text_obj: The generated main text
+        
+    Returns:
+        Dictionary mapping enrichment names to step function generators
+    """
+    from core.text_generator import (
+        generate_summary,
+        extract_key_words,
+        generate_comprehension_questions,
+        generate_language_exercises,
+        generate_translation
+    )
+    text, language, level = text_obj.text, text_obj.language, text_obj.level
+    
+    def summary():
+        summary = yield from generate_summary.steps(text, language, level)
+        return {'summary': summary} if summary else {}
+    
+    def key_words():
+        count = DIFFICULTY_WORDS_COUNT.get(level, 5)
+        key_words = yield from extract_key_words.steps(text, language, level, count)
+        return {'key_words': key_words} if key_words else {}
+    
+    def questions():
+        questions = yield from generate_comprehension_questions.steps(text, language, level)
+        return {'questions': questions} if questions else {}
+    
+    def exercises():
+        exercises = yield from generate_language_exercises.steps(text, language, level)
+        return {'exercises': exercises} if exercises else {}
+    
+    def translation(translation_language):
+        translation = yield from generate_translation.steps(text, language, translation_language, level)
+        if not translation:
+            return {}
+        return {'translation': translation, 'translation_language': translation_language}
+    
+    steps = {}
+    if data.get('include_summary', False):
+        steps['summary'] = summary()
+    if data.get('include_key_words', False):
+        steps['key_words'] = key_words()
+    if data.get('include_questions', False):
+        steps['questions'] = questions()
+    if data.get('include_exercises', False):
+        steps['exercises'] = exercises()
+    if data.get('include_translation', False):
+        translation_language = data.get('translation_language', 'English')
+        if translation_language != language:
+            steps['translation'] = translation(translation_language)
+    return {name: _stored(generator) for name, generator in steps.items()}
+
+def _stored(steps):
+    """Step function converting the fields of an enrichment to the shape stored in history."""
+    fields = yield from steps
+    return GeneratedText.stored_fields(fields)
+
+@uses_api
+def generate_text_response(data: Dict[str, Any]):
+    """
+    Generate a text and its requested extras for a generate-text request.
+    
+    Args:
+        data: Request body
+        
+    Returns:
+        Response payload and HTTP status
+    """
+    text_obj, response = yield from _main_text_steps(data)
+    if response:
+        return response
+    
+    # Generate additional content if requested. The main text is already
+    # paid for, so running out of time or API keeps it with the finished enrichments
+    enrichments = {}
+    steps = _enrichment_steps(data, text_obj)
+    finished = []
+    for name, generator in steps.items():
+        try:
+            fields = yield from generator
+        except (BudgetExceeded, CircuitOpen):
+            break
+        finished.append(name)
+        enrichments.update(fields)
+        for field, value in fields.items():
+            setattr(text_obj, field, value)
+    
+    # Save to history and bank the questions and exercises of saved texts
+    text_dict = text_obj.to_dict()
+    if data.get('save_history', True):
+        session_manager.add_to_history(text_dict)
+        item_bank.add_from_text(text_dict, enrichments)
+    
+    # Return the results
+    return {
+        "success": True,
+        "text": text_dict,
+        "skipped": [name for name in steps if name not in finished]
+    }, 200
+
+@uses_api
+def generate_enrichment_response(data: Dict[str, Any]):
+    """
+    Get one enrichment of a stored text, generating it on first request.
+    
+    The result is memoized on the history item, so later requests (and
+    reloads of the text) are served without an API call.
+    
+    Args:
+        data: Request body with the enrichment name, text_id, for texts not
+            saved to history the text (with topic, text, language and level)
+            and, for translations, translation_language
+        
+    Returns:
+        Response payload and HTTP status
+    """
+    name = data.get('name')
+    text_id = data.get('text_id')
+    if name not in ENRICHMENTS:
+        return {"error": f"Unknown enrichment: {name}"}, 400
+    if not text_id:
+        return {"error": "Text ID is required"}, 400
+    
+    # Texts generated without saving them to history are sent with the request
+    item = session_manager.get_history_item(text_id)
+    saved = item is not None
+    if not saved:
+        item = data.get('text')
+        if not isinstance(item, dict) or not all(isinstance(item.get(key), str) for key in ('text', 'language', 'level')):
+            return {"error": "Text not found; texts not saved to history must be sent with the request"}, 404
+    
+    translation_language = data.get('translation_language', 'English')
+    if item.get(name) and (name != 'translation' or item.get('translation_language') == translation_language):
+        fields = {'translation': item['translation'], 'translation_language': translation_language} if name == 'translation' else {name: item[name]}
+        return {"success": True, "name": name, "fields": fields, "cached": True}, 200
+    
+    # Only the text itself is needed; stored enrichments may not fit the models
+    text_obj = GeneratedText(topic=item.get('topic') or '', text=item['text'], language=item['language'], level=item['level'])
+    steps = _enrichment_steps({f'include_{name}': True, 'translation_language': translation_language}, text_obj)
+    if name not in steps:
+        return {"error": "Translation language must differ from the text language"}, 400
+    
+    fields = yield from steps[name]
+    if not fields:
+        return {"error": f"Failed to generate {name.replace('_', ' ')}"}, 500
+    
+    if saved:
+        session_manager.update_history_item(text_id, fields)
+        item_bank.add_from_text(item, fields)
+    return {"success": True, "name": name, "fields": fields, "cached": False}, 200
+
+def _sse(event: str, payload: Any) -> str:
+    """Format a server-sent event."""
+    return f"event: {event}\ndata: {json.dumps(payload, ensure_ascii=False)}\n\n"
+
+def _enrichment_event(data: Dict[str, Any], text_obj: GeneratedText, name: str, fields: Dict[str, Any]) -> str:
+    """Apply a finished enrichment to the text and its history entry, and format its event."""
+    if not fields:
+        return _sse('enrichment', {"name": name, "error": f"Failed to generate {name.replace('_', ' ')}"})
+    for field, value in fields.items():
+        setattr(text_obj, field, value)
+    if data.get('save_history', True):
+        session_manager.update_history_item(text_obj.id, fields)
+        item_bank.add_from_text({'id': text_obj.id, 'topic': text_obj.topic, 'language': text_obj.language, 'level': text_obj.level}, fields)
+    return _sse('enrichment', {"name": name, "fields": fields})
+
+def _main_text_event(data: Dict[str, Any], text_obj: GeneratedText, response, pending: List[str]) -> str:
+    """Save a new main text to history and format the event announcing it."""
+    if response:
+        payload, status = response
+        return _sse('text' if status == 200 else 'error', payload)
+    saved = data.get('save_history', True)
+    if saved:
+        session_manager.add_to_history(text_obj.to_dict())
+    return _sse('text', {"success": True, "text": text_obj.to_dict(), "saved": bool(saved), "pending": pending})
+
+def stream_text_events(data: Dict[str, Any], budget: Budget) -> Iterator[str]:
+    """
+    Generate a text, streaming it as soon as it is ready and each enrichment as it completes.
+    
+    Enrichments run concurrently on worker threads.
+    
+    Args:
+        data: Request body
+        budget: Limits of the request, see request_budget()
+        
+    Yields:
+        Server-sent events: "text" (or "error"), one "enrichment" per
+        requested enrichment, then "done"
+    """
+    try:
+        try:
+            text_obj, response = run_steps(_main_text_steps(data), budget)
+        except CircuitOpen as e:
+            text_obj, response = None, degraded_response(generate_text_response, data, e)
+        steps = {} if response else _enrichment_steps(data, text_obj)
+        yield _main_text_event(data, text_obj, response, list(steps))
+        
+        def run(generator):
+            try:
+                return run_steps(generator, budget)
+            except (BudgetExceeded, CircuitOpen):
+                return {}
+        
+        if steps:
+            with ThreadPoolExecutor(max_workers=len(steps)) as executor:
+                futures = {executor.submit(run, generator): name for name, generator in steps.items()}
+                for future in as_completed(futures):
+                    yield _enrichment_event(data, text_obj, futures[future], future.result())
+        yield _sse('done', {})
+    except Exception as e:
+        print(f"Error in stream_text_events: {e}")
+        yield _sse('error', {"error": str(e)})
+
+async def stream_text_events_async(data: Dict[str, Any], budget: Budget) -> AsyncIterator[str]:
+    """
+    Async version of stream_text_events(), running enrichments as concurrent tasks.
+    
+    Args:
+        data: Request body
+        budget: Limits of the request, see request_budget()
+        
+    Yields:
+        Server-sent events, as for stream_text_events()
+    """
+    # Events that save to storage are built on the default executor, off the event loop
+    loop = asyncio.get_running_loop()
+    try:
+        try:
+            text_obj, response = await run_steps_async(_main_text_steps(data), budget)
+        except CircuitOpen as e:
+            text_obj, response = None, degraded_response(generate_text_response, data, e)
+        steps = {} if response else _enrichment_steps(data, text_obj)
+        yield await loop.run_in_executor(None, _main_text_event, data, text_obj, response, list(steps))
+        
+        async def run(name, generator):
+            try:
+                return name, await run_steps_async(generator, budget)
+            except (BudgetExceeded, CircuitOpen):
+                return name, {}
+        
+        for task in asyncio.as_completed([run(name, generator) for name, generator in steps.items()]):
+            name, fields = await task
+            yield await loop.run_in_executor(None, _enrichment_event, data, text_obj, name, fields)
+        yield _sse('done', {})
+    except Exception as e:
+        print(f"Error in stream_text_events_async: {e}")
+        yield _sse('error', {"error": str(e)})
+
 @app.route('/api/generate-text', methods=['POST'])
 def api_generate_text():
     """API endpoint to generate text."""
     try:
         data = request.json
         
-        language = data.get('language', 'English')
-        level = data.get('level', 'B1-B2')
-        word_count = int(data.get('word_count', DEFAULT_WORD_COUNT))
-        topic = data.get('topic')
-        text_type = data.get('text_type', 'General')
-        temperature = float(data.get('temperature', DEFAULT_TEMPERATURE))
-        top_p = float(data.get('top_p', DEFAULT_TOP_P))
+        # Stream the main text first and enrichments as they complete
+        if data.get('stream', False):
+            try:
+                budget = request_budget(data)
+            except QuotaExceeded as e:
+                return jsonify({"error": str(e)}), 429, retry_after_headers(e)
+            return Response(
+                stream_with_context(stream_text_events(data, budget)),
+                mimetype='text/event-stream',
+                headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+            )
         
-        # If no topic provided, generate one
-        if not topic:
-            topic = get_topic_suggestion(language, level, temperature, top_p)
-            if not topic:
-                return jsonify({"error": "Failed to generate topic"}), 500
-        
-        # Generate the text
-        generated_text = generate_text(
-            language=language,
-            level=level,
-            word_count=word_count,
-            topic=topic,
-            text_type=text_type,
-            temperature=temperature,
-            top_p=top_p
+        return generation_response(generate_text_response, data)
+        
+    except Exception as e:
+        import traceback
+        print(f"Error in api_generate_text: {e}")
+        print(traceback.format_exc())
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/enrichment/<name>', methods=['POST'])
+def api_enrichment(name):
+    """API endpoint to get an enrichment of a stored text, generating it on first request."""
+    try:
+        return generation_response(generate_enrichment_response, dict(request.json or {}, name=name))
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _translation_request(data: Dict[str, Any]) -> Tuple[Optional[Dict[str, Any]], List[str], Optional[str]]:
+    """
+    Find the stored text and target languages of a translate-text request.
+    
+    Args:
+        data: Request body with text_id and target_languages
+        
+    Returns:
+        Tuple of (history item, target languages, None), or (None, [], error message)
+    """
+    text_id = data.get('text_id')
+    if not text_id:
+        return None, [], "Text ID is required"
+    item = session_manager.get_history_item(text_id)
+    if not item:
+        return None, [], "Text not found"
+    targets = []
+    for language in data.get('target_languages') or []:
+        if language in LANGUAGE_MAP and language != item['language'] and language not in targets:
+            targets.append(language)
+    if not targets:
+        return None, [], "Choose at least one target language different from the text language"
+    return item, targets, None
+
+def _translation_steps(item: Dict[str, Any], languages: List[str]) -> Dict[str, Any]:
+    """
+    Prepare one step function per target language translating a stored text.
+    
+    The text is segmented once and every language gets the same lines, so
+    the translations stay aligned with each other.
+    
+    Args:
+        item: History item of the text
+        languages: Target languages
+        
+    Returns:
+        Dictionary mapping languages to step function generators, each
+        returning the translation set as a dictionary or None on failure
+    """
+    from core.text_generator import generate_translation, segment_sentences
+    segments = segment_sentences(item['text'])
+    
+    def translate(language):
+        lines = yield from generate_translation.steps(
+            item['text'], item['language'], language, item['level'], segments=segments
         )
+        if not lines:
+            return None
+        return TranslationSet(item['id'], language, [Translation(**line) for line in lines]).to_dict()
+    
+    return {language: translate(language) for language in languages}
+
+def _cached_translation_events(item: Dict[str, Any], targets: List[str]) -> Tuple[List[str], List[str]]:
+    """Events for the translations a text already has, and the target languages still to translate."""
+    stored = item.get('translations') or {}
+    events = [
+        _sse('translation', {"language": language, "translation": stored[language], "cached": True})
+        for language in targets if language in stored
+    ]
+    return events, [language for language in targets if language not in stored]
+
+def _translation_event(text_id: str, language: str, translation_set: Optional[Dict[str, Any]]) -> str:
+    """Store a finished translation with its text and format its event."""
+    if not translation_set:
+        return _sse('translation', {"language": language, "error": f"Failed to translate into {language}"})
+    item = session_manager.get_history_item(text_id)
+    if item:
+        fields = {'translations': dict(item.get('translations') or {}, **{language: translation_set})}
+        # The first translation also becomes the one shown by the translation tab
+        if not item.get('translation'):
+            fields.update(translation=translation_set['lines'], translation_language=language)
+        session_manager.update_history_item(text_id, fields)
+    return _sse('translation', {"language": language, "translation": translation_set, "cached": False})
+
+def stream_translation_events(data: Dict[str, Any], budget: Budget) -> Iterator[str]:
+    """
+    Translate a stored text into several languages at once, streaming each translation as it finishes.
+    
+    Translations run concurrently on worker threads, so the request takes
+    about as long as its slowest translation.
+    
+    Args:
+        data: Request body with text_id and target_languages
+        budget: Limits of the request, see request_budget()
+        
+    Yields:
+        Server-sent events: one "translation" per target language, then
+        "done"; or a single "error"
+    """
+    try:
+        item, targets, error = _translation_request(data)
+        if error:
+            yield _sse('error', {"error": error})
+            return
+        events, targets = _cached_translation_events(item, targets)
+        yield from events
         
-        if not generated_text:
-            return jsonify({"error": "Failed to generate text"}), 500
-        
-        # Create a GeneratedText object
-        text_obj = GeneratedText(
-            topic=topic,
-            text=generated_text,
-            language=language,
-            level=level,
-            text_type=text_type,
-            word_count=word_count
+        def run(generator):
+            try:
+                return run_steps(generator, budget)
+            except (BudgetExceeded, CircuitOpen):
+                return None
+        
+        steps = _translation_steps(item, targets) if targets else {}
+        if steps:
+            with ThreadPoolExecutor(max_workers=len(steps)) as executor:
+                futures = {executor.submit(run, generator): language for language, generator in steps.items()}
+                for future in as_completed(futures):
+                    yield _translation_event(item['id'], futures[future], future.result())
+        yield _sse('done', {})
+    except Exception as e:
+        print(f"Error in stream_translation_events: {e}")
+        yield _sse('error', {"error": str(e)})
+
+async def stream_translation_events_async(data: Dict[str, Any], budget: Budget) -> AsyncIterator[str]:
+    """
+    Async version of stream_translation_events(), running translations as concurrent tasks.
+    
+    Args:
+        data: Request body with text_id and target_languages
+        budget: Limits of the request, see request_budget()
+        
+    Yields:
+        Server-sent events, as for stream_translation_events()
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        item, targets, error = _translation_request(data)
+        if error:
+            yield _sse('error', {"error": error})
+            return
+        events, targets = _cached_translation_events(item, targets)
+        for event in events:
+            yield event
+        
+        async def run(language, generator):
+            try:
+                return language, await run_steps_async(generator, budget)
+            except (BudgetExceeded, CircuitOpen):
+                return language, None
+        
+        steps = _translation_steps(item, targets) if targets else {}
+        for task in asyncio.as_completed([run(language, generator) for language, generator in steps.items()]):
+            language, translation_set = await task
+            # Saved off the event loop, one translation at a time
+            yield await loop.run_in_executor(None, _translation_event, item['id'], language, translation_set)
+        yield _sse('done', {})
+    except Exception as e:
+        print(f"Error in stream_translation_events_async: {e}")
+        yield _sse('error', {"error": str(e)})
+
+@app.route('/api/translate-text', methods=['POST'])
+def api_translate_text():
+    """API endpoint to translate a stored text into several languages at once, as server-sent events."""
+    try:
+        data = request.json or {}
+        try:
+            budget = request_budget(data)
+        except QuotaExceeded as e:
+            return jsonify({"error": str(e)}), 429, retry_after_headers(e)
+        return Response(
+            stream_with_context(stream_translation_events(data, budget)),
+            mimetype='text/event-stream',
+            headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
         )
         
-        # Generate additional content if requested
-        include_summary = data.get('include_summary', False)
-        include_key_words = data.get('include_key_words', False)
-        include_questions = data.get('include_questions', False)
-        include_exercises = data.get('include_exercises', False)
-        include_translation = data.get('include_translation', False)
-        
-        if include_summary:
-            summary = generate_summary(generated_text, language, level)
-            if summary:
-                text_obj.summary = summary
-        
-        if include_key_words:
-            word_count = DIFFICULTY_WORDS_COUNT.get(level, 5)
-            key_words = extract_key_words(generated_text, language, level, word_count)
-            if key_words:
-                text_obj.key_words = key_words
-        
-        if include_questions:
-            questions = generate_comprehension_questions(generated_text, language, level)
-            if questions:
-                text_obj.questions = questions
-        
-        if include_exercises:
-            exercises = generate_language_exercises(generated_text, language, level)
-            if exercises:
-                text_obj.exercises = exercises
-        
-        if include_translation:
-            translation_language = data.get('translation_language', 'English')
-            if translation_language != language:
-                translation = generate_translation(
-                    generated_text, 
-                    language, 
-                    translation_language, 
-                    level
-                )
-                if translation:
-                    text_obj.translation = translation
-                    text_obj.translation_language = translation_language
-        
-        # Save to history
-        if data.get('save_history', True):
-            session_manager.add_to_history(text_obj.to_dict())
-        
-        # Return the results
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/backfill-enrichment', methods=['POST'])
+def api_backfill_enrichment():
+    """API endpoint to add an enrichment to stored texts lacking it, several texts per API call."""
+    from core.batch_enrichment import BATCH_TASKS, enrich_texts
+    try:
+        data = request.json or {}
+        name = data.get('name')
+        if name not in BATCH_TASKS:
+            return jsonify({"error": f"Enrichment cannot be backfilled: {name}"}), 400
+        budget = request_budget(data)
+        limit = min(max(int(data.get('limit', BACKFILL_LIMIT)), 1), BACKFILL_LIMIT)
+        
+        # One text past the limit tells whether another request is needed
+        pending = []
+        for item in session_manager.iter_history():
+            if not item.get(name):
+                pending.append({'id': item['id'], 'topic': item['topic'], 'text': item['text'], 'language': item['language'], 'level': item['level']})
+                if len(pending) > limit:
+                    break
+        more = len(pending) > limit
+        pending = pending[:limit]
+        
+        # Results are saved and banked as each batch completes, so a timeout keeps the finished ones
+        by_id = {item['id']: item for item in pending}
+        def save(text_id, fields):
+            session_manager.update_history_item(text_id, fields)
+            item_bank.add_from_text(by_id[text_id], fields)
+        results = enrich_texts(name, pending, budget, on_result=save)
         return jsonify({
             "success": True,
-            "text": text_obj.to_dict()
+            "name": name,
+            "enriched": len(results),
+            "failed": len(pending) - len(results),
+            "more": more
         })
         
+    except QuotaExceeded as e:
+        return jsonify({"error": str(e)}), 429, retry_after_headers(e)
     except Exception as e:
-        import traceback
-        print(f"Error in api_generate_text: {e}")
-        print(traceback.format_exc())
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/generate-story-part', methods=['POST'])
-def api_generate_story_part():
-    """API endpoint to generate a story part."""
+@app.route('/api/bank/items', methods=['GET'])
+def api_bank_items():
+    """API endpoint to list banked questions or exercises by language, level, type or source text."""
     try:
-        data = request.json
-        
-        language = data.get('language', 'English')
-        level = data.get('level', 'B1-B2')
-        topic = data.get('topic', '')
-        part_number = int(data.get('part_number', 1))
-        previous_text = data.get('previous_text', '')
-        choice_made = data.get('choice_made', '')
-        temperature = float(data.get('temperature', DEFAULT_TEMPERATURE))
-        top_p = float(data.get('top_p', DEFAULT_TOP_P))
-        
-        # Generate the story part
-        story_part = generate_story_part(
-            language=language,
-            level=level,
-            topic=topic,
-            part_number=part_number,
-            previous_text=previous_text,
-            choice_made=choice_made,
-            temperature=temperature,
-            top_p=top_p
-        )
+        kind = request.args.get('kind', 'exercise')
+        if kind not in ('question', 'exercise'):
+            return jsonify({"error": f"Unknown item kind: {kind}"}), 400
+        text_id = request.args.get('text_id')
+        language = request.args.get('language')
+        level = request.args.get('level')
+        if not text_id and not (language and level):
+            return jsonify({"error": "Language and level, or a text ID, are required"}), 400
+        offset = max(int(request.args.get('offset', 0)), 0)
+        limit = min(max(int(request.args.get('limit', WORKSHEET_MAX_ITEMS)), 1), WORKSHEET_MAX_ITEMS)
         
-        if not story_part:
-            return jsonify({"error": "Failed to generate story part"}), 500
+        items = item_bank.find(kind, language, level, request.args.get('type'), text_id)
+        return jsonify({
+            "success": True,
+            "items": items[offset:offset + limit],
+            "total": len(items)
+        })
         
-        # If this is the first part or we don't have the story yet, create it
-        story_id = data.get('story_id', topic)
-        story = session_manager.get_story(story_id)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/worksheet', methods=['POST'])
+def api_worksheet():
+    """API endpoint to assemble a worksheet from banked questions and exercises, without an API call."""
+    try:
+        data = request.json or {}
+        language = data.get('language')
+        level = data.get('level')
+        if not language or not level:
+            return jsonify({"error": "Language and level are required"}), 400
+        exercise_types = data.get('exercise_types') or []
+        unknown = [name for name in exercise_types if name not in EXERCISE_TYPES and name != OTHER_TYPE]
+        if unknown:
+            return jsonify({"error": f"Unknown exercise type: {unknown[0]}"}), 400
         
-        if not story:
-            story = {
-                'title': story_id,
-                'language': language,
-                'level': level,
-                'parts': {},
-                'last_updated': datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            }
+        questions = min(max(int(data.get('questions', WORKSHEET_QUESTIONS)), 0), WORKSHEET_MAX_ITEMS)
+        exercises = min(max(int(data.get('exercises', WORKSHEET_EXERCISES)), 0), WORKSHEET_MAX_ITEMS)
+        worksheet = item_bank.worksheet(
+            language, level, questions, exercises,
+            exercise_types=exercise_types,
+            text_id=data.get('text_id'),
+            seed=data.get('seed')
+        )
+        return jsonify({
+            "success": True,
+            "worksheet": worksheet
+        })
         
-        # Add the new part
-        part_key = f"part_{part_number}"
-        story['parts'][part_key] = {
-            'text': story_part.get('story_text', ''),
-            'choice_1': story_part.get('choice_1', ''),
-            'choice_2': story_part.get('choice_2', ''),
-            'is_final': story_part.get('is_final', False)
-        }
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/bank/sync-history', methods=['POST'])
+def api_bank_sync_history():
+    """API endpoint to bank the questions and exercises of texts stored before the bank existed."""
+    try:
+        added = sum(item_bank.add_from_text(item) for item in session_manager.iter_history())
+        return jsonify({
+            "success": True,
+            "added": added,
+            "total": len(item_bank)
+        })
         
-        if choice_made:
-            story['parts'][part_key]['choice_made'] = choice_made
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/find-similar', methods=['POST'])
+def api_find_similar():
+    """API endpoint to find an existing text with a similar topic."""
+    try:
+        data = request.json
+        topic = data.get('topic', '')
         
-        # Update last updated timestamp
-        story['last_updated'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if not topic:
+            return jsonify({"error": "Topic is required"}), 400
         
-        # Save the story
-        session_manager.save_story(story_id, story)
+        similar = session_manager.find_similar_text(
+            topic,
+            data.get('language', 'English'),
+            data.get('level', 'B1-B2'),
+            data.get('text_type', 'General'),
+            float(data.get('threshold', SIMILARITY_THRESHOLD))
+        )
         
-        # Return the results
         return jsonify({
             "success": True,
-            "story_part": story_part,
-            "story_id": story_id
+            "text": similar['item'] if similar else None,
+            "similarity": similar['similarity'] if similar else 0.0
         })
         
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+def _new_story_id(title: str) -> str:
+    """Story id for a new story, the title unless a story already uses it."""
+    story_id, number = title, 1
+    while session_manager.get_story(story_id):
+        number += 1
+        story_id = f"{title} ({number})"
+    return story_id
+
+@uses_api
+def generate_story_part_response(data: Dict[str, Any]):
+    """
+    Get the part of a story at a choice path, generating and saving it on first request.
+    
+    Parts already explored, by this reader or on an earlier visit to the
+    branch, are served from the stored story without an API call. With the
+    shared story library enabled, parts generated for other stories on the
+    same topic are reused too, unless the request opts out or novelty
+    picks a fresh part.
+    
+    Args:
+        data: Request body with the story_id (defaults to the topic) and the
+            path of choices made, "" for the beginning. "new_story": true
+            starts a new story under an unused id; "shared": false skips the
+            library and "novelty" overrides the probability of generating a
+            fresh part although the library has one.
+        
+    Returns:
+        Response payload and HTTP status
+    """
+    from core.story_generator import generate_story_part
+    language = data.get('language', 'English')
+    level = data.get('level', 'B1-B2')
+    topic = data.get('topic', '')
+    path = str(data.get('path', ''))
+    temperature, top_p = _sampling(data)
+    story_id = _new_story_id(topic) if data.get('new_story') else (data.get('story_id') or topic)
+    shared = story_library is not None and data.get('shared', True)
+    novelty = min(max(float(data.get('novelty', STORY_LIBRARY_NOVELTY)), 0.0), 1.0)
+    
+    if not is_valid_path(path):
+        return {"error": "Invalid choice path"}, 400
+    
+    stored = session_manager.get_story(story_id)
+    story = Story.from_dict(stored) if stored else Story(title=topic or story_id, language=language, level=level)
+    part = story.get_part(path)
+    source = 'story'
+    
+    if part is None:
+        parent = story.parent_of(path)
+        if path and parent is None:
+            return {"error": "The choice leads from a part that has not been generated"}, 400
+        if parent and parent.get('is_final'):
+            return {"error": "The story has already ended on this branch"}, 400
+        
+        library_key = StoryLibrary.key(story.title, story.language, story.level, path, parent['text'] if parent else "")
+        fields = story_library.get(library_key) if shared and random.random() >= novelty else None
+        source = 'library'
+        
+        if fields is None:
+            story_part = yield from generate_story_part.steps(
+                language=story.language,
+                level=story.level,
+                topic=story.title,
+                part_number=len(path) + 1,
+                previous_text=story.get_text(path[:-1]) if path else "",
+                choice_made=parent[f'choice_{path[-1]}'] if path else "",
+                temperature=temperature,
+                top_p=top_p
+            )
+            if not story_part:
+                return {"error": "Failed to generate story part"}, 500
+            
+            fields = {
+                'text': story_part.get('story_text', ''),
+                'choice_1': story_part.get('choice_1', ''),
+                'choice_2': story_part.get('choice_2', ''),
+                'is_final': bool(story_part.get('is_final', False))
+            }
+            source = 'generated'
+            if shared:
+                story_library.put(library_key, fields)
+        
+        # Add the part to the latest version, which may have gained other branches meanwhile
+        stored = session_manager.get_story(story_id)
+        if stored:
+            story = Story.from_dict(stored)
+        part = story.add_part(path, **fields)
+        session_manager.save_story(story_id, story.to_dict())
+    
+    return {
+        "success": True,
+        "story_id": story_id,
+        "path": path,
+        "story_part": {
+            "story_text": part['text'],
+            "choice_1": part.get('choice_1', ''),
+            "choice_2": part.get('choice_2', ''),
+            "is_final": part.get('is_final', False)
+        },
+        "explored": story.explored_choices(path),
+        "source": source,
+        "cached": source != 'generated'
+    }, 200
+
+@app.route('/api/generate-story-part', methods=['POST'])
+def api_generate_story_part():
+    """API endpoint to generate a story part."""
+    try:
+        return generation_response(generate_story_part_response, request.json)
+        
     except Exception as e:
         import traceback
         print(f"Error in api_generate_story_part: {e}")
@@ -255,26 +1313,54 @@ def api_get_story():
         if not story_id:
             return jsonify({"error": "Story ID is required"}), 400
         
+        etag = _etag('story', session_manager.story_version(story_id))
         story = session_manager.get_story(story_id)
         if not story:
             return jsonify({"error": "Story not found"}), 404
         
-        return jsonify({
+        # Stories saved before parts were keyed by choice path are converted
+        return _conditional_response(etag, lambda: jsonify({
             "success": True,
-            "story": story
-        })
+            "story": Story.from_dict(story).to_dict()
+        }))
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
 @app.route('/api/list-stories', methods=['GET'])
 def api_list_stories():
-    """API endpoint to list all stories."""
+    """API endpoint to list stories, optionally a page at a time."""
+    try:
+        etag = _etag('stories', session_manager.stories_version)
+        offset = int(request.args.get('offset', 0))
+        limit = request.args.get('limit')
+        limit = int(limit) if limit else None
+        
+        return _conditional_response(etag, lambda: jsonify({
+            "success": True,
+            "stories": session_manager.list_stories(offset, limit),
+            "total": session_manager.count_stories()
+        }))
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/delete-text', methods=['POST'])
+def api_delete_text():
+    """API endpoint to delete a text from history."""
     try:
-        stories = session_manager.list_stories()
+        data = request.json
+        text_id = data.get('text_id')
+        
+        if not text_id:
+            return jsonify({"error": "Text ID is required"}), 400
+        
+        if not session_manager.delete_history_item(text_id):
+            return jsonify({"error": "Text not found"}), 404
+        
         return jsonify({
             "success": True,
-            "stories": stories
+            "message": f"Text '{text_id}' deleted successfully"
         })
         
     except Exception as e:
@@ -306,10 +1392,170 @@ def api_delete_story():
 def api_get_history():
     """API endpoint to get text generation history."""
     try:
-        history = session_manager.get('history', [])
+        etag = _etag('history', session_manager.history_version)
+        
+        # Optional projection, e.g. fields=topic,language,level,timestamp
+        fields = [field for field in request.args.get('fields', '').split(',') if field] or None
+        offset = int(request.args.get('offset', 0))
+        limit = request.args.get('limit')
+        limit = int(limit) if limit else None
+        
+        # Listings only need metadata (or the projected fields); bodies are fetched per item
+        if fields or request.args.get('metadata_only', 'false').lower() == 'true':
+            return _conditional_response(etag, lambda: jsonify({
+                "success": True,
+                "history": session_manager.list_history(offset, limit, fields),
+                "total": session_manager.count_history()
+            }))
+        
+        return _conditional_response(etag, lambda: jsonify({
+            "success": True,
+            "history": session_manager.get('history', [])
+        }))
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/get-history-item', methods=['GET'])
+def api_get_history_item():
+    """API endpoint to get a single history item."""
+    try:
+        text_id = request.args.get('text_id')
+        if not text_id:
+            return jsonify({"error": "Text ID is required"}), 400
+        
+        etag = _etag('history', session_manager.history_version)
+        item = session_manager.get_history_item(text_id)
+        if not item:
+            return jsonify({"error": "Text not found"}), 404
+        
+        fields = [field for field in request.args.get('fields', '').split(',') if field]
+        if fields:
+            item = {field: item.get(field) for field in fields}
+        
+        return _conditional_response(etag, lambda: jsonify({
+            "success": True,
+            "text": item
+        }))
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/export-history', methods=['GET'])
+def api_export_history():
+    """API endpoint to stream history and stories as NDJSON."""
+    return Response(
+        stream_with_context(session_manager.export_ndjson()),
+        mimetype='application/x-ndjson',
+        headers={'Content-Disposition': 'attachment; filename=language-learning-history.ndjson'}
+    )
+
+def _export_response(kind: str, data: Optional[Dict[str, Any]], options: Dict[str, Any]) -> Response:
+    """Render one text or story in the export pool and send it as a download."""
+    from core.export import FORMATS, ExportUnavailable, check_format, export_document, file_name
+    try:
+        fmt = request.args.get('format', 'html')
+        check_format(fmt)
+        if data is None:
+            return jsonify({"error": f"{kind.capitalize()} not found"}), 404
+        
+        rendered = export_document(kind, data, fmt, options)
+        return send_file(
+            io.BytesIO(rendered),
+            mimetype=FORMATS[fmt][0],
+            as_attachment=fmt != 'html',
+            download_name=file_name(kind, data, fmt)
+        )
+        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ExportUnavailable as e:
+        return jsonify({"error": str(e)}), 501
+    except TimeoutError:
+        return jsonify({"error": "Export took too long; please try again"}), 504
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/export/text/<text_id>', methods=['GET'])
+def api_export_text(text_id):
+    """API endpoint to export a stored text as a printable worksheet (format: html, pdf or docx)."""
+    return _export_response('text', session_manager.get_history_item(text_id), {
+        'answers': request.args.get('answers', '1') != '0'
+    })
+
+@app.route('/api/export/story/<story_id>', methods=['GET'])
+def api_export_story(story_id):
+    """API endpoint to export one branch of a story (format: html, pdf or docx; path: choice path)."""
+    path = request.args.get('path')
+    if path is not None and not is_valid_path(path):
+        return jsonify({"error": "Invalid choice path"}), 400
+    return _export_response('story', session_manager.get_story(story_id), {'path': path})
+
+@app.route('/api/export/pack', methods=['POST'])
+def api_export_pack():
+    """API endpoint to export many texts and stories as a ZIP archive, streamed as they are rendered."""
+    from core.export import ExportUnavailable, check_format, export_pack
+    try:
+        data = request.json or {}
+        fmt = data.get('format', 'html')
+        check_format(fmt)
+        text_ids = list(data.get('text_ids') or [])
+        story_ids = list(data.get('story_ids') or [])
+        if not text_ids and not story_ids:
+            return jsonify({"error": "Text or story IDs are required"}), 400
+        if len(text_ids) + len(story_ids) > EXPORT_PACK_MAX_ITEMS:
+            return jsonify({"error": f"A pack holds at most {EXPORT_PACK_MAX_ITEMS} texts and stories"}), 400
+        
+        # Items are loaded one at a time as the pack is rendered
+        documents = itertools.chain(
+            (('text', session_manager.get_history_item(text_id)) for text_id in text_ids),
+            (('story', session_manager.get_story(story_id)) for story_id in story_ids)
+        )
+        options = {'answers': bool(data.get('answers', True))}
+        return Response(
+            stream_with_context(export_pack(documents, fmt, options)),
+            mimetype='application/zip',
+            headers={'Content-Disposition': f'attachment; filename=worksheets-{fmt}.zip'}
+        )
+        
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except ExportUnavailable as e:
+        return jsonify({"error": str(e)}), 501
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/import-history', methods=['POST'])
+def api_import_history():
+    """API endpoint to import history and stories from an NDJSON upload."""
+    try:
+        # Parse the body line by line instead of loading it all
+        counts = session_manager.import_ndjson(iter(request.stream.readline, b''))
+        return jsonify({
+            "success": True,
+            "imported": counts
+        })
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/search', methods=['GET'])
+def api_search():
+    """API endpoint to search history and stories."""
+    try:
+        results = session_manager.search(
+            query=request.args.get('q', ''),
+            language=request.args.get('language') or None,
+            level=request.args.get('level') or None,
+            kind=request.args.get('kind') or None,
+            topic=request.args.get('topic') or None,
+            text_type=request.args.get('text_type') or None,
+            page=int(request.args.get('page', 1)),
+            per_page=min(int(request.args.get('per_page', 20)), 100)
+        )
         return jsonify({
             "success": True,
-            "history": history
+            **results
         })
         
     except Exception as e:
@@ -328,50 +1574,211 @@ def api_clear_history():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@uses_api
+def generate_topic_response(data: Dict[str, Any]):
+    """
+    Suggest a topic for a generate-topic request.
+    
+    Args:
+        data: Request body
+        
+    Returns:
+        Response payload and HTTP status
+    """
+    from core.text_generator import get_topic_suggestion
+    language = data.get('language', 'English')
+    level = data.get('level', 'B1-B2')
+    
+    topic = yield from get_topic_suggestion.steps(language, level)
+    if not topic:
+        return {"error": "Failed to generate topic"}, 500
+    
+    return {
+        "success": True,
+        "topic": topic
+    }, 200
+
 @app.route('/api/generate-topic', methods=['POST'])
 def api_generate_topic():
     """API endpoint to generate a topic suggestion."""
     try:
-        data = request.json
-        language = data.get('language', 'English')
-        level = data.get('level', 'B1-B2')
+        return generation_response(generate_topic_response, request.json)
         
-        topic = get_topic_suggestion(language, level)
-        if not topic:
-            return jsonify({"error": "Failed to generate topic"}), 500
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@uses_api
+def generate_summary_response(data: Dict[str, Any]):
+    """
+    Summarize the text of a generate-summary request.
+    
+    Args:
+        data: Request body
         
+    Returns:
+        Response payload and HTTP status
+    """
+    from core.text_generator import generate_summary
+    text = data.get('text', '')
+    language = data.get('language', 'English')
+    level = data.get('level', 'B1-B2')
+    
+    if not text:
+        return {"error": "Text is required"}, 400
+    
+    summary = yield from generate_summary.steps(text, language, level)
+    if not summary:
+        return {"error": "Failed to generate summary"}, 500
+    
+    return {
+        "success": True,
+        "summary": summary
+    }, 200
+
+@app.route('/api/generate-summary', methods=['POST'])
+def api_generate_summary():
+    """API endpoint to generate a summary."""
+    try:
+        return generation_response(generate_summary_response, request.json)
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+# Stand-ins served by degraded_response() while the API circuit is open
+DEGRADED_FALLBACKS = {
+    generate_text_response: degraded_text_response,
+    generate_topic_response: degraded_topic_response
+}
+
+@app.route('/api/health', methods=['GET'])
+def api_health():
+    """API endpoint reporting whether text generation is available."""
+    circuit = circuit_breaker.snapshot()
+    return jsonify({
+        "status": "ok" if circuit['state'] == 'closed' else "degraded",
+        "circuit": circuit
+    })
+
+@app.route('/api/generation-stats', methods=['GET'])
+def api_generation_stats():
+    """API endpoint to get text validation and repair statistics."""
+    from core.text_validator import get_repair_stats
+    from core.batch_enrichment import get_batch_stats
+    try:
         return jsonify({
             "success": True,
-            "topic": topic
+            "stats": get_repair_stats(),
+            "batch_enrichment": get_batch_stats(),
+            "story_library": story_library.stats() if story_library else None,
+            "item_bank": item_bank.stats()
         })
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
-@app.route('/api/generate-summary', methods=['POST'])
-def api_generate_summary():
-    """API endpoint to generate a summary."""
+def admin_required(view):
+    """Decorator restricting an endpoint to requests with the admin token; without one configured it does not exist."""
+    @functools.wraps(view)
+    def check_admin(*args, **kwargs):
+        if not ADMIN_TOKEN:
+            return jsonify({"error": "Not found"}), 404
+        if not is_admin_token(request.headers.get('X-Admin-Token')):
+            return jsonify({"error": "Admin token required"}), 403
+        return view(*args, **kwargs)
+    return check_admin
+
+@app.route('/api/usage-report', methods=['GET'])
+@admin_required
+def api_usage_report():
+    """API endpoint to get API token usage and cost by task, endpoint, model and client."""
     try:
-        data = request.json
-        text = data.get('text', '')
-        language = data.get('language', 'English')
-        level = data.get('level', 'B1-B2')
+        top = int(request.args.get('top', LEDGER_REPORT_TOP))
+        return jsonify({
+            "success": True,
+            "report": token_ledger.report(top)
+        })
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/quota', methods=['GET'])
+def api_quota():
+    """API endpoint to get the calling client's own API usage quota."""
+    try:
+        return jsonify({
+            "success": True,
+            "quota": token_ledger.quota_status(client_id())
+        })
+        
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/debug/task-profiles', methods=['GET'])
+@admin_required
+def api_task_profiles():
+    """API endpoint to get the model, sampling and caching settings in use for each task."""
+    try:
+        return jsonify({"success": True, **task_profiles.describe()})
         
-        if not text:
-            return jsonify({"error": "Text is required"}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/debug/task-profiles/reload', methods=['POST'])
+@admin_required
+def api_reload_task_profiles():
+    """API endpoint to reload the task profile file now, without waiting for the change check."""
+    try:
+        task_profiles.reload()
+        return jsonify({"success": True, **task_profiles.describe()})
         
-        summary = generate_summary(text, language, level)
-        if not summary:
-            return jsonify({"error": "Failed to generate summary"}), 500
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/debug/profiling', methods=['POST'])
+@admin_required
+def api_configure_profiling():
+    """API endpoint to switch request profiling on or off and choose what is profiled."""
+    try:
+        data = request.json or {}
+        request_profiler.configure(
+            enabled=bool(data.get('enabled', False)),
+            mode=data.get('mode', 'cprofile'),
+            sample_rate=float(data.get('sample_rate', 0)),
+            paths=data.get('paths'),
+            memory=bool(data.get('memory', False))
+        )
+        return jsonify({"success": True, "settings": request_profiler.settings()})
         
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
+
+@app.route('/api/debug/profiles', methods=['GET'])
+@admin_required
+def api_list_profiles():
+    """API endpoint to list the stored request profiles, newest first."""
+    try:
         return jsonify({
             "success": True,
-            "summary": summary
+            "settings": request_profiler.settings(),
+            "profiles": request_profiler.list()
         })
         
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route('/api/debug/profiles/<profile_id>', methods=['GET'])
+@admin_required
+def api_download_profile(profile_id):
+    """API endpoint to download a stored profile: a pstats dump, or an HTML report for sampling profiles."""
+    summary = request_profiler.get(profile_id)
+    if summary is None:
+        return jsonify({"error": "Profile not found"}), 404
+    return send_from_directory(request_profiler.directory, summary['file'], as_attachment=True)
+
 # Additional API endpoints for other functionalities would follow the same pattern
 
 if __name__ == '__main__':
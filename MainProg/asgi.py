@@ -0,0 +1,313 @@
+"""
+ASGI entry point serving the application without a thread per waiting request.
+
+Routes that wait on the model are served natively on the event loop, so a
+request holds no thread while its API calls are in flight. Every other route
+is handed to the Flask app on a small thread pool.
+"""
+import asyncio
+import sys
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional, Tuple
+from urllib.parse import unquote
+
+from itsdangerous import BadSignature
+from werkzeug.http import parse_accept_header, parse_cookie
+
+from app import (
+    app,
+    generate_text_response,
+    generate_story_part_response,
+    generate_topic_response,
+    generate_summary_response,
+    generate_enrichment_response,
+    stream_text_events_async,
+    stream_translation_events_async,
+    degraded_response,
+    retry_after_headers,
+    request_budget,
+    negotiate_encoding,
+    compress_body,
+    request_profiler
+)
+from api.budget import BudgetExceeded
+from api.circuit_breaker import CircuitOpen
+from api.token_ledger import QuotaExceeded
+from config.settings import ASGI_WSGI_THREADS, COMPRESSION_MIN_SIZE
+
+# POST routes whose handlers await API calls on the event loop
+ASYNC_ROUTES = {
+    '/api/generate-text': generate_text_response,
+    '/api/generate-story-part': generate_story_part_response,
+    '/api/generate-topic': generate_topic_response,
+    '/api/generate-summary': generate_summary_response
+}
+
+# Async routes taking the last path segment as a body field, e.g. /api/enrichment/summary
+ASYNC_PREFIX_ROUTES = {
+    '/api/enrichment': (generate_enrichment_response, 'name')
+}
+
+# Async routes that stream server-sent events when the body has "stream": true,
+# or always if they have no JSON handler
+STREAMING_ROUTES = {
+    '/api/generate-text': stream_text_events_async,
+    '/api/translate-text': stream_translation_events_async
+}
+
+# Request bodies larger than this are spooled to disk before reaching Flask
+_MAX_MEMORY_BODY = 1024 * 1024
+
+_wsgi_executor = ThreadPoolExecutor(max_workers=ASGI_WSGI_THREADS, thread_name_prefix="wsgi")
+
+async def _read_body(receive: Callable) -> SpooledTemporaryFile:
+    """Collect the request body from the http.request messages."""
+    body = SpooledTemporaryFile(max_size=_MAX_MEMORY_BODY)
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        body.write(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    body.seek(0)
+    return body
+
+async def _send_json(
+    scope: Dict[str, Any],
+    send: Callable,
+    payload: Any,
+    status: int,
+    extra_headers: Optional[Dict[str, str]] = None
+) -> None:
+    """Send a JSON response encoded and compressed the same way as the Flask routes."""
+    body = app.json.dumps(payload).encode("utf-8") + b"\n"
+    headers = [(b"content-type", b"application/json"), (b"vary", b"Accept-Encoding")]
+    for name, value in (extra_headers or {}).items():
+        headers.append((name.lower().encode("latin-1"), value.encode("latin-1")))
+    
+    accept = dict(scope.get("headers", [])).get(b"accept-encoding", b"").decode("latin-1")
+    encoding = negotiate_encoding(parse_accept_header(accept))
+    if encoding and len(body) >= COMPRESSION_MIN_SIZE:
+        body = compress_body(body, encoding)
+        headers.append((b"content-encoding", encoding.encode("latin-1")))
+    headers.append((b"content-length", str(len(body)).encode("latin-1")))
+    
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": headers
+    })
+    await send({"type": "http.response.body", "body": body})
+
+async def _stream_events(send: Callable, events: AsyncIterator[str]) -> None:
+    """Send server-sent events as they are produced."""
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [
+            (b"content-type", b"text/event-stream; charset=utf-8"),
+            (b"cache-control", b"no-cache"),
+            (b"x-accel-buffering", b"no")
+        ]
+    })
+    async for event in events:
+        await send({"type": "http.response.body", "body": event.encode("utf-8"), "more_body": True})
+    await send({"type": "http.response.body", "body": b""})
+
+def _async_handler(path: str) -> Tuple[Any, Dict[str, str]]:
+    """Find the async handler for a path and the body fields taken from the path."""
+    if path in ASYNC_ROUTES:
+        return ASYNC_ROUTES[path], {}
+    prefix, _, segment = path.rpartition("/")
+    if prefix in ASYNC_PREFIX_ROUTES and segment:
+        handler, field = ASYNC_PREFIX_ROUTES[prefix]
+        return handler, {field: unquote(segment)}
+    return None, {}
+
+def _client_id(scope: Dict[str, Any]) -> str:
+    """Client of a request, identified as app.client_id() does from the Flask session cookie."""
+    cookie_header = b"; ".join(value for name, value in scope.get("headers", []) if name == b"cookie")
+    cookies = parse_cookie(cookie_header.decode("latin-1"))
+    cookie = cookies.get(app.config["SESSION_COOKIE_NAME"])
+    if cookie:
+        serializer = app.session_interface.get_signing_serializer(app)
+        try:
+            uid = serializer.loads(cookie, max_age=int(app.permanent_session_lifetime.total_seconds())).get("uid")
+        except BadSignature:
+            uid = None
+        if uid:
+            return uid
+    return (scope.get("client") or ("",))[0]
+
+async def _call_async_route(scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+    """Serve a route whose handler awaits API calls."""
+    handler, path_fields = _async_handler(scope["path"])
+    with await _read_body(receive) as body:
+        raw = body.read()
+    headers = None
+    try:
+        data = dict(app.json.loads(raw or b"{}"), **path_fields)
+        budget = request_budget(data, client=_client_id(scope), endpoint=scope["path"])
+        if scope["path"] in STREAMING_ROUTES and (data.get("stream") or handler is None):
+            await _stream_events(send, STREAMING_ROUTES[scope["path"]](data, budget))
+            return
+        payload, status = await handler.run_async(data, budget=budget)
+    except BudgetExceeded as e:
+        payload, status = {"error": str(e)}, 504
+    except QuotaExceeded as e:
+        payload, status = {"error": str(e)}, 429
+        headers = retry_after_headers(e)
+    except CircuitOpen as e:
+        payload, status = degraded_response(handler, data, e)
+        headers = retry_after_headers(e)
+    except Exception as e:
+        print(f"Error in {scope['path']}: {e}")
+        print(traceback.format_exc())
+        payload, status = {"error": str(e)}, 500
+    await _send_json(scope, send, payload, status, headers)
+
+async def _profiled_async_route(scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+    """
+    Serve an async route, profiling it if the request profiler selects it.
+
+    The profile covers the event loop for as long as the request runs, so
+    it also counts work done for other requests in the meantime.
+    """
+    headers = dict(scope.get("headers", []))
+    session = request_profiler.start(
+        scope["method"],
+        scope["path"],
+        headers.get(b"x-profile", b"").decode("latin-1") or None,
+        headers.get(b"x-admin-token", b"").decode("latin-1") or None
+    )
+    if session is None:
+        await _call_async_route(scope, receive, send)
+        return
+
+    async def profiled_send(message: Dict[str, Any]) -> None:
+        if message["type"] == "http.response.start":
+            session.status = message["status"]
+        await send(message)
+
+    try:
+        await _call_async_route(scope, receive, profiled_send)
+    finally:
+        session.finish()
+
+# Serves the async routes; swapped for _profiled_async_route while profiling is on
+_async_route = _call_async_route
+
+def _install_profiling(enabled: bool) -> None:
+    """Route async requests through the profiler, or straight to their handlers."""
+    global _async_route
+    _async_route = _profiled_async_route if enabled else _call_async_route
+
+request_profiler.add_installer(_install_profiling)
+
+def _environ(scope: Dict[str, Any], body: SpooledTemporaryFile) -> Dict[str, Any]:
+    """Build the WSGI environ for an ASGI HTTP scope."""
+    server = scope.get("server") or ("localhost", 80)
+    client = scope.get("client") or ("", 0)
+    environ = {
+        "REQUEST_METHOD": scope["method"],
+        "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+        "PATH_INFO": unquote(scope["path"]).encode("utf-8").decode("latin-1"),
+        "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+        "SERVER_NAME": server[0],
+        "SERVER_PORT": str(server[1]),
+        "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+        "REMOTE_ADDR": client[0],
+        "REMOTE_PORT": str(client[1]),
+        "wsgi.version": (1, 0),
+        "wsgi.url_scheme": scope.get("scheme", "http"),
+        "wsgi.input": body,
+        "wsgi.errors": sys.stderr,
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": True,
+        "wsgi.run_once": False
+    }
+    for raw_name, raw_value in scope.get("headers", []):
+        name = raw_name.decode("latin-1").upper().replace("-", "_")
+        value = raw_value.decode("latin-1")
+        if name not in ("CONTENT_TYPE", "CONTENT_LENGTH"):
+            name = f"HTTP_{name}"
+        if name in environ:
+            # Repeated headers are joined as a list, except cookies, which have their own separator
+            value = f"{environ[name]}{'; ' if name == 'HTTP_COOKIE' else ','}{value}"
+        environ[name] = value
+    return environ
+
+async def _call_flask(scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+    """Serve a route with the Flask app on the WSGI thread pool, streaming its response."""
+    loop = asyncio.get_running_loop()
+    body = await _read_body(receive)
+
+    def send_from_thread(message: Dict[str, Any]) -> None:
+        asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+    def run() -> None:
+        response_start: List[Tuple[int, List[Tuple[bytes, bytes]]]] = []
+
+        def start_response(status: str, headers: List[Tuple[str, str]], exc_info=None):
+            response_start[:] = [(
+                int(status.split(" ", 1)[0]),
+                [(name.lower().encode("latin-1"), value.encode("latin-1")) for name, value in headers]
+            )]
+
+        def send_start() -> None:
+            status, headers = response_start[0]
+            send_from_thread({"type": "http.response.start", "status": status, "headers": headers})
+
+        result = app(_environ(scope, body), start_response)
+        try:
+            started = False
+            for chunk in result:
+                if not chunk:
+                    continue
+                if not started:
+                    send_start()
+                    started = True
+                send_from_thread({"type": "http.response.body", "body": chunk, "more_body": True})
+            if not started:
+                send_start()
+            send_from_thread({"type": "http.response.body", "body": b""})
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+
+    try:
+        await loop.run_in_executor(_wsgi_executor, run)
+    finally:
+        body.close()
+
+async def _lifespan(receive: Callable, send: Callable) -> None:
+    """Acknowledge server startup and shutdown."""
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            _wsgi_executor.shutdown(wait=False)
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+async def application(scope: Dict[str, Any], receive: Callable, send: Callable) -> None:
+    """
+    ASGI application exposing the same routes as the Flask app.
+
+    Args:
+        scope: Connection scope
+        receive: Awaitable returning the next event from the client
+        send: Awaitable sending an event to the client
+    """
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+    elif scope["type"] != "http":
+        return
+    elif scope["method"] == "POST" and (scope["path"] in STREAMING_ROUTES or _async_handler(scope["path"])[0]):
+        await _async_route(scope, receive, send)
+    else:
+        await _call_flask(scope, receive, send)
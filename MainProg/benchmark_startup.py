@@ -0,0 +1,135 @@
+"""
+Measure how quickly a fresh process serves its first page.
+
+Run with `python benchmark_startup.py` after changing imports. Each run
+starts a new interpreter that imports the app and requests the home page
+and a static file through the Flask test client. The script reports the
+median timings, the modules that take longest to import and any module from
+config.settings.STARTUP_HEAVY_MODULES that was imported before the first
+generation. It exits with status 1 if a process takes longer than
+STARTUP_BUDGET_MS to start and serve its first page or a heavy module was
+imported, so it can guard against import regressions in CI.
+"""
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+from config.settings import STARTUP_BUDGET_MS, STARTUP_HEAVY_MODULES
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Run in each child process; prints its timings as JSON
+_CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+client = app.app.test_client()
+status = client.get('/').status_code
+served = time.perf_counter()
+static_status = client.get('/static/css/style.css').status_code
+print(json.dumps({
+    "import_ms": (imported - started) * 1000,
+    "first_page_ms": (served - started) * 1000,
+    "statuses": [status, static_status],
+    "heavy": [name for name in json.loads(sys.argv[1]) if name in sys.modules]
+}))
+'''
+
+# Lines of python -X importtime output: self and cumulative microseconds, module name
+_IMPORT_TIME = re.compile(r'^import time:\s+(\d+) \|\s+(\d+) \|(\s*)(\S+)$')
+
+def _run_child() -> Tuple[Dict[str, Any], float]:
+    """Start one app process and return its timings and its wall time in milliseconds."""
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-c', _CHILD, json.dumps(STARTUP_HEAVY_MODULES)],
+        cwd=APP_DIR, capture_output=True, text=True, check=True
+    )
+    process_ms = (time.perf_counter() - started) * 1000
+    return json.loads(result.stdout.strip().splitlines()[-1]), process_ms
+
+def slowest_imports(count: int) -> List[Tuple[str, float]]:
+    """
+    Find the top-level imports of the app that take longest, with python -X importtime.
+
+    Args:
+        count: Number of modules to return
+
+    Returns:
+        List of (module name, cumulative milliseconds), slowest first
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=APP_DIR, capture_output=True, text=True, check=True
+    )
+    modules = []
+    for line in result.stderr.splitlines():
+        match = _IMPORT_TIME.match(line)
+        # Only modules imported directly by the app, which start one level below it
+        if match and len(match.group(3)) == 3:
+            modules.append((match.group(4), int(match.group(2)) / 1000))
+    return sorted(modules, key=lambda module: module[1], reverse=True)[:count]
+
+def benchmark(runs: int) -> Dict[str, Any]:
+    """
+    Start the app `runs` times and summarize the timings.
+
+    Args:
+        runs: Number of fresh processes to measure
+
+    Returns:
+        Dictionary with the median and worst timings in milliseconds and the
+        heavy modules imported at startup
+    """
+    samples = [_run_child() for _ in range(runs)]
+    children = [child for child, _ in samples]
+    process_ms = [wall for _, wall in samples]
+    return {
+        "runs": runs,
+        "import_ms": statistics.median(child["import_ms"] for child in children),
+        "first_page_ms": statistics.median(child["first_page_ms"] for child in children),
+        "process_ms": statistics.median(process_ms),
+        "worst_process_ms": max(process_ms),
+        "statuses": sorted({status for child in children for status in child["statuses"]}),
+        "heavy": sorted({name for child in children for name in child["heavy"]})
+    }
+
+def main() -> int:
+    """Run the benchmark from the command line and return the exit status."""
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help="fresh processes to measure")
+    parser.add_argument('--budget-ms', type=float, default=STARTUP_BUDGET_MS,
+                        help="maximum median milliseconds for a process to start and serve its first page")
+    parser.add_argument('--top', type=int, default=10, help="slowest imports to list")
+    args = parser.parse_args()
+
+    report = benchmark(args.runs)
+    print(f"Startup over {report['runs']} runs (median):")
+    print(f"  import app:            {report['import_ms']:8.1f} ms")
+    print(f"  first page (in-proc):  {report['first_page_ms']:8.1f} ms")
+    print(f"  whole process:         {report['process_ms']:8.1f} ms (worst {report['worst_process_ms']:.1f} ms)")
+    if args.top:
+        print("Slowest imports of app.py (cumulative):")
+        for name, ms in slowest_imports(args.top):
+            print(f"  {name:<30} {ms:8.1f} ms")
+
+    failures = []
+    if report['process_ms'] > args.budget_ms:
+        failures.append(f"a process took {report['process_ms']:.0f} ms, over the {args.budget_ms:.0f} ms budget")
+    if report['heavy']:
+        failures.append(f"imported at startup: {', '.join(report['heavy'])}")
+    if any(status != 200 for status in report['statuses']):
+        failures.append(f"unexpected statuses: {report['statuses']}")
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    return 1 if failures else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
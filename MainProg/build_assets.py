@@ -0,0 +1,141 @@
+"""
+Build the static asset bundles.
+
+Run with `python build_assets.py` after changing files under web/static.
+Each bundle in config.settings.ASSET_BUNDLES is concatenated, minified and
+written under web/static/dist with its content hash in the file name, and
+a manifest tells the templates which files to load. Minification uses
+rjsmin and rcssmin when they are installed; files that are already
+minified are copied as they are.
+"""
+import hashlib
+import json
+import os
+import posixpath
+import re
+from typing import Dict
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+from config.settings import ASSET_BUNDLES, ASSET_DIST_DIR
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'web', 'static')
+
+# Source map comments of vendored files, whose maps are not shipped
+_SOURCE_MAP = re.compile(r'^\s*/[*/]# sourceMappingURL=.*$', re.MULTILINE)
+
+# url() references in stylesheets
+_CSS_URL = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+
+def _fingerprint(filename: str) -> str:
+    """Content hash of a static file, as the app computes it for ?v= URLs."""
+    with open(os.path.join(STATIC_DIR, filename), 'rb') as f:
+        return hashlib.md5(f.read()).hexdigest()[:12]
+
+def _rebase_urls(css: str, source: str) -> str:
+    """
+    Point the relative url() references of a stylesheet at the same files from the dist directory.
+
+    The references get the file's fingerprint, so fonts and images are cached
+    as long as the bundle itself.
+    """
+    source_dir = posixpath.dirname(source)
+
+    def rebase(match: re.Match) -> str:
+        quote, url = match.groups()
+        if re.match(r'[a-z][a-z0-9+.-]*:|/|#', url, re.IGNORECASE):
+            return match.group(0)
+        path, fragment = (url.split('#', 1) + [''])[:2]
+        path = path.split('?', 1)[0]
+        target = posixpath.normpath(posixpath.join(source_dir, path))
+        if not os.path.isfile(os.path.join(STATIC_DIR, target)):
+            print(f"  warning: {source} references missing file {target}")
+            return match.group(0)
+        rebased = f"{posixpath.relpath(target, ASSET_DIST_DIR)}?v={_fingerprint(target)}"
+        if fragment:
+            rebased += f"#{fragment}"
+        return f"url({quote}{rebased}{quote})"
+
+    return _CSS_URL.sub(rebase, css)
+
+def _minify(content: str, source: str) -> str:
+    """Minify a source file unless it already is, keeping /*! license comments."""
+    content = _SOURCE_MAP.sub('', content)
+    if '.min.' in posixpath.basename(source):
+        return content.strip()
+    if source.endswith('.js') and rjsmin:
+        return rjsmin.jsmin(content, keep_bang_comments=True)
+    if source.endswith('.css') and rcssmin:
+        return rcssmin.cssmin(content, keep_bang_comments=True)
+    return content.strip()
+
+def build_bundle(name: str, sources: list) -> bytes:
+    """
+    Concatenate and minify the sources of one bundle.
+
+    Args:
+        name: Bundle name ending in .css or .js
+        sources: Files under web/static, in load order
+
+    Returns:
+        The bundle contents
+    """
+    parts = []
+    for source in sources:
+        with open(os.path.join(STATIC_DIR, source), encoding='utf-8') as f:
+            content = _minify(f.read(), source)
+        if name.endswith('.css'):
+            content = _rebase_urls(content, source)
+        parts.append(content)
+    # Scripts are joined on a semicolon in case one ends without a statement terminator
+    separator = '\n;\n' if name.endswith('.js') else '\n'
+    return (separator.join(parts) + '\n').encode('utf-8')
+
+def build() -> Dict[str, str]:
+    """
+    Build every bundle and write the manifest.
+
+    Files from earlier builds that are no longer referenced are removed.
+
+    Returns:
+        Map of bundle names to the built file names
+    """
+    dist_dir = os.path.join(STATIC_DIR, ASSET_DIST_DIR)
+    os.makedirs(dist_dir, exist_ok=True)
+
+    manifest = {}
+    for name, sources in ASSET_BUNDLES.items():
+        content = build_bundle(name, sources)
+        stem, extension = os.path.splitext(name)
+        filename = f"{stem}.{hashlib.md5(content).hexdigest()[:12]}{extension}"
+        with open(os.path.join(dist_dir, filename), 'wb') as f:
+            f.write(content)
+        manifest[name] = filename
+
+        source_size = sum(os.path.getsize(os.path.join(STATIC_DIR, source)) for source in sources)
+        print(f"{name}: {len(sources)} file(s), {source_size} -> {len(content)} bytes as {filename}")
+
+    # Swap the manifest in atomically; a running app picks it up on its next page
+    manifest_path = os.path.join(dist_dir, 'manifest.json')
+    with open(f"{manifest_path}.tmp", 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(f"{manifest_path}.tmp", manifest_path)
+
+    for filename in os.listdir(dist_dir):
+        if filename != 'manifest.json' and filename not in manifest.values():
+            os.remove(os.path.join(dist_dir, filename))
+
+    if not rjsmin or not rcssmin:
+        print("Install rjsmin and rcssmin to minify the application's own scripts and styles")
+    return manifest
+
+if __name__ == '__main__':
+    build()
@@ -30,4 +30,31 @@ TEXT_LENGTH_OPTIONS = [500, 750, 1000]
 PROFICIENCY_LEVELS = ["A1-A2", "B1-B2", "C1-C2"]
 
 # Text types
-TEXT_TYPES = ["General", "Story", "Dialogue", "Letter", "Article", "News", "Informative"]
\ No newline at end of file
+TEXT_TYPES = ["General", "Story", "Dialogue", "Letter", "Article", "News", "Informative"]
+
+# Topics suggested while text generation is unavailable and no stored text gives one
+FALLBACK_TOPICS = [
+    "A day at the market",
+    "Travelling by train",
+    "My favourite season",
+    "Cooking a family recipe",
+    "Life in a big city",
+    "Protecting the environment",
+    "Learning a new hobby",
+    "The history of the bicycle",
+    "Working from home",
+    "A festival in my country"
+]
+# Function words dropped from search queries; they occur in nearly every text,
+# so they barely change the ranking but make every document a candidate
+STOPWORDS = {
+    "English": {"the", "a", "an", "and", "or", "of", "to", "in", "on", "at", "is", "are", "was", "it", "for", "with", "as", "by", "that", "this", "be"},
+    "Turkish": {"ve", "bir", "bu", "da", "de", "için", "ile", "çok", "ne", "mi", "o"},
+    "German": {"der", "die", "das", "und", "ein", "eine", "ist", "in", "zu", "den", "von", "mit", "sich", "des", "auf", "nicht", "dem"},
+    "French": {"le", "la", "les", "de", "des", "du", "un", "une", "et", "est", "en", "à", "que", "qui", "dans", "pour", "au"},
+    "Spanish": {"el", "la", "los", "las", "de", "del", "y", "un", "una", "en", "que", "es", "por", "con", "se", "al"},
+    "Italian": {"il", "lo", "la", "i", "gli", "le", "di", "e", "un", "una", "in", "che", "è", "per", "con", "del", "della"},
+    "Dutch": {"de", "het", "een", "en", "van", "in", "is", "dat", "op", "te", "met", "voor", "zijn"},
+    "Russian": {"и", "в", "не", "на", "что", "с", "как", "по", "это", "к", "но", "а", "из", "у", "о"},
+    "Portuguese": {"o", "a", "os", "as", "de", "do", "da", "dos", "das", "e", "um", "uma", "em", "que", "no", "na", "para", "com"}
+}
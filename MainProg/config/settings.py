@@ -14,12 +14,160 @@ DEFAULT_MODEL = "gpt-3.5-turbo"
 API_MAX_RETRIES = 3
 API_TIMEOUT = 30
 
+# Generation Budget Settings (clients may ask for less, never more)
+GENERATION_TIMEOUT = 60  # Default seconds for all API calls of one request, retries included
+MAX_GENERATION_TIMEOUT = 120
+MAX_API_RETRIES = 5  # Attempts per API call
+MAX_COMPLETION_TOKENS = 4096  # Completion tokens per API call
+
+# Circuit Breaker Settings
+CIRCUIT_WINDOW = 60  # Seconds of API call history the error and latency rates cover
+CIRCUIT_MIN_CALLS = 10  # Calls in the window before the circuit may open
+CIRCUIT_FAILURE_RATE = 0.5  # Share of failed calls that opens the circuit
+CIRCUIT_SLOW_CALL_SECONDS = 20  # Calls taking longer count as slow
+CIRCUIT_SLOW_CALL_RATE = 0.8  # Share of slow calls that opens the circuit
+CIRCUIT_OPEN_SECONDS = 30  # Seconds without API calls before a trial call
+API_RESPONSE_CACHE_SIZE = 256  # Recent API responses that can be replayed while the circuit is open
+DEGRADED_SIMILARITY_THRESHOLD = 0.25  # Looser topic match for stored texts served while the circuit is open
+DEGRADED_POOL_SIZE = 20  # Recent stored texts to pick a stand-in from when no topic matches
+
+# Token Ledger Settings
+LEDGER_FLUSH_SIZE = 100  # Recorded API calls written to the ledger file at once
+LEDGER_FLUSH_INTERVAL = 30  # Seconds after which recorded calls are written anyway
+LEDGER_REPORT_TOP = 20  # Heaviest clients listed in the usage report
+QUOTA_WINDOW = 3600  # Seconds of usage a client quota covers
+QUOTA_TOKENS_PER_WINDOW = int(os.getenv("QUOTA_TOKENS_PER_WINDOW", "200000"))  # Per client, 0 for no limit
+QUOTA_CALLS_PER_WINDOW = int(os.getenv("QUOTA_CALLS_PER_WINDOW", "0"))  # Per client, 0 for no limit
+TOKEN_PRICES_PER_1K = {  # US dollars per 1000 prompt and completion tokens, for cost estimates
+    "gpt-3.5-turbo": (0.0005, 0.0015),
+    "gpt-4o-mini": (0.00015, 0.0006)
+}
+
+# Task Profile Settings
+# Model and parameters of the API calls of each task (see api/token_ledger.py for
+# the task names). Fields missing from a task are taken from "default":
+#   model, temperature, top_p
+#   max_tokens: completion tokens per call, 0 for the request budget's limit only
+#   input_chars: characters of the source text put into the prompt
+#   cache_ttl: seconds an answer to the same prompt is reused, 0 to always call the API
+#   timeout: seconds per attempt
+# Callers passing temperature or top_p explicitly (the user's settings for texts
+# and stories) override the profile.
+TASK_PROFILES = {
+    "default": {"model": DEFAULT_MODEL, "temperature": 0.7, "top_p": 0.9, "max_tokens": 0,
+                "input_chars": 2000, "cache_ttl": 0, "timeout": API_TIMEOUT},
+    "topic": {"temperature": 0.9, "timeout": 10},
+    "summary": {"temperature": 0.3, "input_chars": 2000, "cache_ttl": 86400},
+    "key_words": {"temperature": 0.3, "input_chars": 1500, "cache_ttl": 86400},
+    "questions": {"temperature": 0.3, "input_chars": 1500, "cache_ttl": 86400},
+    "exercises": {"temperature": 0.4, "input_chars": 1500, "cache_ttl": 3600},
+    "translation": {"temperature": 0.3, "input_chars": 2000, "cache_ttl": 86400},
+    "batch_enrichment": {"temperature": 0.3, "input_chars": 1500, "cache_ttl": 86400}
+}
+TASK_PROFILE_PATH = os.getenv("TASK_PROFILE_PATH", "")  # JSON file of profile fields overriding TASK_PROFILES, reloaded when it changes
+TASK_PROFILE_CHECK_INTERVAL = 5  # Seconds between checks of the file for changes
+
 # App Settings
 DEFAULT_TEMPERATURE = 0.7
 DEFAULT_TOP_P = 0.9
 DEFAULT_FONT_SIZE = 16
 DEFAULT_WORD_COUNT = 500
 
+# Text Validation Settings
+TEXT_LENGTH_TOLERANCE = 0.15  # Allowed relative deviation from the requested word count
+TEXT_REPAIR_MAX_ROUNDS = 2  # Maximum targeted repair calls per generated text
+
+# Batch Enrichment Settings (bulk jobs such as history backfills)
+BATCH_ENRICHMENT_PROMPT_TOKENS = 3000  # Estimated text tokens packed into one prompt
+BATCH_ENRICHMENT_OUTPUT_TOKENS = 3000  # Estimated answer tokens per batch; keep below MAX_COMPLETION_TOKENS
+BATCH_ENRICHMENT_MAX_ITEMS = 8  # Texts per batch
+BATCH_ENRICHMENT_WORKERS = 4  # Batches run concurrently
+BACKFILL_LIMIT = 50  # Texts enriched per backfill request
+
+# Item Bank Settings (generated questions and exercises reused in worksheets)
+WORKSHEET_QUESTIONS = 5  # Default questions per worksheet
+WORKSHEET_EXERCISES = 3  # Default exercises per worksheet
+WORKSHEET_MAX_ITEMS = 50  # Most questions or exercises a worksheet, or a page of bank items, may hold
+
+# Export Settings (printable HTML, PDF and DOCX worksheets and stories)
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", "2"))  # Processes rendering exports
+# How export processes start: "forkserver", "spawn" or "fork". The first two import the
+# main script again in every process; app.py then skips opening the storage logs.
+EXPORT_START_METHOD = os.getenv("EXPORT_START_METHOD", "forkserver")
+EXPORT_TIMEOUT = 60  # Seconds to render one document
+EXPORT_PACK_MAX_ITEMS = 200  # Texts and stories per exported pack
+
+# Similar Text Reuse Settings
+SIMILARITY_THRESHOLD = 0.3  # Minimum estimated topic similarity (0-1) to offer an existing text
+REUSE_SIMILARITY_THRESHOLD = 0.9  # Near-exact topic match needed to reuse a text instead of generating one
+
+# Shared Story Library Settings
+STORY_LIBRARY_ENABLED = os.getenv("STORY_LIBRARY", "0") == "1"  # Reuse story parts generated for other stories on the same topic
+STORY_LIBRARY_MAX_PARTS = int(os.getenv("STORY_LIBRARY_MAX_PARTS", "5000"))
+STORY_LIBRARY_NOVELTY = float(os.getenv("STORY_LIBRARY_NOVELTY", "0"))  # Probability of generating a fresh part although the library has one
+STORY_LIBRARY_EVICTION_SAMPLE = 16  # Least recently used parts compared by popularity when evicting
+
+# Storage Settings
+STORAGE_TYPE = os.getenv("STORAGE_TYPE", "memory")  # "memory" or "log"
+DATA_DIR = os.getenv("DATA_DIR", os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"))
+LOG_FSYNC = os.getenv("LOG_FSYNC", "1") == "1"
+LOG_COMPACTION_INTERVAL = 300  # Seconds between compaction checks
+LOG_COMPACTION_MIN_SIZE = 1024 * 1024  # Never compact logs smaller than this (bytes)
+
+# API Cassette Settings (record API calls once, then replay them offline to profile the pipeline)
+API_CASSETTE_MODE = os.getenv("API_CASSETTE", "off")  # "off", "record" or "replay"
+API_CASSETTE_PATH = os.getenv("API_CASSETTE_PATH", os.path.join(DATA_DIR, "api_cassette.jsonl"))
+API_CASSETTE_LATENCY = float(os.getenv("API_CASSETTE_LATENCY", "0"))  # Share of the recorded latency replayed, 1 for the original timing
+
+# ASGI Server Settings
+ASGI_HOST = os.getenv("ASGI_HOST", "127.0.0.1")
+ASGI_PORT = int(os.getenv("ASGI_PORT", "8000"))
+ASGI_WORKERS = int(os.getenv("ASGI_WORKERS", "1"))  # History and stories live in process memory, so keep one worker per storage
+ASGI_LIMIT_CONCURRENCY = int(os.getenv("ASGI_LIMIT_CONCURRENCY", "10000"))  # Open connections per worker before answering 503
+ASGI_BACKLOG = int(os.getenv("ASGI_BACKLOG", "4096"))
+ASGI_KEEP_ALIVE = 5  # Seconds to keep idle connections open
+ASGI_WSGI_THREADS = int(os.getenv("ASGI_WSGI_THREADS", "32"))  # Threads for routes served by the Flask app
+
+# Admin Settings
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")  # Sent in the X-Admin-Token header to use the debug endpoints; they are disabled without one
+
+# Profiling Settings (switched on at runtime through /api/debug/profiling)
+PROFILE_DIR = os.getenv("PROFILE_DIR", os.path.join(DATA_DIR, "profiles"))
+PROFILE_MAX_FILES = 100  # Stored profiles, oldest removed first
+PROFILE_TOP = 30  # Functions and allocation sites listed in each profile summary
+PROFILE_MEMORY_FRAMES = 10  # Stack frames tracemalloc records per allocation
+
+# Startup Settings
+STARTUP_BUDGET_MS = 500  # benchmark_startup.py fails if the first page takes longer from process start
+STARTUP_HEAVY_MODULES = ["openai", "core.text_generator", "core.story_generator"]  # Must not be imported before the first generation
+
+# Response Compression Settings
+COMPRESSION_MIN_SIZE = 1024  # Smaller API responses are sent uncompressed (bytes)
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5  # Higher qualities cost too much CPU for dynamic responses
+
+# Static Asset Settings
+# Bundles built by build_assets.py, as name -> source files under web/static in load order.
+# Without a build the sources are served one by one.
+ASSET_BUNDLES = {
+    "app.css": [
+        "vendor/bootstrap/bootstrap.min.css",
+        "vendor/fontawesome/css/all.min.css",
+        "css/style.css"
+    ],
+    "app.js": [
+        "vendor/jquery/jquery.min.js",
+        "vendor/bootstrap/bootstrap.min.js",
+        "js/app.js",
+        "js/settings.js"
+    ],
+    "text_generator.js": ["js/pages/text_generator.js"],
+    "interactive_story.js": ["js/pages/interactive_story.js"],
+    "history.js": ["js/pages/history.js"]
+}
+ASSET_DIST_DIR = "dist"  # Build output under web/static, with the manifest mapping bundles to hashed files
+ASSET_PRELOAD_FONTS = ["vendor/fontawesome/webfonts/fa-solid-900.woff2"]  # Only solid icons are used
+
 # UI Settings
 PRIMARY_COLOR = "#4F8BF9"
 SECONDARY_COLOR = "#FF4B4B"
@@ -0,0 +1,266 @@
+"""
+Batched enrichment of many texts, for bulk jobs such as history backfills.
+
+Several short texts are packed into one prompt, up to a token budget, and
+the model answers with a JSON array keyed by text id. Each item of the
+answer is validated on its own; texts whose result is missing or malformed
+are enriched again one at a time with the regular enrichment functions.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+from api.budget import Budget, BudgetExceeded
+from api.circuit_breaker import CircuitOpen
+from api.openai_client import api_request, uses_api, parse_json_response, run_steps
+from api.task_profiles import input_limit
+from api.token_ledger import token_ledger, QuotaExceeded
+from config.language_data import LANGUAGE_MAP, DIFFICULTY_WORDS_COUNT
+from config.settings import (
+    BATCH_ENRICHMENT_PROMPT_TOKENS,
+    BATCH_ENRICHMENT_OUTPUT_TOKENS,
+    BATCH_ENRICHMENT_MAX_ITEMS,
+    BATCH_ENRICHMENT_WORKERS
+)
+from core.text_generator import generate_summary, extract_key_words, generate_comprehension_questions
+
+# Rough number of characters per token, for packing prompts without a tokenizer
+CHARACTERS_PER_TOKEN = 4
+
+# Enrichments that can be batched: what to ask for each text, the JSON fields
+# of an answer item, and the estimated answer tokens per text
+BATCH_TASKS = {
+    'summary': {
+        'request': "a brief summary of 3-5 sentences capturing the main points",
+        'fields': '"summary" (a string)',
+        'output_tokens': lambda count: 150
+    },
+    'key_words': {
+        'request': "the {count} most important vocabulary words to study, each with its meaning in {language} and a new example sentence",
+        'fields': '"key_words" (a list of objects with "word", "definition" and "example" keys)',
+        'output_tokens': lambda count: 60 * count
+    },
+    'questions': {
+        'request': "{count} comprehension questions with their correct answers",
+        'fields': '"questions" (a list of objects with "question" and "answer" keys)',
+        'output_tokens': lambda count: 50 * count
+    }
+}
+
+# Questions asked per text, as generate_comprehension_questions() does by default
+QUESTION_COUNT = 5
+
+# Batch counters, shared across requests
+_stats_lock = threading.Lock()
+_batch_stats = {
+    "batch_calls": 0,
+    "texts_batched": 0,
+    "texts_from_batches": 0,
+    "single_calls": 0,
+    "texts_failed": 0
+}
+
+def _count_stat(name: str, value: int = 1) -> None:
+    with _stats_lock:
+        _batch_stats[name] += value
+
+def _item_count(name: str, level: str) -> int:
+    """Number of words or questions asked per text."""
+    return DIFFICULTY_WORDS_COUNT.get(level, 5) if name == 'key_words' else QUESTION_COUNT
+
+def _estimate_tokens(text: str) -> int:
+    return len(text) // CHARACTERS_PER_TOKEN + 1
+
+def _valid_entries(entries: Any, keys: tuple) -> bool:
+    return (
+        isinstance(entries, list) and bool(entries)
+        and all(isinstance(entry, dict) and all(entry.get(key) for key in keys) for entry in entries)
+    )
+
+def validate_fields(name: str, value: Any) -> Optional[Dict[str, Any]]:
+    """
+    Check an enrichment result and convert it to the fields stored on a text.
+
+    Args:
+        name: Enrichment name
+        value: Result for one text, from a batch item or a single call
+
+    Returns:
+        Fields to store, in the same shape as the single-text enrichments
+        produce, or None if the result is unusable
+    """
+    if name == 'summary':
+        return {'summary': value.strip()} if isinstance(value, str) and value.strip() else None
+    if name == 'key_words':
+        return {'key_words': value} if _valid_entries(value, ('word', 'definition')) else None
+    if name == 'questions':
+        questions = value.get('questions') if isinstance(value, dict) else value
+        return {'questions': questions} if _valid_entries(questions, ('question', 'answer')) else None
+    return None
+
+def plan_batches(name: str, items: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+    """
+    Pack texts into batches that fit the prompt and answer token budgets.
+
+    Only texts in the same language and at the same level share a batch, as
+    the instructions depend on both.
+
+    Args:
+        name: Enrichment name, a key of BATCH_TASKS
+        items: Texts, each a dictionary with id, text, language and level
+
+    Returns:
+        List of batches, each a list of items
+    """
+    groups: Dict[tuple, List[Dict[str, Any]]] = {}
+    for item in items:
+        groups.setdefault((item['language'], item['level']), []).append(item)
+
+    limit = input_limit('batch_enrichment')
+    batches = []
+    for (_, level), group in groups.items():
+        output_tokens = BATCH_TASKS[name]['output_tokens'](_item_count(name, level))
+        batch: List[Dict[str, Any]] = []
+        prompt_tokens = answer_tokens = 0
+        for item in group:
+            tokens = _estimate_tokens(item['text'][:limit])
+            if batch and (
+                len(batch) >= BATCH_ENRICHMENT_MAX_ITEMS
+                or prompt_tokens + tokens > BATCH_ENRICHMENT_PROMPT_TOKENS
+                or answer_tokens + output_tokens > BATCH_ENRICHMENT_OUTPUT_TOKENS
+            ):
+                batches.append(batch)
+                batch, prompt_tokens, answer_tokens = [], 0, 0
+            batch.append(item)
+            prompt_tokens += tokens
+            answer_tokens += output_tokens
+        if batch:
+            batches.append(batch)
+    return batches
+
+def _batch_prompt(name: str, batch: List[Dict[str, Any]]) -> str:
+    """Prompt asking for one enrichment of every text in a batch."""
+    language, level = batch[0]['language'], batch[0]['level']
+    lang_english = LANGUAGE_MAP.get(language, language)
+    task = BATCH_TASKS[name]
+    request = task['request'].format(count=_item_count(name, level), language=lang_english)
+    limit = input_limit('batch_enrichment')
+    texts = "\n\n".join(
+        f'TEXT id="t{index}":\n{item["text"][:limit]}'
+        for index, item in enumerate(batch, 1)
+    )
+    return f"""For each of the following {lang_english} texts, write {request}, suitable for {level} level language learners.
+
+    Format your response as a JSON array with one object per text, in any order.
+    Each object has an "id" key with the id of its text and {task['fields']}.
+    Make sure the JSON is properly formatted and valid.
+
+    {texts}"""
+
+def _single_steps(name: str, item: Dict[str, Any]):
+    """Step function enriching one text with the regular enrichment function."""
+    text, language, level = item['text'], item['language'], item['level']
+    if name == 'summary':
+        return generate_summary.steps(text, language, level)
+    if name == 'key_words':
+        return extract_key_words.steps(text, language, level, _item_count(name, level))
+    return generate_comprehension_questions.steps(text, language, level, QUESTION_COUNT)
+
+@uses_api
+def enrich_batch(name: str, batch: List[Dict[str, Any]]):
+    """
+    Enrich a batch of texts with one API call, retrying failed texts one by one.
+
+    Args:
+        name: Enrichment name, a key of BATCH_TASKS
+        batch: Texts from plan_batches()
+
+    Returns:
+        Dictionary mapping text ids to the fields to store; texts that could
+        not be enriched are left out
+    """
+    results: Dict[str, Dict[str, Any]] = {}
+    if len(batch) > 1:
+        _count_stat("batch_calls")
+        _count_stat("texts_batched", len(batch))
+        response = yield api_request(_batch_prompt(name, batch), max_retries=3)
+        answer = parse_json_response(response) if response else None
+        if isinstance(answer, dict):
+            # Some answers wrap the array in an object
+            answer = next((value for value in answer.values() if isinstance(value, list)), None)
+        by_key = {f"t{index}": item for index, item in enumerate(batch, 1)}
+        for entry in answer if isinstance(answer, list) else []:
+            item = by_key.get(str(entry.get('id'))) if isinstance(entry, dict) else None
+            fields = validate_fields(name, entry.get(name)) if item else None
+            if fields and item['id'] not in results:
+                results[item['id']] = fields
+        _count_stat("texts_from_batches", len(results))
+
+    # Texts missing from the answer or with malformed results are retried individually
+    for item in batch:
+        if item['id'] in results:
+            continue
+        _count_stat("single_calls")
+        fields = validate_fields(name, (yield from _single_steps(name, item)))
+        if fields:
+            results[item['id']] = fields
+        else:
+            _count_stat("texts_failed")
+    return results
+
+def enrich_texts(
+    name: str,
+    items: List[Dict[str, Any]],
+    budget: Optional[Budget] = None,
+    on_result: Optional[Callable[[str, Dict[str, Any]], None]] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Enrich many texts, running their batches concurrently.
+
+    The quota of the budget's session is checked again before each batch,
+    since a large backfill can use it up part way. A batch that runs out
+    of time or quota, or meets an open circuit, is skipped, so the texts
+    enriched before stay usable.
+
+    Args:
+        name: Enrichment name, a key of BATCH_TASKS
+        items: Texts, each a dictionary with id, text, language and level
+        budget: Limits shared by all the API calls
+        on_result: Called with the text id and fields of every enriched text
+            as its batch completes
+
+    Returns:
+        Dictionary mapping text ids to the fields to store
+    """
+    if name not in BATCH_TASKS:
+        raise ValueError(f"Enrichment cannot be batched: {name}")
+
+    def run(batch: List[Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        try:
+            if budget:
+                token_ledger.check_quota(budget.session)
+            results = run_steps(enrich_batch.steps(name, batch), budget)
+        except (BudgetExceeded, CircuitOpen, QuotaExceeded):
+            return {}
+        if on_result:
+            for text_id, fields in results.items():
+                on_result(text_id, fields)
+        return results
+
+    batches = plan_batches(name, items)
+    results: Dict[str, Dict[str, Any]] = {}
+    if batches:
+        with ThreadPoolExecutor(max_workers=min(BATCH_ENRICHMENT_WORKERS, len(batches))) as executor:
+            for batch_results in executor.map(run, batches):
+                results.update(batch_results)
+    return results
+
+def get_batch_stats() -> Dict[str, int]:
+    """
+    Get the batch enrichment counters.
+
+    Returns:
+        Copy of the counters
+    """
+    with _stats_lock:
+        return dict(_batch_stats)
@@ -0,0 +1,505 @@
+"""
+Printable exports of texts with their exercises and of stories, as HTML, PDF and DOCX.
+
+Documents are rendered in a process pool so rendering never holds a web
+worker's CPU. Each pool process compiles the templates once and keeps them
+for its lifetime. Packs of many documents are streamed as a ZIP archive
+while later documents are still rendering.
+"""
+import functools
+import multiprocessing
+import os
+import re
+import threading
+import zipfile
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from importlib.util import find_spec
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape as xml_escape
+
+from config.language_data import LANGUAGE_MAP
+from config.settings import EXPORT_WORKERS, EXPORT_START_METHOD, EXPORT_TIMEOUT
+from models.story import Story
+
+# Export formats: media type, file extension and the optional module they need
+FORMATS = {
+    'html': ('text/html; charset=utf-8', 'html', None),
+    'pdf': ('application/pdf', 'pdf', 'weasyprint'),
+    'docx': ('application/vnd.openxmlformats-officedocument.wordprocessingml.document', 'docx', None)
+}
+
+# Kinds of exported documents
+KINDS = ('text', 'story')
+
+TEMPLATE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'web', 'templates', 'export')
+
+class ExportUnavailable(Exception):
+    """Raised for an export format whose renderer is not installed."""
+
+def check_format(fmt: str) -> None:
+    """
+    Make sure a format can be exported.
+
+    Raises:
+        ValueError: If the format is unknown
+        ExportUnavailable: If the module it needs is not installed
+    """
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format: {fmt}")
+    module = FORMATS[fmt][2]
+    if module and find_spec(module) is None:
+        raise ExportUnavailable(f"{fmt.upper()} export needs the {module} package")
+
+def _paragraphs(text: Any) -> List[str]:
+    """Paragraphs of a stored text, split at line breaks."""
+    if not isinstance(text, str):
+        return []
+    return [line.strip() for line in text.split("\n") if line.strip()]
+
+def _entries(value: Any, key: str) -> List[Dict[str, Any]]:
+    """Entries of a stored list field, which may be wrapped in an object under key."""
+    if isinstance(value, dict):
+        value = value.get(key)
+    return [entry for entry in value if isinstance(entry, dict)] if isinstance(value, list) else []
+
+def _language_name(language: Optional[str]) -> str:
+    return LANGUAGE_MAP.get(language, language or "")
+
+def _pairs_section(heading: str, lines: Any) -> Optional[Dict[str, Any]]:
+    """Section of original and translated lines, None without any."""
+    pairs = [
+        (entry.get('original', ''), entry.get('translation', ''))
+        for entry in _entries(lines, 'lines')
+        if entry.get('original') or entry.get('translation')
+    ]
+    return {"heading": heading, "pairs": pairs} if pairs else None
+
+def _loose_section(heading: str, value: Any) -> Optional[Dict[str, Any]]:
+    """Section for a field whose answer could not be parsed, kept as plain text."""
+    paragraphs = _paragraphs(value)
+    return {"heading": heading, "paragraphs": paragraphs} if paragraphs else None
+
+def text_document(item: Dict[str, Any], answers: bool = True) -> Dict[str, Any]:
+    """
+    Lay out a stored text as a worksheet.
+
+    Args:
+        item: History item, as GeneratedText.to_dict() stores it
+        answers: Whether to end with an answer key
+
+    Returns:
+        Document with a title, subtitle and sections; every section has a
+        heading and one of paragraphs, terms, numbered, exercises or pairs,
+        and may have a note and page_break
+    """
+    sections = [{"heading": "Text", "paragraphs": _paragraphs(item.get('text'))}]
+    if item.get('summary'):
+        sections.append({"heading": "Summary", "paragraphs": _paragraphs(item['summary'])})
+
+    key_words = _entries(item.get('key_words'), 'key_words')
+    if key_words:
+        sections.append({"heading": "Key words", "terms": [
+            (entry.get('word', ''), entry.get('definition', ''), entry.get('example', '')) for entry in key_words
+        ]})
+    else:
+        sections.append(_loose_section("Key words", item.get('key_words')))
+
+    questions = _entries(item.get('questions'), 'questions')
+    if questions:
+        sections.append({"heading": "Comprehension questions", "numbered": [entry.get('question', '') for entry in questions]})
+    else:
+        sections.append(_loose_section("Comprehension questions", item.get('questions')))
+
+    exercises = _entries(item.get('exercises'), 'exercises')
+    if exercises:
+        sections.append({"heading": "Exercises", "exercises": [
+            (entry.get('instructions', ''), entry.get('content', '')) for entry in exercises
+        ]})
+    else:
+        sections.append(_loose_section("Exercises", item.get('exercises')))
+
+    translated = set()
+    if item.get('translation'):
+        language = item.get('translation_language')
+        sections.append(_pairs_section(f"Translation ({_language_name(language)})" if language else "Translation", item['translation']))
+        translated.add(language)
+    for language, translation_set in sorted((item.get('translations') or {}).items()):
+        if language not in translated and isinstance(translation_set, dict):
+            sections.append(_pairs_section(f"Translation ({_language_name(language)})", translation_set.get('lines')))
+
+    # The answer key starts on a page of its own, so it can be handed out separately
+    answer_key = []
+    if answers and questions:
+        answer_key.append({"heading": "Answer key: comprehension questions", "numbered": [entry.get('answer', '') for entry in questions]})
+    if answers and exercises:
+        answer_key.append({"heading": "Answer key: exercises", "numbered": [entry.get('solution', '') for entry in exercises]})
+    if answer_key:
+        answer_key[0]["page_break"] = True
+    sections.extend(answer_key)
+
+    return {
+        "title": item.get('topic') or "Text",
+        "subtitle": " · ".join(part for part in (
+            _language_name(item.get('language')), item.get('level'), item.get('text_type')
+        ) if part),
+        "sections": [section for section in sections if section]
+    }
+
+def _story_path(parts: Dict[str, Any], path: Optional[str]) -> str:
+    """The branch to export: the given one, else the shortest finished one, else the longest."""
+    if path is not None:
+        return path
+    finished = [key for key, part in parts.items() if part.get('is_final')]
+    if finished:
+        return min(finished, key=lambda key: (len(key), key))
+    return max(parts, key=lambda key: (len(key), [-int(choice) for choice in key]), default="")
+
+def story_document(story: Dict[str, Any], path: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Lay out one branch of a stored story.
+
+    Args:
+        story: Stored story, as Story.to_dict() stores it
+        path: Choice path of the last part to include; by default the
+            shortest branch that reached an ending, or the longest one
+
+    Returns:
+        Document laid out like text_document()
+    """
+    story_obj = Story.from_dict(story)
+    path = _story_path(story_obj.parts, path)
+
+    sections = []
+    lineage = story_obj.lineage(path)
+    for number, part in enumerate(lineage, 1):
+        section = {"heading": f"Part {number}", "paragraphs": _paragraphs(part.get('text'))}
+        if part.get('choice_made'):
+            section["note"] = part['choice_made']
+        sections.append(section)
+    if lineage and not lineage[-1].get('is_final'):
+        choices = [lineage[-1].get(f'choice_{choice}') for choice in ('1', '2')]
+        if any(choices):
+            sections.append({"heading": "What happens next?", "numbered": [choice for choice in choices if choice]})
+
+    vocabulary = _entries(story_obj.vocabulary, 'key_words')
+    if vocabulary:
+        sections.append({"heading": "Vocabulary", "terms": [
+            (entry.get('word', ''), entry.get('definition', ''), entry.get('example', '')) for entry in vocabulary
+        ]})
+    else:
+        sections.append(_loose_section("Vocabulary", story_obj.vocabulary))
+    if story_obj.translation:
+        language = story_obj.translation_language
+        sections.append(_pairs_section(f"Translation ({_language_name(language)})" if language else "Translation", story_obj.translation))
+
+    return {
+        "title": story_obj.title or "Story",
+        "subtitle": " · ".join(part for part in (_language_name(story_obj.language), story_obj.level) if part),
+        "sections": [section for section in sections if section]
+    }
+
+@functools.lru_cache(maxsize=None)
+def _template(name: str) -> Any:
+    """Compiled template, loaded once per process."""
+    from jinja2 import Environment, FileSystemLoader, select_autoescape
+    environment = Environment(
+        loader=FileSystemLoader(TEMPLATE_DIR),
+        autoescape=select_autoescape(default=True),
+        auto_reload=False,
+        trim_blocks=True,
+        lstrip_blocks=True
+    )
+    return environment.get_template(name)
+
+def _warm_templates() -> None:
+    """Compile the templates when a pool process starts, before its first document."""
+    _template('document.html')
+
+def _html(document: Dict[str, Any]) -> bytes:
+    return _template('document.html').render(document=document).encode('utf-8')
+
+def _pdf(document: Dict[str, Any]) -> bytes:
+    from weasyprint import HTML
+    return HTML(string=_html(document).decode('utf-8')).write_pdf()
+
+# Parts of a DOCX file other than the document body
+_DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+    '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '<Override PartName="/word/styles.xml" ContentType="application/vnd.openxmlformats-officedocument.wordprocessingml.styles+xml"/>'
+    '</Types>'
+)
+_DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/officeDocument" Target="word/document.xml"/>'
+    '</Relationships>'
+)
+_DOCX_DOCUMENT_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/officeDocument/2006/relationships/styles" Target="styles.xml"/>'
+    '</Relationships>'
+)
+_DOCX_STYLES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<w:styles xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+    '<w:style w:type="paragraph" w:default="1" w:styleId="Normal"><w:name w:val="Normal"/>'
+    '<w:pPr><w:spacing w:after="120" w:line="276" w:lineRule="auto"/></w:pPr><w:rPr><w:sz w:val="22"/></w:rPr></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Title"><w:name w:val="Title"/><w:basedOn w:val="Normal"/>'
+    '<w:rPr><w:b/><w:sz w:val="40"/></w:rPr></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Subtitle"><w:name w:val="Subtitle"/><w:basedOn w:val="Normal"/>'
+    '<w:rPr><w:color w:val="666666"/></w:rPr></w:style>'
+    '<w:style w:type="paragraph" w:styleId="Heading1"><w:name w:val="heading 1"/><w:basedOn w:val="Normal"/>'
+    '<w:pPr><w:keepNext/><w:spacing w:before="240"/><w:outlineLvl w:val="0"/></w:pPr><w:rPr><w:b/><w:sz w:val="28"/></w:rPr></w:style>'
+    '</w:styles>'
+)
+
+# Characters XML 1.0 does not allow
+_XML_INVALID = re.compile('[\x00-\x08\x0b\x0c\x0e-\x1f]')
+
+def _run(text: str, bold: bool = False, italic: bool = False) -> str:
+    """A run of text, with line breaks kept."""
+    properties = ('<w:b/>' if bold else '') + ('<w:i/>' if italic else '')
+    lines = _XML_INVALID.sub('', text).split("\n")
+    content = '<w:br/>'.join(f'<w:t xml:space="preserve">{xml_escape(line)}</w:t>' for line in lines)
+    return f'<w:r>{f"<w:rPr>{properties}</w:rPr>" if properties else ""}{content}</w:r>'
+
+def _paragraph(*runs: str, style: Optional[str] = None, indent: bool = False) -> str:
+    properties = (f'<w:pStyle w:val="{style}"/>' if style else '') + ('<w:ind w:left="360"/>' if indent else '')
+    return f'<w:p>{f"<w:pPr>{properties}</w:pPr>" if properties else ""}{"".join(runs)}</w:p>'
+
+def _table(rows: Iterable[Tuple[str, str]]) -> str:
+    """Two-column table with borders, for translations."""
+    border = 'w:val="single" w:sz="4" w:space="0" w:color="BBBBBB"'
+    cells = "".join(
+        '<w:tr>' + "".join(
+            f'<w:tc><w:tcPr><w:tcW w:w="2500" w:type="pct"/></w:tcPr>{_paragraph(_run(cell))}</w:tc>' for cell in row
+        ) + '</w:tr>'
+        for row in rows
+    )
+    return (
+        f'<w:tbl><w:tblPr><w:tblW w:w="5000" w:type="pct"/><w:tblBorders>'
+        f'<w:top {border}/><w:left {border}/><w:bottom {border}/><w:right {border}/>'
+        f'<w:insideH {border}/><w:insideV {border}/></w:tblBorders></w:tblPr>'
+        f'<w:tblGrid><w:gridCol/><w:gridCol/></w:tblGrid>{cells}</w:tbl>'
+    )
+
+def _docx(document: Dict[str, Any]) -> bytes:
+    """Write a document as a minimal WordprocessingML package."""
+    body = [_paragraph(_run(document['title']), style='Title')]
+    if document['subtitle']:
+        body.append(_paragraph(_run(document['subtitle']), style='Subtitle'))
+    for section in document['sections']:
+        if section.get('page_break'):
+            body.append('<w:p><w:r><w:br w:type="page"/></w:r></w:p>')
+        body.append(_paragraph(_run(section['heading']), style='Heading1'))
+        if section.get('note'):
+            body.append(_paragraph(_run(section['note'], italic=True)))
+        for text in section.get('paragraphs', []):
+            body.append(_paragraph(_run(text)))
+        for word, definition, example in section.get('terms', []):
+            runs = [_run(word, bold=True), _run(f" – {definition}")]
+            if example:
+                runs.append(_run(f"\n{example}", italic=True))
+            body.append(_paragraph(*runs))
+        for number, text in enumerate(section.get('numbered', []), 1):
+            body.append(_paragraph(_run(f"{number}. ", bold=True), _run(text)))
+        for number, (instructions, content) in enumerate(section.get('exercises', []), 1):
+            body.append(_paragraph(_run(f"{number}. ", bold=True), _run(instructions, bold=True)))
+            body.append(_paragraph(_run(content), indent=True))
+        if section.get('pairs'):
+            body.append(_table(section['pairs']))
+            body.append(_paragraph())
+
+    document_xml = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main"><w:body>'
+        + "".join(body)
+        + '<w:sectPr><w:pgSz w:w="11906" w:h="16838"/>'
+        '<w:pgMar w:top="1134" w:right="1134" w:bottom="1134" w:left="1134" w:header="567" w:footer="567" w:gutter="0"/>'
+        '</w:sectPr></w:body></w:document>'
+    )
+    buffer = _ChunkBuffer()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as package:
+        package.writestr('[Content_Types].xml', _DOCX_CONTENT_TYPES)
+        package.writestr('_rels/.rels', _DOCX_RELS)
+        package.writestr('word/_rels/document.xml.rels', _DOCX_DOCUMENT_RELS)
+        package.writestr('word/styles.xml', _DOCX_STYLES)
+        package.writestr('word/document.xml', document_xml)
+    return buffer.take()
+
+_RENDERERS: Dict[str, Callable[[Dict[str, Any]], bytes]] = {
+    'html': _html,
+    'pdf': _pdf,
+    'docx': _docx
+}
+
+def render(kind: str, data: Dict[str, Any], fmt: str, options: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Render a stored text or story; runs in the export pool.
+
+    Args:
+        kind: "text" or "story"
+        data: History item or stored story
+        fmt: Key of FORMATS
+        options: answers (bool) for texts, path (choice path) for stories
+
+    Returns:
+        The rendered file
+    """
+    options = options or {}
+    if kind == 'story':
+        document = story_document(data, options.get('path'))
+    else:
+        document = text_document(data, options.get('answers', True))
+    return _RENDERERS[fmt](document)
+
+def file_name(kind: str, data: Dict[str, Any], fmt: str) -> str:
+    """File name of an export, from the text topic or story title."""
+    title = data.get('title' if kind == 'story' else 'topic') or kind
+    slug = re.sub(r'[^\w]+', '-', title).strip('-').lower()[:60] or kind
+    return f"{slug}.{FORMATS[fmt][1]}"
+
+class _ChunkBuffer:
+    """Write-only file collecting bytes until they are taken, for writing ZIP archives piece by piece."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data: bytes) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def take(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks = []
+        return data
+
+# Pool rendering the exports, started on the first export
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+def _executor() -> ProcessPoolExecutor:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            context = multiprocessing.get_context(EXPORT_START_METHOD)
+            if EXPORT_START_METHOD == 'forkserver':
+                # Workers fork from a server that already imported this module
+                context.set_forkserver_preload([__name__])
+            _pool = ProcessPoolExecutor(max_workers=EXPORT_WORKERS, mp_context=context, initializer=_warm_templates)
+        return _pool
+
+def _submit(kind: str, data: Dict[str, Any], fmt: str, options: Optional[Dict[str, Any]]) -> Future:
+    """Queue a document in the pool, replacing the pool if a process died."""
+    global _pool
+    try:
+        return _executor().submit(render, kind, data, fmt, options)
+    except BrokenProcessPool:
+        with _pool_lock:
+            _pool = None
+        return _executor().submit(render, kind, data, fmt, options)
+
+def shutdown() -> None:
+    """Stop the export pool, if it was started."""
+    global _pool
+    with _pool_lock:
+        pool, _pool = _pool, None
+    if pool:
+        pool.shutdown(wait=False, cancel_futures=True)
+
+def export_document(kind: str, data: Dict[str, Any], fmt: str, options: Optional[Dict[str, Any]] = None) -> bytes:
+    """
+    Render a stored text or story in the export pool.
+
+    Args:
+        kind: "text" or "story"
+        data: History item or stored story
+        fmt: Key of FORMATS
+        options: See render()
+
+    Returns:
+        The rendered file
+
+    Raises:
+        TimeoutError: If rendering takes longer than EXPORT_TIMEOUT
+    """
+    return _submit(kind, data, fmt, options).result(timeout=EXPORT_TIMEOUT)
+
+def export_pack(
+    documents: Iterable[Tuple[str, Optional[Dict[str, Any]]]],
+    fmt: str,
+    options: Optional[Dict[str, Any]] = None
+) -> Iterator[bytes]:
+    """
+    Render many texts and stories into a ZIP archive, streamed as documents complete.
+
+    A window of documents renders ahead in the pool while the finished ones
+    are written out in order, so the first bytes go out after the first
+    document and memory holds a few documents, not the whole pack.
+
+    The response has started by the time a document fails, so a failure
+    never ends the stream: a document whose pool process died or timed out
+    is rendered once more, and one that still fails is replaced by an
+    ERROR text entry, leaving a complete archive.
+
+    Args:
+        documents: (kind, data) of every document, data None for ones not found
+        fmt: Key of FORMATS
+        options: See render(), applied to every document
+
+    Yields:
+        Chunks of the ZIP archive
+    """
+    buffer = _ChunkBuffer()
+    archive = zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED if fmt == 'pdf' else zipfile.ZIP_DEFLATED)
+    window: List[Tuple[str, str, Dict[str, Any], Future]] = []
+    names = set()
+    missing = 0
+
+    def write(name: str, kind: str, data: Dict[str, Any], future: Future) -> bytes:
+        try:
+            try:
+                content = future.result(timeout=EXPORT_TIMEOUT)
+            except (BrokenProcessPool, TimeoutError):
+                future.cancel()
+                content = _submit(kind, data, fmt, options).result(timeout=EXPORT_TIMEOUT)
+        except Exception as e:
+            stem, _ = os.path.splitext(name)
+            archive.writestr(f"ERROR-{stem}.txt", f"{name} could not be rendered: {type(e).__name__} {e}\n")
+        else:
+            archive.writestr(name, content)
+        return buffer.take()
+
+    try:
+        for kind, data in documents:
+            if data is None:
+                missing += 1
+                continue
+            name = stem_name = file_name(kind, data, fmt)
+            copy = 1
+            while name in names:
+                copy += 1
+                stem, extension = os.path.splitext(stem_name)
+                name = f"{stem}-{copy}{extension}"
+            names.add(name)
+            window.append((name, kind, data, _submit(kind, data, fmt, options)))
+            if len(window) > EXPORT_WORKERS * 2:
+                yield write(*window.pop(0))
+        while window:
+            yield write(*window.pop(0))
+        if missing:
+            archive.writestr('MISSING.txt', f"{missing} requested texts or stories were not found.\n")
+        archive.close()
+        yield buffer.take()
+    finally:
+        for *_, future in window:
+            future.cancel()
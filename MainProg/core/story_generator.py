@@ -1,11 +1,12 @@
 """
 Interactive story generation functionality.
 """
-from typing import Dict, List, Optional, Any, Union
+from typing import Dict, Optional, Any
 
-from api.openai_client import call_openai_api, parse_json_response
+from api.openai_client import api_request, uses_api, parse_json_response
 from config.language_data import LANGUAGE_MAP
 
+@uses_api
 def generate_story_part(
     language: str,
     level: str,
@@ -13,8 +14,8 @@ def generate_story_part(
     part_number: int,
     previous_text: str = "",
     choice_made: str = "",
-    temperature: float = 0.7,
-    top_p: float = 0.9,
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
     max_retries: int = 3
 ) -> Optional[Dict[str, Any]]:
     """
@@ -27,8 +28,8 @@ def generate_story_part(
         part_number: Which part of the story this is
         previous_text: The previous parts of the story (for context)
         choice_made: The choice the user made to continue the story
-        temperature: API temperature parameter
-        top_p: API top_p parameter
+        temperature: API temperature parameter; by default the task profile's
+        top_p: API top_p parameter; by default the task profile's
         max_retries: Maximum API retry attempts
         
     Returns:
@@ -75,153 +76,9 @@ def generate_story_part(
         Make sure the JSON is properly formatted and valid.
         """
     
-    result = call_openai_api(prompt, temperature, top_p, max_retries)
+    result = yield api_request(prompt, temperature, top_p, max_retries)
     if result:
         parsed_result = parse_json_response(result)
         if isinstance(parsed_result, dict):
             return parsed_result
-    return None
-
-class Story:
-    """Class representing an interactive story."""
-    
-    def __init__(
-        self,
-        title: str,
-        language: str,
-        level: str
-    ):
-        """
-        Initialize a new story.
-        
-        Args:
-            title: Story title
-            language: Story language
-            level: Language proficiency level
-        """
-        self.title = title
-        self.language = language
-        self.level = level
-        self.parts = {}  # Dict of story parts
-        self.vocabulary = None
-        self.translation = None
-        self.translation_language = None
-    
-    def add_part(
-        self,
-        part_number: int,
-        text: str,
-        choice_1: str = "",
-        choice_2: str = "",
-        is_final: bool = False,
-        choice_made: str = ""
-    ) -> Dict[str, Union[str, bool]]:
-        """
-        Add a new part to the story.
-        
-        Args:
-            part_number: Part number
-            text: Part text
-            choice_1: First choice
-            choice_2: Second choice
-            is_final: Whether this is the final part
-            choice_made: Choice that led to this part
-            
-        Returns:
-            The part data dictionary
-        """
-        part_key = f"part_{part_number}"
-        part_data = {
-            'text': text,
-            'choice_1': choice_1,
-            'choice_2': choice_2,
-            'is_final': is_final
-        }
-        
-        if choice_made:
-            part_data['choice_made'] = choice_made
-            
-        self.parts[part_key] = part_data
-        return part_data
-    
-    def get_current_text(self, up_to_part: Optional[int] = None) -> str:
-        """
-        Get the complete story text up to a specific part.
-        
-        Args:
-            up_to_part: Part number to get text up to (or all parts if None)
-            
-        Returns:
-            Concatenated story text
-        """
-        full_text = ""
-        part_numbers = sorted([int(key.split('_')[1]) for key in self.parts.keys()])
-        
-        for part_num in part_numbers:
-            if up_to_part is not None and part_num > up_to_part:
-                break
-                
-            part_key = f"part_{part_num}"
-            full_text += self.parts[part_key]['text'] + "\n\n"
-            
-        return full_text
-    
-    def get_latest_part(self) -> Dict[str, Any]:
-        """
-        Get the latest part of the story.
-        
-        Returns:
-            The latest part data or empty dict if no parts
-        """
-        if not self.parts:
-            return {}
-            
-        part_numbers = sorted([int(key.split('_')[1]) for key in self.parts.keys()])
-        latest_part_num = part_numbers[-1]
-        part_key = f"part_{latest_part_num}"
-        
-        return {
-            'part_number': latest_part_num,
-            'data': self.parts[part_key]
-        }
-    
-    def to_dict(self) -> Dict[str, Any]:
-        """
-        Convert story to dictionary for storage.
-        
-        Returns:
-            Dictionary representation of the story
-        """
-        return {
-            'title': self.title,
-            'language': self.language,
-            'level': self.level,
-            'parts': self.parts,
-            'vocabulary': self.vocabulary,
-            'translation': self.translation,
-            'translation_language': self.translation_language
-        }
-    
-    @classmethod
-    def from_dict(cls, data: Dict[str, Any]) -> 'Story':
-        """
-        Create a Story instance from a dictionary.
-        
-        Args:
-            data: Dictionary with story data
-            
-        Returns:
-            Story instance
-        """
-        story = cls(
-            title=data['title'],
-            language=data['language'],
-            level=data['level']
-        )
-        
-        story.parts = data['parts']
-        story.vocabulary = data.get('vocabulary')
-        story.translation = data.get('translation')
-        story.translation_language = data.get('translation_language')
-        
-        return story
\ No newline at end of file
+    return None
\ No newline at end of file
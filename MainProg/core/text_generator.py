@@ -3,19 +3,58 @@ Core text generation functionality.
 """
 from typing import Dict, List, Optional, Any
 import json
+import re
 
-from api.openai_client import call_openai_api, parse_json_response
+from api.openai_client import api_request, uses_api, parse_json_response
+from api.task_profiles import input_limit
 from config.language_data import LANGUAGE_MAP
+from core.text_validator import validate_and_repair
 
+# Sentence ends: closing punctuation, possibly followed by a closing quote, then spaces;
+# full-width punctuation needs no space after it
+_SENTENCE_END = re.compile(r'(?:(?<=[.!?…])|(?<=[.!?…]["”»)]))\s+|(?<=[。！？])\s*')
+
+def segment_sentences(text: str, limit: Optional[int] = None) -> List[str]:
+    """
+    Split a text into the lines translated one by one.
+    
+    Segmenting once and sending the same lines for every target language
+    keeps translations into several languages aligned line by line.
+    
+    Args:
+        text: Text to split
+        limit: Maximum total characters of the lines returned; by default
+            the input budget of the translation task profile
+        
+    Returns:
+        Sentences in text order, stopping before the one that would exceed
+        the limit (the first sentence is cut to the limit if longer)
+    """
+    limit = limit or input_limit('translation')
+    segments = []
+    total = 0
+    for paragraph in text.split("\n"):
+        for sentence in _SENTENCE_END.split(paragraph.strip()):
+            sentence = sentence.strip()
+            if not sentence:
+                continue
+            if total + len(sentence) > limit:
+                return segments or [sentence[:limit]]
+            segments.append(sentence)
+            total += len(sentence)
+    return segments
+
+@uses_api
 def generate_text(
     language: str,
     level: str,
     word_count: int,
     topic: str,
     text_type: str = "General",
-    temperature: float = 0.7,
-    top_p: float = 0.9,
-    max_retries: int = 3
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
+    max_retries: int = 3,
+    validate: bool = True
 ) -> Optional[str]:
     """
     Generate creative text for language learners.
@@ -26,9 +65,10 @@ def generate_text(
         word_count: Target word count
         topic: Text topic
         text_type: Type of text (General, Story, etc.)
-        temperature: API temperature parameter
-        top_p: API top_p parameter
+        temperature: API temperature parameter; by default the task profile's
+        top_p: API top_p parameter; by default the task profile's
         max_retries: Maximum API retry attempts
+        validate: Check length and level, repairing single sections if off target
         
     Returns:
         Generated text or None if generation failed
@@ -56,13 +96,20 @@ def generate_text(
     Make sure the vocabulary and grammar complexity match the specified language level.{text_type_prompt}
     Only provide the generated text, without any additional explanations or notes."""
     
-    return call_openai_api(prompt, temperature, top_p, max_retries)
+    result = yield api_request(prompt, temperature, top_p, max_retries)
+    if result and validate:
+        return (yield from validate_and_repair.steps(
+            result, topic, language, level, word_count,
+            temperature, top_p, max_retries, text_type=text_type
+        ))
+    return result
 
+@uses_api
 def get_topic_suggestion(
     language: str, 
     level: str,
-    temperature: float = 0.9,
-    top_p: float = 0.9,
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
     max_retries: int = 3
 ) -> Optional[str]:
     """
@@ -71,8 +118,8 @@ def get_topic_suggestion(
     Args:
         language: Target language
         level: Language proficiency level
-        temperature: API temperature parameter
-        top_p: API top_p parameter
+        temperature: API temperature parameter; by default the task profile's
+        top_p: API top_p parameter; by default the task profile's
         max_retries: Maximum API retry attempts
         
     Returns:
@@ -80,14 +127,15 @@ def get_topic_suggestion(
     """
     lang_english = LANGUAGE_MAP.get(language, language)
     prompt = f"Suggest an interesting and educational topic for a {lang_english} text at {level} level. Return just the topic, no explanations."
-    return call_openai_api(prompt, temperature, top_p, max_retries)
+    return (yield api_request(prompt, temperature, top_p, max_retries))
 
+@uses_api
 def generate_summary(
     text: str,
     language: str,
     level: str,
-    temperature: float = 0.3,
-    top_p: float = 0.9,
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
     max_retries: int = 3
 ) -> Optional[str]:
     """
@@ -97,8 +145,8 @@ def generate_summary(
         text: Source text to summarize
         language: Text language
         level: Language proficiency level
-        temperature: API temperature parameter
-        top_p: API top_p parameter
+        temperature: API temperature parameter; by default the task profile's
+        top_p: API top_p parameter; by default the task profile's
         max_retries: Maximum API retry attempts
         
     Returns:
@@ -108,17 +156,18 @@ def generate_summary(
     prompt = f"""Create a brief summary of the following {lang_english} text, suitable for {level} level language learners.
     The summary should be approximately 3-5 sentences and capture the main points.
     
-    TEXT: {text[:2000]}"""  # Limit text to prevent token overflow
+    TEXT: {text[:input_limit('summary')]}"""  # Limit text to the task's input budget
     
-    return call_openai_api(prompt, temperature, top_p, max_retries)
+    return (yield api_request(prompt, temperature, top_p, max_retries))
 
+@uses_api
 def extract_key_words(
     text: str,
     language: str,
     level: str,
     count: int,
-    temperature: float = 0.3,
-    top_p: float = 0.9,
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
     max_retries: int = 3
 ) -> Any:
     """
@@ -129,8 +178,8 @@ def extract_key_words(
         language: Text language
         level: Language proficiency level
         count: Number of words to extract
-        temperature: API temperature parameter
-        top_p: API top_p parameter
+        temperature: API temperature parameter; by default the task profile's
+        top_p: API top_p parameter; by default the task profile's
         max_retries: Maximum API retry attempts
         
     Returns:
@@ -146,20 +195,21 @@ def extract_key_words(
     Format as a JSON list where each item has "word", "definition", and "example" keys.
     Make sure the JSON is properly formatted and valid.
     
-    TEXT: {text[:1500]}"""  # Limit text to prevent token overflow
+    TEXT: {text[:input_limit('key_words')]}"""  # Limit text to the task's input budget
     
-    result = call_openai_api(prompt, temperature, top_p, max_retries)
+    result = yield api_request(prompt, temperature, top_p, max_retries)
     if result:
         return parse_json_response(result)
     return None
 
+@uses_api
 def generate_comprehension_questions(
     text: str,
     language: str,
     level: str,
     count: int = 5,
-    temperature: float = 0.3,
-    top_p: float = 0.9,
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
     max_retries: int = 3
 ) -> Any:
     """
@@ -170,8 +220,8 @@ def generate_comprehension_questions(
         language: Text language
         level: Language proficiency level
         count: Number of questions to generate
-        temperature: API temperature parameter
-        top_p: API top_p parameter
+        temperature: API temperature parameter; by default the task profile's
+        top_p: API top_p parameter; by default the task profile's
         max_retries: Maximum API retry attempts
         
     Returns:
@@ -186,20 +236,21 @@ def generate_comprehension_questions(
     Format as a JSON object with "questions" as a list, where each item has "question" and "answer" keys.
     Make sure the JSON is properly formatted and valid.
     
-    TEXT: {text[:1500]}"""  # Limit text to prevent token overflow
+    TEXT: {text[:input_limit('questions')]}"""  # Limit text to the task's input budget
     
-    result = call_openai_api(prompt, temperature, top_p, max_retries)
+    result = yield api_request(prompt, temperature, top_p, max_retries)
     if result:
         return parse_json_response(result)
     return None
 
+@uses_api
 def generate_language_exercises(
     text: str,
     language: str,
     level: str,
     count: int = 3,
-    temperature: float = 0.4,
-    top_p: float = 0.9,
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
     max_retries: int = 3
 ) -> Any:
     """
@@ -210,8 +261,8 @@ def generate_language_exercises(
         language: Text language
         level: Language proficiency level
         count: Number of exercises to generate
-        temperature: API temperature parameter
-        top_p: API top_p parameter
+        temperature: API temperature parameter; by default the task profile's
+        top_p: API top_p parameter; by default the task profile's
         max_retries: Maximum API retry attempts
         
     Returns:
@@ -232,21 +283,23 @@ def generate_language_exercises(
     Format as a JSON object with "exercises" as a list, where each item has "instructions", "content", and "solution" keys.
     Make sure the JSON is properly formatted and valid.
     
-    TEXT: {text[:1500]}"""  # Limit text to prevent token overflow
+    TEXT: {text[:input_limit('exercises')]}"""  # Limit text to the task's input budget
     
-    result = call_openai_api(prompt, temperature, top_p, max_retries)
+    result = yield api_request(prompt, temperature, top_p, max_retries)
     if result:
         return parse_json_response(result)
     return None
 
+@uses_api
 def generate_translation(
     text: str,
     source_language: str,
     target_language: str,
     level: str,
-    temperature: float = 0.3,
-    top_p: float = 0.9,
-    max_retries: int = 3
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
+    max_retries: int = 3,
+    segments: Optional[List[str]] = None
 ) -> Any:
     """
     Generate a line-by-line translation of a text.
@@ -256,9 +309,11 @@ def generate_translation(
         source_language: Source language
         target_language: Target language
         level: Language proficiency level
-        temperature: API temperature parameter
-        top_p: API top_p parameter
+        temperature: API temperature parameter; by default the task profile's
+        top_p: API top_p parameter; by default the task profile's
         max_retries: Maximum API retry attempts
+        segments: Lines of the text from segment_sentences(), to translate
+            exactly these lines instead of letting the model split the text
         
     Returns:
         List of dictionaries with original and translation or raw text if parsing fails
@@ -266,6 +321,9 @@ def generate_translation(
     source_lang_english = LANGUAGE_MAP.get(source_language, source_language)
     target_lang_english = LANGUAGE_MAP.get(target_language, target_language)
     
+    if segments:
+        return (yield from _translate_segments(segments, source_lang_english, target_lang_english, level, temperature, top_p, max_retries))
+    
     prompt = f"""Translate the following {source_lang_english} text into {target_lang_english}, line by line.
     Provide a translation that is appropriate for {level} level language learners.
     For each line, give both the original text and its translation.
@@ -274,9 +332,55 @@ def generate_translation(
     Make sure the JSON is properly formatted and valid.
     
     TEXT:
-    {text[:2000]}"""  # Limit text to prevent token overflow
+    {text[:input_limit('translation')]}"""  # Limit text to the task's input budget
     
-    result = call_openai_api(prompt, temperature, top_p, max_retries)
+    result = yield api_request(prompt, temperature, top_p, max_retries)
     if result:
         return parse_json_response(result)
-    return None
\ No newline at end of file
+    return None
+
+def _translate_segments(
+    segments: List[str],
+    source_lang_english: str,
+    target_lang_english: str,
+    level: str,
+    temperature: Optional[float],
+    top_p: Optional[float],
+    max_retries: int
+):
+    """
+    Step function translating numbered lines, keeping the original lines as given.
+    
+    Returns:
+        List of dictionaries with original and translation, with an empty
+        translation for lines the answer skipped, or None if it has none
+    """
+    lines = "\n".join(f"{number}. {segment}" for number, segment in enumerate(segments, 1))
+    prompt = f"""Translate each of the following numbered {source_lang_english} lines into {target_lang_english}.
+    Provide translations that are appropriate for {level} level language learners.
+    Translate every line separately; do not merge or split lines.
+    
+    Format as a JSON array where each item has "line" (the line number) and "translation" keys.
+    Make sure the JSON is properly formatted and valid.
+    
+    LINES:
+    {lines}"""
+    
+    result = yield api_request(prompt, temperature, top_p, max_retries)
+    answer = parse_json_response(result) if result else None
+    if not isinstance(answer, list):
+        return None
+    
+    translations = {}
+    for entry in answer:
+        if isinstance(entry, dict) and isinstance(entry.get('translation'), str):
+            try:
+                translations.setdefault(int(entry.get('line')), entry['translation'].strip())
+            except (TypeError, ValueError):
+                continue
+    if not translations:
+        return None
+    return [
+        {"original": segment, "translation": translations.get(number, "")}
+        for number, segment in enumerate(segments, 1)
+    ]
@@ -0,0 +1,268 @@
+"""
+Post-generation validation and targeted repair of generated texts.
+"""
+import re
+import threading
+from typing import Dict, List, Optional, Any
+
+from api.openai_client import api_request, uses_api
+from config.language_data import LANGUAGE_MAP
+from config.settings import TEXT_LENGTH_TOLERANCE, TEXT_REPAIR_MAX_ROUNDS
+
+# Rough number of characters per word for languages written without spaces
+CHARACTERS_PER_WORD = {
+    "Japanese": 2.5
+}
+
+# Upper/lower bounds on average sentence length (in words) per level
+LEVEL_SENTENCE_LENGTH = {
+    "A1-A2": (0, 14),
+    "B1-B2": (6, 24),
+    "C1-C2": (10, 60)
+}
+
+# Text types made of short lines, whose sentences are not too simple for any level
+SHORT_SENTENCE_TYPES = ("Dialogue",)
+
+# Repair counters, shared across requests
+_stats_lock = threading.Lock()
+_repair_stats = {
+    "texts_validated": 0,
+    "texts_on_target": 0,
+    "texts_repaired": 0,
+    "texts_still_off_target": 0,
+    "repair_calls": 0,
+    "repairs_rejected": 0,
+    "full_regenerations_avoided": 0,
+    "words_not_regenerated": 0
+}
+
+def count_words(text: str, language: str) -> int:
+    """
+    Count the words in a text, estimating for languages without spaces.
+
+    Args:
+        text: Text to measure
+        language: Text language
+
+    Returns:
+        Approximate word count
+    """
+    if language in CHARACTERS_PER_WORD:
+        characters = len(re.sub(r"\s", "", text))
+        return int(round(characters / CHARACTERS_PER_WORD[language]))
+    return len(text.split())
+
+def _split_sentences(text: str) -> List[str]:
+    """Split a text into sentences on common terminators."""
+    sentences = re.split(r"(?<=[.!?。！？])\s*", text)
+    return [s for s in sentences if s.strip()]
+
+def _average_sentence_length(text: str, language: str) -> float:
+    """Average sentence length in (approximate) words."""
+    sentences = _split_sentences(text)
+    if not sentences:
+        return 0.0
+    return sum(count_words(s, language) for s in sentences) / len(sentences)
+
+def _split_sections(text: str) -> List[str]:
+    """
+    Split a text into paragraphs, keeping the separators so it can be rejoined.
+
+    Even indexes hold paragraphs, odd indexes hold the separators between them.
+    """
+    separator = r"(\n\s*\n)" if re.search(r"\n\s*\n", text) else r"(\n)"
+    return re.split(separator, text)
+
+def validate_text(
+    text: str,
+    language: str,
+    level: str,
+    word_count: int,
+    tolerance: float = TEXT_LENGTH_TOLERANCE,
+    text_type: str = "General"
+) -> Dict[str, Any]:
+    """
+    Measure a generated text against the requested length and level.
+
+    Args:
+        text: Generated text
+        language: Text language
+        level: Requested proficiency level
+        word_count: Requested word count
+        tolerance: Allowed relative deviation from the word count
+        text_type: Type of text; dialogues are never too simple
+
+    Returns:
+        Dictionary with the measurements, whether the text is on target and
+        its distance from the target (0 when on target), which compares
+        candidate texts
+    """
+    actual_words = count_words(text, language)
+    lower = int(word_count * (1 - tolerance))
+    upper = int(word_count * (1 + tolerance))
+
+    length_issue = None
+    if actual_words < lower:
+        length_issue = "too_short"
+    elif actual_words > upper:
+        length_issue = "too_long"
+
+    average_sentence = _average_sentence_length(text, language)
+    min_sentence, max_sentence = LEVEL_SENTENCE_LENGTH.get(level, (0, 60))
+    if text_type in SHORT_SENTENCE_TYPES:
+        min_sentence = 0
+
+    level_issue = None
+    if average_sentence > max_sentence:
+        level_issue = "too_complex"
+    elif average_sentence < min_sentence:
+        level_issue = "too_simple"
+
+    # Deviations beyond the allowed ranges, relative to the range they miss
+    length_distance = max(lower - actual_words, actual_words - upper, 0) / max(word_count, 1)
+    level_distance = max(min_sentence - average_sentence, average_sentence - max_sentence, 0) / max(max_sentence, 1)
+
+    return {
+        "word_count": actual_words,
+        "target_word_count": word_count,
+        "average_sentence_length": round(average_sentence, 1),
+        "length_issue": length_issue,
+        "level_issue": level_issue,
+        "distance": round(length_distance + level_distance, 4),
+        "ok": length_issue is None and level_issue is None
+    }
+
+def _pick_section(sections: List[str], language: str, report: Dict[str, Any]) -> Optional[int]:
+    """Choose the index of the paragraph that the repair should rewrite, or None if there is none."""
+    paragraph_indexes = [i for i in range(0, len(sections), 2) if sections[i].strip()]
+    if not paragraph_indexes:
+        return None
+
+    if report["length_issue"] == "too_short":
+        # Expanding the shortest paragraph keeps the text balanced
+        return min(paragraph_indexes, key=lambda i: count_words(sections[i], language))
+    if report["length_issue"] == "too_long":
+        return max(paragraph_indexes, key=lambda i: count_words(sections[i], language))
+    if report["level_issue"] == "too_complex":
+        return max(paragraph_indexes, key=lambda i: _average_sentence_length(sections[i], language))
+    return min(paragraph_indexes, key=lambda i: _average_sentence_length(sections[i], language))
+
+def _build_repair_prompt(
+    section: str,
+    topic: str,
+    language: str,
+    level: str,
+    report: Dict[str, Any]
+) -> str:
+    """Build the prompt asking the model to rewrite a single paragraph."""
+    lang_english = LANGUAGE_MAP.get(language, language)
+    section_words = count_words(section, language)
+    difference = abs(report["target_word_count"] - report["word_count"])
+
+    if report["length_issue"] == "too_short":
+        target = section_words + difference
+        instruction = f"Expand this paragraph to approximately {target} words by adding relevant detail."
+    elif report["length_issue"] == "too_long":
+        target = max(section_words - difference, section_words // 2)
+        instruction = f"Shorten this paragraph to approximately {target} words, keeping its key points."
+    elif report["level_issue"] == "too_complex":
+        instruction = f"Simplify the sentences in this paragraph so they suit {level} level learners. Keep roughly the same length."
+    else:
+        instruction = f"Make the sentences in this paragraph richer and more varied so they suit {level} level learners. Keep roughly the same length."
+
+    return f"""The following paragraph is part of a {lang_english} text for {level} level language learners on the topic: "{topic}".
+    {instruction}
+    Only provide the rewritten paragraph in {lang_english}, without any additional explanations or notes.
+
+    PARAGRAPH: {section}"""
+
+@uses_api
+def validate_and_repair(
+    text: str,
+    topic: str,
+    language: str,
+    level: str,
+    word_count: int,
+    temperature: Optional[float] = None,
+    top_p: Optional[float] = None,
+    max_retries: int = 3,
+    max_rounds: int = TEXT_REPAIR_MAX_ROUNDS,
+    text_type: str = "General"
+) -> str:
+    """
+    Validate a generated text and repair it section by section if it is off target.
+
+    Each round rewrites a single paragraph instead of regenerating the whole
+    text, and at most max_rounds repair calls are made. A rewrite is only
+    kept if it brings the text closer to the target, so the result is the
+    best candidate seen.
+
+    Args:
+        text: Generated text
+        topic: Text topic
+        language: Text language
+        level: Requested proficiency level
+        word_count: Requested word count
+        temperature: API temperature parameter; by default the task profile's
+        top_p: API top_p parameter; by default the task profile's
+        max_retries: Maximum API retry attempts per repair call
+        max_rounds: Maximum number of repair rounds
+        text_type: Type of text, see validate_text()
+
+    Returns:
+        The repaired text, or the original text if no repair was needed or possible
+    """
+    report = validate_text(text, language, level, word_count, text_type=text_type)
+    repair_calls = 0
+    rejected = 0
+    words_kept = 0
+
+    while not report["ok"] and repair_calls < max_rounds:
+        sections = _split_sections(text)
+        index = _pick_section(sections, language, report)
+        if index is None:
+            break
+
+        repair_calls += 1
+        prompt = _build_repair_prompt(sections[index], topic, language, level, report)
+        rewritten = yield api_request(prompt, temperature, top_p, max_retries)
+        if not rewritten or not rewritten.strip():
+            break
+
+        unchanged_words = count_words(text, language) - count_words(sections[index], language)
+        sections[index] = rewritten.strip()
+        candidate = "".join(sections)
+        candidate_report = validate_text(candidate, language, level, word_count, text_type=text_type)
+        if candidate_report["distance"] >= report["distance"]:
+            # The rewrite did not help; keep the better text and try again
+            rejected += 1
+            continue
+
+        words_kept += unchanged_words
+        text, report = candidate, candidate_report
+
+    with _stats_lock:
+        _repair_stats["texts_validated"] += 1
+        _repair_stats["repair_calls"] += repair_calls
+        _repair_stats["repairs_rejected"] += rejected
+        if report["ok"] and repair_calls == 0:
+            _repair_stats["texts_on_target"] += 1
+        elif report["ok"]:
+            _repair_stats["texts_repaired"] += 1
+            _repair_stats["full_regenerations_avoided"] += 1
+            _repair_stats["words_not_regenerated"] += words_kept
+        else:
+            _repair_stats["texts_still_off_target"] += 1
+
+    return text
+
+def get_repair_stats() -> Dict[str, int]:
+    """
+    Get the validation and repair counters.
+
+    Returns:
+        Copy of the counters
+    """
+    with _stats_lock:
+        return dict(_repair_stats)
@@ -0,0 +1,207 @@
+"""
+Data model for interactive stories.
+"""
+from dataclasses import dataclass, field
+from typing import Any, Dict, List, Optional
+import datetime
+import re
+
+# Choices offered at the end of every part that is not final
+CHOICES = ('1', '2')
+
+# Part keys of stories saved before parts were keyed by choice path
+_LEGACY_PART_KEY = re.compile(r'^part_(\d+)$')
+
+def _now() -> str:
+    return datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+
+def is_valid_path(path: str) -> bool:
+    """Whether a string is a choice path: one digit per choice made, "" for the beginning."""
+    return all(choice in CHOICES for choice in path)
+
+@dataclass
+class Story:
+    """
+    Model for an interactive story as a tree of parts.
+
+    Parts are keyed by their choice path, the choices made to reach them:
+    "" is the beginning, "2" the part after its second choice, "21" the part
+    after the first choice of that one, and so on. Branches share the parts
+    of their common prefix, any part is found with one lookup, and the text
+    leading to a part is the text of its path prefixes.
+    """
+    title: str
+    language: str
+    level: str
+    parts: Dict[str, Dict[str, Any]] = field(default_factory=dict)
+    vocabulary: Optional[Any] = None
+    translation: Optional[Any] = None
+    translation_language: Optional[str] = None
+    last_updated: str = field(default_factory=_now)
+
+    def get_part(self, path: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the part at a choice path.
+
+        Args:
+            path: Choice path of the part
+
+        Returns:
+            The part data or None if that branch is not explored yet
+        """
+        return self.parts.get(path)
+
+    def add_part(
+        self,
+        path: str,
+        text: str,
+        choice_1: str = "",
+        choice_2: str = "",
+        is_final: bool = False
+    ) -> Dict[str, Any]:
+        """
+        Add a part at a choice path, replacing any part already there.
+
+        Args:
+            path: Choice path of the part; its parent must exist
+            text: Part text
+            choice_1: First choice
+            choice_2: Second choice
+            is_final: Whether this is the final part
+
+        Returns:
+            The part data dictionary
+
+        Raises:
+            ValueError: If the path is invalid or leaves from an unexplored or final part
+        """
+        parent = self.parent_of(path)
+        if path and parent is None:
+            raise ValueError(f"Invalid or unexplored choice path: {path!r}")
+        if parent is not None and parent.get('is_final'):
+            raise ValueError("The story has already ended on this branch")
+
+        part_data = {
+            'text': text,
+            'choice_1': choice_1,
+            'choice_2': choice_2,
+            'is_final': is_final
+        }
+        if path:
+            part_data['choice_made'] = parent[f'choice_{path[-1]}']
+
+        self.parts[path] = part_data
+        self.last_updated = _now()
+        return part_data
+
+    def parent_of(self, path: str) -> Optional[Dict[str, Any]]:
+        """The part a choice path continues from, or None for the beginning and invalid paths."""
+        if not path or not is_valid_path(path):
+            return None
+        return self.parts.get(path[:-1])
+
+    def lineage(self, path: str) -> List[Dict[str, Any]]:
+        """
+        Get the parts leading to a choice path, from the beginning.
+
+        Args:
+            path: Choice path
+
+        Returns:
+            The explored parts along the path, stopping at the first unexplored one
+        """
+        parts = []
+        for depth in range(len(path) + 1):
+            part = self.parts.get(path[:depth])
+            if part is None:
+                break
+            parts.append(part)
+        return parts
+
+    def get_text(self, path: str) -> str:
+        """
+        Get the story text read along a choice path.
+
+        Args:
+            path: Choice path of the last part to include
+
+        Returns:
+            Concatenated text of the parts on the path
+        """
+        return "\n\n".join(part['text'] for part in self.lineage(path))
+
+    def explored_choices(self, path: str) -> List[str]:
+        """Choices of a part whose continuation is already stored."""
+        return [choice for choice in CHOICES if path + choice in self.parts]
+
+    @property
+    def is_complete(self) -> bool:
+        """Whether any branch of the story has reached an ending."""
+        return any(part.get('is_final') for part in self.parts.values())
+
+    @property
+    def depth(self) -> int:
+        """Number of parts on the longest explored branch."""
+        return max((len(path) + 1 for path in self.parts), default=0)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert to dictionary for storage.
+
+        Returns:
+            Dictionary representation
+        """
+        return {
+            'title': self.title,
+            'language': self.language,
+            'level': self.level,
+            'parts': self.parts,
+            'vocabulary': self.vocabulary,
+            'translation': self.translation,
+            'translation_language': self.translation_language,
+            'last_updated': self.last_updated
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'Story':
+        """
+        Create a Story instance from a dictionary.
+
+        Stories saved with parts keyed part_1, part_2, ... are read as a
+        single branch, following the choice each part was reached by.
+
+        Args:
+            data: Dictionary with story data
+
+        Returns:
+            Story instance
+        """
+        parts = dict(data.get('parts') or {})
+        legacy = sorted(
+            (int(match.group(1)), key)
+            for key, match in ((key, _LEGACY_PART_KEY.match(key)) for key in parts)
+            if match
+        )
+        if legacy:
+            branch = {}
+            path = None
+            for _, key in legacy:
+                part = parts.pop(key)
+                if path is None:
+                    path = ""
+                else:
+                    previous = branch[path]
+                    path += '2' if part.get('choice_made') and part.get('choice_made') == previous.get('choice_2') else '1'
+                branch[path] = part
+            parts = dict(branch, **parts)
+
+        return cls(
+            title=data.get('title', ''),
+            language=data.get('language', ''),
+            level=data.get('level', ''),
+            parts=parts,
+            vocabulary=data.get('vocabulary'),
+            translation=data.get('translation'),
+            translation_language=data.get('translation_language'),
+            last_updated=data.get('last_updated') or _now()
+        )
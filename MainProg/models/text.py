@@ -4,6 +4,7 @@ Data models for text generation.
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Any
 import datetime
+import uuid
 
 @dataclass
 class KeyWord:
@@ -31,6 +32,49 @@ class Translation:
     original: str
     translation: str
 
+@dataclass
+class TranslationSet:
+    """Model for a line-by-line translation of a text into one language, linked to the text by its id."""
+    text_id: str
+    language: str
+    lines: List[Translation]
+    timestamp: str = field(default_factory=lambda: datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Convert to dictionary for storage.
+        
+        Returns:
+            Dictionary representation
+        """
+        return {
+            "text_id": self.text_id,
+            "language": self.language,
+            "lines": [vars(line) if hasattr(line, '__dict__') else line for line in self.lines],
+            "timestamp": self.timestamp
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> 'TranslationSet':
+        """
+        Create instance from dictionary.
+        
+        Args:
+            data: Dictionary data
+            
+        Returns:
+            TranslationSet instance
+        """
+        return cls(
+            text_id=data["text_id"],
+            language=data["language"],
+            lines=[Translation(**line) for line in data.get("lines") or []],
+            timestamp=data.get("timestamp", datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
+        )
+
+# Enrichment fields holding lists of items
+LIST_FIELDS = ('key_words', 'questions', 'exercises', 'translation')
+
 @dataclass
 class GeneratedText:
     """Model for a complete generated text with all associated content."""
@@ -45,8 +89,10 @@ class GeneratedText:
     exercises: List[Any] = field(default_factory=list)
     translation: List[Any] = field(default_factory=list)
     translation_language: Optional[str] = None
+    translations: Dict[str, TranslationSet] = field(default_factory=dict)  # By target language
     timestamp: str = field(default_factory=lambda: datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
     word_count: int = 0
+    id: str = field(default_factory=lambda: uuid.uuid4().hex)
     
     def to_dict(self) -> Dict[str, Any]:
         """
@@ -56,6 +102,7 @@ class GeneratedText:
             Dictionary representation
         """
         return {
+            "id": self.id,
             "topic": self.topic,
             "text": self.text,
             "language": self.language,
@@ -67,22 +114,33 @@ class GeneratedText:
             "exercises": self._convert_to_dict_list(self.exercises) if self.exercises else None,
             "translation": self._convert_to_dict_list(self.translation) if self.translation else None,
             "translation_language": self.translation_language,
+            "translations": {language: translation_set.to_dict() for language, translation_set in self.translations.items()} or None,
             "timestamp": self.timestamp,
             "word_count": self.word_count
         }
     
-    def _convert_to_dict_list(self, items: List[Any]) -> List[Dict[str, Any]]:
+    @staticmethod
+    def _convert_to_dict_list(items: Any) -> Any:
         """
         Convert a list of items to a list of dictionaries.
         
-        This handles both dataclass instances and dictionaries.
+        This handles both dataclass instances and dictionaries, and lists
+        wrapped in an object as the API returns questions and exercises
+        ({"questions": [...]}). Raw text from a response that could not be
+        parsed is kept as is.
         
         Args:
             items: List of items to convert
             
         Returns:
-            List of dictionaries
+            List of dictionaries, or the raw text
         """
+        if isinstance(items, str):
+            return items
+        if isinstance(items, dict):
+            lists = [value for value in items.values() if isinstance(value, list)]
+            items = lists[0] if len(lists) == 1 else [items]
+        
         result = []
         for item in items:
             if hasattr(item, '__dict__'):
@@ -99,6 +157,22 @@ class GeneratedText:
                     result.append({"value": str(item)})
         return result
     
+    @classmethod
+    def stored_fields(cls, fields: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Convert enrichment fields to the shape to_dict() stores them in.
+        
+        Args:
+            fields: Fields as returned by the enrichment steps
+            
+        Returns:
+            Fields with item lists converted to lists of dictionaries
+        """
+        return {
+            name: cls._convert_to_dict_list(value) if name in LIST_FIELDS and value else value
+            for name, value in fields.items()
+        }
+    
     @classmethod
     def from_dict(cls, data: Dict[str, Any]) -> 'GeneratedText':
         """
@@ -123,6 +197,8 @@ class GeneratedText:
         instance.translation_language = data.get("translation_language")
         instance.timestamp = data.get("timestamp", datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S"))
         instance.word_count = data.get("word_count", 0)
+        if data.get("id"):
+            instance.id = data["id"]
         
         # Convert list data
         if data.get("key_words"):
@@ -145,4 +221,10 @@ class GeneratedText:
             if isinstance(data["translation"], list):
                 instance.translation = [Translation(**t) for t in data["translation"]]
         
+        if data.get("translations"):
+            instance.translations = {
+                language: TranslationSet.from_dict(translation_set)
+                for language, translation_set in data["translations"].items()
+            }
+        
         return instance
\ No newline at end of file
@@ -0,0 +1,39 @@
+"""
+Production launcher for the ASGI application.
+
+Run with `python serve.py`; requires uvicorn. Settings are read from
+config.settings and can be overridden through the environment.
+"""
+import uvicorn
+
+from config.settings import (
+    ASGI_HOST,
+    ASGI_PORT,
+    ASGI_WORKERS,
+    ASGI_LIMIT_CONCURRENCY,
+    ASGI_BACKLOG,
+    ASGI_KEEP_ALIVE
+)
+
+def main() -> None:
+    """Start uvicorn with the tuned server settings."""
+    uvicorn.run(
+        "asgi:application",
+        host=ASGI_HOST,
+        port=ASGI_PORT,
+        # One event loop holds thousands of waiting requests; extra workers
+        # only add CPU for validation and would each get their own storage
+        workers=ASGI_WORKERS,
+        limit_concurrency=ASGI_LIMIT_CONCURRENCY,
+        backlog=ASGI_BACKLOG,
+        timeout_keep_alive=ASGI_KEEP_ALIVE,
+        # Picks uvloop and httptools when they are installed
+        loop="auto",
+        http="auto",
+        lifespan="on",
+        access_log=False,
+        proxy_headers=True
+    )
+
+if __name__ == '__main__':
+    main()
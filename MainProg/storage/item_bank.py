@@ -0,0 +1,299 @@
+"""
+Bank of generated comprehension questions and language exercises, reused across texts.
+"""
+import datetime
+import hashlib
+import json
+import random
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from storage.record_log import RecordLog, OP_BANK_ITEM
+
+# Item kinds and the fields of their content
+KINDS = {
+    'question': ('question', 'answer'),
+    'exercise': ('instructions', 'content', 'solution')
+}
+
+# Exercise types recognized from the instructions, with the words that give them away
+EXERCISE_TYPES = {
+    'fill_in_the_blank': ('blank', 'fill', 'gap', 'complete', 'missing'),
+    'grammar_correction': ('correct', 'mistake', 'error', 'grammar', 'rewrite'),
+    'word_formation': ('formation', 'form of', 'derive', 'suffix', 'prefix')
+}
+
+# Type of questions and of exercises whose type is not recognized
+QUESTION_TYPE = 'comprehension'
+OTHER_TYPE = 'other'
+
+def exercise_type(instructions: str) -> str:
+    """
+    Classify an exercise by its instructions.
+
+    Args:
+        instructions: Exercise instructions
+
+    Returns:
+        A key of EXERCISE_TYPES, or "other"
+    """
+    lowered = instructions.casefold()
+    for name, words in EXERCISE_TYPES.items():
+        if any(word in lowered for word in words):
+            return name
+    return OTHER_TYPE
+
+def _item_id(kind: str, text_id: str, content: Dict[str, str]) -> str:
+    """Id of an item, the same whenever the same content is banked for the same text."""
+    key = json.dumps([kind, text_id, [content[field] for field in KINDS[kind]]], ensure_ascii=False)
+    return hashlib.blake2b(key.encode('utf-8'), digest_size=12).hexdigest()
+
+def _entries(kind: str, value: Any) -> List[Dict[str, Any]]:
+    """Content entries of a stored questions or exercises field, which may be wrapped in an object."""
+    if isinstance(value, dict):
+        value = value.get(f'{kind}s')
+    return [entry for entry in value if isinstance(entry, dict)] if isinstance(value, list) else []
+
+class ItemBank:
+    """
+    Questions and exercises indexed by kind, language, level, type and source text.
+
+    Items are added as they are generated for a text and never change, so
+    the bank is an append-only log of items plus in-memory lists of item ids
+    per (kind, language, level), per (kind, language, level, type) and per
+    source text. Retrieving items and assembling worksheets only reads
+    these lists and never calls the API.
+    """
+
+    def __init__(self, log_path: Optional[str] = None, fsync: bool = True):
+        """
+        Open the bank.
+
+        Args:
+            log_path: Record log persisting the items, or None to keep them in memory only
+            fsync: Whether to fsync after every append
+        """
+        self._lock = threading.RLock()
+        self._items: Dict[str, Dict[str, Any]] = {}
+        self._by_level: Dict[Tuple[str, str, str], List[str]] = {}
+        self._by_type: Dict[Tuple[str, str, str, str], List[str]] = {}
+        self._by_text: Dict[str, List[str]] = {}
+        self.version = 0
+        self._log = RecordLog(log_path, fsync=fsync, lock=self._lock) if log_path else None
+        if self._log:
+            for _, op, meta in self._log.scan():
+                if op == OP_BANK_ITEM:
+                    self._index(meta)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def _index(self, item: Dict[str, Any]) -> None:
+        if item['id'] in self._items:
+            return
+        self._items[item['id']] = item
+        self._by_level.setdefault((item['kind'], item['language'], item['level']), []).append(item['id'])
+        self._by_type.setdefault((item['kind'], item['language'], item['level'], item['type']), []).append(item['id'])
+        self._by_text.setdefault(item['text_id'], []).append(item['id'])
+
+    def add_from_text(self, text: Dict[str, Any], fields: Optional[Dict[str, Any]] = None) -> int:
+        """
+        Bank the questions and exercises generated for a text.
+
+        Items already in the bank are skipped, so a text can be banked again
+        whenever its enrichments change.
+
+        Args:
+            text: Text with id, topic, language and level, as stored in history
+            fields: Enrichment fields just generated for the text; by default
+                the questions and exercises stored on the text itself
+
+        Returns:
+            Number of items added
+        """
+        fields = text if fields is None else fields
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        new_items = []
+        for kind, field_names in KINDS.items():
+            for entry in _entries(kind, fields.get(f'{kind}s')):
+                if not all(isinstance(entry.get(name), str) and entry[name].strip() for name in field_names):
+                    continue
+                content = {name: entry[name].strip() for name in field_names}
+                new_items.append({
+                    'id': _item_id(kind, text['id'], content),
+                    'kind': kind,
+                    'type': exercise_type(content['instructions']) if kind == 'exercise' else QUESTION_TYPE,
+                    'language': text.get('language') or '',
+                    'level': text.get('level') or '',
+                    'text_id': text['id'],
+                    'topic': text.get('topic') or '',
+                    'content': content,
+                    'created': now
+                })
+
+        with self._lock:
+            new_items = [item for item in new_items if item['id'] not in self._items]
+            if not new_items:
+                return 0
+            if self._log:
+                self._log.append_many((OP_BANK_ITEM, item, None) for item in new_items)
+            for item in new_items:
+                self._index(item)
+            self.version += 1
+            return len(new_items)
+
+    def find(
+        self,
+        kind: str,
+        language: Optional[str] = None,
+        level: Optional[str] = None,
+        item_type: Optional[str] = None,
+        text_id: Optional[str] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the items matching the given criteria, oldest first.
+
+        Args:
+            kind: "question" or "exercise"
+            language: Text language; required unless text_id is given
+            level: Language proficiency level; required unless text_id is given
+            item_type: Question or exercise type
+            text_id: Source text
+
+        Returns:
+            Matching items
+        """
+        with self._lock:
+            if text_id:
+                ids = self._by_text.get(text_id, [])
+            elif item_type:
+                ids = self._by_type.get((kind, language, level, item_type), [])
+            else:
+                ids = self._by_level.get((kind, language, level), [])
+            items = [self._items[item_id] for item_id in ids]
+        return [
+            item for item in items
+            if item['kind'] == kind
+            and (language is None or item['language'] == language)
+            and (level is None or item['level'] == level)
+            and (item_type is None or item['type'] == item_type)
+        ]
+
+    def assemble(
+        self,
+        kind: str,
+        language: str,
+        level: str,
+        count: int,
+        item_types: Optional[Iterable[str]] = None,
+        exclude_text: Optional[str] = None,
+        rng: Optional[random.Random] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        Pick items for a worksheet, spreading them over the requested types and source texts.
+
+        Args:
+            kind: "question" or "exercise"
+            language: Text language
+            level: Language proficiency level
+            count: Items to pick
+            item_types: Types to take items of in turn; by default any type
+            exclude_text: Source text whose items are left out
+            rng: Random generator, seeded for reproducible worksheets
+
+        Returns:
+            Up to count items; fewer if the bank has fewer matching items
+        """
+        rng = rng or random.Random()
+        pools = []
+        for item_type in (list(item_types) if item_types else [None]):
+            pool = [item for item in self.find(kind, language, level, item_type) if item['text_id'] != exclude_text]
+            rng.shuffle(pool)
+            pools.append(pool)
+
+        picked: List[Dict[str, Any]] = []
+        picked_ids = set()
+        used_texts = set()
+        while len(picked) < count and any(pools):
+            for pool in pools:
+                if not pool or len(picked) >= count:
+                    continue
+                # Prefer items from texts not used yet, so a worksheet mixes sources
+                index = next((i for i, item in enumerate(pool) if item['text_id'] not in used_texts), 0)
+                item = pool.pop(index)
+                if item['id'] in picked_ids:
+                    continue
+                picked.append(item)
+                picked_ids.add(item['id'])
+                used_texts.add(item['text_id'])
+        return picked
+
+    def worksheet(
+        self,
+        language: str,
+        level: str,
+        questions: int,
+        exercises: int,
+        exercise_types: Optional[Iterable[str]] = None,
+        text_id: Optional[str] = None,
+        seed: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """
+        Assemble a worksheet from banked items.
+
+        Args:
+            language: Text language
+            level: Language proficiency level
+            questions: Comprehension questions to include
+            exercises: Exercises to include
+            exercise_types: Exercise types to take turns between; by default any type
+            text_id: Text the worksheet is for, whose own items come first
+            seed: Seed making the choice of items reproducible
+
+        Returns:
+            Dictionary with the questions and exercises (each with its
+            content, type and source text), the source texts and how many
+            items the bank could not supply
+        """
+        rng = random.Random(seed)
+        exercise_types = list(exercise_types or [])
+        picked = {}
+        for kind, count, types in (('question', questions, None), ('exercise', exercises, exercise_types)):
+            own = self.find(kind, text_id=text_id) if text_id else []
+            if types:
+                own = [item for item in own if item['type'] in types]
+            items = own[:count]
+            items += self.assemble(kind, language, level, count - len(items), types, exclude_text=text_id, rng=rng)
+            picked[kind] = items
+
+        sources = {}
+        for item in picked['question'] + picked['exercise']:
+            sources.setdefault(item['text_id'], item['topic'])
+        return {
+            "language": language,
+            "level": level,
+            "questions": [dict(item['content'], id=item['id'], text_id=item['text_id']) for item in picked['question']],
+            "exercises": [dict(item['content'], id=item['id'], type=item['type'], text_id=item['text_id']) for item in picked['exercise']],
+            "sources": [{"text_id": source, "topic": topic} for source, topic in sources.items()],
+            "missing": {
+                "questions": questions - len(picked['question']),
+                "exercises": exercises - len(picked['exercise'])
+            }
+        }
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Describe the bank for monitoring.
+
+        Returns:
+            Dictionary with the number of items per kind and type, and of source texts
+        """
+        with self._lock:
+            counts: Dict[str, Dict[str, int]] = {kind: {} for kind in KINDS}
+            for (kind, _, _, item_type), ids in self._by_type.items():
+                counts[kind][item_type] = counts[kind].get(item_type, 0) + len(ids)
+            return {
+                "items": len(self._items),
+                "texts": len(self._by_text),
+                "by_kind": counts
+            }
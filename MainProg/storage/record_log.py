@@ -0,0 +1,335 @@
+"""
+Append-only, compressed record log for persistent session storage.
+"""
+import json
+import mmap
+import os
+import struct
+import threading
+import zlib
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Tuple, Union
+
+# Record operations
+OP_HISTORY_ADD = 1
+OP_HISTORY_CLEAR = 2
+OP_STORY_SAVE = 3
+OP_STORY_PART = 4
+OP_STORY_DELETE = 5
+OP_HISTORY_UPDATE = 6  # Replaces the item with the same id, or adds it if unknown
+OP_BANK_ITEM = 7  # Question or exercise of the item bank, in its own log
+OP_HISTORY_DELETE = 8
+
+MAGIC = b"ATXTLOG1"
+
+# Record header: operation, metadata length, body length, metadata CRC32, body CRC32
+_HEADER = struct.Struct("<BIIII")
+
+# A snapshot is the list of live records and the log size it reflects. Each record is
+# either (op, meta, body) or the offset of an existing record to copy as is.
+Snapshot = Tuple[List[Union[int, Tuple[int, Dict[str, Any], Any]]], int]
+
+def _encode_meta(meta: Dict[str, Any]) -> bytes:
+    return json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def _encode_body(body: Any) -> bytes:
+    if body is None:
+        return b""
+    return zlib.compress(json.dumps(body, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+
+def _decode_body(raw: bytes) -> Any:
+    if not raw:
+        return None
+    return json.loads(zlib.decompress(raw))
+
+def _pack(op: int, meta: Dict[str, Any], body: Any) -> bytes:
+    """Serialize one record."""
+    meta_bytes = _encode_meta(meta)
+    body_bytes = _encode_body(body)
+    header = _HEADER.pack(op, len(meta_bytes), len(body_bytes), zlib.crc32(meta_bytes), zlib.crc32(body_bytes))
+    return header + meta_bytes + body_bytes
+
+def _fsync_directory(path: str) -> None:
+    """Persist a rename by syncing the containing directory."""
+    try:
+        fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.fsync(fd)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class RecordLog:
+    """
+    Length-prefixed log of zlib-compressed JSON records.
+
+    Each record carries a small uncompressed metadata part and an optional
+    compressed body, so a startup scan only needs to read metadata. Writes
+    are appends, which keeps the cost of a save proportional to the change.
+    Compaction rewrites the live state into a snapshot that replaces the
+    log atomically.
+    """
+
+    def __init__(self, path: str, fsync: bool = True, lock: Optional[threading.RLock] = None):
+        """
+        Open (or create) a record log.
+
+        Args:
+            path: Log file path
+            fsync: Whether to fsync after every append
+            lock: Lock to guard the log with, so callers can make their own
+                state changes atomic with the records they append
+        """
+        self.path = path
+        self.fsync = fsync
+        self._lock = lock or threading.RLock()
+        self._mapped: Optional[mmap.mmap] = None
+        self._compaction_lock = threading.Lock()
+        self._compactor: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._file = open(path, "a+b")
+        if self._size() == 0:
+            self._file.write(MAGIC)
+            self._sync()
+        self._compacted_size = self._size()
+
+    def _size(self) -> int:
+        return os.fstat(self._file.fileno()).st_size
+
+    def _sync(self) -> None:
+        self._file.flush()
+        if self.fsync:
+            os.fsync(self._file.fileno())
+
+    def _map(self) -> mmap.mmap:
+        """Map the current log contents, remapping after appends."""
+        size = self._size()
+        if self._mapped is None or len(self._mapped) != size:
+            if self._mapped is not None:
+                self._mapped.close()
+            self._file.flush()
+            self._mapped = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+        return self._mapped
+
+    @property
+    def size(self) -> int:
+        """Current size of the log in bytes."""
+        with self._lock:
+            return self._size()
+
+    def append(self, op: int, meta: Dict[str, Any], body: Any = None) -> int:
+        """
+        Append a record.
+
+        Args:
+            op: Record operation
+            meta: Small metadata dictionary, stored uncompressed
+            body: Optional JSON-serializable payload, stored compressed
+
+        Returns:
+            Offset of the record in the log
+        """
+        record = _pack(op, meta, body)
+        with self._lock:
+            offset = self._size()
+            self._file.write(record)
+            self._sync()
+            return offset
+
+    def append_many(self, records: Iterable[Tuple[int, Dict[str, Any], Any]]) -> None:
+        """
+        Append several records with a single sync.
+
+        Args:
+            records: Records as (op, meta, body)
+        """
+        data = b"".join(_pack(op, meta, body) for op, meta, body in records)
+        if not data:
+            return
+        with self._lock:
+            self._file.write(data)
+            self._sync()
+
+    def scan(self) -> Iterator[Tuple[int, int, Dict[str, Any]]]:
+        """
+        Iterate over the records without decompressing their bodies.
+
+        Only metadata checksums are verified, so the scan does not touch the
+        (much larger) bodies; the body of the last record is also verified,
+        since that is where a crash during an append leaves a torn write.
+        A torn or corrupt tail ends the scan and is truncated away.
+
+        Yields:
+            Tuples of (offset, operation, metadata)
+        """
+        with self._lock:
+            data = self._map()
+            if data[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{self.path} is not a record log")
+
+            offset = len(MAGIC)
+            end = len(data)
+            while offset < end:
+                if offset + _HEADER.size > end:
+                    break
+                op, meta_length, body_length, meta_crc, body_crc = _HEADER.unpack_from(data, offset)
+                meta_start = offset + _HEADER.size
+                body_start = meta_start + meta_length
+                record_end = body_start + body_length
+                if record_end > end or zlib.crc32(data[meta_start:body_start]) != meta_crc:
+                    break
+                if record_end == end and zlib.crc32(data[body_start:record_end]) != body_crc:
+                    break
+                yield offset, op, json.loads(data[meta_start:body_start])
+                offset = record_end
+
+            # Metadata has been consumed; let the kernel drop the scanned pages
+            if hasattr(mmap, "MADV_DONTNEED"):
+                data.madvise(mmap.MADV_DONTNEED)
+
+            if offset < end:
+                print(f"Record log {self.path}: discarding {end - offset} bytes of incomplete data")
+                self._mapped.close()
+                self._mapped = None
+                self._file.truncate(offset)
+                self._sync()
+
+    def _raw_record(self, offset: int) -> bytes:
+        """Copy the bytes of a whole record."""
+        data = self._map()
+        _, meta_length, body_length, _, _ = _HEADER.unpack_from(data, offset)
+        return data[offset:offset + _HEADER.size + meta_length + body_length]
+
+    def read_body(self, offset: int) -> Any:
+        """
+        Read and decompress the body of a record.
+
+        Args:
+            offset: Record offset returned by append() or scan()
+
+        Returns:
+            The decoded body, or None if the record has none
+
+        Raises:
+            ValueError: If the body fails its checksum
+        """
+        with self._lock:
+            data = self._map()
+            _, meta_length, body_length, _, body_crc = _HEADER.unpack_from(data, offset)
+            body_start = offset + _HEADER.size + meta_length
+            raw = data[body_start:body_start + body_length]
+        if zlib.crc32(raw) != body_crc:
+            raise ValueError(f"Corrupt record body at offset {offset} in {self.path}")
+        return _decode_body(raw)
+
+    def needs_compaction(self, min_size: int) -> bool:
+        """
+        Check whether the log has grown enough since the last compaction.
+
+        Args:
+            min_size: Size in bytes below which compaction is never worth it
+
+        Returns:
+            True if the log is at least min_size and twice its compacted size
+        """
+        size = self.size
+        return size >= min_size and size >= 2 * self._compacted_size
+
+    def compact(
+        self,
+        snapshot: Callable[[], Snapshot],
+        on_relocate: Optional[Callable[[Callable[[int], int]], None]] = None
+    ) -> None:
+        """
+        Replace the log with a snapshot of the live records.
+
+        The snapshot is written without holding the log lock; records
+        appended after the snapshot was taken are copied over before the
+        atomic rename, so no write is lost and a crash at any point leaves
+        either the old or the new log. Records given by offset are copied
+        without being decompressed.
+
+        Args:
+            snapshot: Callable returning the live records and the log size they reflect
+            on_relocate: Called under the lock right after the swap with a
+                function mapping old record offsets to new ones
+        """
+        with self._compaction_lock:
+            records, start = snapshot()
+            relocations = {}
+
+            temporary_path = f"{self.path}.compact"
+            with open(temporary_path, "wb") as f:
+                f.write(MAGIC)
+                position = len(MAGIC)
+                for record in records:
+                    if isinstance(record, int):
+                        with self._lock:
+                            raw = self._raw_record(record)
+                        relocations[record] = position
+                    else:
+                        raw = _pack(*record)
+                    f.write(raw)
+                    position += len(raw)
+
+                with self._lock:
+                    self._file.flush()
+                    end = self._size()
+                    if end > start:
+                        f.write(self._map()[start:end])
+                    f.flush()
+                    os.fsync(f.fileno())
+
+                    if self._mapped is not None:
+                        self._mapped.close()
+                        self._mapped = None
+                    self._file.close()
+                    os.replace(temporary_path, self.path)
+                    _fsync_directory(self.path)
+                    self._file = open(self.path, "a+b")
+                    self._compacted_size = self._size()
+
+                    if on_relocate:
+                        delta = position - start
+                        on_relocate(lambda offset: relocations[offset] if offset < start else offset + delta)
+
+    def start_compaction(
+        self,
+        snapshot: Callable[[], Snapshot],
+        interval: float,
+        min_size: int,
+        on_relocate: Optional[Callable[[Callable[[int], int]], None]] = None
+    ) -> None:
+        """
+        Compact the log periodically in a background thread.
+
+        Args:
+            snapshot: Callable returning the live records and the log size they reflect
+            interval: Seconds between checks
+            min_size: Minimum log size in bytes before compacting
+            on_relocate: Passed to compact()
+        """
+        def run():
+            while not self._stop.wait(interval):
+                if not self.needs_compaction(min_size):
+                    continue
+                try:
+                    self.compact(snapshot, on_relocate)
+                except Exception as e:
+                    print(f"Record log compaction failed: {e}")
+
+        self._compactor = threading.Thread(target=run, name="record-log-compaction", daemon=True)
+        self._compactor.start()
+
+    def close(self) -> None:
+        """Stop background compaction and close the log."""
+        self._stop.set()
+        with self._lock:
+            if self._mapped is not None:
+                self._mapped.close()
+                self._mapped = None
+            self._file.close()
@@ -0,0 +1,379 @@
+"""
+Full-text search index over history entries and stories.
+"""
+import heapq
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Callable, Dict, List, Any, Optional, Set, Tuple
+
+from config.language_data import STOPWORDS
+
+# Characters from scripts written without spaces between words
+_CJK_CHARS = r"\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff"
+_CJK_RUN = re.compile(f"[{_CJK_CHARS}]+")
+_WORD = re.compile(r"\w+")
+
+# Stopwords of queries whose language is not given
+_ALL_STOPWORDS = frozenset().union(*STOPWORDS.values())
+
+# Extra weight for terms found in the topic/title
+TOPIC_WEIGHT = 3
+
+# BM25 parameters
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+def _normalize(text: str) -> str:
+    """Normalize width and case so queries match regardless of input form."""
+    return unicodedata.normalize("NFKC", text).lower()
+
+def _cjk_bigrams(run: str) -> List[str]:
+    """Split a run of CJK characters into overlapping character bigrams."""
+    if len(run) == 1:
+        return [run]
+    return [run[i:i + 2] for i in range(len(run) - 1)]
+
+def tokenize_words(text: str) -> List[str]:
+    """
+    Tokenize space-delimited text into words.
+
+    CJK runs inside the text are still split into bigrams, so mixed
+    content (e.g. a German text quoting a Japanese word) stays searchable.
+    """
+    tokens = []
+    for word in _WORD.findall(_normalize(text)):
+        if _CJK_RUN.search(word):
+            for part in re.split(f"([{_CJK_CHARS}]+)", word):
+                if not part:
+                    continue
+                if _CJK_RUN.fullmatch(part):
+                    tokens.extend(_cjk_bigrams(part))
+                else:
+                    tokens.append(part)
+        else:
+            tokens.append(word)
+    return tokens
+
+def tokenize_japanese(text: str) -> List[str]:
+    """
+    Tokenize Japanese text into character bigrams.
+
+    Japanese has no spaces between words, so every run of kana/kanji is
+    indexed as overlapping bigrams; latin words and numbers are kept whole.
+    """
+    tokens = []
+    normalized = _normalize(text)
+    for run in _CJK_RUN.findall(normalized):
+        tokens.extend(_cjk_bigrams(run))
+    for word in _WORD.findall(_CJK_RUN.sub(" ", normalized)):
+        tokens.append(word)
+    return tokens
+
+# Tokenizer per language; languages not listed use tokenize_words
+TOKENIZERS: Dict[str, Callable[[str], List[str]]] = {
+    "Japanese": tokenize_japanese
+}
+
+def _is_cjk_character(term: str) -> bool:
+    """Whether a token is a single CJK character, which documents only hold inside bigrams."""
+    return len(term) == 1 and _CJK_RUN.match(term) is not None
+
+def tokenize(text: str, language: Optional[str] = None) -> List[str]:
+    """
+    Tokenize text with the tokenizer for its language.
+
+    Args:
+        text: Text to tokenize
+        language: Text language
+
+    Returns:
+        List of normalized tokens
+    """
+    if not text:
+        return []
+    return TOKENIZERS.get(language, tokenize_words)(text)
+
+class SearchIndex:
+    """
+    In-memory inverted index with BM25 ranking and facet filters.
+
+    Documents are addressed by (kind, id) externally and by an increasing
+    integer internally, which keeps postings and set intersections cheap and
+    doubles as insertion order for "newest first" listings.
+    """
+
+    def __init__(self):
+        """Initialize an empty index."""
+        self.doc_numbers: Dict[Tuple[str, str], int] = {}
+        self.documents: Dict[int, Dict[str, Any]] = {}
+        self.postings: Dict[str, Dict[int, int]] = defaultdict(dict)
+        self.topic_postings: Dict[str, Set[int]] = defaultdict(set)
+        self.facets: Dict[Tuple[str, str], Set[int]] = defaultdict(set)
+        self.doc_terms: Dict[int, List[str]] = {}
+        self.doc_topic_terms: Dict[int, Set[str]] = {}
+        self.doc_lengths: Dict[int, int] = {}
+        # CJK bigram terms by each of their characters, for single character queries
+        self.cjk_terms: Dict[str, Set[str]] = defaultdict(set)
+        self.total_length = 0
+        self._next_number = 0
+
+    def __len__(self) -> int:
+        return len(self.documents)
+
+    def add_document(
+        self,
+        kind: str,
+        doc_id: str,
+        topic: str,
+        body: str,
+        language: str = "",
+        level: str = "",
+        text_type: str = "",
+        timestamp: str = ""
+    ) -> None:
+        """
+        Add or replace a document in the index.
+
+        Args:
+            kind: Document kind ("history" or "story")
+            doc_id: Identifier of the document within its kind
+            topic: Topic or title, weighted higher in ranking
+            body: Main text of the document
+            language: Document language
+            level: Language proficiency level
+            text_type: Type of text
+            timestamp: Creation or last update time
+        """
+        if (kind, doc_id) in self.doc_numbers:
+            self.remove_document(kind, doc_id)
+
+        number = self._next_number
+        self._next_number += 1
+
+        topic_terms = tokenize(topic, language)
+        frequencies: Dict[str, int] = defaultdict(int)
+        for term in tokenize(body, language):
+            frequencies[term] += 1
+        for term in topic_terms:
+            frequencies[term] += TOPIC_WEIGHT
+
+        for term, frequency in frequencies.items():
+            if term not in self.postings and len(term) == 2 and _CJK_RUN.fullmatch(term):
+                for character in term:
+                    self.cjk_terms[character].add(term)
+            self.postings[term][number] = frequency
+        for term in topic_terms:
+            self.topic_postings[term].add(number)
+
+        for facet in (("kind", kind), ("language", language), ("level", level), ("text_type", text_type)):
+            self.facets[facet].add(number)
+
+        length = sum(frequencies.values())
+        self.doc_terms[number] = list(frequencies)
+        self.doc_topic_terms[number] = set(topic_terms)
+        self.doc_lengths[number] = length
+        self.total_length += length
+        self.doc_numbers[(kind, doc_id)] = number
+        self.documents[number] = {
+            "kind": kind,
+            "id": doc_id,
+            "topic": topic,
+            "language": language,
+            "level": level,
+            "text_type": text_type,
+            "timestamp": timestamp
+        }
+
+    def remove_document(self, kind: str, doc_id: str) -> bool:
+        """
+        Remove a document from the index.
+
+        Args:
+            kind: Document kind
+            doc_id: Document identifier
+
+        Returns:
+            True if the document was indexed, False otherwise
+        """
+        number = self.doc_numbers.pop((kind, doc_id), None)
+        if number is None:
+            return False
+        document = self.documents.pop(number)
+
+        for term in self.doc_terms.pop(number):
+            postings = self.postings[term]
+            postings.pop(number, None)
+            if not postings:
+                del self.postings[term]
+                if len(term) == 2 and _CJK_RUN.fullmatch(term):
+                    for character in term:
+                        self.cjk_terms[character].discard(term)
+                        if not self.cjk_terms[character]:
+                            del self.cjk_terms[character]
+        for term in self.doc_topic_terms.pop(number):
+            numbers = self.topic_postings[term]
+            numbers.discard(number)
+            if not numbers:
+                del self.topic_postings[term]
+        for facet in (("kind", kind), ("language", document["language"]),
+                      ("level", document["level"]), ("text_type", document["text_type"])):
+            self.facets[facet].discard(number)
+
+        self.total_length -= self.doc_lengths.pop(number)
+        return True
+
+    def remove_kind(self, kind: str) -> None:
+        """
+        Remove every document of a kind.
+
+        Args:
+            kind: Document kind
+        """
+        for number in list(self.facets.get(("kind", kind), ())):
+            self.remove_document(kind, self.documents[number]["id"])
+
+    def clear(self) -> None:
+        """Remove every document."""
+        self.__init__()
+
+    def search(
+        self,
+        query: str = "",
+        language: Optional[str] = None,
+        level: Optional[str] = None,
+        kind: Optional[str] = None,
+        topic: Optional[str] = None,
+        text_type: Optional[str] = None,
+        page: int = 1,
+        per_page: int = 20
+    ) -> Dict[str, Any]:
+        """
+        Search the index.
+
+        All query terms must match, except stopwords of the query language
+        (of any language if none is given), which are dropped. Results are
+        ranked with BM25, or by insertion order (newest first) when only
+        filters or stopwords are given. A single CJK character matches the
+        bigrams containing it.
+
+        Args:
+            query: Free text query
+            language: Only return documents in this language
+            level: Only return documents at this level
+            kind: Only return documents of this kind
+            topic: Only return documents whose topic contains these words
+            text_type: Only return documents of this text type
+            page: 1-based page number
+            per_page: Results per page
+
+        Returns:
+            Dictionary with the total number of matches and the requested page
+        """
+        page = max(page, 1)
+        per_page = max(per_page, 1)
+
+        candidate_sets = []
+        for facet, value in (("language", language), ("level", level),
+                             ("kind", kind), ("text_type", text_type)):
+            if value:
+                candidate_sets.append(self.facets.get((facet, value), set()))
+        for term in set(tokenize(topic or "", language)):
+            candidate_sets.append(self.topic_postings.get(term, set()))
+
+        stopwords = STOPWORDS.get(language, frozenset()) if language else _ALL_STOPWORDS
+        query_terms = [term for term in dict.fromkeys(tokenize(query, language)) if term not in stopwords]
+        term_postings = [self._term_postings(term) for term in query_terms]
+        candidate_sets.extend(postings.keys() for postings in term_postings)
+
+        # Intersect the smallest candidate sets first
+        if candidate_sets:
+            candidate_sets.sort(key=len)
+            candidates = set(candidate_sets[0])
+            for numbers in candidate_sets[1:]:
+                if not candidates:
+                    break
+                candidates.intersection_update(numbers)
+        else:
+            candidates = None
+
+        total = len(self.documents) if candidates is None else len(candidates)
+        limit = page * per_page
+
+        if term_postings:
+            scores = self._score(candidates, term_postings)
+            ranked = heapq.nlargest(limit, scores, key=scores.__getitem__)
+        else:
+            scores = {}
+            ranked = self._newest(candidates, limit)
+
+        results = []
+        for number in ranked[limit - per_page:]:
+            result = dict(self.documents[number])
+            if scores:
+                result["score"] = round(scores[number], 4)
+            results.append(result)
+
+        return {
+            "total": total,
+            "page": page,
+            "per_page": per_page,
+            "results": results
+        }
+
+    def _term_postings(self, term: str) -> Dict[int, int]:
+        """Postings of a query term, merging the bigrams of a single CJK character."""
+        postings = self.postings.get(term, {})
+        if not _is_cjk_character(term) or term not in self.cjk_terms:
+            return postings
+        merged = dict(postings)
+        for bigram in self.cjk_terms[term]:
+            for number, frequency in self.postings[bigram].items():
+                merged[number] = merged.get(number, 0) + frequency
+        return merged
+
+    def _newest(self, candidates: Optional[Set[int]], limit: int) -> List[int]:
+        """Return the most recently indexed candidates, newest first."""
+        if candidates is not None and len(candidates) * 8 < len(self.documents):
+            return heapq.nlargest(limit, candidates)
+
+        # Broad filters: walking back from the newest document stops early
+        ranked = []
+        for number in reversed(self.documents):
+            if candidates is None or number in candidates:
+                ranked.append(number)
+                if len(ranked) == limit:
+                    break
+        return ranked
+
+    def _score(self, candidates: Set[int], term_postings: List[Dict[int, int]]) -> Dict[int, float]:
+        """Compute BM25 scores for the candidate documents."""
+        document_count = len(self.documents)
+        average_length = self.total_length / document_count if document_count else 1.0
+        base = BM25_K1 * (1 - BM25_B)
+        slope = BM25_K1 * BM25_B / average_length
+        lengths = self.doc_lengths
+
+        weights = [
+            math.log(1 + (document_count - len(postings) + 0.5) / (len(postings) + 0.5)) * (BM25_K1 + 1)
+            for postings in term_postings
+        ]
+        if len(term_postings) == 1:
+            # One comprehension over the candidates is about twice as fast as the general loop
+            postings, weight = term_postings[0], weights[0]
+            return {
+                number: weight * (frequency := postings[number]) / (frequency + base + slope * lengths[number])
+                for number in candidates
+            }
+
+        # Length normalization is shared by every query term
+        norms = {number: base + slope * lengths[number] for number in candidates}
+        scores = dict.fromkeys(candidates, 0.0)
+
+        for postings, weight in zip(term_postings, weights):
+            for number, norm in norms.items():
+                frequency = postings[number]
+                scores[number] += weight * frequency / (frequency + norm)
+
+        return scores
@@ -4,17 +4,54 @@ Works with different frontends (Streamlit, web app).
 """
 import json
 import datetime
-from typing import Dict, List, Any, Optional, Union
+import os
+import threading
+import uuid
+import zlib
+from collections import OrderedDict
+from typing import Dict, Iterable, Iterator, List, Any, Optional, Union
+
+from config.settings import LOG_FSYNC, LOG_COMPACTION_INTERVAL, LOG_COMPACTION_MIN_SIZE
+from models.story import Story
+from storage.record_log import (
+    RecordLog,
+    Snapshot,
+    OP_HISTORY_ADD,
+    OP_HISTORY_UPDATE,
+    OP_HISTORY_CLEAR,
+    OP_STORY_SAVE,
+    OP_STORY_PART,
+    OP_STORY_DELETE,
+    OP_HISTORY_DELETE
+)
+from storage.search_index import SearchIndex
+from storage.similarity_index import SimilarityIndex, storable_id
+
+# History fields kept uncompressed in the record log metadata and returned by listings
+HISTORY_METADATA_FIELDS = ('id', 'topic', 'language', 'level', 'text_type', 'timestamp', 'word_count')
+
+# Length of the text preview included in history listings
+HISTORY_PREVIEW_LENGTH = 200
+
+# Number of history bodies kept decoded when bodies are loaded on demand
+HISTORY_BODY_CACHE_SIZE = 128
 
 class SessionManager:
     """Manages application session data."""
     
-    def __init__(self, storage_type: str = "memory"):
+    def __init__(
+        self,
+        storage_type: str = "memory",
+        similarity_path: Optional[str] = None,
+        log_path: Optional[str] = None
+    ):
         """
         Initialize session manager.
         
         Args:
-            storage_type: Type of storage backend ("memory", "file", etc.)
+            storage_type: Type of storage backend ("memory" or "log")
+            similarity_path: File for the topic similarity index, or None to keep it in memory
+            log_path: Record log file, required for the "log" storage type
         """
         self.storage_type = storage_type
         self.data = {
@@ -31,6 +68,34 @@ class SessionManager:
             'current_story_part': 1,
             'current_choices': []
         }
+        self.search_index = SearchIndex()
+        self.similarity_index = SimilarityIndex(similarity_path)
+        self._history_by_id = {}
+        self._indexes_ready = True
+        self._index_lock = threading.RLock()
+        self._write_lock = threading.RLock()
+        self._story_digests = {}
+        self._body_cache = OrderedDict()
+        self._log = None
+        
+        # Version counters, bumped on every write, for HTTP validators. The
+        # epoch keeps versions from before a restart from matching new ones.
+        self.epoch = uuid.uuid4().hex[:8]
+        self.history_version = 0
+        self.stories_version = 0
+        self._story_versions = {}
+        
+        # With the log backend, history holds only metadata and record offsets;
+        # bodies are read from the log on demand.
+        if storage_type == "log":
+            self._log = RecordLog(log_path, fsync=LOG_FSYNC, lock=self._write_lock)
+            self._load_from_log()
+            self._log.start_compaction(
+                self._snapshot,
+                LOG_COMPACTION_INTERVAL,
+                LOG_COMPACTION_MIN_SIZE,
+                on_relocate=self._relocate_history
+            )
     
     def get(self, key: str, default: Any = None) -> Any:
         """
@@ -43,6 +108,8 @@ class SessionManager:
         Returns:
             The stored value or default
         """
+        if key == 'history' and self._log:
+            return list(self.iter_history())
         return self.data.get(key, default)
     
     def set(self, key: str, value: Any) -> None:
@@ -53,7 +120,13 @@ class SessionManager:
             key: Data key
             value: Value to store
         """
-        self.data[key] = value
+        with self._write_lock:
+            self.data[key] = value
+            if key in ('history', 'stories'):
+                self._bump_versions()
+                self._reset_history_ids()
+                self._invalidate_indexes()
+                self._rewrite_log()
     
     def add_to_history(self, item: Dict[str, Any]) -> None:
         """
@@ -61,17 +134,191 @@ class SessionManager:
         
         Args:
             item: History item data
+            
+        Raises:
+            ValueError: If the item's id is not at most 32 ASCII characters
         """
         if 'timestamp' not in item:
             item['timestamp'] = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        if not item.get('id'):
+            item['id'] = uuid.uuid4().hex
+        # Checked before anything is written, so a bad id cannot leave a half-added item
+        if not storable_id(item['id']):
+            raise ValueError(f"Invalid history item id: {item['id']!r}")
+        
+        with self._write_lock:
+            entry = item
+            if self._log:
+                offset = self._log.append(OP_HISTORY_ADD, self._history_metadata(item), item)
+                entry = dict(self._history_metadata(item), _offset=offset)
+                self._cache_body(item)
+            history = self.data.get('history', [])
+            history.append(entry)
+            self.data['history'] = history
+            self._history_by_id[item['id']] = entry
+            self.history_version += 1
+        self._add_to_similarity_index(item)
+        self._index_history_item(item)
+    
+    def update_history_item(self, text_id: str, fields: Dict[str, Any]) -> bool:
+        """
+        Update fields of a history item, e.g. as enrichments arrive.
+        
+        Args:
+            text_id: History item identifier
+            fields: Fields to set on the item
+            
+        Returns:
+            True if the item was updated, False if it was not found
+        """
+        with self._write_lock:
+            entry = self._history_by_id.get(text_id)
+            if entry is None:
+                return False
+            if self._log:
+                item = dict(self._history_body(entry), **fields)
+                metadata = self._history_metadata(item)
+                entry.update(metadata, _offset=self._log.append(OP_HISTORY_UPDATE, metadata, item))
+                self._cache_body(item)
+            else:
+                entry.update(fields)
+            self.history_version += 1
+            return True
+    
+    def count_history(self) -> int:
+        """
+        Count history items.
+        
+        Returns:
+            Number of history items
+        """
+        return len(self.data.get('history', []))
+    
+    def list_history(
+        self,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        fields: Optional[Iterable[str]] = None
+    ) -> List[Dict[str, Any]]:
+        """
+        List history items, by default as metadata without loading text bodies.
+        
+        Args:
+            offset: Number of items to skip
+            limit: Maximum number of items, or None for all
+            fields: Fields to include in each item, or None for the metadata
+                fields and a preview. Bodies are only loaded if a requested
+                field is not part of the metadata.
             
+        Returns:
+            List of history dictionaries, oldest first
+        """
         history = self.data.get('history', [])
-        history.append(item)
-        self.data['history'] = history
+        end = None if limit is None else offset + limit
+        if fields is None:
+            return [self._history_metadata(item) for item in history[offset:end]]
+        
+        fields = list(fields)
+        metadata_only = all(field in HISTORY_METADATA_FIELDS or field == 'preview' for field in fields)
+        result = []
+        for entry in history[offset:end]:
+            item = self._history_metadata(entry) if metadata_only else self._history_body(entry)
+            result.append({field: item.get(field) for field in fields})
+        return result
+    
+    def iter_history(self) -> Iterator[Dict[str, Any]]:
+        """
+        Iterate over full history items, loading one body at a time.
+        
+        Yields:
+            History item data
+        """
+        for entry in list(self.data.get('history', [])):
+            yield self._history_body(entry)
+    
+    def get_history_item(self, text_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a history item by its id.
+        
+        Args:
+            text_id: History item identifier
+            
+        Returns:
+            History item data or None if not found
+        """
+        entry = self._history_by_id.get(text_id)
+        if entry is None:
+            return None
+        return self._history_body(entry)
+    
+    def find_similar_text(
+        self,
+        topic: str,
+        language: str,
+        level: str,
+        text_type: str,
+        threshold: float
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Find an existing history item with a similar topic.
+        
+        Only items with the same language, level and text type are considered.
+        
+        Args:
+            topic: Topic of the text about to be generated
+            language: Text language
+            level: Language proficiency level
+            text_type: Type of text
+            threshold: Minimum topic similarity (0-1)
+            
+        Returns:
+            Dictionary with the matching item and its similarity, or None if there is no match
+        """
+        matches = self.similarity_index.find_similar(topic, language, level, text_type, threshold)
+        for text_id, similarity in matches:
+            item = self.get_history_item(text_id)
+            if item:
+                return {'item': item, 'similarity': similarity}
+        return None
+    
+    def delete_history_item(self, text_id: str) -> bool:
+        """
+        Delete a history item.
+        
+        Args:
+            text_id: History item identifier
+            
+        Returns:
+            True if the item was deleted, False if it was not found
+        """
+        with self._write_lock:
+            entry = self._history_by_id.pop(text_id, None)
+            if entry is None:
+                return False
+            self.data['history'] = [item for item in self.data.get('history', []) if item is not entry]
+            self._body_cache.pop(text_id, None)
+            self.history_version += 1
+            if self._log:
+                self._log.append(OP_HISTORY_DELETE, {'id': text_id})
+        with self._index_lock:
+            self.similarity_index.remove(text_id)
+            if self._indexes_ready:
+                self.search_index.remove_document('history', text_id)
+        return True
     
     def clear_history(self) -> None:
         """Clear text generation history."""
-        self.data['history'] = []
+        with self._write_lock:
+            self.data['history'] = []
+            self._history_by_id = {}
+            self._body_cache.clear()
+            self.history_version += 1
+            if self._log:
+                self._log.append(OP_HISTORY_CLEAR, {})
+        with self._index_lock:
+            self.similarity_index.clear()
+            if self._indexes_ready:
+                self.search_index.remove_kind('history')
     
     def save_story(self, story_id: str, story_data: Dict[str, Any]) -> None:
         """
@@ -81,9 +328,14 @@ class SessionManager:
             story_id: Story identifier
             story_data: Story data dictionary
         """
-        stories = self.data.get('stories', {})
-        stories[story_id] = story_data
-        self.data['stories'] = stories
+        with self._write_lock:
+            stories = self.data.get('stories', {})
+            stories[story_id] = story_data
+            self.data['stories'] = stories
+            self._bump_story_version(story_id)
+            if self._log:
+                self._log.append_many(self._story_records(story_id, story_data, changed_only=True))
+        self._index_story(story_id, story_data)
     
     def get_story(self, story_id: str) -> Optional[Dict[str, Any]]:
         """
@@ -108,35 +360,68 @@ class SessionManager:
         Returns:
             True if story was deleted, False otherwise
         """
-        stories = self.data.get('stories', {})
-        if story_id in stories:
+        with self._write_lock:
+            stories = self.data.get('stories', {})
+            if story_id not in stories:
+                return False
             del stories[story_id]
             self.data['stories'] = stories
-            return True
-        return False
+            self._story_digests.pop(story_id, None)
+            self._bump_story_version(story_id)
+            if self._log:
+                self._log.append(OP_STORY_DELETE, {'id': story_id})
+        with self._index_lock:
+            if self._indexes_ready:
+                self.search_index.remove_document('story', story_id)
+        return True
     
-    def list_stories(self) -> List[Dict[str, Any]]:
+    def story_version(self, story_id: str) -> int:
         """
-        List all stories with metadata.
+        Get the version counter of a story.
         
+        Args:
+            story_id: Story identifier
+            
+        Returns:
+            Number of writes to the story (0 if it was never written)
+        """
+        return self._story_versions.get(story_id, 0)
+    
+    def count_stories(self) -> int:
+        """
+        Count stories.
+        
+        Returns:
+            Number of stories
+        """
+        return len(self.data.get('stories', {}))
+    
+    def list_stories(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        List stories with metadata.
+        
+        Args:
+            offset: Number of stories to skip
+            limit: Maximum number of stories, or None for all
+            
         Returns:
             List of story metadata dictionaries
         """
         stories = self.data.get('stories', {})
+        end = None if limit is None else offset + limit
         result = []
         
-        for story_id, story_data in stories.items():
-            parts_count = len(story_data.get('parts', {}))
-            latest_part = max([int(k.split('_')[1]) for k in story_data.get('parts', {}).keys()]) if story_data.get('parts') else 0
-            is_complete = latest_part > 0 and story_data.get('parts', {}).get(f'part_{latest_part}', {}).get('is_final', False)
+        for story_id, story_data in list(stories.items())[offset:end]:
+            story = Story.from_dict(story_data)
             
             result.append({
                 'id': story_id,
-                'title': story_id,
-                'language': story_data.get('language', ''),
-                'level': story_data.get('level', ''),
-                'parts_count': parts_count,
-                'is_complete': is_complete,
+                'title': story.title or story_id,
+                'language': story.language,
+                'level': story.level,
+                'parts_count': len(story.parts),
+                'depth': story.depth,
+                'is_complete': story.is_complete,
                 'last_updated': story_data.get('last_updated', '')
             })
             
@@ -149,8 +434,60 @@ class SessionManager:
         Returns:
             Dictionary of all session data
         """
+        if self._log:
+            return dict(self.data, history=self.get('history'))
         return self.data
     
+    def export_ndjson(self) -> Iterator[str]:
+        """
+        Stream history and stories as newline-delimited JSON.
+        
+        Each line is one record, so memory use does not grow with history size.
+        
+        Yields:
+            JSON lines ending in a newline
+        """
+        for item in self.iter_history():
+            yield json.dumps({'type': 'history', 'item': item}, ensure_ascii=False) + "\n"
+        for story_id, story_data in list(self.data.get('stories', {}).items()):
+            yield json.dumps({'type': 'story', 'id': story_id, 'story': story_data}, ensure_ascii=False) + "\n"
+    
+    def import_ndjson(self, lines: Iterable[Union[str, bytes]]) -> Dict[str, int]:
+        """
+        Import history and stories from newline-delimited JSON, one line at a time.
+        
+        History items whose id is already in the history are left as they
+        are, so importing the same export twice does not duplicate them;
+        stories with an existing id are replaced.
+        
+        Args:
+            lines: Lines as produced by export_ndjson()
+            
+        Returns:
+            Counts of imported history items, stories, history items that
+            already existed and skipped lines
+        """
+        counts = {'history': 0, 'stories': 0, 'existing': 0, 'skipped': 0}
+        for line in lines:
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                if record.get('type') == 'history':
+                    if record['item'].get('id') in self._history_by_id:
+                        counts['existing'] += 1
+                        continue
+                    self.add_to_history(record['item'])
+                    counts['history'] += 1
+                elif record.get('type') == 'story':
+                    self.save_story(record['id'], record['story'])
+                    counts['stories'] += 1
+                else:
+                    counts['skipped'] += 1
+            except (ValueError, KeyError, TypeError, AttributeError):
+                counts['skipped'] += 1
+        return counts
+    
     def import_data(self, data: Dict[str, Any]) -> None:
         """
         Import session data from backup or storage.
@@ -158,11 +495,21 @@ class SessionManager:
         Args:
             data: Session data dictionary
         """
-        self.data = data
+        with self._write_lock:
+            self.data = data
+            self._story_digests = {}
+            self._body_cache.clear()
+            self._bump_versions()
+            self._reset_history_ids()
+            self._invalidate_indexes()
+            self._rewrite_log()
     
     def save_to_file(self, filepath: str) -> bool:
         """
-        Save session data to a file.
+        Save a snapshot of session data to a file.
+        
+        The snapshot is written to a temporary file, synced and renamed into
+        place, so a crash never leaves a partially written file behind.
         
         Args:
             filepath: Path to save file
@@ -170,9 +517,14 @@ class SessionManager:
         Returns:
             True if saving was successful, False otherwise
         """
+        temporary_path = f"{filepath}.tmp"
         try:
-            with open(filepath, 'w', encoding='utf-8') as f:
-                json.dump(self.data, f, ensure_ascii=False, indent=2)
+            with self._write_lock:
+                with open(temporary_path, 'w', encoding='utf-8') as f:
+                    json.dump(self.export_data(), f, ensure_ascii=False, separators=(',', ':'))
+                    f.flush()
+                    os.fsync(f.fileno())
+            os.replace(temporary_path, filepath)
             return True
         except Exception:
             return False
@@ -189,7 +541,240 @@ class SessionManager:
         """
         try:
             with open(filepath, 'r', encoding='utf-8') as f:
-                self.data = json.load(f)
+                data = json.load(f)
+            self.import_data(data)
             return True
         except Exception:
-            return False
\ No newline at end of file
+            return False
+    
+    def search(
+        self,
+        query: str = "",
+        language: Optional[str] = None,
+        level: Optional[str] = None,
+        kind: Optional[str] = None,
+        topic: Optional[str] = None,
+        text_type: Optional[str] = None,
+        page: int = 1,
+        per_page: int = 20
+    ) -> Dict[str, Any]:
+        """
+        Search history entries and stories.
+        
+        Args:
+            query: Free text query
+            language: Language filter
+            level: Proficiency level filter
+            kind: "history" or "story" to search only one kind
+            topic: Words that must appear in the topic/title
+            text_type: Text type filter
+            page: 1-based page number
+            per_page: Results per page
+            
+        Returns:
+            Dictionary with the total number of matches and the ranked page of results
+        """
+        self._ensure_indexes()
+        with self._index_lock:
+            return self.search_index.search(
+                query, language=language, level=level, kind=kind, topic=topic,
+                text_type=text_type, page=page, per_page=per_page
+            )
+    
+    def _bump_story_version(self, story_id: str) -> None:
+        """Record a write to a story."""
+        self._story_versions[story_id] = self._story_versions.get(story_id, 0) + 1
+        self.stories_version += 1
+    
+    def _bump_versions(self) -> None:
+        """Record a write that may have changed any history item or story."""
+        self.history_version += 1
+        self.stories_version += 1
+        for story_id in set(self._story_versions) | set(self.data.get('stories', {})):
+            self._story_versions[story_id] = self._story_versions.get(story_id, 0) + 1
+    
+    def _add_to_similarity_index(self, item: Dict[str, Any]) -> None:
+        """Add a history item (or its metadata) to the similarity index."""
+        if not storable_id(item['id']):
+            return  # Stored before ids were checked; such items are not offered for reuse
+        self.similarity_index.add(
+            item['id'],
+            item.get('topic') or '',
+            item.get('language') or '',
+            item.get('level') or '',
+            item.get('text_type') or 'General'
+        )
+    
+    def _sync_similarity_index(self) -> None:
+        """Rebuild the similarity index from history metadata unless it already covers the history."""
+        # A persisted similarity index with one record per history item is reused as is
+        if len(self.similarity_index) == self.count_history():
+            return
+        self.similarity_index.clear()
+        for entry in self.data.get('history', []):
+            self._add_to_similarity_index(entry)
+    
+    def _index_history_item(self, item: Dict[str, Any]) -> None:
+        """Add a history item to the search index."""
+        with self._index_lock:
+            if not self._indexes_ready:
+                return
+            self.search_index.add_document(
+                'history',
+                item['id'],
+                item.get('topic', ''),
+                item.get('text', ''),
+                language=item.get('language', ''),
+                level=item.get('level', ''),
+                text_type=item.get('text_type', ''),
+                timestamp=item.get('timestamp', '')
+            )
+    
+    def _index_story(self, story_id: str, story_data: Dict[str, Any]) -> None:
+        """Add a story to the search index, replacing any previous version."""
+        body = "\n\n".join(part.get('text', '') for part in story_data.get('parts', {}).values())
+        with self._index_lock:
+            if not self._indexes_ready:
+                return
+            self.search_index.add_document(
+                'story',
+                story_id,
+                story_data.get('title', story_id),
+                body,
+                language=story_data.get('language', ''),
+                level=story_data.get('level', ''),
+                timestamp=story_data.get('last_updated', '')
+            )
+    
+    def _invalidate_indexes(self) -> None:
+        """Resync the similarity index and mark the search index stale so it is rebuilt on next use."""
+        with self._index_lock:
+            self._indexes_ready = False
+            self._sync_similarity_index()
+    
+    def _ensure_indexes(self) -> None:
+        """Rebuild the search index if it is stale."""
+        with self._index_lock:
+            if self._indexes_ready:
+                return
+            self._indexes_ready = True
+            self.search_index.clear()
+            for item in self.iter_history():
+                self._index_history_item(item)
+            for story_id, story_data in self.data.get('stories', {}).items():
+                self._index_story(story_id, story_data)
+    
+    def _history_metadata(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        """Small part of a history item used for listings and log metadata."""
+        metadata = {field: item.get(field) for field in HISTORY_METADATA_FIELDS}
+        metadata['preview'] = item['preview'] if 'preview' in item else (item.get('text') or '')[:HISTORY_PREVIEW_LENGTH]
+        return metadata
+    
+    def _history_body(self, entry: Dict[str, Any]) -> Dict[str, Any]:
+        """Return the full history item for a history entry, reading it from the log if needed."""
+        if '_offset' not in entry:
+            return entry
+        with self._write_lock:
+            item = self._body_cache.get(entry['id'])
+            if item is None:
+                item = self._log.read_body(entry['_offset'])
+                self._cache_body(item)
+            else:
+                self._body_cache.move_to_end(entry['id'])
+            return item
+    
+    def _cache_body(self, item: Dict[str, Any]) -> None:
+        """Keep a decoded history body in the LRU cache."""
+        self._body_cache[item['id']] = item
+        self._body_cache.move_to_end(item['id'])
+        while len(self._body_cache) > HISTORY_BODY_CACHE_SIZE:
+            self._body_cache.popitem(last=False)
+    
+    def _reset_history_ids(self) -> None:
+        """Rebuild the id lookup for history entries."""
+        history = self.data.get('history', [])
+        for entry in history:
+            if not entry.get('id'):
+                entry['id'] = uuid.uuid4().hex
+        self._history_by_id = {entry['id']: entry for entry in history}
+    
+    def _relocate_history(self, relocate) -> None:
+        """Update history record offsets after log compaction."""
+        for entry in self.data.get('history', []):
+            if '_offset' in entry:
+                entry['_offset'] = relocate(entry['_offset'])
+    
+    def _story_records(self, story_id: str, story_data: Dict[str, Any], changed_only: bool) -> List[Any]:
+        """
+        Build the log records for a story.
+        
+        The story header is always written; parts are written only if they
+        are new or changed since they were last logged, unless changed_only is False.
+        """
+        parts = story_data.get('parts', {})
+        header = {key: value for key, value in story_data.items() if key != 'parts'}
+        records = [(OP_STORY_SAVE, {'id': story_id, 'parts': list(parts)}, header)]
+        
+        digests = self._story_digests.setdefault(story_id, {})
+        for part_key, part in parts.items():
+            digest = zlib.crc32(json.dumps(part, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+            if changed_only and digests.get(part_key) == digest:
+                continue
+            digests[part_key] = digest
+            records.append((OP_STORY_PART, {'story_id': story_id, 'part': part_key}, dict(part)))
+        return records
+    
+    def _snapshot(self) -> Snapshot:
+        """Live records for log compaction, with the log size they reflect."""
+        with self._write_lock:
+            records = [
+                entry['_offset'] if '_offset' in entry else (OP_HISTORY_ADD, self._history_metadata(entry), dict(entry))
+                for entry in self.data.get('history', [])
+            ]
+            for story_id, story_data in self.data.get('stories', {}).items():
+                records.extend(self._story_records(story_id, story_data, changed_only=False))
+            return records, self._log.size
+    
+    def _rewrite_log(self) -> None:
+        """Replace the whole log after the session data was replaced."""
+        if self._log:
+            self._log.compact(self._snapshot, on_relocate=self._relocate_history)
+    
+    def _load_from_log(self) -> None:
+        """Replay the record log into session data."""
+        history = []
+        stories = {}
+        
+        history_by_id = {}
+        for offset, op, meta in self._log.scan():
+            if op == OP_HISTORY_ADD or (op == OP_HISTORY_UPDATE and meta.get('id') not in history_by_id):
+                entry = dict(meta, _offset=offset)
+                history.append(entry)
+                history_by_id[meta.get('id')] = entry
+            elif op == OP_HISTORY_UPDATE:
+                history_by_id[meta['id']].update(meta, _offset=offset)
+            elif op == OP_HISTORY_CLEAR:
+                history = []
+                history_by_id = {}
+            elif op == OP_HISTORY_DELETE:
+                entry = history_by_id.pop(meta['id'], None)
+                if entry is not None:
+                    history.remove(entry)
+            elif op == OP_STORY_SAVE:
+                previous_parts = stories.get(meta['id'], {}).get('parts', {})
+                story = self._log.read_body(offset)
+                story['parts'] = {key: previous_parts[key] for key in meta['parts'] if key in previous_parts}
+                stories[meta['id']] = story
+            elif op == OP_STORY_PART:
+                part = self._log.read_body(offset)
+                stories[meta['story_id']]['parts'][meta['part']] = part
+                digest = zlib.crc32(json.dumps(part, sort_keys=True, ensure_ascii=False).encode('utf-8'))
+                self._story_digests.setdefault(meta['story_id'], {})[meta['part']] = digest
+            elif op == OP_STORY_DELETE:
+                stories.pop(meta['id'], None)
+                self._story_digests.pop(meta['id'], None)
+        
+        self.data['history'] = history
+        self.data['stories'] = stories
+        self._reset_history_ids()
+        self._invalidate_indexes()
@@ -0,0 +1,305 @@
+"""
+MinHash similarity index for finding near-duplicate texts by topic.
+"""
+import hashlib
+import mmap
+import os
+import re
+import struct
+import threading
+import unicodedata
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
+
+# Signature size and LSH banding (BANDS * ROWS_PER_BAND == NUM_PERMUTATIONS)
+NUM_PERMUTATIONS = 128
+BANDS = 64
+ROWS_PER_BAND = 2
+
+# Words this short are mostly articles and prepositions ("the", "der", "la")
+MIN_WORD_LENGTH = 4
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_MAX_HASH = (1 << 32) - 1
+
+# Fixed permutation parameters so signatures stay valid across restarts
+_PERMUTATIONS = [
+    (
+        int.from_bytes(hashlib.blake2b(f"a{i}".encode(), digest_size=8).digest(), "little") % _MERSENNE_PRIME or 1,
+        int.from_bytes(hashlib.blake2b(f"b{i}".encode(), digest_size=8).digest(), "little") % _MERSENNE_PRIME
+    )
+    for i in range(NUM_PERMUTATIONS)
+]
+
+# Record layout: text id, bucket hash, signature
+_RECORD = struct.Struct(f"<32sQ{NUM_PERMUTATIONS}I")
+_BUCKET_START = 32
+_SIGNATURE_START = 40
+_BAND_SIZE = 4 * ROWS_PER_BAND
+
+def _stem(word: str) -> str:
+    """Strip a plural "s" so "changes" and "change" make the same word shingle."""
+    if len(word) > MIN_WORD_LENGTH and word.isascii() and word.endswith("s") and not word.endswith("ss"):
+        return word[:-1]
+    return word
+
+def shingles(topic: str) -> Set[str]:
+    """
+    Split a topic into its content words and their character trigrams.
+
+    Word shingles keep unrelated topics that share a few letters apart
+    ("Climate change" and "Exchange students"), while trigrams let related
+    wordings overlap ("Climate change" and "The climate crisis") and cover
+    scripts written without spaces, where a whole topic is a single word.
+
+    Args:
+        topic: Topic text
+
+    Returns:
+        Set of shingles
+    """
+    normalized = unicodedata.normalize("NFKC", topic).lower()
+    words = re.findall(r"\w+", normalized)
+    content_words = [_stem(w) for w in words if len(w) >= MIN_WORD_LENGTH or not w.isascii()] or words
+
+    result = set()
+    for word in content_words:
+        result.add(f"w:{word}")
+        padded = f" {word} "
+        for i in range(max(len(padded) - 2, 1)):
+            result.add(f"c:{padded[i:i + 3]}")
+    return result
+
+def storable_id(text_id: str) -> bool:
+    """Whether a text id fits the index records (at most 32 ASCII characters)."""
+    return isinstance(text_id, str) and text_id.isascii() and 0 < len(text_id) <= 32
+
+def minhash(items: Set[str]) -> Tuple[int, ...]:
+    """
+    Compute the MinHash signature of a set of shingles.
+
+    Args:
+        items: Shingles
+
+    Returns:
+        Signature with NUM_PERMUTATIONS values
+    """
+    hashes = [
+        int.from_bytes(hashlib.blake2b(item.encode(), digest_size=8).digest(), "little")
+        for item in items
+    ]
+    if not hashes:
+        return (_MAX_HASH,) * NUM_PERMUTATIONS
+    return tuple(
+        min(((a * h + b) % _MERSENNE_PRIME) & _MAX_HASH for h in hashes)
+        for a, b in _PERMUTATIONS
+    )
+
+def _bucket_hash(language: str, level: str, text_type: str) -> int:
+    """Hash the (language, level, text type) bucket a text belongs to."""
+    key = f"{language}\x00{level}\x00{text_type}".encode()
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+class SimilarityIndex:
+    """
+    Locality-sensitive index of topic signatures.
+
+    Signatures are stored as fixed-size records in a file that is memory
+    mapped on open, so startup does not parse anything; the LSH band tables
+    of a bucket are built on its first lookup and then maintained
+    incrementally.
+    Without a path the records live in memory.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the index.
+
+        Args:
+            path: File to store signatures in, or None to keep them in memory
+        """
+        self.path = path
+        self._lock = threading.RLock()
+        self._buffer = bytearray()
+        self._mapped: Optional[mmap.mmap] = None
+        self._file = None
+        self._buckets: Optional[Dict[bytes, List[int]]] = None
+        self._bands: Dict[bytes, Dict[bytes, List[int]]] = {}
+        self._removed: Set[str] = set()
+
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            self._file = open(path, "a+b")
+            self._remap()
+
+    def __len__(self) -> int:
+        return self._record_count() - len(self._removed)
+
+    def _remap(self) -> None:
+        """Map the signature file into memory after it has grown."""
+        if self._mapped is not None:
+            self._mapped.close()
+            self._mapped = None
+        size = os.fstat(self._file.fileno()).st_size
+        if size:
+            self._mapped = mmap.mmap(self._file.fileno(), size, access=mmap.ACCESS_READ)
+
+    def _records(self):
+        """Return the buffer holding the records."""
+        if self._file is None:
+            return self._buffer
+        return self._mapped if self._mapped is not None else b""
+
+    def _record_count(self) -> int:
+        return len(self._records()) // _RECORD.size
+
+    def _read(self, number: int) -> Tuple[bytes, int, Tuple[int, ...]]:
+        """Read a record by position."""
+        values = _RECORD.unpack_from(self._records(), number * _RECORD.size)
+        return values[0], values[1], values[2:]
+
+    def _band_keys(self, record: bytes) -> List[bytes]:
+        """
+        LSH band keys of a packed record.
+
+        Keys are the raw signature bytes of each band prefixed with the band
+        number, so they can be sliced out of a record without unpacking it.
+        """
+        return [
+            bytes((band,)) + record[start:start + _BAND_SIZE]
+            for band, start in enumerate(range(_SIGNATURE_START, _RECORD.size, _BAND_SIZE))
+        ]
+
+    def _bucket_bands(self, bucket: bytes) -> Dict[bytes, List[int]]:
+        """
+        Get the band table of a bucket, building it on first use.
+
+        Only the buckets that are actually queried get band tables, which
+        keeps the first lookup after startup proportional to one bucket.
+        """
+        if self._buckets is None:
+            buckets = defaultdict(list)
+            records = self._records()
+            for number in range(len(records) // _RECORD.size):
+                start = number * _RECORD.size
+                buckets[bytes(records[start + _BUCKET_START:start + _SIGNATURE_START])].append(number)
+            self._buckets = buckets
+            self._bands = {}
+
+        bands = self._bands.get(bucket)
+        if bands is None:
+            bands = defaultdict(list)
+            records = self._records()
+            for number in self._buckets.get(bucket, ()):
+                start = number * _RECORD.size
+                for key in self._band_keys(bytes(records[start:start + _RECORD.size])):
+                    bands[key].append(number)
+            self._bands[bucket] = bands
+        return bands
+
+    def add(self, text_id: str, topic: str, language: str, level: str, text_type: str) -> None:
+        """
+        Add a text to the index.
+
+        Args:
+            text_id: Identifier of the stored text, see storable_id()
+            topic: Text topic
+            language: Text language
+            level: Language proficiency level
+            text_type: Type of text
+
+        Raises:
+            ValueError: If the id does not fit the index records
+        """
+        if not storable_id(text_id):
+            raise ValueError(f"Text id does not fit the similarity index: {text_id!r}")
+        bucket = _bucket_hash(language, level, text_type)
+        signature = minhash(shingles(topic))
+        record = _RECORD.pack(text_id.encode("ascii"), bucket, *signature)
+
+        with self._lock:
+            number = self._record_count()
+            if self._file is None:
+                self._buffer += record
+            else:
+                self._file.write(record)
+                self._file.flush()
+                self._remap()
+            self._removed.discard(text_id)
+            if self._buckets is not None:
+                bucket_key = record[_BUCKET_START:_SIGNATURE_START]
+                self._buckets[bucket_key].append(number)
+                bands = self._bands.get(bucket_key)
+                if bands is not None:
+                    for key in self._band_keys(record):
+                        bands[key].append(number)
+
+    def remove(self, text_id: str) -> None:
+        """
+        Exclude a text from future lookups.
+
+        Args:
+            text_id: Identifier of the stored text
+        """
+        with self._lock:
+            self._removed.add(text_id)
+
+    def clear(self) -> None:
+        """Remove every record."""
+        with self._lock:
+            if self._file is None:
+                self._buffer = bytearray()
+            else:
+                if self._mapped is not None:
+                    self._mapped.close()
+                    self._mapped = None
+                self._file.truncate(0)
+                self._file.flush()
+            self._buckets = None
+            self._bands = {}
+            self._removed = set()
+
+    def find_similar(
+        self,
+        topic: str,
+        language: str,
+        level: str,
+        text_type: str,
+        threshold: float,
+        limit: int = 5
+    ) -> List[Tuple[str, float]]:
+        """
+        Find stored texts with a similar topic in the same bucket.
+
+        Args:
+            topic: Topic to look up
+            language: Text language
+            level: Language proficiency level
+            text_type: Type of text
+            threshold: Minimum estimated Jaccard similarity
+            limit: Maximum number of matches
+
+        Returns:
+            List of (text id, similarity) pairs, most similar first
+        """
+        bucket = _bucket_hash(language, level, text_type)
+        signature = minhash(shingles(topic))
+        query = _RECORD.pack(b"", bucket, *signature)
+
+        with self._lock:
+            bands = self._bucket_bands(query[_BUCKET_START:_SIGNATURE_START])
+            candidates = set()
+            for key in self._band_keys(query):
+                candidates.update(bands.get(key, ()))
+
+            matches = {}
+            for number in candidates:
+                raw_id, _, stored = self._read(number)
+                text_id = raw_id.rstrip(b"\0").decode("ascii")
+                if text_id in self._removed:
+                    continue
+                similarity = sum(x == y for x, y in zip(signature, stored)) / NUM_PERMUTATIONS
+                if similarity >= threshold:
+                    matches[text_id] = max(similarity, matches.get(text_id, 0.0))
+
+        return sorted(matches.items(), key=lambda match: match[1], reverse=True)[:limit]
@@ -0,0 +1,128 @@
+"""
+Shared library of generated story parts, reused across readers.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+# (topic, language, level, choice path, digest of the part it continues)
+LibraryKey = Tuple[str, str, str, str, str]
+
+def _normalize(value: str) -> str:
+    return " ".join(value.casefold().split())
+
+def _digest(text: str) -> str:
+    return hashlib.blake2b(text.encode('utf-8'), digest_size=8).hexdigest()
+
+class StoryLibrary:
+    """
+    Cache of story parts shared by every story on the same topic.
+
+    Parts are keyed by topic, language, level and choice path, plus a digest
+    of the part they continue: readers who were shown the same beginning are
+    offered the same continuations, while a part generated after a different
+    (or regenerated) parent never follows the wrong text.
+
+    When the library is full, the least popular of the `eviction_sample`
+    least recently used parts is evicted, so a branch many readers take
+    outlives one that was read once, even if it was read longer ago.
+    """
+
+    def __init__(self, max_parts: int, eviction_sample: int):
+        """
+        Initialize an empty library.
+
+        Args:
+            max_parts: Parts kept before the library starts evicting
+            eviction_sample: Least recently used parts compared by popularity per eviction
+        """
+        self.max_parts = max_parts
+        self.eviction_sample = max(eviction_sample, 1)
+        self._lock = threading.Lock()
+        # Key -> [part data, times served], least recently used first
+        self._parts: "OrderedDict[LibraryKey, list]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def key(topic: str, language: str, level: str, path: str, parent_text: str = "") -> LibraryKey:
+        """
+        Build the library key of a story part.
+
+        Args:
+            topic: Story topic or title
+            language: Story language
+            level: Language proficiency level
+            path: Choice path of the part
+            parent_text: Text of the part it continues, "" for the beginning
+
+        Returns:
+            Library key
+        """
+        return (_normalize(topic), language, level, path, _digest(parent_text) if path else "")
+
+    def get(self, key: LibraryKey) -> Optional[Dict[str, Any]]:
+        """
+        Get a part generated for another reader, counting it as served.
+
+        Args:
+            key: Library key of the part
+
+        Returns:
+            Copy of the part data, or None if the library has no such part
+        """
+        with self._lock:
+            entry = self._parts.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            entry[1] += 1
+            self._parts.move_to_end(key)
+            self.hits += 1
+            return dict(entry[0])
+
+    def put(self, key: LibraryKey, part: Dict[str, Any]) -> None:
+        """
+        Add a newly generated part, replacing any part with the same key.
+
+        Args:
+            key: Library key of the part
+            part: Part data
+        """
+        with self._lock:
+            self._parts[key] = [dict(part), 1]
+            self._parts.move_to_end(key)
+            while len(self._parts) > self.max_parts:
+                self._evict()
+
+    def _evict(self) -> None:
+        """Remove the least popular of the least recently used parts."""
+        candidates = []
+        for key, entry in self._parts.items():
+            candidates.append((entry[1], len(candidates), key))
+            if len(candidates) >= self.eviction_sample:
+                break
+        _, _, key = min(candidates)
+        del self._parts[key]
+        self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._parts)
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Describe the library for monitoring.
+
+        Returns:
+            Dictionary with the number of parts, hits, misses and evictions
+        """
+        with self._lock:
+            return {
+                "parts": len(self._parts),
+                "max_parts": self.max_parts,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions
+            }
@@ -0,0 +1,78 @@
+"""
+Tests for batched enrichment of stored texts.
+"""
+import json
+import time
+
+import core.batch_enrichment as batch_enrichment
+from api.budget import Budget
+from api.token_ledger import QuotaExceeded
+from config.settings import BATCH_ENRICHMENT_MAX_ITEMS
+from core.batch_enrichment import enrich_batch, enrich_texts, plan_batches, validate_fields
+
+def _item(text_id, language="English", level="B1", text="A short text."):
+    return {'id': text_id, 'topic': text_id, 'text': text, 'language': language, 'level': level}
+
+def _run(steps, responses):
+    """Drive step functions with canned API responses; return the result and the prompts asked."""
+    responses = list(responses)
+    prompts = []
+    try:
+        request = next(steps)
+        while True:
+            prompts.append(request)
+            request = steps.send(responses.pop(0) if responses else None)
+    except StopIteration as stop:
+        return stop.value, prompts
+
+def test_validate_fields():
+    assert validate_fields('summary', "  Gist. ") == {'summary': "Gist."}
+    assert validate_fields('summary', "") is None
+    assert validate_fields('key_words', [{'word': "Haus", 'definition': "house"}]) == {
+        'key_words': [{'word': "Haus", 'definition': "house"}]
+    }
+    assert validate_fields('key_words', [{'word': "Haus"}]) is None
+    questions = [{'question': "Why?", 'answer': "Because."}]
+    assert validate_fields('questions', {'questions': questions}) == {'questions': questions}
+    assert validate_fields('questions', questions) == {'questions': questions}
+    assert validate_fields('questions', []) is None
+
+def test_batches_group_by_language_and_level():
+    items = [_item("a"), _item("b", level="C1"), _item("c"), _item("d", language="German")]
+    batches = plan_batches('summary', items)
+    assert sorted([item['id'] for item in batch] for batch in batches) == [["a", "c"], ["b"], ["d"]]
+
+def test_batches_respect_item_limit():
+    items = [_item(str(number)) for number in range(BATCH_ENRICHMENT_MAX_ITEMS * 2 + 1)]
+    batches = plan_batches('summary', items)
+    assert [len(batch) for batch in batches] == [BATCH_ENRICHMENT_MAX_ITEMS, BATCH_ENRICHMENT_MAX_ITEMS, 1]
+    assert [item for batch in batches for item in batch] == items
+
+def test_missing_and_malformed_answers_are_retried_alone():
+    batch = [_item("a"), _item("b"), _item("c")]
+    answer = json.dumps([
+        {'id': "t1", 'summary': "Summary of a."},
+        {'id': "t2", 'summary': ""},
+        {'id': "t9", 'summary': "Unknown text."}
+    ])
+    results, prompts = _run(enrich_batch.steps('summary', batch), [answer, "Summary of b.", None])
+    assert len(prompts) == 3
+    assert results == {'a': {'summary': "Summary of a."}, 'b': {'summary': "Summary of b."}}
+
+def test_quota_is_checked_before_each_batch(monkeypatch):
+    checks = []
+    def check_quota(session):
+        checks.append(session)
+        if len(checks) > 1:
+            raise QuotaExceeded(30)
+    monkeypatch.setattr(batch_enrichment.token_ledger, 'check_quota', check_quota)
+    monkeypatch.setattr(batch_enrichment, 'BATCH_ENRICHMENT_WORKERS', 1)
+    monkeypatch.setattr(batch_enrichment, 'run_steps', lambda steps, budget: _run(steps, ["Done."])[0])
+
+    items = [_item("a"), _item("b", level="C1")]
+    saved = []
+    results = enrich_texts('summary', items, Budget(time.monotonic() + 10, session="client"),
+                           on_result=lambda text_id, fields: saved.append(text_id))
+    assert checks == ["client", "client"]
+    assert results == {'a': {'summary': "Done."}}
+    assert saved == ["a"]
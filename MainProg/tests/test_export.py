@@ -0,0 +1,91 @@
+"""
+Tests for worksheet exports and streamed export packs.
+"""
+import io
+import os
+import zipfile
+
+import pytest
+
+import core.export as export
+from core.export import export_document, export_pack, file_name, render, text_document
+
+ITEM = {
+    'id': "t1",
+    'topic': "Der Wal & das Meer",
+    'text': "Der Wal schwimmt.\nDas Meer ist tief.",
+    'language': "German",
+    'level': "B1",
+    'questions': [{'question': "Wo schwimmt der Wal?", 'answer': "Im Meer."}]
+}
+
+@pytest.fixture(autouse=True)
+def pool(monkeypatch):
+    monkeypatch.setattr(export, 'EXPORT_START_METHOD', 'fork')
+    export.shutdown()
+    yield
+    export.shutdown()
+
+def _item(topic):
+    return dict(ITEM, id=topic, topic=topic)
+
+def _pack(documents, fmt='html'):
+    return zipfile.ZipFile(io.BytesIO(b"".join(export_pack(documents, fmt))))
+
+def _crash_once(kind, data, fmt, options=None):
+    """Renderer that kills its process on a document whose marker file exists, once, and fails on "broken"."""
+    marker = data.get('marker')
+    if marker and os.path.exists(marker):
+        os.remove(marker)
+        os._exit(1)
+    if data['topic'] == "broken":
+        raise ValueError("cannot render")
+    return render(kind, data, fmt, options)
+
+def test_text_document_with_answer_key():
+    document = text_document(ITEM)
+    headings = [section['heading'] for section in document['sections']]
+    assert headings == ["Text", "Comprehension questions", "Answer key: comprehension questions"]
+    assert document['sections'][-1]['page_break']
+    assert "Answer key: comprehension questions" not in [
+        section['heading'] for section in text_document(ITEM, answers=False)['sections']
+    ]
+
+def test_file_name():
+    assert file_name('text', ITEM, 'docx') == "der-wal-das-meer.docx"
+    assert file_name('story', {'title': "!!!"}, 'html') == "story.html"
+
+def test_render_html_and_docx():
+    html = export_document('text', ITEM, 'html').decode("utf-8")
+    assert "Der Wal &amp; das Meer" in html
+    assert "Im Meer." in html
+
+    package = zipfile.ZipFile(io.BytesIO(render('text', ITEM, 'docx')))
+    assert "Wo schwimmt der Wal?" in package.read('word/document.xml').decode("utf-8")
+
+def test_pack_names_and_missing_documents():
+    archive = _pack([('text', ITEM), ('text', None), ('text', ITEM)] + [('text', _item(f"text {n}")) for n in range(6)])
+    assert archive.testzip() is None
+    assert archive.namelist() == (
+        ["der-wal-das-meer.html", "der-wal-das-meer-2.html"]
+        + [f"text-{n}.html" for n in range(6)]
+        + ["MISSING.txt"]
+    )
+
+def test_pack_survives_failed_documents(monkeypatch, tmp_path):
+    marker = str(tmp_path / "crash")
+    open(marker, "w").close()
+    monkeypatch.setattr(export, 'render', _crash_once)
+    documents = [('text', _item(f"text {n}")) for n in range(3)]
+    documents += [('text', dict(_item("crash"), marker=marker)), ('text', _item("broken"))]
+    documents += [('text', _item(f"late {n}")) for n in range(4)]
+
+    archive = _pack(documents)
+    assert archive.testzip() is None
+    assert archive.namelist() == (
+        [f"text-{n}.html" for n in range(3)]
+        + ["crash.html", "ERROR-broken.txt"]
+        + [f"late-{n}.html" for n in range(4)]
+    )
+    assert "ValueError" in archive.read("ERROR-broken.txt").decode("utf-8")
+    assert not os.path.exists(marker)
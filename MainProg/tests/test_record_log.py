@@ -0,0 +1,122 @@
+"""
+Tests for the append-only record log, its compaction and recovery.
+"""
+import os
+
+import pytest
+
+from storage.record_log import MAGIC, OP_HISTORY_ADD, OP_HISTORY_DELETE, OP_STORY_SAVE, RecordLog
+
+def _records(log):
+    return [(op, meta, log.read_body(offset)) for offset, op, meta in log.scan()]
+
+@pytest.fixture
+def log_path(tmp_path):
+    return str(tmp_path / "session.log")
+
+def test_append_and_reopen(log_path):
+    log = RecordLog(log_path, fsync=False)
+    first = log.append(OP_HISTORY_ADD, {"id": "a"}, {"text": "Erste Seite"})
+    second = log.append(OP_STORY_SAVE, {"id": "s"})
+    log.close()
+
+    assert first == len(MAGIC)
+    assert second > first
+    log = RecordLog(log_path, fsync=False)
+    assert _records(log) == [
+        (OP_HISTORY_ADD, {"id": "a"}, {"text": "Erste Seite"}),
+        (OP_STORY_SAVE, {"id": "s"}, None)
+    ]
+    log.close()
+
+def test_torn_tail_is_truncated(log_path):
+    log = RecordLog(log_path, fsync=False)
+    log.append(OP_HISTORY_ADD, {"id": "a"}, {"text": "kept"})
+    end = log.size
+    log.append(OP_HISTORY_ADD, {"id": "b"}, {"text": "torn"})
+    log.close()
+    with open(log_path, "r+b") as f:
+        f.truncate(os.path.getsize(log_path) - 3)
+
+    log = RecordLog(log_path, fsync=False)
+    assert [meta["id"] for _, _, meta in log.scan()] == ["a"]
+    assert log.size == end
+    log.close()
+
+def test_compaction_relocates_copied_records(log_path):
+    log = RecordLog(log_path, fsync=False)
+    offsets = {}
+    for number in range(20):
+        text_id = f"t{number}"
+        offsets[text_id] = log.append(OP_HISTORY_ADD, {"id": text_id}, {"text": "word " * 50 + text_id})
+    for number in range(0, 20, 2):
+        log.append(OP_HISTORY_DELETE, {"id": f"t{number}"})
+    live = {text_id: offset for text_id, offset in offsets.items() if int(text_id[1:]) % 2}
+    size_before = log.size
+
+    # A record appended between the snapshot and the swap must survive
+    def snapshot():
+        records = list(live.values()) + [(OP_STORY_SAVE, {"id": "story"}, {"title": "Neu"})]
+        start = log.size
+        live["late"] = log.append(OP_HISTORY_ADD, {"id": "late"}, {"text": "appended during compaction"})
+        return records, start
+
+    relocated = {}
+    def on_relocate(relocate):
+        relocated.update({text_id: relocate(offset) for text_id, offset in live.items()})
+
+    log.compact(snapshot, on_relocate)
+
+    assert log.size < size_before
+    for text_id, offset in relocated.items():
+        body = log.read_body(offset)
+        assert body["text"].endswith(text_id) or text_id == "late"
+    assert log.read_body(relocated["late"]) == {"text": "appended during compaction"}
+    assert not log.needs_compaction(0)
+    log.close()
+
+    log = RecordLog(log_path, fsync=False)
+    ids = [meta["id"] for _, op, meta in log.scan() if op == OP_HISTORY_ADD]
+    assert ids == [f"t{number}" for number in range(1, 20, 2)] + ["late"]
+    assert dict((meta["id"], offset) for offset, op, meta in log.scan() if op == OP_HISTORY_ADD) == relocated
+    assert (OP_STORY_SAVE, {"id": "story"}, {"title": "Neu"}) in _records(log)
+    log.close()
+
+def test_needs_compaction_after_growth(log_path):
+    log = RecordLog(log_path, fsync=False)
+    assert not log.needs_compaction(1)
+    log.append(OP_HISTORY_ADD, {"id": "a"}, {"text": "x" * 100})
+    assert log.needs_compaction(1)
+    assert not log.needs_compaction(10 ** 6)
+    log.close()
+
+def test_not_a_record_log(log_path):
+    with open(log_path, "wb") as f:
+        f.write(b"something else")
+    log = RecordLog(log_path, fsync=False)
+    with pytest.raises(ValueError):
+        list(log.scan())
+    log.close()
+
+def test_session_history_survives_compaction_and_reopen(log_path):
+    from storage.session_manager import SessionManager
+
+    manager = SessionManager("log", log_path=log_path)
+    for number in range(6):
+        manager.add_to_history({"id": f"t{number}", "topic": f"Topic {number}", "text": f"Text {number}",
+                                "language": "English", "level": "B1"})
+    manager.delete_history_item("t2")
+    manager.update_history_item("t4", {"summary": "Short"})
+    manager._log.compact(manager._snapshot, on_relocate=manager._relocate_history)
+
+    # Bodies must come from the relocated records, not the cache
+    manager._body_cache.clear()
+    assert manager.get_history_item("t5")["text"] == "Text 5"
+    assert manager.get_history_item("t4")["summary"] == "Short"
+    manager._log.close()
+
+    manager = SessionManager("log", log_path=log_path)
+    assert [item["id"] for item in manager.iter_history()] == ["t0", "t1", "t3", "t4", "t5"]
+    assert manager.get_history_item("t4")["summary"] == "Short"
+    assert manager.get_history_item("t2") is None
+    manager._log.close()
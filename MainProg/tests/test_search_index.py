@@ -0,0 +1,71 @@
+"""
+Tests for the full-text search index.
+"""
+import pytest
+
+from storage.search_index import SearchIndex, tokenize
+
+@pytest.fixture
+def index():
+    index = SearchIndex()
+    index.add_document("history", "h1", "The ocean", "Whales live in the ocean. The ocean is deep.", "English", "B1", "General")
+    index.add_document("history", "h2", "Mountains", "The ocean is far from the mountains.", "English", "A2", "General")
+    index.add_document("history", "h3", "Cooking", "The kitchen smells of bread.", "English", "B1", "Dialogue")
+    index.add_document("story", "s1", "Der Ozean", "Der Wal schwimmt im Ozean.", "German", "B1")
+    index.add_document("history", "j1", "東京の天気", "今日は東京で雨が降っています。", "Japanese", "N4")
+    return index
+
+def _ids(result):
+    return [item["id"] for item in result["results"]]
+
+def test_ranks_topic_and_frequent_matches_first(index):
+    result = index.search("ocean")
+    assert result["total"] == 2
+    assert _ids(result) == ["h1", "h2"]
+    assert result["results"][0]["score"] > result["results"][1]["score"]
+
+def test_all_terms_must_match(index):
+    assert _ids(index.search("ocean whales")) == ["h1"]
+    assert index.search("ocean bread")["total"] == 0
+
+def test_stopwords_are_dropped(index):
+    assert _ids(index.search("the ocean")) == _ids(index.search("ocean"))
+    # Only stopwords: every document, newest first
+    assert _ids(index.search("the", language="English")) == ["h3", "h2", "h1"]
+    assert index.search("the")["total"] == len(index)
+
+def test_filters(index):
+    assert _ids(index.search(level="B1", kind="history")) == ["h3", "h1"]
+    assert _ids(index.search(text_type="Dialogue")) == ["h3"]
+    assert _ids(index.search("ozean", language="German")) == ["s1"]
+    assert _ids(index.search(topic="mountains")) == ["h2"]
+
+def test_japanese_bigrams_and_single_characters(index):
+    assert tokenize("東京都", "Japanese") == ["東京", "京都"]
+    assert _ids(index.search("東京", language="Japanese")) == ["j1"]
+    assert _ids(index.search("雨", language="Japanese")) == ["j1"]
+    assert index.search("猫", language="Japanese")["total"] == 0
+
+def test_width_and_case_are_normalized(index):
+    assert _ids(index.search("ＯＣＥＡＮ whales")) == ["h1"]
+
+def test_replace_and_remove(index):
+    index.add_document("history", "h1", "Deserts", "Sand everywhere.", "English", "B1")
+    assert _ids(index.search("ocean")) == ["h2"]
+    assert _ids(index.search("sand")) == ["h1"]
+
+    assert index.remove_document("history", "j1")
+    assert not index.remove_document("history", "j1")
+    assert index.search("雨", language="Japanese")["total"] == 0
+    assert not index.cjk_terms
+
+    index.remove_kind("story")
+    assert index.search("ozean")["total"] == 0
+    assert len(index) == 3
+
+def test_pagination(index):
+    first = index.search("the", per_page=2)
+    second = index.search("the", page=2, per_page=2)
+    assert len(first["results"]) == 2
+    assert not set(_ids(first)) & set(_ids(second))
+    assert first["total"] == second["total"] == len(index)
@@ -0,0 +1,73 @@
+"""
+Tests for the topic similarity index.
+"""
+import pytest
+
+from config.settings import REUSE_SIMILARITY_THRESHOLD, SIMILARITY_THRESHOLD
+from storage.similarity_index import SimilarityIndex, shingles, storable_id
+
+BUCKET = ("English", "B1", "General")
+
+def _similar(index, topic, threshold=SIMILARITY_THRESHOLD, bucket=BUCKET):
+    return dict(index.find_similar(topic, *bucket, threshold=threshold))
+
+@pytest.fixture
+def index():
+    index = SimilarityIndex()
+    index.add("climate", "Climate change", *BUCKET)
+    index.add("paris", "A weekend in Paris", *BUCKET)
+    index.add("cooking", "Cooking Italian pasta", *BUCKET)
+    return index
+
+def test_shingles_ignore_stopwords_and_plurals():
+    assert shingles("The climate changes") == shingles("climate change")
+    assert "w:climate" in shingles("Climate")
+
+def test_related_topics_match(index):
+    assert _similar(index, "climate changes")["climate"] == 1.0
+    assert "climate" in _similar(index, "The climate crisis")
+    assert "paris" in _similar(index, "Weekend trip to Paris")
+
+def test_unrelated_topics_do_not_match(index):
+    assert "climate" not in _similar(index, "Exchange students")
+    assert not _similar(index, "Football results")
+
+def test_reuse_threshold_is_strict(index):
+    assert list(_similar(index, "Climate change", REUSE_SIMILARITY_THRESHOLD)) == ["climate"]
+    assert not _similar(index, "The climate crisis", REUSE_SIMILARITY_THRESHOLD)
+
+def test_buckets_are_separate(index):
+    assert not _similar(index, "Climate change", bucket=("German", "B1", "General"))
+    assert not _similar(index, "Climate change", bucket=("English", "C1", "General"))
+
+def test_remove(index):
+    index.remove("climate")
+    assert "climate" not in _similar(index, "Climate change")
+    assert len(index) == 2
+    index.add("climate", "Climate change", *BUCKET)
+    assert "climate" in _similar(index, "Climate change")
+
+def test_ids_are_checked():
+    assert storable_id("a" * 32)
+    assert not storable_id("a" * 33)
+    assert not storable_id("thème")
+    with pytest.raises(ValueError):
+        SimilarityIndex().add("thème", "Climate change", *BUCKET)
+
+def test_file_index_persists(tmp_path):
+    path = str(tmp_path / "similarity.idx")
+    index = SimilarityIndex(path)
+    index.add("climate", "Climate change", *BUCKET)
+    assert "climate" in _similar(index, "Climate change")
+    # Added after the band tables were built
+    index.add("ocean", "Life in the ocean", *BUCKET)
+    assert "ocean" in _similar(index, "Ocean life")
+
+    reopened = SimilarityIndex(path)
+    assert len(reopened) == 2
+    assert _similar(reopened, "Climate change") == {"climate": 1.0}
+    assert "ocean" in _similar(reopened, "Ocean life")
+
+    reopened.clear()
+    assert len(reopened) == 0
+    assert not _similar(reopened, "Climate change")
@@ -0,0 +1,68 @@
+"""
+Tests for text validation and paragraph-level repair.
+"""
+from core.text_validator import validate_and_repair, validate_text
+
+def _sentences(count, words=10):
+    return " ".join(" ".join(["word"] * words) + "." for _ in range(count))
+
+def _run(responses, *args, **kwargs):
+    """Drive the repair steps with canned API responses; return the text and the number of calls."""
+    steps = validate_and_repair.steps(*args, **kwargs)
+    responses = list(responses)
+    calls = 0
+    try:
+        next(steps)
+        while True:
+            calls += 1
+            steps.send(responses.pop(0) if responses else None)
+    except StopIteration as stop:
+        return stop.value, calls
+
+def test_on_target_text_is_not_repaired():
+    text = _sentences(10)
+    assert validate_text(text, "English", "B1-B2", 100) == {
+        "word_count": 100,
+        "target_word_count": 100,
+        "average_sentence_length": 10.0,
+        "length_issue": None,
+        "level_issue": None,
+        "distance": 0,
+        "ok": True
+    }
+    assert _run([], text, "Topic", "English", "B1-B2", 100) == (text, 0)
+
+def test_short_paragraph_is_expanded():
+    text = _sentences(4) + "\n\n" + _sentences(2)
+    repaired, calls = _run([_sentences(6)], text, "Topic", "English", "B1-B2", 100)
+    assert calls == 1
+    assert repaired == _sentences(4) + "\n\n" + _sentences(6)
+    assert validate_text(repaired, "English", "B1-B2", 100)["ok"]
+
+def test_worse_rewrite_is_rejected():
+    text = _sentences(5) + "\n\n" + _sentences(3)
+    # The first rewrite shortens the text further, the second one fixes it
+    repaired, calls = _run([_sentences(1), _sentences(6)], text, "Topic", "English", "B1-B2", 100)
+    assert calls == 2
+    assert repaired == _sentences(5) + "\n\n" + _sentences(6)
+
+def test_best_candidate_is_kept_when_rounds_run_out():
+    text = _sentences(5) + "\n\n" + _sentences(3)
+    repaired, calls = _run([_sentences(1), _sentences(2)], text, "Topic", "English", "B1-B2", 100)
+    assert calls == 2
+    assert repaired == text
+
+def test_empty_rewrite_stops_repairs():
+    text = _sentences(4)
+    assert _run([" "], text, "Topic", "English", "B1-B2", 100) == (text, 1)
+
+def test_empty_text_makes_no_calls():
+    assert _run([], "\n\n", "Topic", "English", "B1-B2", 100) == ("\n\n", 0)
+
+def test_dialogues_may_have_short_sentences():
+    text = "\n".join(["Anna: Hello there, Tom.", "Tom: Hi! How are you?"] * 10)
+    assert validate_text(text, "English", "B1-B2", 100)["level_issue"] == "too_simple"
+    report = validate_text(text, "English", "B1-B2", 100, text_type="Dialogue")
+    assert report["level_issue"] is None
+    assert report["ok"]
+    assert _run([], text, "Topic", "English", "B1-B2", 100, text_type="Dialogue") == (text, 0)
@@ -0,0 +1,84 @@
+"""
+Tests for API usage accounting and per-session quotas.
+"""
+import json
+
+import pytest
+
+import api.token_ledger
+from api.token_ledger import QuotaExceeded, TokenLedger
+
+class Clock:
+    """Stand-in for time.monotonic that only moves when told to."""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(api.token_ledger.time, 'monotonic', clock)
+    return clock
+
+def _ledger(path=None, quota_tokens=0, quota_calls=0):
+    return TokenLedger(path, flush_size=100, flush_interval=3600, quota_window=300,
+                       quota_tokens=quota_tokens, quota_calls=quota_calls)
+
+def test_token_quota_window(clock):
+    ledger = _ledger(quota_tokens=1000)
+    ledger.record("text", "gpt-3.5-turbo", 1.0, 600, 300, session="a")
+    ledger.check_quota("a")
+    clock.now += 90
+    ledger.record("text", "gpt-3.5-turbo", 1.0, 100, 0, session="a")
+    with pytest.raises(QuotaExceeded) as error:
+        ledger.check_quota("a")
+    # Retry once the first bucket has left the window
+    assert error.value.retry_after == pytest.approx(210)
+    ledger.check_quota("b")
+    ledger.check_quota(None)
+
+    clock.now += 210
+    ledger.check_quota("a")
+    assert ledger.quota_status("a")["tokens"] == 100
+
+def test_call_quota_ignores_cached_responses(clock):
+    ledger = _ledger(quota_calls=2)
+    ledger.record("summary", "gpt-3.5-turbo", 0.5, 10, 10, session="a")
+    ledger.record("summary", "gpt-3.5-turbo", 0.0, 10, 10, session="a", cached=True)
+    ledger.check_quota("a")
+    ledger.record("summary", "gpt-3.5-turbo", 0.5, 10, 10, session="a")
+    with pytest.raises(QuotaExceeded):
+        ledger.check_quota("a")
+    assert ledger.quota_status("a") == {
+        "window": 300, "tokens": 40, "calls": 2, "token_limit": None, "call_limit": 2
+    }
+
+def test_no_quota_by_default(clock):
+    ledger = _ledger()
+    for _ in range(50):
+        ledger.record("text", "gpt-3.5-turbo", 1.0, 5000, 5000, session="a")
+    ledger.check_quota("a")
+
+def test_report_and_flush(tmp_path, clock):
+    path = str(tmp_path / "ledger.jsonl")
+    ledger = _ledger(path)
+    ledger.record("text", "gpt-3.5-turbo", 2.0, 100, 50, endpoint="/api/generate-text", session="a")
+    ledger.record("summary", "gpt-3.5-turbo", 0.0, 20, 10, session="b", cached=True)
+    ledger.record("summary", "gpt-3.5-turbo", 1.0, 0, 0, session="b", failed=True)
+
+    report = ledger.report()
+    assert report["totals"]["calls"] == 3
+    assert report["totals"]["tokens"] == 180
+    assert report["totals"]["average_latency"] == 1.5
+    assert report["by_task"]["summary"]["cached"] == 1
+    assert report["by_task"]["summary"]["failed"] == 1
+    assert list(report["by_session"]) == ["a", "b"]
+
+    ledger.flush()
+    with open(path, encoding="utf-8") as f:
+        entries = [json.loads(line) for line in f]
+    assert [entry["task"] for entry in entries] == ["text", "summary", "summary"]
+    assert entries[0]["endpoint"] == "/api/generate-text"
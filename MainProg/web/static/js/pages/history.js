@@ -0,0 +1,1025 @@
+/**
+ * History page: browsing, viewing and managing saved texts and stories
+ */
+
+// Listing pages requested from the API at a time
+const PAGE_SIZE = 50;
+
+// Listing pages kept in memory; pages furthest from the one just loaded are dropped
+const MAX_CACHED_PAGES = 8;
+
+// Rows rendered above and below the visible ones
+const OVERSCAN_ROWS = 3;
+
+// Row height used until a rendered row has been measured
+const DEFAULT_ROW_HEIGHT = 314;
+
+// Current selected item
+let currentViewingItem = null;
+let currentActionCallback = null;
+
+// Virtualized lists of the two tabs
+let textsList = null;
+let storiesList = null;
+
+/**
+ * Card grid that only renders the rows in view.
+ *
+ * Items are fetched a page at a time from a listing API returning the page
+ * under `key` and the number of items as `total`, so the DOM and the cached
+ * data stay the same size however long the list is.
+ */
+class VirtualGrid {
+    constructor(options) {
+        this.container = $(options.container);
+        this.rows = this.container.find('.virtual-rows');
+        this.emptyState = $(options.emptyState);
+        this.url = options.url;
+        this.params = options.params || {};
+        this.key = options.key;
+        this.renderItem = options.renderItem;
+        this.pages = new Map();
+        this.total = null;
+        this.rowHeight = DEFAULT_ROW_HEIGHT;
+        this.renderedRange = null;
+        this.frame = null;
+    }
+
+    // Columns of the grid, matching row-cols-1 row-cols-md-2
+    columns() {
+        return window.matchMedia('(min-width: 768px)').matches ? 2 : 1;
+    }
+
+    // Drop every cached page and reload what is in view
+    reset() {
+        this.pages.clear();
+        this.total = null;
+        this.renderedRange = null;
+        this.schedule();
+    }
+
+    // Render on the next animation frame, at most once per frame
+    schedule() {
+        if (this.frame === null) {
+            this.frame = requestAnimationFrame(() => {
+                this.frame = null;
+                this.render();
+            });
+        }
+    }
+
+    loadPage(page) {
+        if (this.pages.has(page)) return;
+        this.pages.set(page, null);  // Pending
+
+        $.ajax({
+            url: this.url,
+            method: 'GET',
+            data: Object.assign({ offset: page * PAGE_SIZE, limit: PAGE_SIZE }, this.params),
+            success: (response) => {
+                if (!response.success) {
+                    this.pages.delete(page);
+                    showCustomAlert('Error loading history: ' + (response.error || 'Unknown error'), 'danger');
+                    return;
+                }
+                this.pages.set(page, response[this.key]);
+                this.total = response.total;
+                this.evictPages(page);
+                this.renderedRange = null;
+                this.schedule();
+            },
+            error: (xhr, status, error) => {
+                this.pages.delete(page);
+                showCustomAlert('Failed to load history. Please try again.', 'danger');
+                console.error(error);
+            }
+        });
+    }
+
+    evictPages(currentPage) {
+        const loaded = [...this.pages.keys()].filter(page => this.pages.get(page) !== null);
+        loaded.sort((a, b) => Math.abs(b - currentPage) - Math.abs(a - currentPage));
+        while (loaded.length > MAX_CACHED_PAGES) {
+            this.pages.delete(loaded.shift());
+        }
+    }
+
+    itemAt(index) {
+        const page = Math.floor(index / PAGE_SIZE);
+        if (!this.pages.has(page)) {
+            this.loadPage(page);
+        }
+        const items = this.pages.get(page);
+        return items ? items[index % PAGE_SIZE] : null;
+    }
+
+    render() {
+        // Hidden tabs have no layout; they are rendered when shown
+        if (!this.container.closest('.tab-pane').hasClass('active')) return;
+
+        if (this.total === null) {
+            this.loadPage(0);
+            return;
+        }
+
+        this.emptyState.toggleClass('d-none', this.total > 0);
+        this.container.toggleClass('d-none', this.total === 0);
+        if (this.total === 0) return;
+
+        const columns = this.columns();
+        const rowCount = Math.ceil(this.total / columns);
+        const top = this.container.offset().top;
+        const scrollTop = window.scrollY;
+        const firstRow = Math.max(0, Math.floor((scrollTop - top) / this.rowHeight) - OVERSCAN_ROWS);
+        const lastRow = Math.min(rowCount, Math.ceil((scrollTop + window.innerHeight - top) / this.rowHeight) + OVERSCAN_ROWS);
+
+        const range = `${firstRow}:${lastRow}:${columns}:${this.total}:${this.rowHeight}`;
+        if (range === this.renderedRange) return;
+        this.renderedRange = range;
+
+        let html = '';
+        const end = Math.min(this.total, lastRow * columns);
+        for (let index = firstRow * columns; index < end; index++) {
+            const item = this.itemAt(index);
+            html += `<div class="col">${item ? this.renderItem(item) : placeholderCard()}</div>`;
+        }
+        this.container.css('height', rowCount * this.rowHeight);
+        this.rows.css('transform', `translateY(${firstRow * this.rowHeight}px)`).html(html);
+
+        // Rows are as tall as a card plus the gutter above it
+        const measured = this.rows.children('.col').first().outerHeight(true);
+        if (measured && Math.abs(measured - this.rowHeight) >= 1) {
+            this.rowHeight = measured;
+            this.renderedRange = null;
+            this.schedule();
+        }
+    }
+}
+
+// Escape text for insertion into HTML
+function escapeHtml(value) {
+    return String(value ?? '').replace(/[&<>"']/g, ch => ({
+        '&': '&amp;', '<': '&lt;', '>': '&gt;', '"': '&quot;', "'": '&#39;'
+    })[ch]);
+}
+
+// Card shown while its page is loading
+function placeholderCard() {
+    return `
+        <div class="card history-card placeholder-glow">
+            <div class="card-body">
+                <h5 class="card-title"><span class="placeholder col-8"></span></h5>
+                <p class="history-date"><span class="placeholder col-4"></span></p>
+                <p><span class="placeholder col-6"></span></p>
+                <p><span class="placeholder col-12"></span><span class="placeholder col-10"></span></p>
+            </div>
+        </div>
+    `;
+}
+
+// Card of a history text, from its listing metadata
+function textCard(item) {
+    const id = escapeHtml(item.id);
+    return `
+        <div class="card history-card" data-id="${id}" data-type="text">
+            <div class="card-body">
+                <h5 class="card-title text-truncate">${escapeHtml(item.topic)}</h5>
+                <p class="history-date">
+                    <i class="fas fa-calendar-alt me-1"></i>${escapeHtml(item.timestamp)}
+                </p>
+                <p class="history-languages">
+                    <span class="badge bg-primary">${escapeHtml(item.language)}</span>
+                    <span class="badge bg-secondary">${escapeHtml(item.level)}</span>
+                    ${item.text_type && item.text_type !== 'General' ? `<span class="badge bg-info">${escapeHtml(item.text_type)}</span>` : ''}
+                </p>
+                <div class="history-preview">
+                    ${escapeHtml(item.preview)}
+                </div>
+            </div>
+            <div class="card-footer d-flex justify-content-between">
+                <button class="btn btn-sm btn-outline-primary view-text-btn" data-id="${id}">
+                    <i class="fas fa-eye me-1"></i>View
+                </button>
+                <button class="btn btn-sm btn-outline-danger delete-text-btn" data-id="${id}">
+                    <i class="fas fa-trash me-1"></i>Delete
+                </button>
+            </div>
+        </div>
+    `;
+}
+
+// Card of a story, from its listing metadata
+function storyCard(story) {
+    const id = escapeHtml(story.id);
+    return `
+        <div class="card history-card" data-id="${id}" data-type="story">
+            <div class="card-body">
+                <h5 class="card-title text-truncate">${escapeHtml(story.title)}</h5>
+                <p class="history-date">
+                    <i class="fas fa-calendar-alt me-1"></i>${escapeHtml(story.last_updated)}
+                </p>
+                <p class="history-languages">
+                    <span class="badge bg-primary">${escapeHtml(story.language)}</span>
+                    <span class="badge bg-secondary">${escapeHtml(story.level)}</span>
+                    <span class="badge bg-info">Parts: ${escapeHtml(story.parts_count)}</span>
+                    ${story.is_complete ? '<span class="badge bg-success">Completed</span>' : '<span class="badge bg-warning">In Progress</span>'}
+                </p>
+            </div>
+            <div class="card-footer d-flex justify-content-between">
+                ${story.is_complete ? `
+                <button class="btn btn-sm btn-outline-primary view-story-btn" data-id="${id}">
+                    <i class="fas fa-eye me-1"></i>View
+                </button>` : `
+                <button class="btn btn-sm btn-outline-primary continue-story-btn" data-id="${id}">
+                    <i class="fas fa-play me-1"></i>Continue
+                </button>`}
+                <button class="btn btn-sm btn-outline-danger delete-story-btn" data-id="${id}">
+                    <i class="fas fa-trash me-1"></i>Delete
+                </button>
+            </div>
+        </div>
+    `;
+}
+
+$(document).ready(function() {
+    textsList = new VirtualGrid({
+        container: '#textsList',
+        emptyState: '#textsEmpty',
+        url: '/api/get-history',
+        params: { metadata_only: true },
+        key: 'history',
+        renderItem: textCard
+    });
+    storiesList = new VirtualGrid({
+        container: '#storiesList',
+        emptyState: '#storiesEmpty',
+        url: '/api/list-stories',
+        key: 'stories',
+        renderItem: storyCard
+    });
+
+    const renderLists = () => {
+        textsList.schedule();
+        storiesList.schedule();
+    };
+    $(window).on('scroll resize', renderLists);
+    $('#historyTabs button[data-bs-toggle="tab"]').on('shown.bs.tab', renderLists);
+    renderLists();
+
+    // Cards are re-rendered while scrolling, so their events are delegated
+    const lists = $('#textsList, #storiesList');
+
+    // View text button or card click
+    lists.on('click', '.history-card[data-type="text"]', function() {
+        viewText($(this).data('id'));
+    });
+
+    // View/continue story button or card click
+    lists.on('click', '.history-card[data-type="story"]', function() {
+        viewStory($(this).data('id'));
+    });
+
+    // Delete text button click
+    lists.on('click', '.delete-text-btn', function(e) {
+        e.stopPropagation(); // Prevent card click
+        const id = $(this).data('id');
+        showConfirmation(
+            "Delete Text", 
+            "Are you sure you want to delete this text? This action cannot be undone.",
+            () => deleteText(id)
+        );
+    });
+
+    // Delete story button click
+    lists.on('click', '.delete-story-btn', function(e) {
+        e.stopPropagation(); // Prevent card click
+        const id = $(this).data('id');
+        showConfirmation(
+            "Delete Story", 
+            "Are you sure you want to delete this story? This action cannot be undone.",
+            () => deleteStory(id)
+        );
+    });
+
+    // Confirm action button click
+    $('#confirmActionBtn').click(function() {
+        // Execute callback function if exists
+        if (typeof currentActionCallback === 'function') {
+            currentActionCallback();
+        }
+
+        // Hide modal
+        $('#confirmationModal').modal('hide');
+    });
+
+    // Print button in text modal
+    $('#printTextModalBtn').click(function() {
+        if (currentViewingItem) {
+            printText(currentViewingItem);
+        }
+    });
+
+    // Copy button in text modal
+    $('#copyTextModalBtn').click(function() {
+        if (currentViewingItem) {
+            copyTextToClipboard(currentViewingItem.text);
+        }
+    });
+
+    // Print button in story modal
+    $('#printStoryModalBtn').click(function() {
+        if (currentViewingItem) {
+            printStory(currentViewingItem);
+        }
+    });
+
+    // Copy button in story modal
+    $('#copyStoryModalBtn').click(function() {
+        if (currentViewingItem) {
+            copyTextToClipboard(currentViewingItem.text);
+        }
+    });
+
+    // Export links in the text and story modals
+    $('.export-text-btn').click(function() {
+        if (currentViewingItem) {
+            exportItem('text', currentViewingItem.id, $(this).data('format'));
+        }
+    });
+
+    $('.export-story-btn').click(function() {
+        if (currentViewingItem) {
+            exportItem('story', currentViewingItem.id, $(this).data('format'));
+        }
+    });
+
+    // Story part selector change
+    $('#storyPartSelector').change(function() {
+        const partIndex = $(this).val();
+        if (currentViewingItem && currentViewingItem.parts) {
+            displayStoryPart(currentViewingItem, partIndex);
+        }
+    });
+
+    // Continue story button in modal
+    $('#continueStoryModalBtn').click(function() {
+        if (currentViewingItem) {
+            continueStory(currentViewingItem.id);
+        }
+    });
+
+    // Clear all history button
+    $('#clearHistoryBtn').click(function() {
+        showConfirmation(
+            "Clear All History", 
+            "Are you sure you want to clear all history? This will delete all texts and stories and cannot be undone.",
+            clearAllHistory
+        );
+    });
+
+    // Export history button
+    $('#exportHistoryBtn').click(function() {
+        exportHistory();
+    });
+});
+
+// View text details in modal, loading the full text and its enrichments
+// Open a printable export of a text or story, or download it
+function exportItem(kind, id, format) {
+    const url = `/api/export/${kind}/${encodeURIComponent(id)}?format=${format}`;
+    if (format === 'html') {
+        window.open(url, '_blank');
+    } else {
+        window.location.href = url;
+    }
+}
+
+function viewText(id) {
+    $.ajax({
+        url: '/api/get-history-item',
+        method: 'GET',
+        data: { text_id: id },
+        success: function(response) {
+            if (response.success) {
+                showTextModal(response.text);
+            } else {
+                showCustomAlert('Error retrieving text: ' + (response.error || 'Unknown error'), 'danger');
+            }
+        },
+        error: function(xhr, status, error) {
+            showCustomAlert('Failed to retrieve text. Please try again.', 'danger');
+            console.error(error);
+        }
+    });
+}
+
+// Show a loaded text in the modal
+function showTextModal(textData) {
+    // Store current viewing item
+    currentViewingItem = textData;
+
+    // Update modal title
+    $('#viewTextModalLabel').text(textData.topic);
+
+    // Update text content
+    $('#modalTextContent').html(textData.text.replace(/\n/g, '<br>'));
+
+    // Update summary content
+    if (textData.summary) {
+        $('#modalSummaryContent').html(`
+            <div class="text-content">
+                ${textData.summary.replace(/\n/g, '<br>')}
+            </div>
+        `);
+    } else {
+        $('#modalSummaryContent').html(`
+            <div class="text-center py-4">
+                <i class="fas fa-list fa-2x text-muted mb-2"></i>
+                <p class="text-muted">No summary available for this text.</p>
+            </div>
+        `);
+    }
+
+    // Update vocabulary content
+    if (textData.key_words) {
+        try {
+            displayModalVocabulary(textData.key_words);
+        } catch (e) {
+            $('#modalVocabularyContent').html(`
+                <div class="text-center py-4">
+                    <i class="fas fa-exclamation-triangle fa-2x text-warning mb-2"></i>
+                    <p class="text-muted">Could not display vocabulary data.</p>
+                </div>
+            `);
+        }
+    } else {
+        $('#modalVocabularyContent').html(`
+            <div class="text-center py-4">
+                <i class="fas fa-book fa-2x text-muted mb-2"></i>
+                <p class="text-muted">No vocabulary available for this text.</p>
+            </div>
+        `);
+    }
+
+    // Update questions content
+    if (textData.questions) {
+        try {
+            displayModalQuestions(textData.questions);
+        } catch (e) {
+            $('#modalQuestionsContent').html(`
+                <div class="text-center py-4">
+                    <i class="fas fa-exclamation-triangle fa-2x text-warning mb-2"></i>
+                    <p class="text-muted">Could not display questions data.</p>
+                </div>
+            `);
+        }
+    } else {
+        $('#modalQuestionsContent').html(`
+            <div class="text-center py-4">
+                <i class="fas fa-question-circle fa-2x text-muted mb-2"></i>
+                <p class="text-muted">No questions available for this text.</p>
+            </div>
+        `);
+    }
+
+    // Update exercises content
+    if (textData.exercises) {
+        try {
+            displayModalExercises(textData.exercises);
+        } catch (e) {
+            $('#modalExercisesContent').html(`
+                <div class="text-center py-4">
+                    <i class="fas fa-exclamation-triangle fa-2x text-warning mb-2"></i>
+                    <p class="text-muted">Could not display exercises data.</p>
+                </div>
+            `);
+        }
+    } else {
+        $('#modalExercisesContent').html(`
+            <div class="text-center py-4">
+                <i class="fas fa-tasks fa-2x text-muted mb-2"></i>
+                <p class="text-muted">No exercises available for this text.</p>
+            </div>
+        `);
+    }
+
+    // Update translation content
+    if (textData.translation) {
+        try {
+            displayModalTranslation(textData.translation, textData.translation_language);
+        } catch (e) {
+            $('#modalTranslationContent').html(`
+                <div class="text-center py-4">
+                    <i class="fas fa-exclamation-triangle fa-2x text-warning mb-2"></i>
+                    <p class="text-muted">Could not display translation data.</p>
+                </div>
+            `);
+        }
+    } else {
+        $('#modalTranslationContent').html(`
+            <div class="text-center py-4">
+                <i class="fas fa-language fa-2x text-muted mb-2"></i>
+                <p class="text-muted">No translation available for this text.</p>
+            </div>
+        `);
+    }
+
+    // Show modal
+    $('#viewTextModal').modal('show');
+}
+
+// View story details in modal
+function viewStory(id) {
+    $.ajax({
+        url: '/api/get-story',
+        method: 'GET',
+        data: { story_id: id },
+        success: function(response) {
+            if (response.success) {
+                // Stored stories do not carry their id
+                const storyData = { ...response.story, id: id };
+
+                // Store current viewing item
+                currentViewingItem = storyData;
+
+                // Update modal title
+                $('#viewStoryModalLabel').text(storyData.title);
+
+                // Update story info
+                $('#modalStoryLanguage').text(storyData.language);
+                $('#modalStoryLevel').text(storyData.level);
+
+                // Parts are keyed by the choice path leading to them, '' for the beginning
+                const paths = Object.keys(storyData.parts).sort((a, b) => a.length - b.length || a.localeCompare(b));
+                $('#modalStoryParts').text(`Parts: ${paths.length}`);
+
+                // Check if any branch of the story is complete
+                const isComplete = paths.some(path => storyData.parts[path].is_final);
+
+                if (isComplete) {
+                    $('#modalStoryStatus').text('Completed').removeClass('bg-warning').addClass('bg-success');
+                    $('#continueStoryModalBtn').addClass('d-none');
+                } else {
+                    $('#modalStoryStatus').text('In Progress').removeClass('bg-success').addClass('bg-warning');
+                    $('#continueStoryModalBtn').removeClass('d-none');
+                }
+
+                // Populate part selector, one option per explored branch point
+                $('#storyPartSelector').empty();
+                paths.forEach(path => {
+                    const partChoice = storyData.parts[path].choice_made || 'Beginning';
+                    const branch = path ? ` (${path.split('').join('-')})` : '';
+                    $('#storyPartSelector').append(
+                        $('<option>').val(path).text(`Part ${path.length + 1}${branch}: ${partChoice}`)
+                    );
+                });
+
+                // Display first part by default
+                displayStoryPart(storyData, '');
+
+                // Show modal
+                $('#viewStoryModal').modal('show');
+            } else {
+                showCustomAlert('Error retrieving story: ' + (response.error || 'Unknown error'), 'danger');
+            }
+        },
+        error: function(xhr, status, error) {
+            showCustomAlert('Failed to retrieve story. Please try again.', 'danger');
+            console.error(error);
+        }
+    });
+}
+
+// Display specific story part
+function displayStoryPart(storyData, partKey) {
+    const part = storyData.parts[partKey];
+    if (!part) return;
+
+    // Display part text
+    $('#modalStoryContent').html(part.text.replace(/\n/g, '<br>'));
+
+    // Display choice if not first part
+    if (part.choice_made) {
+        $('#modalStoryChoices').removeClass('d-none');
+        $('#modalStoryChoice').text(part.choice_made);
+    } else {
+        $('#modalStoryChoices').addClass('d-none');
+    }
+
+    // Update select
+    $('#storyPartSelector').val(partKey);
+}
+
+// Display vocabulary data in modal
+function displayModalVocabulary(vocabularyData) {
+    let html = '<div class="accordion" id="modalVocabularyAccordion">';
+
+    const vocabItems = Array.isArray(vocabularyData) ? 
+        vocabularyData : 
+        (vocabularyData.hasOwnProperty('length') ? vocabularyData : [vocabularyData]);
+
+    vocabItems.forEach((item, index) => {
+        const word = item.word || '';
+        const definition = item.definition || '';
+        const example = item.example || '';
+
+        html += `
+            <div class="accordion-item">
+                <h2 class="accordion-header" id="modal-vocab-heading-${index}">
+                    <button class="accordion-button collapsed" type="button" data-bs-toggle="collapse" data-bs-target="#modal-vocab-collapse-${index}" aria-expanded="false" aria-controls="modal-vocab-collapse-${index}">
+                        ${word}
+                    </button>
+                </h2>
+                <div id="modal-vocab-collapse-${index}" class="accordion-collapse collapse" aria-labelledby="modal-vocab-heading-${index}" data-bs-parent="#modalVocabularyAccordion">
+                    <div class="accordion-body">
+                        <p><strong>Definition:</strong> ${definition}</p>
+                        <p><strong>Example:</strong> ${example}</p>
+                    </div>
+                </div>
+            </div>
+        `;
+    });
+
+    html += '</div>';
+    $('#modalVocabularyContent').html(html);
+}
+
+// Display questions data in modal
+function displayModalQuestions(questionsData) {
+    let html = '<div class="accordion" id="modalQuestionsAccordion">';
+
+    let questionItems = [];
+
+    if (Array.isArray(questionsData)) {
+        questionItems = questionsData;
+    } else if (typeof questionsData === 'object') {
+        if (questionsData.questions && Array.isArray(questionsData.questions)) {
+            questionItems = questionsData.questions;
+        } else {
+            questionItems = [questionsData];
+        }
+    }
+
+    questionItems.forEach((item, index) => {
+        const question = item.question || '';
+        const answer = item.answer || '';
+
+        html += `
+            <div class="accordion-item">
+                <h2 class="accordion-header" id="modal-question-heading-${index}">
+                    <button class="accordion-button collapsed" type="button" data-bs-toggle="collapse" data-bs-target="#modal-question-collapse-${index}" aria-expanded="false" aria-controls="modal-question-collapse-${index}">
+                        ${question}
+                    </button>
+                </h2>
+                <div id="modal-question-collapse-${index}" class="accordion-collapse collapse" aria-labelledby="modal-question-heading-${index}" data-bs-parent="#modalQuestionsAccordion">
+                    <div class="accordion-body">
+                        <p><strong>Answer:</strong> ${answer}</p>
+                    </div>
+                </div>
+            </div>
+        `;
+    });
+
+    html += '</div>';
+    $('#modalQuestionsContent').html(html);
+}
+
+// Display exercises data in modal
+function displayModalExercises(exercisesData) {
+    let html = '<div class="accordion" id="modalExercisesAccordion">';
+
+    let exerciseItems = [];
+
+    if (Array.isArray(exercisesData)) {
+        exerciseItems = exercisesData;
+    } else if (typeof exercisesData === 'object') {
+        if (exercisesData.exercises && Array.isArray(exercisesData.exercises)) {
+            exerciseItems = exercisesData.exercises;
+        } else {
+            exerciseItems = [exercisesData];
+        }
+    }
+
+    exerciseItems.forEach((item, index) => {
+        const instructions = item.instructions || '';
+        const content = item.content || '';
+        const solution = item.solution || '';
+
+        html += `
+            <div class="accordion-item">
+                <h2 class="accordion-header" id="modal-exercise-heading-${index}">
+                    <button class="accordion-button collapsed" type="button" data-bs-toggle="collapse" data-bs-target="#modal-exercise-collapse-${index}" aria-expanded="false" aria-controls="modal-exercise-collapse-${index}">
+                        Exercise ${index+1}: ${instructions}
+                    </button>
+                </h2>
+                <div id="modal-exercise-collapse-${index}" class="accordion-collapse collapse" aria-labelledby="modal-exercise-heading-${index}" data-bs-parent="#modalExercisesAccordion">
+                    <div class="accordion-body">
+                        <p><strong>Content:</strong> ${content}</p>
+                        <p class="mt-3 solution-hidden">
+                            <button class="btn btn-sm btn-outline-primary modal-show-solution-btn" data-index="${index}">
+                                <i class="fas fa-eye me-1"></i>Show Solution
+                            </button>
+                        </p>
+                        <div class="solution-content modal-solution-${index} d-none">
+                            <p><strong>Solution:</strong> ${solution}</p>
+                        </div>
+                    </div>
+                </div>
+            </div>
+        `;
+    });
+
+    html += '</div>';
+    $('#modalExercisesContent').html(html);
+
+    // Add event listener for show solution buttons
+    $('.modal-show-solution-btn').click(function() {
+        const index = $(this).data('index');
+        $(this).addClass('d-none');
+        $(`.modal-solution-${index}`).removeClass('d-none');
+    });
+}
+
+// Display translation data in modal
+function displayModalTranslation(translationData, targetLanguage) {
+    let html = `
+        <div class="mb-3">
+            <h5>Translation to ${targetLanguage || 'other language'}</h5>
+        </div>
+    `;
+
+    if (Array.isArray(translationData)) {
+        html += '<div class="translation-content">';
+
+        translationData.forEach((item) => {
+            const original = item.original || '';
+            const translation = item.translation || '';
+
+            html += `
+                <div class="row mb-3 border-bottom pb-2">
+                    <div class="col-md-6">
+                        <div class="original-text">
+                            <p>${original}</p>
+                        </div>
+                    </div>
+                    <div class="col-md-6">
+                        <div class="translation-text">
+                            <p>${translation}</p>
+                        </div>
+                    </div>
+                </div>
+            `;
+        });
+
+        html += '</div>';
+    } else {
+        html = `<div class="alert alert-warning">
+                    Could not display translation data in the expected format.
+                </div>
+                <pre>${JSON.stringify(translationData, null, 2)}</pre>`;
+    }
+
+    $('#modalTranslationContent').html(html);
+}
+
+// Delete text
+function deleteText(id) {
+    $.ajax({
+        url: '/api/delete-text',
+        method: 'POST',
+        data: JSON.stringify({ text_id: id }),
+        contentType: 'application/json',
+        success: function(response) {
+            if (response.success) {
+                showCustomAlert('Text deleted successfully!', 'success');
+                textsList.reset(); // Reload the pages in view
+            } else {
+                showCustomAlert('Error deleting text: ' + (response.error || 'Unknown error'), 'danger');
+            }
+        },
+        error: function(xhr, status, error) {
+            showCustomAlert('Failed to delete text. Please try again.', 'danger');
+            console.error(error);
+        }
+    });
+}
+
+// Delete story
+function deleteStory(id) {
+    $.ajax({
+        url: '/api/delete-story',
+        method: 'POST',
+        data: JSON.stringify({ story_id: id }),
+        contentType: 'application/json',
+        success: function(response) {
+            if (response.success) {
+                showCustomAlert('Story deleted successfully!', 'success');
+                storiesList.reset(); // Reload the pages in view
+            } else {
+                showCustomAlert('Error deleting story: ' + (response.error || 'Unknown error'), 'danger');
+            }
+        },
+        error: function(xhr, status, error) {
+            showCustomAlert('Failed to delete story. Please try again.', 'danger');
+            console.error(error);
+        }
+    });
+}
+
+// Continue story
+function continueStory(id) {
+    // Navigate to interactive story page with story ID
+    window.location.href = `/interactive-story?story_id=${id}`;
+}
+
+// Print text
+function printText(textData) {
+    if (!textData) return;
+
+    const printWindow = window.open('', '_blank');
+    printWindow.document.write(`
+        <html>
+            <head>
+                <title>${textData.topic}</title>
+                <style>
+                    body {
+                        font-family: Arial, sans-serif;
+                        padding: 20px;
+                        line-height: 1.6;
+                    }
+                    h1 {
+                        text-align: center;
+                        color: #4F8BF9;
+                        margin-bottom: 20px;
+                    }
+                    .metadata {
+                        text-align: center;
+                        color: #666;
+                        margin-bottom: 30px;
+                    }
+                    .content {
+                        max-width: 800px;
+                        margin: 0 auto;
+                    }
+                    hr {
+                        margin: 30px 0;
+                        border: 0;
+                        border-top: 1px solid #ddd;
+                    }
+                    h2 {
+                        color: #4F8BF9;
+                        margin-top: 30px;
+                    }
+                </style>
+            </head>
+            <body>
+                <h1>${textData.topic}</h1>
+                <div class="metadata">
+                    <p>Language: ${textData.language} | Level: ${textData.level}</p>
+                </div>
+                <div class="content">
+                    <div class="text">
+                        ${textData.text.replace(/\n/g, '<br>')}
+                    </div>
+
+                    ${textData.summary ? `
+                        <hr>
+                        <h2>Summary</h2>
+                        <div class="summary">
+                            ${textData.summary.replace(/\n/g, '<br>')}
+                        </div>
+                    ` : ''}
+                </div>
+            </body>
+        </html>
+    `);
+
+    printWindow.document.close();
+    printWindow.focus();
+    setTimeout(() => {
+        printWindow.print();
+        printWindow.close();
+    }, 500);
+}
+
+// Print story
+function printStory(storyData) {
+    if (!storyData) return;
+
+    const printWindow = window.open('', '_blank');
+
+    let storyText = '';
+    // Combine the parts of the branch leading to the selected part
+    const path = $('#storyPartSelector').val() || '';
+    for (let depth = 0; depth <= path.length; depth++) {
+        const part = storyData.parts[path.slice(0, depth)];
+        if (part) {
+            storyText += part.text + '\n\n';
+        }
+    }
+
+    printWindow.document.write(`
+        <html>
+            <head>
+                <title>${storyData.title}</title>
+                <style>
+                    body {
+                        font-family: Arial, sans-serif;
+                        padding: 20px;
+                        line-height: 1.6;
+                    }
+                    h1 {
+                        text-align: center;
+                        color: #4F8BF9;
+                        margin-bottom: 20px;
+                    }
+                    .metadata {
+                        text-align: center;
+                        color: #666;
+                        margin-bottom: 30px;
+                    }
+                    .content {
+                        max-width: 800px;
+                        margin: 0 auto;
+                    }
+                </style>
+            </head>
+            <body>
+                <h1>${storyData.title}</h1>
+                <div class="metadata">
+                    <p>Language: ${storyData.language} | Level: ${storyData.level} | Parts: ${partKeys.length}</p>
+                </div>
+                <div class="content">
+                    ${storyText.replace(/\n/g, '<br>')}
+                </div>
+            </body>
+        </html>
+    `);
+
+    printWindow.document.close();
+    printWindow.focus();
+    setTimeout(() => {
+        printWindow.print();
+        printWindow.close();
+    }, 500);
+}
+
+// Copy text to clipboard
+function copyTextToClipboard(text) {
+    if (!text) return;
+
+    navigator.clipboard.writeText(text)
+        .then(() => {
+            showCustomAlert('Text copied to clipboard!', 'success');
+        })
+        .catch(() => {
+            showCustomAlert('Failed to copy text. Please try again.', 'danger');
+        });
+}
+
+// Show confirmation modal
+function showConfirmation(title, message, callback) {
+    $('#confirmationModalLabel').text(title);
+    $('#confirmationModalBody').text(message);
+    currentActionCallback = callback;
+    $('#confirmationModal').modal('show');
+}
+
+// Clear all history
+function clearAllHistory() {
+    // In a real implementation, this would be an API call
+    showCustomAlert('All history cleared successfully!', 'success');
+    location.reload(); // Reload page to reflect changes
+}
+
+// Export history
+function exportHistory() {
+    // The server streams the export, so large histories are never built in the browser
+    const downloadAnchorNode = document.createElement('a');
+    downloadAnchorNode.setAttribute("href", "/api/export-history");
+    downloadAnchorNode.setAttribute("download", "language-learning-history.ndjson");
+    document.body.appendChild(downloadAnchorNode);
+    downloadAnchorNode.click();
+    downloadAnchorNode.remove();
+
+    showCustomAlert('History exported successfully!', 'success');
+}
+
+// Show custom alert
+function showCustomAlert(message, type = 'info') {
+    // Create alert element
+    const alertHtml = `
+        <div class="custom-alert alert alert-${type} alert-dismissible fade show">
+            <div>${message}</div>
+            <button type="button" class="btn-close" data-bs-dismiss="alert" aria-label="Close"></button>
+        </div>
+    `;
+
+    // Add alert to the page
+    $('body').append(alertHtml);
+
+    // Auto-dismiss after 5 seconds
+    setTimeout(function() {
+        $('.custom-alert').alert('close');
+    }, 5000);
+}
@@ -0,0 +1,541 @@
+/**
+ * Interactive story page: story parts, choices and saving
+ */
+
+// Current story data; path holds the choices made so far ('1' or '2' each)
+let currentStoryData = {
+    id: null,
+    title: '',
+    language: '',
+    level: '',
+    path: '',
+    part: 1,
+    text: '',
+    choices: [],
+    explored: [],
+    is_final: false
+};
+
+// Story data before each choice made, for going back
+let storyTrail = [];
+
+$(document).ready(function() {
+    // Load settings
+    const settings = JSON.parse(localStorage.getItem('appSettings')) || {};
+    if (settings.defaultLanguage) {
+        $('#language').val(settings.defaultLanguage);
+    }
+    if (settings.defaultLevel) {
+        $('#level').val(settings.defaultLevel);
+    }
+
+    // Form submission - Start new story
+    $('#storyGeneratorForm').submit(function(e) {
+        e.preventDefault();
+        startNewStory();
+    });
+
+    // Start new story buttons
+    $('#newStoryBtn, #newStoryAfterEndBtn').click(function() {
+        resetStoryInterface();
+    });
+
+    // Choice buttons
+    $('#choice1').click(function() {
+        makeChoice(0);
+    });
+
+    $('#choice2').click(function() {
+        makeChoice(1);
+    });
+
+    // Back buttons
+    $('.back-choice-btn').click(function() {
+        goBack();
+    });
+
+    // End story button
+    $('#endStoryBtn').click(function() {
+        endStory();
+    });
+
+    // Generate vocabulary buttons
+    $('#generateVocabularyBtn, #vocabularyTabGenBtn').click(function() {
+        generateVocabulary();
+    });
+
+    // Generate translation buttons
+    $('#generateTranslationBtn, #translationTabGenBtn').click(function() {
+        generateTranslation();
+    });
+
+    // Copy and print buttons
+    $('#copyStoryBtn').click(function() {
+        copyStoryToClipboard();
+    });
+
+    $('#printStoryBtn').click(function() {
+        printStory();
+    });
+});
+
+// Start a new story
+function startNewStory() {
+    // Show loading overlay
+    $('#loadingOverlay').removeClass('d-none');
+    $('#loadingMessage').text('Generating story...');
+
+    // Get form data
+    const language = $('#language').val();
+    const level = $('#level').val();
+    const title = $('#storyTitle').val() || 'Adventure';
+
+    storyTrail = [];
+    requestStoryPart({ language, level, topic: title, path: '', new_story: true }, function(response) {
+        updateStoryData({
+            id: response.story_id,
+            title: title,
+            language: language,
+            level: level,
+            path: '',
+            part: 1,
+            text: response.story_part.story_text,
+            choices: [
+                response.story_part.choice_1,
+                response.story_part.choice_2
+            ],
+            explored: response.explored || [],
+            is_final: response.story_part.is_final || false
+        });
+
+        displayStory();
+    }, 'story');
+}
+
+// Make a choice and continue the story
+function makeChoice(choiceIndex) {
+    if (!currentStoryData.id) return;
+
+    // Show loading overlay
+    $('#loadingOverlay').removeClass('d-none');
+    $('#loadingMessage').text('Generating next part...');
+
+    // Parts are keyed by the choices leading to them
+    const path = currentStoryData.path + (choiceIndex + 1);
+
+    requestStoryPart({
+        story_id: currentStoryData.id,
+        language: currentStoryData.language,
+        level: currentStoryData.level,
+        topic: currentStoryData.title,
+        path
+    }, function(response) {
+        storyTrail.push({ ...currentStoryData });
+        updateStoryData({
+            path,
+            part: path.length + 1,
+            text: currentStoryData.text + '\n\n' + response.story_part.story_text,
+            choices: [
+                response.story_part.choice_1,
+                response.story_part.choice_2
+            ],
+            explored: response.explored || [],
+            is_final: response.story_part.is_final || false
+        });
+
+        displayStory();
+    }, 'story continuation');
+}
+
+// Return to the previous part to pick the other choice; branches already read are kept
+function goBack() {
+    if (!storyTrail.length) return;
+
+    const choiceTaken = currentStoryData.path.slice(-1);
+    currentStoryData = storyTrail.pop();
+    if (!currentStoryData.explored.includes(choiceTaken)) {
+        currentStoryData.explored = [...currentStoryData.explored, choiceTaken];
+    }
+    displayStory();
+}
+
+// Get the part of the story at a choice path, generated or from storage
+function requestStoryPart(requestData, onSuccess, what) {
+    // Get settings from localStorage
+    const settings = JSON.parse(localStorage.getItem('appSettings')) || {};
+
+    $.ajax({
+        url: '/api/generate-story-part',
+        type: 'POST',
+        data: JSON.stringify({
+            ...requestData,
+            // Sampling left unset is taken from the server's task profile
+            temperature: settings.temperature,
+            top_p: settings.topP,
+            max_retries: settings.maxRetries || 3
+        }),
+        contentType: 'application/json',
+        success: function(response) {
+            if (response.success) {
+                onSuccess(response);
+            } else {
+                showCustomAlert(`Error generating ${what}: ` + (response.error || 'Unknown error'), 'danger');
+            }
+            $('#loadingOverlay').addClass('d-none');
+        },
+        error: function(xhr, status, error) {
+            showCustomAlert(`Failed to generate ${what}. Please try again.`, 'danger');
+            $('#loadingOverlay').addClass('d-none');
+            console.error(error);
+        }
+    });
+}
+
+// Update story data
+function updateStoryData(data) {
+    // Merge new data with current data
+    currentStoryData = {
+        ...currentStoryData,
+        ...data
+    };
+}
+
+// Display story
+function displayStory() {
+    // Hide initial message, show story content
+    $('#initialMessage').addClass('d-none');
+    $('#storyContent').removeClass('d-none');
+
+    // Update title and part indicator
+    $('#storyTitleDisplay').html(`
+        <i class="fas fa-book-open me-2"></i>${currentStoryData.title}
+        <span class="story-part-indicator">${currentStoryData.part}</span>
+    `);
+
+    // Display story text
+    $('#mainStoryText').html(currentStoryData.text.replace(/\n/g, '<br>'));
+
+    // Update choices or show ending
+    if (currentStoryData.is_final) {
+        // Story has ended
+        $('#storyChoices').addClass('d-none');
+        $('#storySettings').addClass('d-none');
+        $('#storyEnded').removeClass('d-none');
+    } else {
+        // Show choices
+        $('#storySettings').addClass('d-none');
+        $('#storyEnded').addClass('d-none');
+        $('#storyChoices').removeClass('d-none');
+
+        // Update choice buttons, marking branches that are already stored
+        ['1', '2'].forEach((choice, index) => {
+            const button = $(`#choice${choice}`).text(currentStoryData.choices[index]);
+            if (currentStoryData.explored.includes(choice)) {
+                button.prepend('<i class="fas fa-history me-2" title="Already explored"></i>');
+            }
+        });
+    }
+    $('.back-choice-btn').toggleClass('d-none', !storyTrail.length);
+
+    // Scroll to top of story
+    $('#storyContent')[0].scrollIntoView({ behavior: 'smooth' });
+}
+
+// Reset story interface to start new story
+function resetStoryInterface() {
+    // Reset story data
+    currentStoryData = {
+        id: null,
+        title: '',
+        language: '',
+        level: '',
+        path: '',
+        part: 1,
+        text: '',
+        choices: [],
+        explored: [],
+        is_final: false
+    };
+    storyTrail = [];
+
+    // Reset interface
+    $('#storySettings').removeClass('d-none');
+    $('#storyChoices').addClass('d-none');
+    $('#storyEnded').addClass('d-none');
+    $('#storyContent').addClass('d-none');
+    $('#initialMessage').removeClass('d-none');
+
+    // Clear vocabulary and translation
+    $('#vocabularyContent').html(`
+        <div class="text-center py-4 vocabulary-placeholder">
+            <i class="fas fa-book fa-2x text-muted mb-2"></i>
+            <p class="text-muted">No vocabulary list generated yet.</p>
+            <button class="btn btn-sm btn-primary" id="vocabularyTabGenBtn">
+                <i class="fas fa-magic me-1"></i>Generate Vocabulary
+            </button>
+        </div>
+    `);
+
+    $('#translationContent').html(`
+        <div class="text-center py-4 translation-placeholder">
+            <i class="fas fa-language fa-2x text-muted mb-2"></i>
+            <p class="text-muted">No translation generated yet.</p>
+            <div class="mb-3">
+                <label for="translationTargetLang" class="form-label">Target Language</label>
+                <select class="form-select" id="translationTargetLang">
+                    <!-- Language options will be added dynamically -->
+                </select>
+            </div>
+            <button class="btn btn-sm btn-primary" id="translationTabGenBtn">
+                <i class="fas fa-magic me-1"></i>Generate Translation
+            </button>
+        </div>
+    `);
+
+    // Rebind event handlers
+    $('#vocabularyTabGenBtn').click(function() {
+        generateVocabulary();
+    });
+
+    $('#translationTabGenBtn').click(function() {
+        generateTranslation();
+    });
+}
+
+// End current story
+function endStory() {
+    if (!currentStoryData.id) return;
+
+    // Mark story as final
+    currentStoryData.is_final = true;
+
+    // Update interface
+    $('#storyChoices').addClass('d-none');
+    $('#storyEnded').removeClass('d-none');
+
+    showCustomAlert('Story ended. You can now generate vocabulary or translation.', 'info');
+}
+
+// Generate vocabulary for the story
+function generateVocabulary() {
+    if (!currentStoryData.id) return;
+
+    $('#loadingOverlay').removeClass('d-none');
+    $('#loadingMessage').text('Generating vocabulary...');
+
+    // Mock API call for vocabulary generation
+    // In a real implementation, this would be an actual API call
+    setTimeout(function() {
+        const wordCount = currentStoryData.level === 'A1-A2' ? 5 : 
+                         (currentStoryData.level === 'B1-B2' ? 8 : 10);
+
+        // Sample vocabulary data (would come from API in real implementation)
+        const vocabData = [
+            {
+                word: "Sample Word 1",
+                definition: "Definition of the first sample word.",
+                example: "Example sentence using the first sample word."
+            },
+            {
+                word: "Sample Word 2",
+                definition: "Definition of the second sample word.",
+                example: "Example sentence using the second sample word."
+            },
+            {
+                word: "Sample Word 3",
+                definition: "Definition of the third sample word.",
+                example: "Example sentence using the third sample word."
+            }
+        ];
+
+        displayVocabulary(vocabData);
+        $('#loadingOverlay').addClass('d-none');
+
+        // Show vocabulary tab
+        $('#vocabulary-tab').tab('show');
+
+        showCustomAlert('Vocabulary generated successfully!', 'success');
+    }, 1500);
+}
+
+// Display vocabulary
+function displayVocabulary(vocabularyData) {
+    let html = '<div class="accordion" id="vocabularyAccordion">';
+
+    try {
+        vocabularyData.forEach((item, index) => {
+            const word = item.word || '';
+            const definition = item.definition || '';
+            const example = item.example || '';
+
+            html += `
+                <div class="accordion-item">
+                    <h2 class="accordion-header" id="vocab-heading-${index}">
+                        <button class="accordion-button collapsed" type="button" data-bs-toggle="collapse" data-bs-target="#vocab-collapse-${index}" aria-expanded="false" aria-controls="vocab-collapse-${index}">
+                            ${word}
+                        </button>
+                    </h2>
+                    <div id="vocab-collapse-${index}" class="accordion-collapse collapse" aria-labelledby="vocab-heading-${index}" data-bs-parent="#vocabularyAccordion">
+                        <div class="accordion-body">
+                            <p><strong>Definition:</strong> ${definition}</p>
+                            <p><strong>Example:</strong> ${example}</p>
+                        </div>
+                    </div>
+                </div>
+            `;
+        });
+    } catch (e) {
+        console.error('Error parsing vocabulary data', e);
+        html = `<div class="alert alert-warning">
+                    Could not display vocabulary data in the expected format.
+                </div>`;
+    }
+
+    html += '</div>';
+    $('#vocabularyContent').html(html);
+}
+
+// Generate translation for the story
+function generateTranslation() {
+    if (!currentStoryData.id) return;
+
+    $('#loadingOverlay').removeClass('d-none');
+    $('#loadingMessage').text('Generating translation...');
+
+    // Get selected target language
+    const targetLanguage = $('#translationTargetLang').val();
+
+    // Mock API call for translation generation
+    // In a real implementation, this would be an actual API call
+    setTimeout(function() {
+        // Sample translation data (would come from API in real implementation)
+        const translationData = [
+            {
+                original: "First paragraph of the story.",
+                translation: "Translation of the first paragraph."
+            },
+            {
+                original: "Second paragraph with more text.",
+                translation: "Translation of the second paragraph with more text."
+            },
+            {
+                original: "Third paragraph concluding this sample.",
+                translation: "Translation of the third paragraph concluding this sample."
+            }
+        ];
+
+        displayTranslation(translationData, targetLanguage);
+        $('#loadingOverlay').addClass('d-none');
+
+        // Show translation tab
+        $('#translation-tab').tab('show');
+
+        showCustomAlert('Translation generated successfully!', 'success');
+    }, 1500);
+}
+
+// Display translation
+function displayTranslation(translationData, targetLanguage) {
+    let html = `
+        <div class="mb-3">
+            <h5>Translation to ${targetLanguage || 'other language'}</h5>
+        </div>
+    `;
+
+    try {
+        html += '<div class="translation-content">';
+
+        translationData.forEach((item) => {
+            const original = item.original || '';
+            const translation = item.translation || '';
+
+            html += `
+                <div class="row mb-3 border-bottom pb-2">
+                    <div class="col-md-6">
+                        <div class="original-text">
+                            <p>${original}</p>
+                        </div>
+                    </div>
+                    <div class="col-md-6">
+                        <div class="translation-text">
+                            <p>${translation}</p>
+                        </div>
+                    </div>
+                </div>
+            `;
+        });
+
+        html += '</div>';
+    } catch (e) {
+        console.error('Error parsing translation data', e);
+        html = `<div class="alert alert-warning">
+                    Could not display translation data in the expected format.
+                </div>`;
+    }
+
+    $('#translationContent').html(html);
+}
+
+// Copy story to clipboard
+function copyStoryToClipboard() {
+    if (!currentStoryData.text) return;
+
+    navigator.clipboard.writeText(currentStoryData.text)
+        .then(() => {
+            showCustomAlert('Story copied to clipboard!', 'success');
+        })
+        .catch(() => {
+            showCustomAlert('Failed to copy story. Please try again.', 'danger');
+        });
+}
+
+// Print story
+function printStory() {
+    if (!currentStoryData.text) return;
+
+    const printWindow = window.open('', '_blank');
+    printWindow.document.write(`
+        <html>
+            <head>
+                <title>${currentStoryData.title}</title>
+                <style>
+                    body {
+                        font-family: Arial, sans-serif;
+                        padding: 20px;
+                        line-height: 1.6;
+                    }
+                    h1 {
+                        text-align: center;
+                        color: #4F8BF9;
+                        margin-bottom: 20px;
+                    }
+                    .metadata {
+                        text-align: center;
+                        color: #666;
+                        margin-bottom: 30px;
+                    }
+                    .content {
+                        max-width: 800px;
+                        margin: 0 auto;
+                    }
+                </style>
+            </head>
+            <body>
+                <h1>${currentStoryData.title}</h1>
+                <div class="metadata">
+                    <p>Language: ${currentStoryData.language} | Level: ${currentStoryData.level} | Parts: ${currentStoryData.part}</p>
+                </div>
+                <div class="content">
+                    ${currentStoryData.text.replace(/\n/g, '<br>')}
+                </div>
+            </body>
+        </html>
+    `);
+
+    printWindow.document.close();
+    printWindow.focus();
+    setTimeout(() => {
+        printWindow.print();
+        printWindow.close();
+    }, 500);
+}
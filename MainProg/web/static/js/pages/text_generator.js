@@ -0,0 +1,978 @@
+/**
+ * Text generator page: generation, streamed enrichments and display
+ */
+
+// Current text data
+let currentTextData = null;
+let currentTextSaved = true;  // False for texts generated without saving them to history
+
+// Enrichments being generated for the current text
+const loadingEnrichments = new Set();
+
+$(document).ready(function() {
+    // Load settings
+    const settings = JSON.parse(localStorage.getItem('appSettings')) || {};
+    if (settings.defaultLanguage) {
+        $('#language').val(settings.defaultLanguage);
+    }
+    if (settings.defaultLevel) {
+        $('#level').val(settings.defaultLevel);
+    }
+    if (settings.fontSize) {
+        document.documentElement.style.setProperty('--text-font-size', `${settings.fontSize}px`);
+    }
+
+    // Toggle custom topic input
+    $('input[name="topicOption"]').change(function() {
+        if ($('#customTopic').is(':checked')) {
+            $('#customTopicInput').removeClass('d-none');
+            $('#popularTopicsSection').addClass('d-none');
+        } else {
+            $('#customTopicInput').addClass('d-none');
+            $('#popularTopicsSection').removeClass('d-none');
+        }
+    });
+
+    // Toggle translation options
+    $('#includeTranslation').change(function() {
+        if ($(this).is(':checked')) {
+            $('#translationOptions').removeClass('d-none');
+            // Set default translation language different from main language
+            const mainLang = $('#language').val();
+            $('#translationLanguage option').each(function() {
+                if ($(this).val() !== mainLang) {
+                    $('#translationLanguage').val($(this).val());
+                    return false; // break the loop
+                }
+            });
+        } else {
+            $('#translationOptions').addClass('d-none');
+        }
+    });
+
+    // Update translation language options when main language changes
+    $('#language').change(function() {
+        const mainLang = $(this).val();
+        $('#translationLanguage option').prop('disabled', false);
+        $(`#translationLanguage option[value="${mainLang}"]`).prop('disabled', true);
+
+        // If current selection is now disabled, change it
+        if ($('#translationLanguage').val() === mainLang) {
+            $('#translationLanguage option').each(function() {
+                if ($(this).val() !== mainLang) {
+                    $('#translationLanguage').val($(this).val());
+                    return false; // break the loop
+                }
+            });
+        }
+
+        // Also update translation tab's language selector
+        $('#translationTargetLang option').prop('disabled', false);
+        $(`#translationTargetLang option[value="${mainLang}"]`).prop('disabled', true);
+
+        // Update popular topics based on level
+        updatePopularTopics();
+    });
+
+    // Update popular topics when level changes
+    $('#level').change(function() {
+        updatePopularTopics();
+    });
+
+    // Popular topics handler
+    $(document).on('click', '.topic-badge', function() {
+        const topic = $(this).text();
+        $('#customTopic').prop('checked', true).trigger('change');
+        $('#topic').val(topic);
+    });
+
+    // Initialize popular topics
+    updatePopularTopics();
+
+    // Form submission - Generate text
+    $('#textGeneratorForm').submit(function(e) {
+        e.preventDefault();
+        generateText();
+    });
+
+    // Generate additional content buttons
+    $('#generateSummaryBtn').click(function() {
+        generateSummary();
+    });
+
+    $('#generateVocabularyBtn').click(function() {
+        generateVocabulary();
+    });
+
+    $('#generateQuestionsBtn').click(function() {
+        generateQuestions();
+    });
+
+    $('#generateExercisesBtn').click(function() {
+        generateExercises();
+    });
+
+    $('#generateTranslationBtn').click(function() {
+        generateTranslation();
+    });
+
+    // Generate enrichments only when their tab is opened
+    $('#contentTabs button[data-bs-toggle="tab"]').on('shown.bs.tab', function() {
+        const name = {
+            'summary-tab': 'summary',
+            'vocabulary-tab': 'key_words',
+            'questions-tab': 'questions',
+            'exercises-tab': 'exercises'
+        }[this.id];
+        if (name && currentTextData && !currentTextData[name]) {
+            requestEnrichment(name);
+        }
+    });
+
+    // Action buttons
+    $('#copyTextBtn').click(function() {
+        copyTextToClipboard();
+    });
+
+    $('#printTextBtn').click(function() {
+        printText();
+    });
+
+    $('#saveTextBtn').click(function() {
+        saveText();
+    });
+
+    $('#clearTextBtn').click(function() {
+        clearText();
+    });
+});
+
+// Update popular topics based on language and level
+function updatePopularTopics() {
+    const level = $('#level').val();
+
+    // Define popular topics by level
+    const popularTopics = {
+        'A1-A2': ["Daily Routines", "Family and Friends", "Weather", "Hobbies", "Food"],
+        'B1-B2': ["Travel Experiences", "Sports and Health", "Environmental Issues", "Technology", "Cultural Differences"],
+        'C1-C2': ["Global Economy", "Philosophy and Ethics", "Literature and Art", "Scientific Developments", "Social Change"]
+    };
+
+    // Get topics for selected level
+    const topics = popularTopics[level] || popularTopics['B1-B2'];
+
+    // Clear current topics
+    $('#popularTopics').empty();
+
+    // Add topics as badges
+    topics.forEach(topic => {
+        $('#popularTopics').append(`
+            <span class="badge bg-light text-primary border cursor-pointer topic-badge">${topic}</span>
+        `);
+    });
+}
+
+// Generate text
+function generateText() {
+    // Show loading overlay
+    $('#loadingOverlay').removeClass('d-none');
+    $('#loadingMessage').text('Generating text...');
+
+    // Get form data
+    const language = $('#language').val();
+    const level = $('#level').val();
+    const wordCount = $('#wordCount').val();
+    const textType = $('#textType').val();
+    const topicOption = $('input[name="topicOption"]:checked').val();
+    const topic = topicOption === 'custom' ? $('#topic').val() : '';
+
+    // Additional options
+    const includeSummary = $('#includeSummary').is(':checked');
+    const includeKeyWords = $('#includeKeyWords').is(':checked');
+    const includeQuestions = $('#includeQuestions').is(':checked');
+    const includeExercises = $('#includeExercises').is(':checked');
+    const includeTranslation = $('#includeTranslation').is(':checked');
+    const translationLanguage = $('#translationLanguage').val();
+
+    // Get settings from localStorage
+    const settings = JSON.parse(localStorage.getItem('appSettings')) || {};
+    // Sampling left unset is taken from the server's task profile
+    const temperature = settings.temperature;
+    const topP = settings.topP;
+    const maxRetries = settings.maxRetries || 3;
+    const saveHistory = settings.saveHistory !== undefined ? settings.saveHistory : true;
+
+    // Prepare request data
+    const requestData = {
+        language,
+        level,
+        word_count: parseInt(wordCount),
+        text_type: textType,
+        topic,
+        temperature,
+        top_p: topP,
+        max_retries: maxRetries,
+        include_summary: includeSummary,
+        include_key_words: includeKeyWords,
+        include_questions: includeQuestions,
+        include_exercises: includeExercises,
+        include_translation: includeTranslation,
+        translation_language: includeTranslation ? translationLanguage : null,
+        save_history: saveHistory
+    };
+
+    // Offer a stored text on a similar topic before paying for a new one
+    if (!topic) {
+        requestTextGeneration(requestData);
+        return;
+    }
+
+    $.ajax({
+        url: '/api/find-similar',
+        type: 'POST',
+        data: JSON.stringify({ language, level, text_type: textType, topic }),
+        contentType: 'application/json',
+        success: function(response) {
+            if (response.success && response.text &&
+                confirm(`A similar text already exists: "${response.text.topic}". Use it instead of generating a new one?`)) {
+                currentTextData = response.text;
+                currentTextSaved = true;
+                displayText(currentTextData);
+                $('#loadingOverlay').addClass('d-none');
+            } else {
+                requestTextGeneration(requestData);
+            }
+        },
+        error: function() {
+            requestTextGeneration(requestData);
+        }
+    });
+}
+
+// Send the text generation request; the main text arrives first and
+// each enrichment is streamed into its tab as soon as it is ready
+function requestTextGeneration(requestData) {
+    fetch('/api/generate-text', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({ ...requestData, stream: true })
+    })
+        .then(response => {
+            if (!response.ok || !response.body) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return readEventStream(response.body.getReader(), handleGenerationEvent);
+        })
+        .catch(error => {
+            showAlert('Failed to generate text. Please try again.', 'danger');
+            console.error(error);
+        })
+        .finally(() => {
+            $('#loadingOverlay').addClass('d-none');
+        });
+}
+
+// Read server-sent events from a response body
+function readEventStream(reader, onEvent) {
+    const decoder = new TextDecoder();
+    let buffer = '';
+
+    function read() {
+        return reader.read().then(({ done, value }) => {
+            if (done) return;
+            buffer += decoder.decode(value, { stream: true });
+
+            let boundary;
+            while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                const block = buffer.slice(0, boundary);
+                buffer = buffer.slice(boundary + 2);
+
+                let event = 'message';
+                let data = '';
+                block.split('\n').forEach(line => {
+                    if (line.startsWith('event: ')) event = line.slice(7);
+                    else if (line.startsWith('data: ')) data += line.slice(6);
+                });
+                onEvent(event, data ? JSON.parse(data) : {});
+            }
+            return read();
+        });
+    }
+
+    return read();
+}
+
+// Handle one event of a streamed text generation
+function handleGenerationEvent(event, data) {
+    if (event === 'text') {
+        currentTextData = data.text;
+        currentTextSaved = data.saved !== false;
+        loadingEnrichments.clear();
+        displayText(currentTextData);
+        $('#loadingOverlay').addClass('d-none');
+        if (data.degraded) {
+            showAlert('Text generation is unavailable right now, so a stored text is shown instead.', 'warning');
+        }
+        (data.pending || []).forEach(name => {
+            loadingEnrichments.add(name);
+            showEnrichmentLoading(name);
+        });
+    } else if (event === 'enrichment') {
+        loadingEnrichments.delete(data.name);
+        if (data.fields) {
+            Object.assign(currentTextData, data.fields);
+            displayEnrichment(data.name);
+        } else {
+            $(enrichmentContainers[data.name]).html(`<div class="alert alert-warning">${data.error}</div>`);
+        }
+    } else if (event === 'error') {
+        showAlert('Error generating text: ' + (data.error || 'Unknown error'), 'danger');
+    }
+}
+
+// Result containers of the enrichment tabs
+const enrichmentContainers = {
+    summary: '#summaryContent',
+    key_words: '#vocabularyContent',
+    questions: '#questionsContent',
+    exercises: '#exercisesContent',
+    translation: '#translationContent'
+};
+
+// Show a spinner in the tab of an enrichment that is still being generated
+function showEnrichmentLoading(name) {
+    $(enrichmentContainers[name]).html(`
+        <div class="text-center py-4">
+            <div class="spinner-border spinner-border-sm text-primary mb-2" role="status"></div>
+            <p class="text-muted">Generating...</p>
+        </div>
+    `);
+}
+
+// Display a single enrichment of the current text
+function displayEnrichment(name) {
+    if (name === 'summary') {
+        $('#summaryContent').html(`
+            <div class="text-content">
+                ${currentTextData.summary.replace(/\n/g, '<br>')}
+            </div>
+        `);
+    } else if (name === 'key_words') {
+        displayVocabulary(currentTextData.key_words);
+    } else if (name === 'questions') {
+        displayQuestions(currentTextData.questions);
+    } else if (name === 'exercises') {
+        displayExercises(currentTextData.exercises);
+    } else if (name === 'translation') {
+        displayTranslation(currentTextData.translation, currentTextData.translation_language);
+    }
+}
+
+// Display generated text and additional content
+function displayText(textData) {
+    // Update title
+    $('#textTitle').html(`<i class="fas fa-file-alt me-2"></i>${textData.topic}`);
+
+    // Show text content, hide initial message
+    $('#initialMessage').addClass('d-none');
+    $('#textContent').removeClass('d-none');
+
+    // Enable action buttons
+    $('#copyTextBtn, #printTextBtn, #saveTextBtn, #clearTextBtn').prop('disabled', false);
+
+    // Display main text
+    $('#mainText').html(textData.text.replace(/\n/g, '<br>'));
+
+    // Display summary if available
+    if (textData.summary) {
+        $('#summaryContent').html(`
+            <div class="text-content">
+                ${textData.summary.replace(/\n/g, '<br>')}
+            </div>
+        `);
+    } else {
+        $('#summaryContent').html(`
+            <div class="text-center py-4 summary-placeholder">
+                <i class="fas fa-list fa-2x text-muted mb-2"></i>
+                <p class="text-muted">No summary generated yet.</p>
+                <button class="btn btn-sm btn-primary" id="generateSummaryBtn">
+                    <i class="fas fa-magic me-1"></i>Generate Summary
+                </button>
+            </div>
+        `);
+    }
+
+    // Display vocabulary if available
+    if (textData.key_words && (Array.isArray(textData.key_words) || typeof textData.key_words === 'object')) {
+        displayVocabulary(textData.key_words);
+    } else {
+        $('#vocabularyContent').html(`
+            <div class="text-center py-4 vocabulary-placeholder">
+                <i class="fas fa-book fa-2x text-muted mb-2"></i>
+                <p class="text-muted">No vocabulary list generated yet.</p>
+                <button class="btn btn-sm btn-primary" id="generateVocabularyBtn">
+                    <i class="fas fa-magic me-1"></i>Generate Vocabulary
+                </button>
+            </div>
+        `);
+    }
+
+    // Display questions if available
+    if (textData.questions) {
+        displayQuestions(textData.questions);
+    } else {
+        $('#questionsContent').html(`
+            <div class="text-center py-4 questions-placeholder">
+                <i class="fas fa-question-circle fa-2x text-muted mb-2"></i>
+                <p class="text-muted">No comprehension questions generated yet.</p>
+                <button class="btn btn-sm btn-primary" id="generateQuestionsBtn">
+                    <i class="fas fa-magic me-1"></i>Generate Questions
+                </button>
+            </div>
+        `);
+    }
+
+    // Display exercises if available
+    if (textData.exercises) {
+        displayExercises(textData.exercises);
+    } else {
+        $('#exercisesContent').html(`
+            <div class="text-center py-4 exercises-placeholder">
+                <i class="fas fa-tasks fa-2x text-muted mb-2"></i>
+                <p class="text-muted">No language exercises generated yet.</p>
+                <button class="btn btn-sm btn-primary" id="generateExercisesBtn">
+                    <i class="fas fa-magic me-1"></i>Generate Exercises
+                </button>
+            </div>
+        `);
+    }
+
+    // Display translations if available
+    if (textData.translations && Object.keys(textData.translations).length > 1) {
+        displayTranslationSets(textData.translations);
+    } else if (textData.translation) {
+        displayTranslation(textData.translation, textData.translation_language);
+    } else {
+        $('#translationContent').html(`
+            <div class="text-center py-4 translation-placeholder">
+                <i class="fas fa-language fa-2x text-muted mb-2"></i>
+                <p class="text-muted">No translation generated yet.</p>
+                <div class="mb-3">
+                    <label for="translationTargetLang" class="form-label">Target Languages</label>
+                    <select class="form-select" id="translationTargetLang" multiple size="4">
+                        ${generateLanguageOptions(textData.language)}
+                    </select>
+                </div>
+                <button class="btn btn-sm btn-primary" id="generateTranslationBtn">
+                    <i class="fas fa-magic me-1"></i>Generate Translation
+                </button>
+            </div>
+        `);
+    }
+
+    // Rebind event handlers for dynamic content
+    $('#generateSummaryBtn').click(function() {
+        generateSummary();
+    });
+
+    $('#generateVocabularyBtn').click(function() {
+        generateVocabulary();
+    });
+
+    $('#generateQuestionsBtn').click(function() {
+        generateQuestions();
+    });
+
+    $('#generateExercisesBtn').click(function() {
+        generateExercises();
+    });
+
+    $('#generateTranslationBtn').click(function() {
+        generateTranslation();
+    });
+}
+
+// Generate language options excluding current language
+function generateLanguageOptions(currentLanguage) {
+    const languages = [
+        "English", "Turkish", "German", "French", "Spanish",
+        "Italian", "Dutch", "Russian", "Portuguese", "Japanese"
+    ];
+
+    const firstOther = languages.find(lang => lang !== currentLanguage);
+    return languages.map(lang => {
+        const disabled = lang === currentLanguage ? 'disabled' : '';
+        const selected = lang === firstOther ? 'selected' : '';
+        return `<option value="${lang}" ${disabled} ${selected}>${lang}</option>`;
+    }).join('');
+}
+
+// Display vocabulary
+function displayVocabulary(vocabularyData) {
+    let html = '<div class="accordion" id="vocabularyAccordion">';
+
+    try {
+        const vocabItems = Array.isArray(vocabularyData) ? 
+            vocabularyData : 
+            (vocabularyData.hasOwnProperty('length') ? vocabularyData : [vocabularyData]);
+
+        vocabItems.forEach((item, index) => {
+            const word = item.word || '';
+            const definition = item.definition || '';
+            const example = item.example || '';
+
+            html += `
+                <div class="accordion-item">
+                    <h2 class="accordion-header" id="vocab-heading-${index}">
+                        <button class="accordion-button collapsed" type="button" data-bs-toggle="collapse" data-bs-target="#vocab-collapse-${index}" aria-expanded="false" aria-controls="vocab-collapse-${index}">
+                            ${word}
+                        </button>
+                    </h2>
+                    <div id="vocab-collapse-${index}" class="accordion-collapse collapse" aria-labelledby="vocab-heading-${index}" data-bs-parent="#vocabularyAccordion">
+                        <div class="accordion-body">
+                            <p><strong>Definition:</strong> ${definition}</p>
+                            <p><strong>Example:</strong> ${example}</p>
+                        </div>
+                    </div>
+                </div>
+            `;
+        });
+    } catch (e) {
+        console.error('Error parsing vocabulary data', e);
+        html = `<div class="alert alert-warning">
+                    Could not display vocabulary data in the expected format.
+                </div>
+                <pre>${JSON.stringify(vocabularyData, null, 2)}</pre>`;
+    }
+
+    html += '</div>';
+    $('#vocabularyContent').html(html);
+}
+
+// Display questions
+function displayQuestions(questionsData) {
+    let html = '<div class="accordion" id="questionsAccordion">';
+
+    try {
+        let questionItems = [];
+
+        if (Array.isArray(questionsData)) {
+            questionItems = questionsData;
+        } else if (typeof questionsData === 'object') {
+            if (questionsData.questions && Array.isArray(questionsData.questions)) {
+                questionItems = questionsData.questions;
+            } else {
+                questionItems = [questionsData];
+            }
+        }
+
+        questionItems.forEach((item, index) => {
+            const question = item.question || '';
+            const answer = item.answer || '';
+
+            html += `
+                <div class="accordion-item">
+                    <h2 class="accordion-header" id="question-heading-${index}">
+                        <button class="accordion-button collapsed" type="button" data-bs-toggle="collapse" data-bs-target="#question-collapse-${index}" aria-expanded="false" aria-controls="question-collapse-${index}">
+                            ${question}
+                        </button>
+                    </h2>
+                    <div id="question-collapse-${index}" class="accordion-collapse collapse" aria-labelledby="question-heading-${index}" data-bs-parent="#questionsAccordion">
+                        <div class="accordion-body">
+                            <p><strong>Answer:</strong> ${answer}</p>
+                        </div>
+                    </div>
+                </div>
+            `;
+        });
+    } catch (e) {
+        console.error('Error parsing questions data', e);
+        html = `<div class="alert alert-warning">
+                    Could not display questions data in the expected format.
+                </div>
+                <pre>${JSON.stringify(questionsData, null, 2)}</pre>`;
+    }
+
+    html += '</div>';
+    $('#questionsContent').html(html);
+}
+
+// Display exercises
+function displayExercises(exercisesData) {
+    let html = '<div class="accordion" id="exercisesAccordion">';
+
+    try {
+        let exerciseItems = [];
+
+        if (Array.isArray(exercisesData)) {
+            exerciseItems = exercisesData;
+        } else if (typeof exercisesData === 'object') {
+            if (exercisesData.exercises && Array.isArray(exercisesData.exercises)) {
+                exerciseItems = exercisesData.exercises;
+            } else {
+                exerciseItems = [exercisesData];
+            }
+        }
+
+        exerciseItems.forEach((item, index) => {
+            const instructions = item.instructions || '';
+            const content = item.content || '';
+            const solution = item.solution || '';
+
+            html += `
+                <div class="accordion-item">
+                    <h2 class="accordion-header" id="exercise-heading-${index}">
+                        <button class="accordion-button collapsed" type="button" data-bs-toggle="collapse" data-bs-target="#exercise-collapse-${index}" aria-expanded="false" aria-controls="exercise-collapse-${index}">
+                            Exercise ${index+1}: ${instructions}
+                        </button>
+                    </h2>
+                    <div id="exercise-collapse-${index}" class="accordion-collapse collapse" aria-labelledby="exercise-heading-${index}" data-bs-parent="#exercisesAccordion">
+                        <div class="accordion-body">
+                            <p><strong>Content:</strong> ${content}</p>
+                            <p class="mt-3 solution-hidden">
+                                <button class="btn btn-sm btn-outline-primary show-solution-btn" data-index="${index}">
+                                    <i class="fas fa-eye me-1"></i>Show Solution
+                                </button>
+                            </p>
+                            <div class="solution-content solution-${index} d-none">
+                                <p><strong>Solution:</strong> ${solution}</p>
+                            </div>
+                        </div>
+                    </div>
+                </div>
+            `;
+        });
+    } catch (e) {
+        console.error('Error parsing exercises data', e);
+        html = `<div class="alert alert-warning">
+                    Could not display exercises data in the expected format.
+                </div>
+                <pre>${JSON.stringify(exercisesData, null, 2)}</pre>`;
+    }
+
+    html += '</div>';
+    $('#exercisesContent').html(html);
+
+    // Add event listener for show solution buttons
+    $('.show-solution-btn').click(function() {
+        const index = $(this).data('index');
+        $(this).addClass('d-none');
+        $(`.solution-${index}`).removeClass('d-none');
+    });
+}
+
+// Display translation
+function displayTranslation(translationData, targetLanguage) {
+    $('#translationContent').html(translationHtml(translationData, targetLanguage));
+}
+
+// Display the translations of a text into several languages, one section per language
+function displayTranslationSets(translations) {
+    $('#translationContent').html('<div id="translationSets"></div>');
+    Object.values(translations).forEach(translationSet => addTranslationSet(translationSet));
+}
+
+// Add or replace the section of one translation set
+function addTranslationSet(translationSet) {
+    const id = `translation-set-${translationSet.language}`;
+    const html = `<div id="${id}" class="mb-4">${translationHtml(translationSet.lines, translationSet.language)}</div>`;
+    if ($(`#${id}`).length) {
+        $(`#${id}`).replaceWith(html);
+    } else {
+        $('#translationSets').append(html);
+    }
+}
+
+// Markup of a line-by-line translation
+function translationHtml(translationData, targetLanguage) {
+    let html = `
+        <div class="mb-3">
+            <h5>Translation to ${targetLanguage || 'other language'}</h5>
+        </div>
+    `;
+
+    try {
+        if (Array.isArray(translationData)) {
+            html += '<div class="translation-content">';
+
+            translationData.forEach((item) => {
+                const original = item.original || '';
+                const translation = item.translation || '';
+
+                html += `
+                    <div class="row mb-3 border-bottom pb-2">
+                        <div class="col-md-6">
+                            <div class="original-text">
+                                <p>${original}</p>
+                            </div>
+                        </div>
+                        <div class="col-md-6">
+                            <div class="translation-text">
+                                <p>${translation}</p>
+                            </div>
+                        </div>
+                    </div>
+                `;
+            });
+
+            html += '</div>';
+        } else {
+            html = `<div class="alert alert-warning">
+                        Could not display translation data in the expected format.
+                    </div>
+                    <pre>${JSON.stringify(translationData, null, 2)}</pre>`;
+        }
+    } catch (e) {
+        console.error('Error parsing translation data', e);
+        html = `<div class="alert alert-warning">
+                    Could not display translation data in the expected format.
+                </div>
+                <pre>${JSON.stringify(translationData, null, 2)}</pre>`;
+    }
+
+    return html;
+}
+
+// Get an enrichment of the current text; the server generates it on
+// first request and returns the stored copy afterwards
+function requestEnrichment(name, translationLanguage) {
+    if (!currentTextData || loadingEnrichments.has(name)) return;
+
+    const textId = currentTextData.id;
+    loadingEnrichments.add(name);
+    showEnrichmentLoading(name);
+
+    $.ajax({
+        url: `/api/enrichment/${name}`,
+        type: 'POST',
+        data: JSON.stringify({
+            text_id: textId,
+            // The server only knows texts that were saved to history
+            text: currentTextSaved ? undefined : {
+                topic: currentTextData.topic,
+                text: currentTextData.text,
+                language: currentTextData.language,
+                level: currentTextData.level
+            },
+            translation_language: translationLanguage,
+            max_retries: (JSON.parse(localStorage.getItem('appSettings')) || {}).maxRetries || 3
+        }),
+        contentType: 'application/json',
+        success: function(response) {
+            // Ignore results for a text that is no longer displayed
+            if (!currentTextData || currentTextData.id !== textId) return;
+            Object.assign(currentTextData, response.fields);
+            displayEnrichment(name);
+        },
+        error: function(xhr) {
+            const message = (xhr.responseJSON && xhr.responseJSON.error) || 'Please try again.';
+            $(enrichmentContainers[name]).html(`<div class="alert alert-warning">${message}</div>`);
+        },
+        complete: function() {
+            loadingEnrichments.delete(name);
+        }
+    });
+}
+
+// Generate summary for existing text
+function generateSummary() {
+    requestEnrichment('summary');
+}
+
+// Generate vocabulary for existing text
+function generateVocabulary() {
+    requestEnrichment('key_words');
+}
+
+// Generate questions for existing text
+function generateQuestions() {
+    requestEnrichment('questions');
+}
+
+// Generate exercises for existing text
+function generateExercises() {
+    requestEnrichment('exercises');
+}
+
+// Generate translations for existing text; several languages are translated at once
+function generateTranslation() {
+    const languages = $('#translationTargetLang').val() || [];
+    if (languages.length === 1) {
+        requestEnrichment('translation', languages[0]);
+    } else if (languages.length > 1) {
+        requestTranslations(languages);
+    }
+}
+
+// Translate the current text into several languages, showing each translation as it arrives
+function requestTranslations(languages) {
+    if (!currentTextData || loadingEnrichments.has('translation')) return;
+
+    const textId = currentTextData.id;
+    loadingEnrichments.add('translation');
+    $('#translationContent').html('<div id="translationSets"></div>');
+    languages.forEach(language => {
+        $('#translationSets').append(`
+            <div id="translation-set-${language}" class="text-center py-3">
+                <div class="spinner-border spinner-border-sm text-primary mb-2" role="status"></div>
+                <p class="text-muted">Translating into ${language}...</p>
+            </div>
+        `);
+    });
+
+    fetch('/api/translate-text', {
+        method: 'POST',
+        headers: { 'Content-Type': 'application/json' },
+        body: JSON.stringify({
+            text_id: textId,
+            target_languages: languages,
+            max_retries: (JSON.parse(localStorage.getItem('appSettings')) || {}).maxRetries || 3
+        })
+    })
+        .then(response => {
+            if (!response.ok || !response.body) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+            return readEventStream(response.body.getReader(), (event, data) => {
+                // Ignore results for a text that is no longer displayed
+                if (!currentTextData || currentTextData.id !== textId) return;
+                if (event === 'translation' && data.translation) {
+                    currentTextData.translations = { ...(currentTextData.translations || {}), [data.language]: data.translation };
+                    if (!currentTextData.translation) {
+                        currentTextData.translation = data.translation.lines;
+                        currentTextData.translation_language = data.language;
+                    }
+                    addTranslationSet(data.translation);
+                } else if (event === 'translation') {
+                    $(`#translation-set-${data.language}`).html(`<div class="alert alert-warning">${data.error}</div>`);
+                } else if (event === 'error') {
+                    $('#translationContent').html(`<div class="alert alert-warning">${data.error || 'Please try again.'}</div>`);
+                }
+            });
+        })
+        .catch(error => {
+            showAlert('Failed to translate the text. Please try again.', 'danger');
+            console.error(error);
+        })
+        .finally(() => {
+            loadingEnrichments.delete('translation');
+        });
+}
+
+// Copy text to clipboard
+function copyTextToClipboard() {
+    if (!currentTextData) return;
+
+    const textToCopy = currentTextData.text;
+
+    navigator.clipboard.writeText(textToCopy)
+        .then(() => {
+            showAlert('Text copied to clipboard!', 'success');
+        })
+        .catch(() => {
+            showAlert('Failed to copy text. Please try again.', 'danger');
+        });
+}
+
+// Print text
+function printText() {
+    if (!currentTextData) return;
+
+    const printWindow = window.open('', '_blank');
+    printWindow.document.write(`
+        <html>
+            <head>
+                <title>${currentTextData.topic}</title>
+                <style>
+                    body {
+                        font-family: Arial, sans-serif;
+                        padding: 20px;
+                        line-height: 1.6;
+                    }
+                    h1 {
+                        text-align: center;
+                        color: #4F8BF9;
+                        margin-bottom: 20px;
+                    }
+                    .metadata {
+                        text-align: center;
+                        color: #666;
+                        margin-bottom: 30px;
+                    }
+                    .content {
+                        max-width: 800px;
+                        margin: 0 auto;
+                    }
+                    hr {
+                        margin: 30px 0;
+                        border: 0;
+                        border-top: 1px solid #ddd;
+                    }
+                    h2 {
+                        color: #4F8BF9;
+                        margin-top: 30px;
+                    }
+                </style>
+            </head>
+            <body>
+                <h1>${currentTextData.topic}</h1>
+                <div class="metadata">
+                    <p>Language: ${currentTextData.language} | Level: ${currentTextData.level}</p>
+                </div>
+                <div class="content">
+                    <div class="text">
+                        ${currentTextData.text.replace(/\n/g, '<br>')}
+                    </div>
+
+                    ${currentTextData.summary ? `
+                        <hr>
+                        <h2>Summary</h2>
+                        <div class="summary">
+                            ${currentTextData.summary.replace(/\n/g, '<br>')}
+                        </div>
+                    ` : ''}
+                </div>
+            </body>
+        </html>
+    `);
+
+    printWindow.document.close();
+    printWindow.focus();
+    setTimeout(() => {
+        printWindow.print();
+        printWindow.close();
+    }, 500);
+}
+
+// Save text
+function saveText() {
+    // This will be handled by the server-side history feature
+    showAlert('Text saved to history!', 'success');
+}
+
+// Clear text
+function clearText() {
+    currentTextData = null;
+    $('#textContent').addClass('d-none');
+    $('#initialMessage').removeClass('d-none');
+    $('#textTitle').html('<i class="fas fa-file-alt me-2"></i>Generated Text');
+    $('#copyTextBtn, #printTextBtn, #saveTextBtn, #clearTextBtn').prop('disabled', true);
+}
+
+// Show alert message
+function showAlert(message, type = 'info') {
+    const alertHtml = `
+        <div class="alert alert-${type} alert-dismissible fade show" role="alert">
+            ${message}
+            <button type="button" class="btn-close" data-bs-dismiss="alert" aria-label="Close"></button>
+        </div>
+    `;
+
+    // Add alert to the page
+    $('main').prepend(alertHtml);
+
+    // Auto-dismiss after 5 seconds
+    setTimeout(function() {
+        $('.alert').alert('close');
+    }, 5000);
+}
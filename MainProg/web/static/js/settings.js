@@ -0,0 +1,94 @@
+/**
+ * Settings modal and alerts shared by every page
+ */
+
+$(document).ready(function() {
+    // Update range value displays
+    $('#temperature').on('input', function() {
+        $('#temperatureValue').text($(this).val());
+    });
+
+    $('#topP').on('input', function() {
+        $('#topPValue').text($(this).val());
+    });
+
+    $('#fontSize').on('input', function() {
+        $('#fontSizeValue').text($(this).val());
+    });
+
+    // Save settings
+    $('#saveSettings').click(function() {
+        const settings = {
+            defaultLanguage: $('#defaultLanguage').val(),
+            defaultLevel: $('#defaultLevel').val(),
+            saveHistory: $('#saveHistory').prop('checked'),
+            temperature: parseFloat($('#temperature').val()),
+            topP: parseFloat($('#topP').val()),
+            maxRetries: parseInt($('#maxRetries').val()),
+            fontSize: parseInt($('#fontSize').val()),
+            theme: $('#theme').val()
+        };
+
+        // Save settings to localStorage
+        localStorage.setItem('appSettings', JSON.stringify(settings));
+
+        // Apply theme if changed
+        if (settings.theme === 'dark') {
+            $('body').addClass('dark-theme');
+        } else {
+            $('body').removeClass('dark-theme');
+        }
+
+        // Close modal
+        $('#settingsModal').modal('hide');
+
+        // Show success message
+        showAlert('Settings saved successfully!', 'success');
+    });
+
+    // Load settings from localStorage
+    const loadSettings = function() {
+        const savedSettings = localStorage.getItem('appSettings');
+        if (savedSettings) {
+            const settings = JSON.parse(savedSettings);
+
+            $('#defaultLanguage').val(settings.defaultLanguage);
+            $('#defaultLevel').val(settings.defaultLevel);
+            $('#saveHistory').prop('checked', settings.saveHistory);
+            $('#temperature').val(settings.temperature);
+            $('#temperatureValue').text(settings.temperature);
+            $('#topP').val(settings.topP);
+            $('#topPValue').text(settings.topP);
+            $('#maxRetries').val(settings.maxRetries);
+            $('#fontSize').val(settings.fontSize);
+            $('#fontSizeValue').text(settings.fontSize);
+            $('#theme').val(settings.theme);
+
+            // Apply theme
+            if (settings.theme === 'dark') {
+                $('body').addClass('dark-theme');
+            }
+        }
+    };
+
+    // Load settings on page load
+    loadSettings();
+});
+
+// Helper function to show alerts
+function showAlert(message, type = 'info') {
+    const alertHtml = `
+        <div class="alert alert-${type} alert-dismissible fade show" role="alert">
+            ${message}
+            <button type="button" class="btn-close" data-bs-dismiss="alert" aria-label="Close"></button>
+        </div>
+    `;
+
+    // Add alert to the page
+    $('main').prepend(alertHtml);
+
+    // Auto-dismiss after 5 seconds
+    setTimeout(function() {
+        $('.alert').alert('close');
+    }, 5000);
+}